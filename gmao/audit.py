@@ -0,0 +1,88 @@
+import hashlib
+import os
+from datetime import datetime, timedelta, timezone
+
+from gmao.core import (
+    audit_event, create_audit_triggers, db_fetchall, db_fetchone, db_transaction, drop_audit_triggers, retry_on_busy
+)
+from gmao.exporter import iter_columnar, write_columnar
+
+# === Configuration ===
+AUDIT_ARCHIVE_DIR = 'audit_archives'
+AUDIT_RETENTION_DAYS = 90  # entries older than this leave the live table on compaction
+AUDIT_COMPACT_MIN_ENTRIES = 10000  # below this, compaction is not worth a new file
+AUDIT_PAGE_SIZE = 200
+AUDIT_COLUMNS = ('id', 'created_at', 'user_id', 'action', 'table_name', 'row_id', 'changes')
+
+# === Reading ===
+def audit_page(table=None, before=None, limit=AUDIT_PAGE_SIZE):
+    # Newest first, keyset-paged on id: [(id, created_at, username, action, table_name, row_id, changes)]
+    before = 2 ** 63 - 1 if before is None else before
+    condition, params = ("WHERE a.table_name=? AND a.id < ?", (table, before)) if table else ("WHERE a.id < ?", (before,))
+    return db_fetchall(f'''SELECT a.id, a.created_at, COALESCE(u.username, ''), a.action, a.table_name, a.row_id,
+                                  a.changes
+                           FROM audit_log a LEFT JOIN users u ON u.id = a.user_id
+                           {condition} ORDER BY a.id DESC LIMIT ?''', (*params, limit))
+
+def audit_tables():
+    return [row[0] for row in db_fetchall("SELECT DISTINCT table_name FROM audit_log ORDER BY table_name")]
+
+def list_archives():
+    return db_fetchall('''SELECT id, created_at, path, first_id, last_id, date_from, date_to, entries, sha256
+                          FROM audit_archives ORDER BY id''')
+
+def iter_archive(path):
+    # Entries of one archive file, as tuples in AUDIT_COLUMNS order
+    return iter_columnar(path)
+
+# === Compaction ===
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+@retry_on_busy
+def compact_audit_log(retention_days=AUDIT_RETENTION_DAYS, min_entries=AUDIT_COMPACT_MIN_ENTRIES,
+                      archive_dir=AUDIT_ARCHIVE_DIR):
+    # Moves entries older than retention_days into a zlib-compressed columnar
+    # file (gmao.exporter format) registered in audit_archives. Everything
+    # happens under one write lock, so no entry can be archived twice or lost;
+    # the file is written under a temporary name and only moved into place once
+    # the delete has committed, so a failed commit leaves no archive behind.
+    # Returns the number of entries archived.
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=retention_days)).strftime("%Y-%m-%d %H:%M:%S")
+    row = db_fetchone("SELECT COUNT(*) FROM audit_log WHERE created_at < ?", (cutoff,))
+    if row[0] < max(min_entries, 1):
+        return 0
+    
+    os.makedirs(archive_dir, exist_ok=True)
+    temporary, committed = None, False
+    try:
+        with db_transaction() as c:
+            c.execute("BEGIN IMMEDIATE")
+            first_id, last_id, count, date_from, date_to = c.execute(
+                '''SELECT MIN(id), MAX(id), COUNT(*), MIN(created_at), MAX(created_at)
+                   FROM audit_log WHERE created_at < ?''', (cutoff,)).fetchone()
+            if not count:
+                return 0
+            path = os.path.join(archive_dir, f"audit_{first_id}_{last_id}.gcol")
+            temporary = path + ".tmp"
+            rows = c.connection.execute(f'''SELECT {', '.join(AUDIT_COLUMNS)} FROM audit_log
+                                            WHERE created_at < ? ORDER BY id''', (cutoff,))
+            write_columnar(temporary, AUDIT_COLUMNS, rows)
+            c.execute('''INSERT INTO audit_archives (path, first_id, last_id, date_from, date_to, entries, sha256)
+                         VALUES (?, ?, ?, ?, ?, ?, ?)''',
+                      (path, first_id, last_id, date_from, date_to, count, _file_sha256(temporary)))
+            drop_audit_triggers(c)
+            c.execute("DELETE FROM audit_log WHERE created_at < ?", (cutoff,))
+            create_audit_triggers(c)
+            audit_event('audit_log', 'bulk', changes={'archive': [None, path], 'entries': [count, 0]})
+        committed = True
+        os.replace(temporary, path)
+    finally:
+        # After the commit the temporary file is the only copy of the entries: it is kept
+        if not committed and temporary is not None and os.path.exists(temporary):
+            os.remove(temporary)
+    return count
@@ -0,0 +1,2245 @@
+import sqlite3
+import os
+import sys
+import threading
+import time
+import random
+import functools
+import heapq
+import hashlib
+import hmac
+import json
+import re
+import bisect
+import calendar
+import math
+import difflib
+import unicodedata
+from contextlib import contextmanager
+from datetime import date, timedelta
+from operator import itemgetter
+from concurrent.futures import ThreadPoolExecutor
+
+# === Configuration ===
+KEY_FILE = 'secret.key'
+DB_FILE = 'gmao_encrypted.db'
+INITIAL_PASSWORD = 'admin123'
+LOW_STOCK_THRESHOLD = 5
+DB_BUSY_TIMEOUT = 5000  # ms
+DB_JOURNAL_MODE = 'WAL'
+DB_STATEMENT_CACHE_SIZE = 256
+DB_RETRY_ATTEMPTS = 6
+DB_RETRY_BASE_DELAY = 0.05  # s, doubled on each attempt with full jitter
+CRYPTO_PARALLEL_THRESHOLD = 2000
+CRYPTO_MAX_WORKERS = 4
+CRYPTO_CACHE_SIZE = 4096  # decrypted values kept in memory, keyed by token
+BLIND_INDEX_BYTES = 16
+WORD_TOKEN_BYTES = 8
+WORD_TOKEN_CACHE_SIZE = 65536  # keyed tokens kept in memory, keyed by word
+HISTORY_PAGE_SIZE = 200
+DETAILS_PREVIEW_LENGTH = 80
+OPEN_MAINTENANCE_STATUSES = ("Planifié", "En cours")
+PASSWORD_HASH_SCHEME = 'scrypt'  # or 'pbkdf2_sha256'
+SCRYPT_N = 2 ** 14
+SCRYPT_R = 8
+SCRYPT_P = 1
+PBKDF2_ITERATIONS = 600000
+PASSWORD_SALT_BYTES = 16
+PASSWORD_TARGET_MS = 250
+SEARCH_RESULT_LIMIT = 500
+SEARCH_EXCERPT_WORDS = 12
+SEARCH_BATCH_SIZE = 50
+SEARCH_FUZZY_CUTOFF = 0.75
+SEARCH_FUZZY_CANDIDATES = 500  # vocabulary terms compared with a misspelt word, by shared trigrams
+SEARCH_VOCABULARY_TTL = 300  # s
+AUTOCOMPLETE_LIMIT = 10
+AUTOCOMPLETE_MIN_PREFIX = 3
+PARTS_CATALOGUE_TTL = 300  # s
+PERMISSION_CACHE_TTL = 60  # s, picks up rights changed from another workstation
+STOCK_RESERVATION_TTL = 8 * 3600  # s, reservations of abandoned forms are released after this
+STOCK_HISTORY_PAGE_SIZE = 200
+PLAN_HORIZON_DAYS = 90  # recurring plans are expanded into planification rows this far ahead
+PLAN_USAGE_WINDOW_DAYS = 180  # counter readings used to estimate operating hours per day
+
+# === Database Access ===
+class ConnectionPool:
+    def __init__(self, db_file, busy_timeout=DB_BUSY_TIMEOUT, journal_mode=DB_JOURNAL_MODE,
+                 cached_statements=DB_STATEMENT_CACHE_SIZE):
+        self.db_file = db_file
+        self.busy_timeout = busy_timeout
+        self.journal_mode = journal_mode
+        self.cached_statements = cached_statements
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = []
+    
+    def connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_file, timeout=self.busy_timeout / 1000,
+                                   cached_statements=self.cached_statements,
+                                   check_same_thread=False)
+            conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout)}")
+            if self.journal_mode:
+                conn.execute(f"PRAGMA journal_mode={self.journal_mode}")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+    
+    def set_busy_timeout(self, busy_timeout):
+        self.busy_timeout = busy_timeout
+        with self._lock:
+            for conn in self._connections:
+                conn.execute(f"PRAGMA busy_timeout={int(busy_timeout)}")
+    
+    def close_all(self):
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+            self._local = threading.local()
+
+db_pool = ConnectionPool(DB_FILE)
+
+def db_fetchall(query, params=()):
+    return db_pool.connection().execute(query, params).fetchall()
+
+def db_fetchone(query, params=()):
+    return db_pool.connection().execute(query, params).fetchone()
+
+@contextmanager
+def db_transaction():
+    conn = db_pool.connection()
+    c = conn.cursor()
+    try:
+        yield c
+        _flush_audit(c)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        _audit_pending().clear()
+        raise
+    finally:
+        c.close()
+
+def _is_busy_error(error):
+    message = str(error).lower()
+    return "locked" in message or "busy" in message
+
+def retry_on_busy(func):
+    # busy_timeout covers ordinary lock waits; this retries the whole transaction
+    # when SQLite gives up anyway (timeout reached, WAL snapshot upgrade), with
+    # jittered backoff so workstations that collided do not collide again
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        for attempt in range(DB_RETRY_ATTEMPTS):
+            try:
+                return func(*args, **kwargs)
+            except sqlite3.OperationalError as e:
+                if attempt == DB_RETRY_ATTEMPTS - 1 or not _is_busy_error(e):
+                    raise
+                time.sleep(random.uniform(0, DB_RETRY_BASE_DELAY * 2 ** attempt))
+    return wrapper
+
+class ConflictError(Exception):
+    # Raised by update methods when the row's version changed since it was read
+    def __init__(self, message, deleted=False):
+        super().__init__(message)
+        self.deleted = deleted
+
+def _check_version(c, table, row_id):
+    if c.rowcount == 0:
+        if db_fetchone(f"SELECT 1 FROM {table} WHERE id=?", (row_id,)) is None:
+            raise ConflictError("L'enregistrement a été supprimé par un autre utilisateur", deleted=True)
+        raise ConflictError("L'enregistrement a été modifié par un autre utilisateur")
+
+# === Audit Log ===
+# Service methods describe the rows they touch with audit_insert / audit_rows.
+# Entries are kept in a per-thread list and written with one executemany just
+# before db_transaction commits, so an action and its audit entries are
+# committed or rolled back together. audit_log is append-only; gmao.audit moves
+# old entries into compressed archive files.
+AUDIT_SNAPSHOT_CHUNK = 500
+AUDIT_IGNORED_COLUMNS = {'version'}
+AUDIT_REDACTED_COLUMNS = {'password_hash'}  # encrypted columns are redacted as well
+
+_audit_state = threading.local()
+_audit_user = {'id': None}
+
+def set_audit_user(user_id):
+    # Process-wide: service calls run on worker threads for the logged-in user
+    _audit_user['id'] = user_id
+
+def _audit_pending():
+    pending = getattr(_audit_state, 'pending', None)
+    if pending is None:
+        pending = _audit_state.pending = []
+    return pending
+
+def _audit_snapshot(c, table, values, key='id'):
+    # {row id: {column: value}}; uses its own cursor so c.rowcount / lastrowid survive.
+    # Encrypted columns are compared on their plaintext (every write produces a
+    # new token) and blind-index hashes, word tokens and previews are left out.
+    rows = {}
+    values = list(values)
+    encrypted = ENCRYPTED_COLUMNS.get(table, ())
+    hashes = list(BLIND_INDEXES.get(table, {}).values())
+    if table in WORD_INDEXES:
+        hashes.append(WORD_INDEX_COLUMN)
+    hashes += PREVIEW_COLUMNS.get(table, {}).values()
+    for start in range(0, len(values), AUDIT_SNAPSHOT_CHUNK):
+        chunk = values[start:start + AUDIT_SNAPSHOT_CHUNK]
+        cursor = c.connection.execute(f"SELECT * FROM {table} WHERE {key} IN ({', '.join('?' * len(chunk))})", chunk)
+        columns = [description[0] for description in cursor.description]
+        for row in cursor:
+            snapshot = dict(zip(columns, row))
+            for column in encrypted:
+                snapshot[column] = decrypt_value(snapshot.get(column))
+            for column in hashes:
+                snapshot.pop(column, None)
+            rows[row[0]] = snapshot
+    return rows
+
+def _audit_value(table, column, value):
+    redacted = column in AUDIT_REDACTED_COLUMNS or column in ENCRYPTED_COLUMNS.get(table, ())
+    return "***" if redacted and value is not None else value
+
+def audit_event(table, action, row_id=None, changes=None, user_id=None):
+    # user_id defaults to the logged-in user (set_audit_user)
+    _audit_pending().append((_audit_user['id'] if user_id is None else user_id, action, table, row_id,
+                             json.dumps(changes, ensure_ascii=False, default=str) if changes else None))
+
+def _audit_diff(table, row_id, before, after, user_id=None):
+    if before is None:
+        action = 'insert'
+        changes = {column: [None, _audit_value(table, column, value)] for column, value in after.items()
+                   if value is not None and column != 'id' and column not in AUDIT_IGNORED_COLUMNS}
+    elif after is None:
+        action = 'delete'
+        changes = {column: [_audit_value(table, column, value), None] for column, value in before.items()
+                   if value is not None and column != 'id' and column not in AUDIT_IGNORED_COLUMNS}
+    else:
+        action = 'update'
+        changes = {column: [_audit_value(table, column, value), _audit_value(table, column, after.get(column))]
+                   for column, value in before.items()
+                   if value != after.get(column) and column not in AUDIT_IGNORED_COLUMNS}
+        if not changes:
+            return
+    audit_event(table, action, row_id, changes, user_id)
+
+def audit_insert(c, table, row_id):
+    _audit_diff(table, row_id, None, _audit_snapshot(c, table, [row_id]).get(row_id, {}))
+
+@contextmanager
+def audit_rows(c, table, values, key='id', user_id=None):
+    # Wraps updates and deletes: rows matching key IN values are compared
+    # before and after the block. Rows are followed by id, so a row whose key
+    # changes is an update, and rows inserted under the same key are caught too.
+    before = _audit_snapshot(c, table, values, key)
+    yield
+    after = _audit_snapshot(c, table, before) if before else {}
+    if key != 'id':
+        after.update(_audit_snapshot(c, table, values, key))
+    for row_id in sorted(before.keys() | after.keys()):
+        _audit_diff(table, row_id, before.get(row_id), after.get(row_id), user_id)
+
+def _flush_audit(c):
+    pending = _audit_pending()
+    if pending:
+        c.executemany('''INSERT INTO audit_log (user_id, action, table_name, row_id, changes) 
+                         VALUES (?, ?, ?, ?, ?)''', pending)
+        pending.clear()
+
+# === Encryption Functions ===
+# cryptography is imported on first use: it is the slowest import and is not
+# needed to show the login window
+_cipher = None
+# Keyed HMAC-SHA256 states, copied for each value instead of rekeying
+_blind_hmac = None
+_word_hmac = None
+_column_cipher = None
+_cipher_lock = threading.Lock()
+
+class EncryptionKeyError(Exception):
+    pass
+
+def _fernet():
+    from cryptography.fernet import Fernet
+    return Fernet
+
+def _aesgcm():
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+    return AESGCM
+
+def _stored_key_check():
+    # Token written by the encryption migration; None before it has run
+    try:
+        row = db_fetchone("SELECT verification FROM chiffrement WHERE id = 1")
+    except sqlite3.OperationalError:
+        return None
+    return row[0] if row else None
+
+def load_key():
+    if os.path.exists(KEY_FILE):
+        with open(KEY_FILE, 'rb') as f:
+            return f.read()
+    else:
+        # A fresh key would make every encrypted value unreadable
+        if _stored_key_check() is not None:
+            raise EncryptionKeyError(f"Clé de chiffrement introuvable ({KEY_FILE}): restaurez-la depuis une sauvegarde")
+        key = _fernet().generate_key()
+        with open(KEY_FILE, 'wb') as f:
+            f.write(key)
+        return key
+
+def _load_cipher():
+    global _cipher, _blind_hmac, _word_hmac, _column_cipher
+    key = load_key()
+    cipher = _fernet()(key)
+    check = _stored_key_check()
+    if check is not None:
+        try:
+            cipher.decrypt(check)
+        except Exception:
+            raise EncryptionKeyError(f"La clé {KEY_FILE} ne correspond pas à cette base de données")
+    _blind_hmac = hmac.new(hmac.new(key, b"gmao-blind-index", hashlib.sha256).digest(), digestmod=hashlib.sha256)
+    _word_hmac = hmac.new(hmac.new(key, b"gmao-word-index", hashlib.sha256).digest(), digestmod=hashlib.sha256)
+    _column_cipher = _aesgcm()(hmac.new(key, b"gmao-column-cipher", hashlib.sha256).digest())
+    _decrypt_cached.cache_clear()
+    _word_token.cache_clear()
+    _cipher = cipher
+    return cipher
+
+def get_cipher():
+    if _cipher is None:
+        with _cipher_lock:
+            if _cipher is None:
+                _load_cipher()
+    return _cipher
+
+def reload_key():
+    # To be called after the key file has been restored
+    with _cipher_lock:
+        return _load_cipher()
+
+def encrypt_data(data):
+    return get_cipher().encrypt(data.encode())
+
+def decrypt_data(token):
+    return get_cipher().decrypt(token).decode()
+
+def _map_cipher(func, values, workers):
+    # func takes a list of values and returns the list of their results
+    values = list(values)
+    if workers is None:
+        workers = min(CRYPTO_MAX_WORKERS, os.cpu_count() or 1)
+    if workers <= 1 or len(values) < CRYPTO_PARALLEL_THRESHOLD:
+        return func(values)
+    chunk_size = -(-len(values) // workers)
+    chunks = [values[i:i + chunk_size] for i in range(0, len(values), chunk_size)]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(func, chunks)
+    return [item for chunk in results for item in chunk]
+
+# Column values are AES-256-GCM tokens, COLUMN_TOKEN_VERSION + nonce + ciphertext,
+# under a key derived from secret.key. Fernet costs ~15 us a value, mostly in
+# Python, against ~2 us (scripts/bench_encryption.py). Fernet tokens, which
+# start with b'gAAAA', were written before migration 17 and are still read.
+COLUMN_TOKEN_VERSION = b'\x01'
+COLUMN_NONCE_BYTES = 12
+
+def encrypt_column(text):
+    get_cipher()
+    nonce = os.urandom(COLUMN_NONCE_BYTES)
+    return COLUMN_TOKEN_VERSION + nonce + _column_cipher.encrypt(nonce, text.encode(), None)
+
+def decrypt_column(token):
+    if token[:1] != COLUMN_TOKEN_VERSION:
+        return decrypt_data(token)
+    get_cipher()
+    nonce = token[1:1 + COLUMN_NONCE_BYTES]
+    return _column_cipher.decrypt(nonce, token[1 + COLUMN_NONCE_BYTES:], None).decode()
+
+def _encrypt_columns(texts):
+    # encrypt_column for a list, with the nonces drawn in one call
+    get_cipher()
+    encrypt = _column_cipher.encrypt
+    nonces = os.urandom(COLUMN_NONCE_BYTES * len(texts))
+    tokens = []
+    for start, text in zip(range(0, len(nonces), COLUMN_NONCE_BYTES), texts):
+        nonce = nonces[start:start + COLUMN_NONCE_BYTES]
+        tokens.append(COLUMN_TOKEN_VERSION + nonce + encrypt(nonce, text.encode(), None))
+    return tokens
+
+def _decrypt_columns(tokens):
+    get_cipher()
+    decrypt = _column_cipher.decrypt
+    return [decrypt(token[1:1 + COLUMN_NONCE_BYTES], token[1 + COLUMN_NONCE_BYTES:], None).decode()
+            if token[:1] == COLUMN_TOKEN_VERSION else decrypt_data(token) for token in tokens]
+
+def encrypt_many(values, workers=None):
+    return _map_cipher(_encrypt_columns, values, workers)
+
+def decrypt_many(tokens, workers=None):
+    return _map_cipher(_decrypt_columns, tokens, workers)
+
+# === Column Encryption ===
+# Sensitive columns hold encrypted tokens (BLOB). NULL and '' are stored as is,
+# and a value read back as text was written before encryption and is returned
+# unchanged. Columns with a blind index also store a truncated HMAC of their
+# normalized value, so equality lookups use a plain index instead of a scan.
+# Free-text columns with a word index store the keyed tokens of their distinct
+# words in WORD_INDEX_COLUMN, which the full-text index covers: a whole word
+# is found without being stored in clear, but prefixes and spelling
+# suggestions only work on the clear columns. Texts listed page by page and
+# too long to be shown whole also store their encrypted preview (text_preview),
+# so a list decrypts a few dozen bytes per row instead of the whole text.
+ENCRYPTED_COLUMNS = {
+    'equipements': ('identifiant_acheteur', 'notes'),
+    'interventions': ('details_reparation',),
+}
+BLIND_INDEXES = {
+    'equipements': {'identifiant_acheteur': 'identifiant_acheteur_hash'},
+}
+WORD_INDEX_COLUMN = 'mots_hash'
+WORD_INDEXES = {
+    'equipements': 'notes',
+    'interventions': 'details_reparation',
+}
+PREVIEW_COLUMNS = {
+    'interventions': {'details_reparation': 'details_apercu'},
+}
+# Words as the unicode61 tokenizer splits them (underscores are separators)
+SEARCH_WORD = re.compile(r"[^\W_]+")
+# Equipment rows as returned by EquipmentService; the last two are encrypted
+EQUIPMENT_COLUMNS = 'id, numero_serie, marque, modele, date_achat, date_vente, identifiant_acheteur, notes'
+EQUIPMENT_ENCRYPTED_POSITIONS = (6, 7)
+
+def encrypt_value(value):
+    return encrypt_column(value) if value else value
+
+def text_preview(text):
+    # What lists show of a long text, or None when it is shown whole
+    if not text or len(text) <= DETAILS_PREVIEW_LENGTH:
+        return None
+    return text[:DETAILS_PREVIEW_LENGTH] + "…"
+
+@functools.lru_cache(maxsize=CRYPTO_CACHE_SIZE)
+def _decrypt_cached(token):
+    # Tokens are unique per write, so a cached plaintext can never be stale
+    return decrypt_column(token)
+
+def decrypt_value(value):
+    return _decrypt_cached(value) if isinstance(value, bytes) else value
+
+def encrypt_values(values):
+    # Batch version of encrypt_value for imports and migrations
+    values = list(values)
+    positions = [i for i, value in enumerate(values) if value]
+    for i, token in zip(positions, encrypt_many([values[i] for i in positions])):
+        values[i] = token
+    return values
+
+def decrypt_values(values):
+    # Batch version of decrypt_value for exports; bypasses the cache
+    values = list(values)
+    positions = [i for i, value in enumerate(values) if isinstance(value, bytes)]
+    for i, text in zip(positions, decrypt_many([values[i] for i in positions])):
+        values[i] = text
+    return values
+
+def decrypt_row(row, positions):
+    if row is None:
+        return None
+    row = list(row)
+    for position in positions:
+        row[position] = decrypt_value(row[position])
+    return tuple(row)
+
+def blind_index(value):
+    value = (value or "").strip()
+    if not value:
+        return None
+    get_cipher()
+    h = _blind_hmac.copy()
+    h.update(normalize_search_term(value).encode())
+    return h.digest()[:BLIND_INDEX_BYTES]
+
+@functools.lru_cache(maxsize=WORD_TOKEN_CACHE_SIZE)
+def _word_token(word):
+    # Keyed by the word as written, so the folding is cached too; cleared with
+    # the key in _load_cipher
+    h = _word_hmac.copy()
+    h.update(normalize_search_term(word).encode())
+    return h.digest()[:WORD_TOKEN_BYTES].hex()
+
+def word_token(word):
+    get_cipher()
+    return _word_token(word)
+
+def word_tokens(text):
+    # Distinct words only, sorted, so neither their order nor their count is kept
+    if not text:
+        return None
+    get_cipher()
+    return " ".join(sorted(set(map(_word_token, SEARCH_WORD.findall(text))))) or None
+
+# === Password Hashing ===
+# Stored formats:
+#   scrypt$<n>$<r>$<p>$<salt hex>$<hash hex>
+#   pbkdf2_sha256$<iterations>$<salt hex>$<hash hex>
+#   <sha256 hex>  (legacy, unsalted; upgraded on the next successful login)
+def _scrypt(password, salt, n, r, p):
+    return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p, dklen=32,
+                          maxmem=128 * n * r * (p + 2))
+
+def _pbkdf2(password, salt, iterations):
+    return hashlib.pbkdf2_hmac('sha256', password.encode(), salt, iterations)
+
+def _password_scheme():
+    if PASSWORD_HASH_SCHEME == 'scrypt' and not hasattr(hashlib, 'scrypt'):
+        return 'pbkdf2_sha256'
+    return PASSWORD_HASH_SCHEME
+
+def hash_password(password):
+    salt = os.urandom(PASSWORD_SALT_BYTES)
+    if _password_scheme() == 'scrypt':
+        digest = _scrypt(password, salt, SCRYPT_N, SCRYPT_R, SCRYPT_P)
+        return f"scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${salt.hex()}${digest.hex()}"
+    digest = _pbkdf2(password, salt, PBKDF2_ITERATIONS)
+    return f"pbkdf2_sha256${PBKDF2_ITERATIONS}${salt.hex()}${digest.hex()}"
+
+def verify_password_hash(password, stored_hash):
+    # Returns (matches, needs_rehash)
+    if not stored_hash:
+        return False, False
+    parts = stored_hash.split('$')
+    try:
+        if parts[0] == 'scrypt' and len(parts) == 6:
+            n, r, p = int(parts[1]), int(parts[2]), int(parts[3])
+            digest = _scrypt(password, bytes.fromhex(parts[4]), n, r, p)
+            matches = hmac.compare_digest(digest.hex(), parts[5])
+            current = _password_scheme() == 'scrypt' and (n, r, p) == (SCRYPT_N, SCRYPT_R, SCRYPT_P)
+        elif parts[0] == 'pbkdf2_sha256' and len(parts) == 4:
+            iterations = int(parts[1])
+            digest = _pbkdf2(password, bytes.fromhex(parts[2]), iterations)
+            matches = hmac.compare_digest(digest.hex(), parts[3])
+            current = _password_scheme() == 'pbkdf2_sha256' and iterations == PBKDF2_ITERATIONS
+        elif len(parts) == 1:
+            matches = hmac.compare_digest(hashlib.sha256(password.encode()).hexdigest(), stored_hash)
+            current = False
+        else:
+            return False, False
+    except ValueError:
+        return False, False
+    return matches, matches and not current
+
+def calibrate_password_cost(target_ms=PASSWORD_TARGET_MS, samples=3):
+    # Largest cost that keeps one verification under target_ms on this machine
+    def measure(func):
+        best = None
+        for _ in range(samples):
+            start = time.perf_counter()
+            func()
+            elapsed = (time.perf_counter() - start) * 1000
+            best = elapsed if best is None else min(best, elapsed)
+        return best
+    
+    salt = os.urandom(PASSWORD_SALT_BYTES)
+    results = {}
+    if hasattr(hashlib, 'scrypt'):
+        n, chosen = 2 ** 12, None
+        while n <= 2 ** 20:
+            elapsed = measure(lambda: _scrypt('benchmark', salt, n, SCRYPT_R, SCRYPT_P))
+            if elapsed > target_ms:
+                break
+            chosen = (n, elapsed)
+            n *= 2
+        results['scrypt'] = chosen
+    
+    iterations, chosen = 50000, None
+    while iterations <= 5000000:
+        elapsed = measure(lambda: _pbkdf2('benchmark', salt, iterations))
+        if elapsed > target_ms:
+            break
+        chosen = (iterations, elapsed)
+        iterations *= 2
+    results['pbkdf2_sha256'] = chosen
+    return results
+
+# === Database Initialization ===
+def migrate_initial_schema(c):
+    # Users table
+    c.execute('''CREATE TABLE IF NOT EXISTS users (
+                 id INTEGER PRIMARY KEY AUTOINCREMENT,
+                 username TEXT UNIQUE,
+                 password_hash TEXT,
+                 role TEXT DEFAULT 'user',
+                 first_login INTEGER DEFAULT 1,
+                 created_at TEXT DEFAULT CURRENT_TIMESTAMP)''')
+    
+    # Permissions table
+    c.execute('''CREATE TABLE IF NOT EXISTS permissions (
+                 id INTEGER PRIMARY KEY AUTOINCREMENT,
+                 user_id INTEGER,
+                 can_view_interventions INTEGER DEFAULT 1,
+                 can_add_interventions INTEGER DEFAULT 0,
+                 can_edit_interventions INTEGER DEFAULT 0,
+                 can_delete_interventions INTEGER DEFAULT 0,
+                 can_view_stock INTEGER DEFAULT 1,
+                 can_add_stock INTEGER DEFAULT 0,
+                 can_edit_stock INTEGER DEFAULT 0,
+                 can_delete_stock INTEGER DEFAULT 0,
+                 can_manage_users INTEGER DEFAULT 0,
+                 FOREIGN KEY(user_id) REFERENCES users(id))''')
+    
+    # Check if admin user exists
+    c.execute("SELECT * FROM users WHERE username='admin'")
+    if not c.fetchone():
+        c.execute("INSERT INTO users (username, password_hash, role, first_login) VALUES (?, ?, ?, ?)",
+                 ('admin', hash_password(INITIAL_PASSWORD), 'admin', 1))
+        
+        c.execute("SELECT id FROM users WHERE username='admin'")
+        admin_id = c.fetchone()[0]
+        c.execute('''INSERT INTO permissions 
+                    (user_id, can_view_interventions, can_add_interventions, can_edit_interventions, 
+                     can_delete_interventions, can_view_stock, can_add_stock, can_edit_stock, 
+                     can_delete_stock, can_manage_users) 
+                    VALUES (?, 1, 1, 1, 1, 1, 1, 1, 1, 1)''', (admin_id,))
+    
+    # Equipment table
+    c.execute('''CREATE TABLE IF NOT EXISTS equipements (
+                 id INTEGER PRIMARY KEY AUTOINCREMENT,
+                 numero_serie TEXT UNIQUE,
+                 marque TEXT,
+                 modele TEXT,
+                 date_achat TEXT,
+                 date_vente TEXT,
+                 identifiant_acheteur TEXT,
+                 notes TEXT)''')
+    
+    # Interventions table
+    c.execute('''CREATE TABLE IF NOT EXISTS interventions (
+                 id INTEGER PRIMARY KEY AUTOINCREMENT,
+                 equipement_id INTEGER,
+                 date_entree TEXT,
+                 date_sortie TEXT,
+                 details_reparation TEXT,
+                 technicien TEXT,
+                 cout REAL,
+                 FOREIGN KEY(equipement_id) REFERENCES equipements(id))''')
+    
+    # Preventive maintenance scheduling
+    c.execute('''CREATE TABLE IF NOT EXISTS planification (
+                 id INTEGER PRIMARY KEY AUTOINCREMENT,
+                 equipement_id INTEGER,
+                 date_prevue TEXT,
+                 type_maintenance TEXT,
+                 technicien TEXT,
+                 statut TEXT DEFAULT 'Planifié',
+                 notes TEXT,
+                 FOREIGN KEY(equipement_id) REFERENCES equipements(id))''')
+    
+    # Spare parts inventory
+    c.execute('''CREATE TABLE IF NOT EXISTS pieces (
+                 id INTEGER PRIMARY KEY AUTOINCREMENT,
+                 nom TEXT,
+                 reference TEXT UNIQUE,
+                 fournisseur TEXT,
+                 prix_unitaire REAL,
+                 quantite_stock INTEGER,
+                 description TEXT)''')
+    
+    # Link between interventions and pieces
+    c.execute('''CREATE TABLE IF NOT EXISTS intervention_pieces (
+                 id INTEGER PRIMARY KEY AUTOINCREMENT,
+                 intervention_id INTEGER,
+                 piece_id INTEGER,
+                 quantite_utilisee INTEGER,
+                 cout_total REAL,
+                 FOREIGN KEY(intervention_id) REFERENCES interventions(id),
+                 FOREIGN KEY(piece_id) REFERENCES pieces(id))''')
+
+def migrate_add_indexes(c):
+    c.execute("CREATE INDEX IF NOT EXISTS idx_interventions_equipement_date ON interventions(equipement_id, date_entree)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_planification_statut_date ON planification(statut, date_prevue)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_planification_equipement_date ON planification(equipement_id, date_prevue)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_intervention_pieces_intervention ON intervention_pieces(intervention_id, piece_id, quantite_utilisee)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_intervention_pieces_piece ON intervention_pieces(piece_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_permissions_user ON permissions(user_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_pieces_nom ON pieces(nom)")
+
+def migrate_pieces_stock_check(c):
+    # SQLite cannot add a CHECK constraint in place: rebuild the table
+    c.execute('''CREATE TABLE pieces_new (
+                 id INTEGER PRIMARY KEY AUTOINCREMENT,
+                 nom TEXT,
+                 reference TEXT UNIQUE,
+                 fournisseur TEXT,
+                 prix_unitaire REAL,
+                 quantite_stock INTEGER CHECK (quantite_stock >= 0),
+                 description TEXT)''')
+    c.execute('''INSERT INTO pieces_new (id, nom, reference, fournisseur, prix_unitaire, quantite_stock, description)
+                 SELECT id, nom, reference, fournisseur, prix_unitaire, 
+                        CASE WHEN quantite_stock < 0 THEN 0 ELSE quantite_stock END, description
+                 FROM pieces''')
+    c.execute("DROP TABLE pieces")
+    c.execute("ALTER TABLE pieces_new RENAME TO pieces")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_pieces_nom ON pieces(nom)")
+
+def migrate_default_permissions(c):
+    # Users created before permissions existed get their role defaults once,
+    # instead of get_user_permissions() inserting them lazily on every lookup
+    columns = ', '.join(PERMISSION_KEYS)
+    placeholders = ', '.join('?' * len(PERMISSION_KEYS))
+    for role, defaults in ROLE_DEFAULT_PERMISSIONS.items():
+        if role == 'user':
+            role_filter, params = "(role IS NULL OR role NOT IN ('admin', 'technicien'))", ()
+        else:
+            role_filter, params = "role=?", (role,)
+        c.execute(f'''INSERT INTO permissions (user_id, {columns})
+                      SELECT id, {placeholders} FROM users
+                      WHERE {role_filter} AND id NOT IN (SELECT user_id FROM permissions WHERE user_id IS NOT NULL)''',
+                  (*defaults, *params))
+
+# External-content FTS5 indexes kept in sync with their tables by triggers.
+# Encrypted columns (ENCRYPTED_COLUMNS) are not indexed, since the index would
+# hold their words in clear; their keyed word tokens (WORD_INDEXES) are.
+FTS_TABLES = {
+    'equipements': ('equipements_fts', ('marque', 'modele', WORD_INDEX_COLUMN)),
+    'interventions': ('interventions_fts', ('technicien', WORD_INDEX_COLUMN)),
+}
+
+def create_fts_triggers(c, table, columns=None):
+    fts, indexed = FTS_TABLES[table]
+    columns = columns or indexed
+    cols = ", ".join(columns)
+    new_cols = ", ".join(f"new.{col}" for col in columns)
+    old_cols = ", ".join(f"old.{col}" for col in columns)
+    
+    c.execute(f'''CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN
+                 INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_cols});
+                 END''')
+    c.execute(f'''CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN
+                 INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_cols});
+                 END''')
+    c.execute(f'''CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {cols} ON {table} BEGIN
+                 INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_cols});
+                 INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_cols});
+                 END''')
+
+def drop_fts_triggers(c, table):
+    # Bulk loads drop the triggers and call rebuild_fts_index() afterwards,
+    # inside the same transaction
+    fts = FTS_TABLES[table][0]
+    for suffix in ('ai', 'ad', 'au'):
+        c.execute(f"DROP TRIGGER IF EXISTS {fts}_{suffix}")
+
+def rebuild_fts_index(c, table):
+    fts = FTS_TABLES[table][0]
+    c.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+def migrate_full_text_search(c):
+    # Also run by later migrations that change the indexed columns; columns
+    # added after this one (the word tokens, 17) are left out until they exist
+    for table, (fts, columns) in FTS_TABLES.items():
+        existing = {row[1] for row in c.execute(f"PRAGMA table_info({table})")}
+        columns = [column for column in columns if column in existing]
+        c.execute(f'''CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(
+                     {", ".join(columns)}, content='{table}', content_rowid='id',
+                     tokenize="unicode61 remove_diacritics 2", prefix='2 3')''')
+        # Per column, so the spelling vocabulary can leave the word tokens out
+        c.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts}_vocab USING fts5vocab({fts}, 'col')")
+        create_fts_triggers(c, table, columns)
+        rebuild_fts_index(c, table)
+
+def drop_full_text_search(c):
+    for table, (fts, columns) in FTS_TABLES.items():
+        drop_fts_triggers(c, table)
+        c.execute(f"DROP TABLE IF EXISTS {fts}_vocab")
+        c.execute(f"DROP TABLE IF EXISTS {fts}")
+
+def migrate_export_indexes(c):
+    # Date-range exports across all equipment
+    c.execute("CREATE INDEX IF NOT EXISTS idx_interventions_date ON interventions(date_entree, id)")
+
+# Maintenance KPIs are served from per-equipment and per-technician running
+# totals kept up to date by triggers on interventions. Every column is a sum,
+# so a change is applied by subtracting the old row and adding the new one.
+def _kpi_repair_days(row):
+    # Repair duration in days, NULL while the equipment has not left the workshop
+    return (f"CASE WHEN julianday({row}.date_sortie) IS NOT NULL AND julianday({row}.date_entree) IS NOT NULL "
+            f"THEN MAX(julianday({row}.date_sortie) - julianday({row}.date_entree), 0) END")
+
+def _kpi_apply(row, sign):
+    days = _kpi_repair_days(row)
+    # Interventions without equipment only count towards their technician:
+    # kpi_equipment.equipement_id is a rowid alias, so NULL would add a phantom row
+    return f'''INSERT INTO kpi_equipment (equipement_id, interventions, repairs, repair_days, total_cost, first_date)
+               SELECT {row}.equipement_id, {sign}1, {sign}({days} IS NOT NULL), {sign}COALESCE({days}, 0),
+                      {sign}COALESCE({row}.cout, 0), {row}.date_entree
+               WHERE {row}.equipement_id IS NOT NULL
+               ON CONFLICT(equipement_id) DO UPDATE SET
+               interventions = interventions + excluded.interventions,
+               repairs = repairs + excluded.repairs,
+               repair_days = repair_days + excluded.repair_days,
+               total_cost = total_cost + excluded.total_cost,
+               first_date = (SELECT MIN(date_entree) FROM interventions WHERE equipement_id={row}.equipement_id);
+               INSERT INTO kpi_technician (technicien, interventions, repairs, repair_days, total_cost)
+               VALUES (COALESCE({row}.technicien, ''), {sign}1, {sign}({days} IS NOT NULL), {sign}COALESCE({days}, 0),
+                       {sign}COALESCE({row}.cout, 0))
+               ON CONFLICT(technicien) DO UPDATE SET
+               interventions = interventions + excluded.interventions,
+               repairs = repairs + excluded.repairs,
+               repair_days = repair_days + excluded.repair_days,
+               total_cost = total_cost + excluded.total_cost;'''
+
+def migrate_kpi_summaries(c):
+    c.execute('''CREATE TABLE IF NOT EXISTS kpi_equipment (
+                 equipement_id INTEGER PRIMARY KEY,
+                 interventions INTEGER NOT NULL DEFAULT 0,
+                 repairs INTEGER NOT NULL DEFAULT 0,
+                 repair_days REAL NOT NULL DEFAULT 0,
+                 total_cost REAL NOT NULL DEFAULT 0,
+                 first_date TEXT)''')
+    c.execute('''CREATE TABLE IF NOT EXISTS kpi_technician (
+                 technicien TEXT PRIMARY KEY,
+                 interventions INTEGER NOT NULL DEFAULT 0,
+                 repairs INTEGER NOT NULL DEFAULT 0,
+                 repair_days REAL NOT NULL DEFAULT 0,
+                 total_cost REAL NOT NULL DEFAULT 0)''')
+    create_kpi_triggers(c)
+    rebuild_kpi_summaries(c)
+
+def create_kpi_triggers(c):
+    c.execute(f'''CREATE TRIGGER IF NOT EXISTS kpi_interventions_ai AFTER INSERT ON interventions BEGIN
+                  {_kpi_apply('new', '')}
+                  END''')
+    c.execute(f'''CREATE TRIGGER IF NOT EXISTS kpi_interventions_ad AFTER DELETE ON interventions BEGIN
+                  {_kpi_apply('old', '-')}
+                  END''')
+    c.execute(f'''CREATE TRIGGER IF NOT EXISTS kpi_interventions_au 
+                  AFTER UPDATE OF equipement_id, date_entree, date_sortie, technicien, cout ON interventions BEGIN
+                  {_kpi_apply('old', '-')}
+                  {_kpi_apply('new', '')}
+                  END''')
+
+def drop_kpi_triggers(c):
+    # Bulk loads drop the triggers and call rebuild_kpi_summaries() afterwards
+    for suffix in ('ai', 'ad', 'au'):
+        c.execute(f"DROP TRIGGER IF EXISTS kpi_interventions_{suffix}")
+
+def rebuild_kpi_summaries(c):
+    days = _kpi_repair_days('interventions')
+    c.execute("DELETE FROM kpi_equipment")
+    c.execute(f'''INSERT INTO kpi_equipment (equipement_id, interventions, repairs, repair_days, total_cost, first_date)
+                  SELECT equipement_id, COUNT(*), COUNT({days}), COALESCE(SUM({days}), 0), 
+                         COALESCE(SUM(cout), 0), MIN(date_entree)
+                  FROM interventions WHERE equipement_id IS NOT NULL GROUP BY equipement_id''')
+    c.execute("DELETE FROM kpi_technician")
+    c.execute(f'''INSERT INTO kpi_technician (technicien, interventions, repairs, repair_days, total_cost)
+                  SELECT COALESCE(technicien, ''), COUNT(*), COUNT({days}), COALESCE(SUM({days}), 0), 
+                         COALESCE(SUM(cout), 0)
+                  FROM interventions GROUP BY COALESCE(technicien, '')''')
+
+STOCK_MOVEMENT_KINDS = ('in', 'out', 'reserve', 'release', 'adjust')
+
+def create_stock_triggers(c):
+    c.execute('''CREATE TRIGGER IF NOT EXISTS stock_movements_ai AFTER INSERT ON stock_movements BEGIN
+                 UPDATE pieces SET
+                     quantite_stock = quantite_stock + CASE new.kind 
+                         WHEN 'in' THEN new.quantite WHEN 'adjust' THEN new.quantite 
+                         WHEN 'out' THEN -new.quantite ELSE 0 END,
+                     quantite_reservee = quantite_reservee + CASE new.kind 
+                         WHEN 'reserve' THEN new.quantite WHEN 'release' THEN -new.quantite ELSE 0 END
+                 WHERE id = new.piece_id;
+                 SELECT RAISE(ABORT, 'Stock insuffisant') FROM pieces 
+                 WHERE id = new.piece_id AND (quantite_reservee < 0 OR quantite_reservee > quantite_stock);
+                 END''')
+    # Append-only: history is corrected with new movements, never rewritten
+    c.execute('''CREATE TRIGGER IF NOT EXISTS stock_movements_bu BEFORE UPDATE ON stock_movements BEGIN
+                 SELECT RAISE(ABORT, 'Les mouvements de stock ne peuvent pas être modifiés');
+                 END''')
+    c.execute('''CREATE TRIGGER IF NOT EXISTS stock_movements_bd BEFORE DELETE ON stock_movements BEGIN
+                 SELECT RAISE(ABORT, 'Les mouvements de stock ne peuvent pas être supprimés');
+                 END''')
+
+def drop_stock_level_triggers(c):
+    # Bulk loads drop the triggers that apply movements one by one, call
+    # apply_stock_levels() and recreate them (create_stock_triggers() and
+    # create_stock_version_trigger()) inside the same transaction. The
+    # append-only guards stay in place.
+    for name in ('stock_movements_ai', 'stock_movements_version'):
+        c.execute(f"DROP TRIGGER IF EXISTS {name}")
+
+def apply_stock_levels(c, first_id, levels, motif):
+    # Set-based STOCK_ADJUST_QUERY, with the same effect as the dropped triggers.
+    # Parts from first_id on were created by the load with their level already
+    # set and only need the matching movement; levels is {reference: level}
+    # for the parts that existed before.
+    c.execute('''INSERT INTO stock_movements (piece_id, kind, quantite, motif)
+                 SELECT id, 'adjust', quantite_stock, ? FROM pieces WHERE id >= ? AND quantite_stock != 0''',
+              (motif, first_id))
+    if not levels:
+        return
+    c.execute("CREATE TEMP TABLE IF NOT EXISTS import_levels (reference TEXT PRIMARY KEY, quantite INTEGER NOT NULL)")
+    c.execute("DELETE FROM import_levels")
+    c.executemany("INSERT INTO import_levels VALUES (?, ?)", levels.items())
+    c.execute('''INSERT INTO stock_movements (piece_id, kind, quantite, motif)
+                 SELECT p.id, 'adjust', l.quantite - p.quantite_stock, ? 
+                 FROM import_levels l JOIN pieces p ON p.reference = l.reference
+                 WHERE p.quantite_stock != l.quantite''', (motif,))
+    c.execute('''UPDATE pieces SET 
+                     quantite_stock = (SELECT quantite FROM import_levels WHERE reference = pieces.reference),
+                     version = version + 1
+                 WHERE id IN (SELECT p.id FROM import_levels l JOIN pieces p ON p.reference = l.reference
+                              WHERE p.quantite_stock != l.quantite)''')
+    short = c.execute('''SELECT 1 FROM pieces JOIN import_levels l ON l.reference = pieces.reference
+                         WHERE quantite_reservee > quantite_stock LIMIT 1''').fetchone()
+    c.execute("DROP TABLE import_levels")
+    if short:
+        raise sqlite3.IntegrityError('Stock insuffisant')
+
+def migrate_stock_movements(c):
+    c.execute("ALTER TABLE pieces ADD COLUMN quantite_reservee INTEGER NOT NULL DEFAULT 0")
+    c.execute(f'''CREATE TABLE IF NOT EXISTS stock_movements (
+                 id INTEGER PRIMARY KEY AUTOINCREMENT,
+                 piece_id INTEGER NOT NULL,
+                 kind TEXT NOT NULL CHECK (kind IN {STOCK_MOVEMENT_KINDS}),
+                 quantite INTEGER NOT NULL,
+                 intervention_id INTEGER,
+                 reservation_id TEXT,
+                 motif TEXT,
+                 created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                 FOREIGN KEY(piece_id) REFERENCES pieces(id))''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_stock_movements_piece ON stock_movements(piece_id, id)")
+    c.execute('''CREATE INDEX IF NOT EXISTS idx_stock_movements_reservation 
+                 ON stock_movements(reservation_id, piece_id) WHERE reservation_id IS NOT NULL''')
+    # Opening balance, written before the trigger exists so levels are unchanged
+    c.execute('''INSERT INTO stock_movements (piece_id, kind, quantite, motif)
+                 SELECT id, 'adjust', quantite_stock, 'Solde initial' FROM pieces WHERE quantite_stock != 0''')
+    create_stock_triggers(c)
+
+def migrate_reorder_points(c):
+    # Lead time is entered per part; the other two are written by gmao.forecast
+    c.execute("ALTER TABLE pieces ADD COLUMN delai_livraison INTEGER")
+    c.execute("ALTER TABLE pieces ADD COLUMN point_commande INTEGER")
+    c.execute("ALTER TABLE pieces ADD COLUMN consommation_journaliere REAL")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_pieces_reorder ON pieces(point_commande) WHERE point_commande IS NOT NULL")
+
+def migrate_row_versions(c):
+    # Optimistic locking: every UPDATE from an edit form bumps version and only
+    # matches the version the form was loaded with
+    for table in ('pieces', 'interventions', 'planification'):
+        c.execute(f"ALTER TABLE {table} ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+    create_stock_version_trigger(c)
+
+def create_stock_version_trigger(c):
+    # Stock level changes also invalidate an open part form, which edits the level
+    c.execute('''CREATE TRIGGER IF NOT EXISTS stock_movements_version AFTER INSERT ON stock_movements 
+                 WHEN new.kind IN ('in', 'out', 'adjust') BEGIN
+                 UPDATE pieces SET version = version + 1 WHERE id = new.piece_id;
+                 END''')
+
+def migrate_planner_indexes(c):
+    # Date-range scans for the fleet-wide planner
+    c.execute("CREATE INDEX IF NOT EXISTS idx_planification_date ON planification(date_prevue, id)")
+
+def migrate_recurring_plans(c):
+    # A plan targets one equipment, or every equipment of a model (any brand when
+    # marque is empty); genere_jusqu_au is the horizon its occurrences reach
+    c.execute('''CREATE TABLE IF NOT EXISTS plans_maintenance (
+                 id INTEGER PRIMARY KEY AUTOINCREMENT,
+                 equipement_id INTEGER,
+                 marque TEXT,
+                 modele TEXT,
+                 type_maintenance TEXT NOT NULL,
+                 technicien TEXT,
+                 intervalle INTEGER NOT NULL CHECK (intervalle > 0),
+                 unite TEXT NOT NULL CHECK (unite IN ('jours', 'semaines', 'mois', 'heures')),
+                 date_debut TEXT NOT NULL,
+                 notes TEXT,
+                 genere_jusqu_au TEXT,
+                 CHECK (equipement_id IS NOT NULL OR modele IS NOT NULL),
+                 FOREIGN KEY(equipement_id) REFERENCES equipements(id))''')
+    c.execute("ALTER TABLE planification ADD COLUMN plan_id INTEGER REFERENCES plans_maintenance(id)")
+    # One occurrence per (plan, equipment, date): regeneration can simply INSERT OR IGNORE
+    c.execute('''CREATE UNIQUE INDEX IF NOT EXISTS idx_planification_plan 
+                 ON planification(plan_id, equipement_id, date_prevue) WHERE plan_id IS NOT NULL''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_plans_horizon ON plans_maintenance(genere_jusqu_au)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_equipements_modele ON equipements(modele, marque)")
+    # Operating-hour counter readings, for plans counted in hours
+    c.execute('''CREATE TABLE IF NOT EXISTS releves_compteur (
+                 id INTEGER PRIMARY KEY AUTOINCREMENT,
+                 equipement_id INTEGER NOT NULL,
+                 date_releve TEXT NOT NULL,
+                 heures REAL NOT NULL CHECK (heures >= 0),
+                 FOREIGN KEY(equipement_id) REFERENCES equipements(id))''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_releves_equipement_date ON releves_compteur(equipement_id, date_releve)")
+
+def migrate_technicians(c):
+    # Roster with daily capacity for the workload scheduler, seeded from the
+    # names already typed in; durations are in hours
+    c.execute('''CREATE TABLE IF NOT EXISTS techniciens (
+                 id INTEGER PRIMARY KEY AUTOINCREMENT,
+                 nom TEXT UNIQUE NOT NULL,
+                 heures_par_jour REAL NOT NULL DEFAULT 7 CHECK (heures_par_jour > 0),
+                 actif INTEGER NOT NULL DEFAULT 1)''')
+    c.execute('''INSERT OR IGNORE INTO techniciens (nom)
+                 SELECT DISTINCT TRIM(technicien) FROM planification WHERE TRIM(COALESCE(technicien, '')) != ''
+                 UNION SELECT DISTINCT TRIM(technicien) FROM interventions WHERE TRIM(COALESCE(technicien, '')) != '' ''')
+    c.execute("ALTER TABLE planification ADD COLUMN duree_estimee REAL")
+    c.execute("ALTER TABLE plans_maintenance ADD COLUMN duree_estimee REAL")
+
+def create_audit_triggers(c):
+    c.execute('''CREATE TRIGGER IF NOT EXISTS audit_log_bu BEFORE UPDATE ON audit_log BEGIN
+                 SELECT RAISE(ABORT, 'Journal d''audit en ajout seul');
+                 END''')
+    c.execute('''CREATE TRIGGER IF NOT EXISTS audit_log_bd BEFORE DELETE ON audit_log BEGIN
+                 SELECT RAISE(ABORT, 'Journal d''audit en ajout seul');
+                 END''')
+
+def drop_audit_triggers(c):
+    # Only for compaction, inside the transaction that archives the entries
+    c.execute("DROP TRIGGER IF EXISTS audit_log_bd")
+
+def migrate_audit_log(c):
+    # changes: JSON {column: [before, after]}; 'bulk' entries summarize batch jobs
+    c.execute('''CREATE TABLE IF NOT EXISTS audit_log (
+                 id INTEGER PRIMARY KEY AUTOINCREMENT,
+                 created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                 user_id INTEGER,
+                 action TEXT NOT NULL CHECK (action IN ('insert', 'update', 'delete', 'bulk')),
+                 table_name TEXT NOT NULL,
+                 row_id INTEGER,
+                 changes TEXT)''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_audit_log_row ON audit_log(table_name, row_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_audit_log_table ON audit_log(table_name, id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_audit_log_created ON audit_log(created_at)")
+    # One row per compaction; the entries themselves live in the archive file
+    c.execute('''CREATE TABLE IF NOT EXISTS audit_archives (
+                 id INTEGER PRIMARY KEY AUTOINCREMENT,
+                 created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                 path TEXT NOT NULL,
+                 first_id INTEGER NOT NULL,
+                 last_id INTEGER NOT NULL,
+                 date_from TEXT,
+                 date_to TEXT,
+                 entries INTEGER NOT NULL,
+                 sha256 TEXT NOT NULL)''')
+    create_audit_triggers(c)
+
+def _encrypt_table(c, table):
+    # Encrypts the values still stored as text and fills their blind indexes
+    for column in ENCRYPTED_COLUMNS[table]:
+        rows = c.execute(f"SELECT id, {column} FROM {table} WHERE typeof({column}) = 'text' AND {column} != ''").fetchall()
+        if not rows:
+            continue
+        ids = [row[0] for row in rows]
+        plaintexts = [row[1] for row in rows]
+        c.executemany(f"UPDATE {table} SET {column}=? WHERE id=?", zip(encrypt_values(plaintexts), ids))
+        hash_column = BLIND_INDEXES.get(table, {}).get(column)
+        if hash_column:
+            c.executemany(f"UPDATE {table} SET {hash_column}=? WHERE id=?",
+                          [(blind_index(value), row_id) for row_id, value in zip(ids, plaintexts)])
+
+def migrate_column_encryption(c):
+    # secure_delete overwrites the plaintext left in freed pages by the rewrite
+    c.execute("PRAGMA secure_delete=ON")
+    c.execute("ALTER TABLE equipements ADD COLUMN identifiant_acheteur_hash BLOB")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_equipements_acheteur_hash ON equipements(identifiant_acheteur_hash)")
+    # The known token lets a missing or wrong secret.key be detected before anything is written with it
+    c.execute('''CREATE TABLE IF NOT EXISTS chiffrement (
+                 id INTEGER PRIMARY KEY CHECK (id = 1),
+                 verification BLOB NOT NULL)''')
+    c.execute("INSERT OR IGNORE INTO chiffrement (id, verification) VALUES (1, ?)", (encrypt_data("gmao"),))
+    # The full-text indexes are rebuilt without the encrypted columns
+    drop_full_text_search(c)
+    for table in ENCRYPTED_COLUMNS:
+        _encrypt_table(c, table)
+    migrate_full_text_search(c)
+    c.execute("PRAGMA secure_delete=OFF")
+
+def migrate_kpi_null_equipment(c):
+    # Triggers recreated without the phantom kpi_equipment rows of interventions lacking equipment
+    drop_kpi_triggers(c)
+    create_kpi_triggers(c)
+    rebuild_kpi_summaries(c)
+
+def migrate_word_index(c):
+    # Encrypted values are rewritten from Fernet to column tokens (encrypt_column),
+    # and notes and repair details get the word tokens that the rebuilt full-text
+    # indexes cover
+    drop_full_text_search(c)
+    for table, columns in ENCRYPTED_COLUMNS.items():
+        source = WORD_INDEXES[table]
+        c.execute(f"ALTER TABLE {table} ADD COLUMN {WORD_INDEX_COLUMN} TEXT")
+        rows = c.execute(f"SELECT id, {', '.join(columns)} FROM {table}").fetchall()
+        if not rows:
+            continue
+        plaintexts = [decrypt_values(column) for column in zip(*[row[1:] for row in rows])]
+        tokens = [word_tokens(value) for value in plaintexts[columns.index(source)]]
+        assignments = ", ".join(f"{column}=?" for column in columns)
+        c.executemany(f"UPDATE {table} SET {assignments}, {WORD_INDEX_COLUMN}=? WHERE id=?",
+                      zip(*[encrypt_values(values) for values in plaintexts], tokens, [row[0] for row in rows]))
+    migrate_full_text_search(c)
+
+def migrate_text_previews(c):
+    # Only texts too long to be shown whole get a preview (text_preview)
+    for table, columns in PREVIEW_COLUMNS.items():
+        for source, target in columns.items():
+            c.execute(f"ALTER TABLE {table} ADD COLUMN {target} BLOB")
+            rows = c.execute(f"SELECT id, {source} FROM {table} WHERE {source} IS NOT NULL").fetchall()
+            texts = decrypt_values(row[1] for row in rows)
+            cut = [(row[0], text) for row, text in zip(rows, texts) if len(text) > DETAILS_PREVIEW_LENGTH]
+            c.executemany(f"UPDATE {table} SET {target}=? WHERE id=?",
+                          zip(encrypt_values(text_preview(text) for row_id, text in cut),
+                              [row_id for row_id, text in cut]))
+
+# Each migration runs once, in its own transaction, and bumps PRAGMA user_version
+MIGRATIONS = [
+    (1, migrate_initial_schema),
+    (2, migrate_add_indexes),
+    (3, migrate_pieces_stock_check),
+    (4, migrate_default_permissions),
+    (5, migrate_full_text_search),
+    (6, migrate_export_indexes),
+    (7, migrate_kpi_summaries),
+    (8, migrate_stock_movements),
+    (9, migrate_reorder_points),
+    (10, migrate_row_versions),
+    (11, migrate_planner_indexes),
+    (12, migrate_recurring_plans),
+    (13, migrate_technicians),
+    (14, migrate_audit_log),
+    (15, migrate_column_encryption),
+    (16, migrate_kpi_null_equipment),
+    (17, migrate_word_index),
+    (18, migrate_text_previews),
+]
+
+def get_schema_version():
+    return db_fetchone("PRAGMA user_version")[0]
+
+def init_db():
+    # Up-to-date databases cost a single PRAGMA read
+    if get_schema_version() >= MIGRATIONS[-1][0]:
+        return
+    conn = db_pool.connection()
+    for version, migration in MIGRATIONS:
+        if get_schema_version() >= version:
+            continue
+        c = conn.cursor()
+        try:
+            c.execute("BEGIN IMMEDIATE")
+            # Another workstation may have migrated while we waited for the lock
+            if c.execute("PRAGMA user_version").fetchone()[0] < version:
+                migration(c)
+                c.execute(f"PRAGMA user_version={int(version)}")
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            c.close()
+
+# Queries on the hot paths; check_query_plans() reports any that fall back to a table scan
+HOT_QUERIES = [
+    ('''SELECT id, date_entree, date_sortie, technicien, cout FROM interventions
+        WHERE equipement_id=? AND (date_entree, id) < (?, ?) ORDER BY date_entree DESC, id DESC LIMIT ?''',
+     (1, '9999-12-31', 0, HISTORY_PAGE_SIZE)),
+    ('''SELECT id, date_prevue, type_maintenance, technicien, statut, notes
+        FROM planification WHERE equipement_id=? ORDER BY date_prevue''', (1,)),
+    ('''SELECT p.id, p.date_prevue, e.numero_serie, e.marque, e.modele, p.type_maintenance
+        FROM planification p JOIN equipements e ON p.equipement_id = e.id
+        WHERE p.statut IN (?, ?)''', OPEN_MAINTENANCE_STATUSES),
+    ('''SELECT p.nom, ip.quantite_utilisee, p.prix_unitaire, ip.cout_total
+        FROM intervention_pieces ip JOIN pieces p ON ip.piece_id = p.id
+        WHERE ip.intervention_id=?''', (1,)),
+    ("SELECT piece_id, quantite_utilisee FROM intervention_pieces WHERE intervention_id=?", (1,)),
+    ("SELECT * FROM permissions WHERE user_id=?", (1,)),
+    (f"SELECT {EQUIPMENT_COLUMNS} FROM equipements WHERE numero_serie=?", ('',)),
+    (f"SELECT {EQUIPMENT_COLUMNS} FROM equipements WHERE identifiant_acheteur_hash=?", (b'',)),
+    ('''SELECT i.id FROM interventions i WHERE i.date_entree >= ? AND i.date_entree <= ?
+        ORDER BY i.date_entree, i.id''', ('2000-01-01', '2000-12-31')),
+    ('''SELECT id, created_at, kind, quantite, intervention_id, motif FROM stock_movements
+        WHERE piece_id=? AND id < ? ORDER BY id DESC LIMIT ?''', (1, 0, STOCK_HISTORY_PAGE_SIZE)),
+    ('''SELECT p.id, p.date_prevue FROM planification p JOIN equipements e ON e.id = p.equipement_id
+        WHERE p.date_prevue >= ? AND p.date_prevue < ? ORDER BY p.date_prevue, p.id''', ('2000-01-01', '2000-02-01')),
+    ('''SELECT equipement_id, MAX(date_prevue) FROM planification WHERE plan_id=? GROUP BY equipement_id''', (1,)),
+    ("SELECT id FROM equipements WHERE modele=? AND (? = '' OR marque=?)", ('', '', '')),
+    ('''SELECT id FROM plans_maintenance WHERE genere_jusqu_au IS NULL OR genere_jusqu_au < ?''', ('2000-01-01',)),
+    ('''SELECT id, created_at, user_id, action, table_name, row_id, changes FROM audit_log 
+        WHERE id < ? ORDER BY id DESC LIMIT ?''', (0, 200)),
+    ('''SELECT id, created_at, user_id, action, table_name, row_id, changes FROM audit_log 
+        WHERE table_name=? AND id < ? ORDER BY id DESC LIMIT ?''', ('', 0, 200)),
+]
+
+def explain_query_plan(query, params=()):
+    return [row[3] for row in db_fetchall(f"EXPLAIN QUERY PLAN {query}", params)]
+
+def check_query_plans():
+    problems = []
+    for query, params in HOT_QUERIES:
+        for detail in explain_query_plan(query, params):
+            if detail.startswith("SCAN ") and "USING" not in detail:
+                problems.append((" ".join(query.split()), detail))
+    return problems
+
+# === Stock Ledger ===
+# Every stock change is a row appended to stock_movements; a trigger applies it
+# to the materialized pieces.quantite_stock / quantite_reservee in the same
+# transaction and aborts it (IntegrityError) when a piece would go negative or
+# have more reserved than on hand.
+
+# Sets a part to an absolute level by appending the difference; {key} is id or
+# reference and params are (level, motif, key value, level)
+STOCK_ADJUST_QUERY = '''INSERT INTO stock_movements (piece_id, kind, quantite, motif)
+                        SELECT id, 'adjust', ? - quantite_stock, ? FROM pieces
+                        WHERE {key}=? AND quantite_stock != ?'''
+
+# Outstanding quantity per (reservation, piece): reserved minus already released
+_RESERVATION_BALANCE = "SUM(CASE kind WHEN 'reserve' THEN quantite ELSE -quantite END)"
+
+# Effect of one unit of each movement kind on quantite_stock
+STOCK_LEVEL_DELTA = {'in': 1, 'adjust': 1, 'out': -1, 'reserve': 0, 'release': 0}
+
+def _release_reservations(c, reservation_ids, motif):
+    # Idempotent: only what is still outstanding for each reservation is released
+    reservation_ids = [r for r in reservation_ids if r]
+    if not reservation_ids:
+        return
+    placeholders = ", ".join("?" * len(reservation_ids))
+    c.execute(f'''INSERT INTO stock_movements (piece_id, kind, quantite, reservation_id, motif)
+                  SELECT piece_id, 'release', {_RESERVATION_BALANCE}, reservation_id, ?
+                  FROM stock_movements WHERE reservation_id IN ({placeholders})
+                  GROUP BY reservation_id, piece_id HAVING {_RESERVATION_BALANCE} > 0''',
+              (motif, *reservation_ids))
+
+def _consume_pieces(c, intervention_id, pieces):
+    # Reservations made by the parts picker are turned into 'out' movements
+    if not pieces:
+        return
+    _release_reservations(c, [p.get('reservation') for p in pieces], "Consommation")
+    c.executemany('''INSERT INTO intervention_pieces 
+                     (intervention_id, piece_id, quantite_utilisee, cout_total) 
+                     VALUES (?, ?, ?, ?)''',
+                  [(intervention_id, p['piece_id'], p['qty'], p['total_cost']) for p in pieces])
+    c.executemany('''INSERT INTO stock_movements (piece_id, kind, quantite, intervention_id, motif)
+                     VALUES (?, 'out', ?, ?, 'Intervention')''',
+                  [(p['piece_id'], p['qty'], intervention_id) for p in pieces])
+    parts_catalogue.invalidate()
+
+def _release_pieces(c, intervention_id):
+    c.execute('''INSERT INTO stock_movements (piece_id, kind, quantite, intervention_id, motif)
+                 SELECT piece_id, 'in', SUM(quantite_utilisee), intervention_id, 'Retour intervention'
+                 FROM intervention_pieces WHERE intervention_id=?
+                 GROUP BY piece_id HAVING SUM(quantite_utilisee) > 0''', (intervention_id,))
+    c.execute("DELETE FROM intervention_pieces WHERE intervention_id=?", (intervention_id,))
+    parts_catalogue.invalidate()
+
+def _replace_pieces(c, intervention_id, pieces):
+    # Only the net change per piece reaches the ledger, so re-saving an
+    # intervention does not add a return and a re-consumption for every piece
+    previous = dict(c.execute('''SELECT piece_id, SUM(quantite_utilisee) FROM intervention_pieces
+                                 WHERE intervention_id=? GROUP BY piece_id''', (intervention_id,)).fetchall())
+    wanted = {}
+    for p in pieces:
+        wanted[p['piece_id']] = wanted.get(p['piece_id'], 0) + p['qty']
+    _release_reservations(c, [p.get('reservation') for p in pieces], "Consommation")
+    c.execute("DELETE FROM intervention_pieces WHERE intervention_id=?", (intervention_id,))
+    c.executemany('''INSERT INTO intervention_pieces 
+                     (intervention_id, piece_id, quantite_utilisee, cout_total) 
+                     VALUES (?, ?, ?, ?)''',
+                  [(intervention_id, p['piece_id'], p['qty'], p['total_cost']) for p in pieces])
+    movements = []
+    for piece_id in previous.keys() | wanted.keys():
+        delta = wanted.get(piece_id, 0) - (previous.get(piece_id) or 0)
+        if delta > 0:
+            movements.append((piece_id, 'out', delta, intervention_id, 'Intervention'))
+        elif delta < 0:
+            movements.append((piece_id, 'in', -delta, intervention_id, 'Retour intervention'))
+    c.executemany('''INSERT INTO stock_movements (piece_id, kind, quantite, intervention_id, motif)
+                     VALUES (?, ?, ?, ?, ?)''', movements)
+    parts_catalogue.invalidate()
+
+# === Recurring Maintenance ===
+# A plan is expanded lazily into ordinary planification rows (plan_id set) up to
+# PLAN_HORIZON_DAYS ahead. Each (plan, equipment) pair continues from its latest
+# occurrence, so regeneration is incremental; completing an occurrence re-anchors
+# the pair on the completion date. Plans counted in operating hours are turned
+# into dates with the usage rate measured from the counter readings.
+PLAN_UNITS = ('jours', 'semaines', 'mois', 'heures')
+
+PLAN_COLUMNS = '''id, equipement_id, marque, modele, type_maintenance, technicien, intervalle, unite, 
+                  date_debut, notes, duree_estimee'''
+
+PLAN_OCCURRENCE_INSERT = '''INSERT OR IGNORE INTO planification 
+                            (equipement_id, date_prevue, type_maintenance, technicien, statut, notes, plan_id, 
+                             duree_estimee) 
+                            VALUES (?, ?, ?, ?, 'Planifié', ?, ?, ?)'''
+
+def add_months(day, months, day_of_month):
+    # Clamped to the end of shorter months, without drifting afterwards
+    month = day.month - 1 + months
+    year = day.year + month // 12
+    month = month % 12 + 1
+    return date(year, month, min(day_of_month, calendar.monthrange(year, month)[1]))
+
+def plan_dates(unit, interval, start, anchor, today, horizon, hours_per_day=None):
+    # Due dates after anchor (from start when the pair has none yet) up to horizon.
+    # The next date is always returned, even beyond the horizon, so long intervals
+    # still show their upcoming occurrence.
+    if unit == 'heures':
+        if not hours_per_day:
+            return []
+        days = max(math.ceil(interval / hours_per_day), 1)
+        step = lambda day: day + timedelta(days=days)
+    elif unit == 'mois':
+        step = lambda day: add_months(day, interval, start.day)
+    else:
+        days = interval * (7 if unit == 'semaines' else 1)
+        step = lambda day: day + timedelta(days=days)
+    
+    if anchor is None:
+        day = step(start) if unit == 'heures' else start
+        if unit != 'heures':
+            while day < today:
+                day = step(day)
+    elif anchor >= horizon:
+        return []
+    else:
+        day = step(anchor)
+    if unit == 'heures' and day < today:
+        # Hours already exceeded: due now
+        day = today
+    
+    dates = [day]
+    while True:
+        day = step(day)
+        if day > horizon:
+            return dates
+        dates.append(day)
+
+def _usage_rates(c, today):
+    # {equipement_id: operating hours per day} over PLAN_USAGE_WINDOW_DAYS
+    since = (today - timedelta(days=PLAN_USAGE_WINDOW_DAYS)).isoformat()
+    return dict(c.execute('''SELECT equipement_id, 
+                                    (MAX(heures) - MIN(heures)) / (julianday(MAX(date_releve)) - julianday(MIN(date_releve)))
+                             FROM releves_compteur WHERE date_releve >= ? 
+                             GROUP BY equipement_id HAVING COUNT(*) > 1''', (since,)).fetchall())
+
+def _plan_equipment(c, plan):
+    if plan[1] is not None:
+        return [plan[1]]
+    brand = plan[2] or ''
+    return [row[0] for row in c.execute("SELECT id FROM equipements WHERE modele=? AND (? = '' OR marque=?)",
+                                         (plan[3], brand, brand))]
+
+def _plan_occurrences(c, plan, today, horizon, rates, anchors=None):
+    # Rows for PLAN_OCCURRENCE_INSERT; anchors {equipement_id: date} overrides
+    # the latest existing occurrence of each pair
+    plan_id, maint_type, technician, interval, unit, start, notes = (plan[0], plan[4], plan[5], plan[6], 
+                                                                     plan[7], plan[8], plan[9])
+    start = date.fromisoformat(start)
+    if anchors is None:
+        anchors = {equipment_id: date.fromisoformat(latest) for equipment_id, latest in c.execute(
+            "SELECT equipement_id, MAX(date_prevue) FROM planification WHERE plan_id=? GROUP BY equipement_id",
+            (plan_id,))}
+        equipment_ids = _plan_equipment(c, plan)
+    else:
+        equipment_ids = list(anchors)
+    rows = []
+    for equipment_id in equipment_ids:
+        for day in plan_dates(unit, interval, start, anchors.get(equipment_id), today, horizon, 
+                              rates.get(equipment_id)):
+            rows.append((equipment_id, day.isoformat(), maint_type, technician, notes, plan_id, plan[10]))
+    return rows
+
+def _reschedule_pair(c, plan_id, equipment_id, after, anchor, today, horizon_days=PLAN_HORIZON_DAYS):
+    # Replaces the pending occurrences dated after `after` by a series continuing
+    # from anchor (from the plan start when None)
+    plan = c.execute(f"SELECT {PLAN_COLUMNS} FROM plans_maintenance WHERE id=?", (plan_id,)).fetchone()
+    if plan is None:
+        return 0
+    c.execute('''DELETE FROM planification 
+                 WHERE plan_id=? AND equipement_id=? AND statut='Planifié' AND date_prevue > ?''',
+              (plan_id, equipment_id, after))
+    rates = _usage_rates(c, today) if plan[7] == 'heures' else {}
+    rows = _plan_occurrences(c, plan, today, today + timedelta(days=horizon_days), rates, {equipment_id: anchor})
+    c.executemany(PLAN_OCCURRENCE_INSERT, rows)
+    audit_event('planification', 'bulk', changes={'plan_id': [None, plan_id], 'equipement_id': [None, equipment_id], 
+                                                  'occurrences': [None, len(rows)]})
+    return len(rows)
+
+# === Full-Text Search ===
+# The last column is the encrypted text behind the word tokens, for excerpts
+SEARCH_QUERY = f'''SELECT kind, equipement_id, numero_serie, equipement, date_entree, extrait, chiffre FROM (
+                      SELECT 'Équipement' AS kind, e.id AS equipement_id, e.numero_serie,
+                             e.marque || ' ' || e.modele AS equipement, NULL AS date_entree,
+                             snippet(equipements_fts, -1, '[', ']', '…', {SEARCH_EXCERPT_WORDS}) AS extrait,
+                             e.notes AS chiffre, bm25(equipements_fts) AS score
+                      FROM equipements_fts JOIN equipements e ON e.id = equipements_fts.rowid
+                      WHERE equipements_fts MATCH ?
+                      UNION ALL
+                      SELECT 'Intervention', e.id, e.numero_serie,
+                             e.marque || ' ' || e.modele, i.date_entree,
+                             snippet(interventions_fts, -1, '[', ']', '…', {SEARCH_EXCERPT_WORDS}),
+                             i.details_reparation, bm25(interventions_fts)
+                      FROM interventions_fts JOIN interventions i ON i.id = interventions_fts.rowid
+                      JOIN equipements e ON e.id = i.equipement_id
+                      WHERE interventions_fts MATCH ?)
+                  ORDER BY score LIMIT ?'''
+# A snippet() taken from the word tokens
+_TOKEN_EXCERPT = re.compile(rf"\b[0-9a-f]{{{WORD_TOKEN_BYTES * 2}}}\b")
+
+def normalize_search_term(term):
+    # Same folding as the unicode61 tokenizer with remove_diacritics
+    if term.isascii():
+        return term.lower()
+    decomposed = unicodedata.normalize('NFKD', term.lower())
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+class SearchVocabulary:
+    # Sorted terms of the full-text indexes plus a trigram index over them, so a
+    # misspelt word is only compared with the terms sharing most of its
+    # trigrams. Built once and rebuilt after SEARCH_VOCABULARY_TTL; a stale
+    # vocabulary only affects spelling suggestions, never the matches.
+    def __init__(self):
+        self._entry = None
+        self._lock = threading.Lock()
+        self.version = 0
+    
+    @staticmethod
+    def _trigrams(term):
+        padded = f"  {term} "
+        return {padded[i:i + 3] for i in range(len(padded) - 2)}
+    
+    def _index(self):
+        entry = self._entry
+        if entry is not None and entry[0] == self.version and time.monotonic() - entry[1] < SEARCH_VOCABULARY_TTL:
+            return entry[2], entry[3]
+        
+        version = self.version
+        terms = sorted(row[0] for row in db_fetchall(
+            f"""SELECT term FROM equipements_fts_vocab WHERE col != '{WORD_INDEX_COLUMN}'
+                UNION SELECT term FROM interventions_fts_vocab WHERE col != '{WORD_INDEX_COLUMN}'"""))
+        trigrams = {}
+        for position, term in enumerate(terms):
+            for trigram in self._trigrams(term):
+                trigrams.setdefault(trigram, []).append(position)
+        with self._lock:
+            if version == self.version:
+                self._entry = (version, time.monotonic(), terms, trigrams)
+        return terms, trigrams
+    
+    def load(self):
+        return len(self._index()[0])
+    
+    def has_prefix(self, term):
+        terms = self._index()[0]
+        pos = bisect.bisect_left(terms, term)
+        return pos < len(terms) and terms[pos].startswith(term)
+    
+    def closest(self, term, n=3, cutoff=SEARCH_FUZZY_CUTOFF):
+        terms, trigrams = self._index()
+        shared = {}
+        for trigram in self._trigrams(term):
+            for position in trigrams.get(trigram, ()):
+                shared[position] = shared.get(position, 0) + 1
+        candidates = heapq.nlargest(SEARCH_FUZZY_CANDIDATES, shared, key=shared.__getitem__)
+        return difflib.get_close_matches(term, [terms[position] for position in candidates], n=n, cutoff=cutoff)
+    
+    def invalidate(self):
+        with self._lock:
+            self.version += 1
+            self._entry = None
+
+search_vocabulary = SearchVocabulary()
+
+def search_terms(text):
+    return [normalize_search_term(word) for word in SEARCH_WORD.findall(text)]
+
+def build_fts_query(text, vocabulary=None):
+    # Each word is a prefix match on the clear columns or the token of the whole
+    # word among the word tokens; words unknown to the index are widened to
+    # their closest indexed spellings (vocabulary: a SearchVocabulary)
+    groups = []
+    for term in search_terms(text):
+        alternatives = [term]
+        if vocabulary is not None and not vocabulary.has_prefix(term):
+            alternatives += vocabulary.closest(term)
+        clear = " OR ".join(f'"{alt}"*' for alt in alternatives)
+        groups.append(f'(- {WORD_INDEX_COLUMN} : ({clear}) OR {WORD_INDEX_COLUMN} : "{word_token(term)}")')
+    return " AND ".join(groups)
+
+def word_excerpt(text, terms, size=SEARCH_EXCERPT_WORDS):
+    # snippet() for a decrypted value: the words of terms in brackets, starting
+    # just before the first one
+    words = list(SEARCH_WORD.finditer(text))
+    matches = [i for i, word in enumerate(words) if normalize_search_term(word.group()) in terms]
+    if not matches:
+        return text[:DETAILS_PREVIEW_LENGTH]
+    first = max(0, min(matches[0] - 2, len(words) - size))
+    last = min(len(words), first + size)
+    parts = ["…"] if first else []
+    position = words[first].start()
+    for i in range(first, last):
+        word = words[i]
+        parts.append(text[position:word.start()])
+        parts.append(f"[{word.group()}]" if i in matches else word.group())
+        position = word.end()
+    if last < len(words):
+        parts.append("…")
+    return "".join(parts)
+
+# === Serial Autocomplete ===
+# Sorted in-memory prefix index over numero_serie, marque and modele. Lookups
+# are a bisect plus a short scan, so they run on the Tk thread without a query.
+class EquipmentIndex:
+    def __init__(self):
+        self._serial_keys, self._serial_rows = [], []
+        self._label_keys, self._label_rows = [], []
+        self._lock = threading.Lock()
+        self._pending = None
+        self.loaded = False
+    
+    def load(self):
+        with self._lock:
+            self._pending = []
+        rows = db_fetchall("SELECT numero_serie, marque, modele FROM equipements")
+        serials, labels, label_keys = [], [], {}
+        for row in rows:
+            row = tuple(row)
+            serials.append((self._key(row[0]), row))
+            for label in row[1:]:
+                if label:
+                    key = label_keys.get(label)
+                    if key is None:
+                        key = label_keys[label] = sys.intern(self._key(label))
+                    labels.append((key, row))
+        serials.sort(key=itemgetter(0))
+        labels.sort(key=itemgetter(0))
+        
+        with self._lock:
+            self._serial_keys = [key for key, row in serials]
+            self._serial_rows = [row for key, row in serials]
+            self._label_keys = [key for key, row in labels]
+            self._label_rows = [row for key, row in labels]
+            # Inserts committed while the table was being read
+            pending, self._pending = self._pending, None
+            for row in pending:
+                self._insert(row)
+            self.loaded = True
+        return len(serials)
+    
+    @staticmethod
+    def _key(text):
+        return text.lower() if text.isascii() else normalize_search_term(text)
+    
+    def add(self, serial_number, brand, model):
+        row = (serial_number, brand, model)
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append(row)
+            self._insert(row)
+    
+    def _insert(self, row):
+        key = self._key(row[0])
+        pos = bisect.bisect_left(self._serial_keys, key)
+        if pos < len(self._serial_keys) and self._serial_rows[pos][0] == row[0]:
+            return
+        self._serial_keys.insert(pos, key)
+        self._serial_rows.insert(pos, row)
+        for label in row[1:]:
+            if label:
+                key = sys.intern(self._key(label))
+                pos = bisect.bisect_right(self._label_keys, key)
+                self._label_keys.insert(pos, key)
+                self._label_rows.insert(pos, row)
+    
+    @staticmethod
+    def _scan(keys, rows, prefix, limit, found, seen):
+        pos = bisect.bisect_left(keys, prefix)
+        while pos < len(keys) and len(found) < limit and keys[pos].startswith(prefix):
+            row = rows[pos]
+            if row[0] not in seen:
+                seen.add(row[0])
+                found.append(row)
+            pos += 1
+    
+    def suggest(self, text, limit=AUTOCOMPLETE_LIMIT):
+        # Serial numbers first, then equipment whose brand or model starts with text
+        prefix = normalize_search_term(text.strip())
+        found, seen = [], set()
+        if not prefix:
+            return found
+        with self._lock:
+            self._scan(self._serial_keys, self._serial_rows, prefix, limit, found, seen)
+            self._scan(self._label_keys, self._label_rows, prefix, limit, found, seen)
+        return found
+    
+    def closest(self, serial_number, limit=AUTOCOMPLETE_LIMIT):
+        # Serials sharing the longest prefix with serial_number, for typo recovery
+        prefix = normalize_search_term(serial_number.strip())
+        with self._lock:
+            for size in range(len(prefix), AUTOCOMPLETE_MIN_PREFIX - 1, -1):
+                found = []
+                self._scan(self._serial_keys, self._serial_rows, prefix[:size], limit, found, set())
+                if found:
+                    return found
+        return []
+
+equipment_index = EquipmentIndex()
+
+# === Permission Management ===
+PERMISSION_KEYS = (
+    'can_view_interventions',
+    'can_add_interventions',
+    'can_edit_interventions',
+    'can_delete_interventions',
+    'can_view_stock',
+    'can_add_stock',
+    'can_edit_stock',
+    'can_delete_stock',
+    'can_manage_users',
+)
+
+ROLE_DEFAULT_PERMISSIONS = {
+    'admin': (1, 1, 1, 1, 1, 1, 1, 1, 1),
+    'technicien': (1, 1, 0, 0, 1, 0, 0, 0, 0),
+    'user': (1, 0, 0, 0, 1, 0, 0, 0, 0),
+}
+
+def default_permissions(role):
+    return ROLE_DEFAULT_PERMISSIONS.get(role, ROLE_DEFAULT_PERMISSIONS['user'])
+
+class PermissionCache:
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.version = 0
+    
+    def get(self, user_id):
+        user_id = int(user_id)
+        entry = self._entries.get(user_id)
+        if entry is not None and entry[0] == self.version and time.monotonic() - entry[1] < PERMISSION_CACHE_TTL:
+            return entry[2]
+        
+        version = self.version
+        permissions = self._load(user_id)
+        with self._lock:
+            if version == self.version:
+                self._entries[user_id] = (version, time.monotonic(), permissions)
+        return permissions
+    
+    def invalidate(self, user_id=None):
+        with self._lock:
+            self.version += 1
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(int(user_id), None)
+    
+    def _load(self, user_id):
+        row = db_fetchone(f"SELECT {', '.join(PERMISSION_KEYS)} FROM permissions WHERE user_id=?", (user_id,))
+        if row is None:
+            role = db_fetchone("SELECT role FROM users WHERE id=?", (user_id,))
+            row = default_permissions(role[0] if role else None)
+        return {key: bool(value) for key, value in zip(PERMISSION_KEYS, row)}
+
+permission_cache = PermissionCache()
+
+def get_user_permissions(user_id):
+    return permission_cache.get(user_id)
+
+# === Parts Catalogue ===
+class PartsCatalogue:
+    # Snapshot of (id, nom, reference, prix_unitaire, available stock) for the
+    # parts pickers; dropped on any stock change and after PARTS_CATALOGUE_TTL
+    def __init__(self):
+        self._entry = None
+        self._lock = threading.Lock()
+        self.version = 0
+    
+    def rows(self):
+        entry = self._entry
+        if entry is not None and entry[0] == self.version and time.monotonic() - entry[1] < PARTS_CATALOGUE_TTL:
+            return entry[2]
+        
+        version = self.version
+        parts = db_fetchall('''SELECT id, nom, reference, prix_unitaire, quantite_stock - quantite_reservee 
+                                FROM pieces ORDER BY nom''')
+        rows = [(tuple(row), f"{row[1]} {row[2]}".lower()) for row in parts]
+        with self._lock:
+            if version == self.version:
+                self._entry = (version, time.monotonic(), rows)
+        return rows
+    
+    def invalidate(self):
+        with self._lock:
+            self.version += 1
+            self._entry = None
+
+parts_catalogue = PartsCatalogue()
+
+def filter_parts(rows, text="", in_stock_only=False):
+    # Lazily yields catalogue rows whose name or reference contains every word of text
+    words = text.lower().split()
+    for row, key in rows:
+        if in_stock_only and row[4] <= 0:
+            continue
+        if all(word in key for word in words):
+            yield row
+
+# === Services ===
+# Business operations without any Tk dependency: the UI, batch jobs and
+# profiling scripts all go through these. Every method uses the calling
+# thread's pooled connection and commits its own transaction.
+class EquipmentService:
+    def find_by_serial(self, serial_number):
+        return decrypt_row(db_fetchone(f"SELECT {EQUIPMENT_COLUMNS} FROM equipements WHERE numero_serie=?", 
+                                       (serial_number,)), EQUIPMENT_ENCRYPTED_POSITIONS)
+    
+    def find_by_buyer(self, buyer_id):
+        # Exact match on the blind index; the decrypted value is compared as well
+        # since the hash is truncated
+        key = blind_index(buyer_id)
+        if key is None:
+            return []
+        rows = db_fetchall(f"SELECT {EQUIPMENT_COLUMNS} FROM equipements WHERE identifiant_acheteur_hash=?", (key,))
+        wanted = normalize_search_term(buyer_id.strip())
+        rows = [decrypt_row(row, EQUIPMENT_ENCRYPTED_POSITIONS) for row in rows]
+        return [row for row in rows if normalize_search_term((row[6] or "").strip()) == wanted]
+    
+    def get(self, equipment_id):
+        return decrypt_row(db_fetchone(f"SELECT {EQUIPMENT_COLUMNS} FROM equipements WHERE id=?", (equipment_id,)), 
+                           EQUIPMENT_ENCRYPTED_POSITIONS)
+    
+    @retry_on_busy
+    def create(self, serial_number, brand, model, purchase_date, sale_date, buyer_id, notes):
+        with db_transaction() as c:
+            c.execute('''INSERT INTO equipements 
+                      (numero_serie, marque, modele, date_achat, date_vente, identifiant_acheteur, notes, 
+                       identifiant_acheteur_hash, mots_hash) 
+                      VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                      (serial_number, brand, model, purchase_date, sale_date, encrypt_value(buyer_id), 
+                       encrypt_value(notes), blind_index(buyer_id), word_tokens(notes)))
+            equipment_id = c.lastrowid
+            audit_insert(c, 'equipements', equipment_id)
+            # Model plans are expanded for this equipment on the next generation pass
+            c.execute("UPDATE plans_maintenance SET genere_jusqu_au = NULL WHERE equipement_id IS NULL AND modele=?",
+                      (model,))
+        equipment_index.add(serial_number, brand, model)
+        return equipment_id
+    
+    def history_page(self, equipment_id, last_key=None, limit=HISTORY_PAGE_SIZE):
+        # Keyset pagination on (date_entree, id) with only the encrypted preview of
+        # details_reparation, or the details when short enough. The history is
+        # reloaded after every edit, so the previews go through the cache.
+        if last_key is None:
+            rows = db_fetchall('''SELECT id, date_entree, date_sortie, technicien, cout, 
+                                         COALESCE(details_apercu, details_reparation)
+                                  FROM interventions WHERE equipement_id=?
+                                  ORDER BY date_entree DESC, id DESC LIMIT ?''',
+                               (equipment_id, limit))
+        else:
+            rows = db_fetchall('''SELECT id, date_entree, date_sortie, technicien, cout, 
+                                         COALESCE(details_apercu, details_reparation)
+                                  FROM interventions WHERE equipement_id=? AND (date_entree, id) < (?, ?)
+                                  ORDER BY date_entree DESC, id DESC LIMIT ?''',
+                               (equipment_id, *last_key, limit))
+        return [(*row[:5], decrypt_value(row[5])) for row in rows]
+    
+    def search(self, text, progress=None, limit=SEARCH_RESULT_LIMIT, fuzzy=True):
+        # Rows are handed to progress in batches as the cursor yields them; without
+        # progress they are collected and returned. A buyer identifier is encrypted
+        # and only found on an exact match, through its blind index.
+        results = []
+        buyers = [('Acheteur', row[0], row[1], f"{row[2]} {row[3]}", None, row[6]) for row in self.find_by_buyer(text)]
+        count = len(buyers)
+        if buyers:
+            if progress is not None:
+                progress(buyers)
+            else:
+                results.extend(buyers)
+        
+        query = build_fts_query(text, search_vocabulary if fuzzy else None)
+        if not query:
+            return count if progress is not None else results
+        
+        terms = set(search_terms(text))
+        cursor = db_pool.connection().execute(SEARCH_QUERY, (query, query, limit))
+        while True:
+            rows = cursor.fetchmany(SEARCH_BATCH_SIZE)
+            if not rows:
+                break
+            # Matches among the word tokens are shown from the decrypted text
+            rows = [(*row[:5], word_excerpt(decrypt_value(row[6]), terms)
+                     if row[5] and row[6] and _TOKEN_EXCERPT.search(row[5]) else row[5]) for row in rows]
+            count += len(rows)
+            if progress is not None:
+                progress(rows)
+            else:
+                results.extend(rows)
+        return count if progress is not None else results
+
+class InterventionService:
+    def get(self, intervention_id):
+        return decrypt_row(db_fetchone('''SELECT date_entree, date_sortie, technicien, cout, details_reparation, version 
+                                          FROM interventions WHERE id=?''', (intervention_id,)), (4,))
+    
+    def get_pieces(self, intervention_id):
+        return db_fetchall('''SELECT ip.piece_id, p.nom, ip.quantite_utilisee, p.prix_unitaire, ip.cout_total
+                              FROM intervention_pieces ip
+                              JOIN pieces p ON ip.piece_id = p.id
+                              WHERE ip.intervention_id=?''', (intervention_id,))
+    
+    @retry_on_busy
+    def create(self, equipment_id, date_in, date_out, details, technician, cost, pieces):
+        total_cost = cost + sum(p['total_cost'] for p in pieces)
+        with db_transaction() as c:
+            c.execute('''INSERT INTO interventions 
+                      (equipement_id, date_entree, date_sortie, details_reparation, mots_hash, details_apercu, 
+                       technicien, cout) 
+                      VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
+                      (equipment_id, date_in, date_out, encrypt_value(details), word_tokens(details), 
+                       encrypt_value(text_preview(details)), technician, total_cost))
+            intervention_id = c.lastrowid
+            audit_insert(c, 'interventions', intervention_id)
+            with audit_rows(c, 'intervention_pieces', [intervention_id], key='intervention_id'):
+                _consume_pieces(c, intervention_id, pieces)
+        return intervention_id
+    
+    @retry_on_busy
+    def update(self, intervention_id, date_in, date_out, details, technician, cost, pieces, version=None):
+        # version=None overwrites whatever is stored
+        with db_transaction() as c, audit_rows(c, 'interventions', [intervention_id]), \
+                audit_rows(c, 'intervention_pieces', [intervention_id], key='intervention_id'):
+            c.execute('''UPDATE interventions SET 
+                      date_entree=?, date_sortie=?, details_reparation=?, mots_hash=?, details_apercu=?, 
+                      technicien=?, cout=?, version=version + 1 
+                      WHERE id=? AND (? IS NULL OR version=?)''',
+                      (date_in, date_out, encrypt_value(details), word_tokens(details), 
+                       encrypt_value(text_preview(details)), technician, cost, intervention_id, version, version))
+            _check_version(c, 'interventions', intervention_id)
+            _replace_pieces(c, intervention_id, pieces)
+    
+    @retry_on_busy
+    def delete(self, intervention_id):
+        with db_transaction() as c, audit_rows(c, 'interventions', [intervention_id]), \
+                audit_rows(c, 'intervention_pieces', [intervention_id], key='intervention_id'):
+            _release_pieces(c, intervention_id)
+            c.execute("DELETE FROM interventions WHERE id=?", (intervention_id,))
+
+class StockService:
+    def list_parts(self):
+        return db_fetchall('''SELECT id, nom, reference, fournisseur, prix_unitaire, quantite_stock, quantite_reservee, 
+                                     description 
+                              FROM pieces ORDER BY nom''')
+    
+    def get_part(self, part_id):
+        return db_fetchone('''SELECT nom, reference, fournisseur, prix_unitaire, quantite_stock, description, 
+                                     delai_livraison, version
+                              FROM pieces WHERE id=?''', (part_id,))
+    
+    def get_stock_level(self, part_id):
+        # Available quantity: on hand minus what open forms have reserved
+        row = db_fetchone("SELECT quantite_stock - quantite_reservee FROM pieces WHERE id=?", (part_id,))
+        return row[0] if row else 0
+    
+    @retry_on_busy
+    def create_part(self, name, reference, supplier, price, quantity, description):
+        with db_transaction() as c:
+            c.execute('''INSERT INTO pieces (nom, reference, fournisseur, prix_unitaire, quantite_stock, description)
+                         VALUES (?, ?, ?, ?, 0, ?)''', 
+                      (name, reference, supplier, price, description))
+            part_id = c.lastrowid
+            if quantity:
+                c.execute("INSERT INTO stock_movements (piece_id, kind, quantite, motif) VALUES (?, 'in', ?, ?)",
+                          (part_id, quantity, "Création"))
+            audit_insert(c, 'pieces', part_id)
+        parts_catalogue.invalidate()
+        return part_id
+    
+    @retry_on_busy
+    def update_part(self, part_id, name, reference, supplier, price, quantity, description, lead_time=None, 
+                    version=None):
+        with db_transaction() as c, audit_rows(c, 'pieces', [part_id]):
+            c.execute('''UPDATE pieces SET nom=?, reference=?, fournisseur=?, prix_unitaire=?, description=?, 
+                         delai_livraison=?, version=version + 1 WHERE id=? AND (? IS NULL OR version=?)''',
+                      (name, reference, supplier, price, description, lead_time, part_id, version, version))
+            _check_version(c, 'pieces', part_id)
+            c.execute(STOCK_ADJUST_QUERY.format(key='id'), (quantity, "Correction manuelle", part_id, quantity))
+        parts_catalogue.invalidate()
+    
+    @retry_on_busy
+    def delete_part(self, part_id):
+        with db_transaction() as c, audit_rows(c, 'pieces', [part_id]):
+            c.execute("DELETE FROM pieces WHERE id=?", (part_id,))
+        parts_catalogue.invalidate()
+    
+    def low_stock(self, threshold=LOW_STOCK_THRESHOLD):
+        # Parts without a computed reorder point fall back to the global threshold
+        return db_fetchall('''SELECT nom, quantite_stock - quantite_reservee FROM pieces 
+                              WHERE quantite_stock - quantite_reservee <= COALESCE(point_commande, ?)''', 
+                           (threshold,))
+    
+    @retry_on_busy
+    def receive(self, part_id, quantity, motif="Réception"):
+        with db_transaction() as c, audit_rows(c, 'pieces', [part_id]):
+            c.execute("INSERT INTO stock_movements (piece_id, kind, quantite, motif) VALUES (?, 'in', ?, ?)",
+                      (part_id, quantity, motif))
+        parts_catalogue.invalidate()
+    
+    @retry_on_busy
+    def reserve(self, part_id, quantity, reservation_id):
+        # Raises sqlite3.IntegrityError when less than quantity is available
+        with db_transaction() as c:
+            c.execute('''INSERT INTO stock_movements (piece_id, kind, quantite, reservation_id, motif)
+                         VALUES (?, 'reserve', ?, ?, 'Sélection')''', (part_id, quantity, reservation_id))
+        parts_catalogue.invalidate()
+    
+    @retry_on_busy
+    def release(self, reservation_ids, motif="Annulation"):
+        with db_transaction() as c:
+            _release_reservations(c, reservation_ids, motif)
+        parts_catalogue.invalidate()
+    
+    def release_expired_reservations(self, max_age=STOCK_RESERVATION_TTL):
+        # Reservations left behind by forms that were never saved (crash, closed session)
+        rows = db_fetchall(f'''SELECT reservation_id FROM stock_movements WHERE reservation_id IS NOT NULL
+                               GROUP BY reservation_id 
+                               HAVING {_RESERVATION_BALANCE} > 0 AND MAX(created_at) < datetime('now', ?)''',
+                           (f"-{int(max_age)} seconds",))
+        if rows:
+            self.release([row[0] for row in rows], "Réservation expirée")
+        return len(rows)
+    
+    def movements(self, part_id, before=None, limit=STOCK_HISTORY_PAGE_SIZE):
+        # Newest first, keyset-paginated on id. The level after each movement is
+        # derived backwards from the materialized level, so no page needs a SUM
+        # over the whole history; before is the (id, level) of the last row shown.
+        if before is None:
+            level = self.get_part(part_id)
+            before = (None, level[4] if level else 0)
+            rows = db_fetchall('''SELECT id, created_at, kind, quantite, intervention_id, motif 
+                                  FROM stock_movements WHERE piece_id=? ORDER BY id DESC LIMIT ?''',
+                               (part_id, limit))
+        else:
+            rows = db_fetchall('''SELECT id, created_at, kind, quantite, intervention_id, motif 
+                                  FROM stock_movements WHERE piece_id=? AND id < ? ORDER BY id DESC LIMIT ?''',
+                               (part_id, before[0], limit))
+        level = before[1]
+        page = []
+        for movement_id, created_at, kind, quantity, intervention_id, motif in rows:
+            page.append((movement_id, created_at, kind, quantity, level, intervention_id, motif))
+            level -= STOCK_LEVEL_DELTA[kind] * quantity
+        return page
+
+class PlanningService:
+    def list_for_equipment(self, equipment_id):
+        return db_fetchall('''SELECT id, date_prevue, type_maintenance, technicien, statut, notes 
+                              FROM planification WHERE equipement_id=? ORDER BY date_prevue''', (equipment_id,))
+    
+    def list_open(self):
+        return db_fetchall('''SELECT p.id, p.date_prevue, e.numero_serie, e.marque, e.modele, p.type_maintenance 
+                              FROM planification p
+                              JOIN equipements e ON p.equipement_id = e.id
+                              WHERE p.statut IN (?, ?)''', OPEN_MAINTENANCE_STATUSES)
+    
+    def list_range(self, date_from, date_to, open_only=False):
+        # [date_from, date_to) across all equipment, for the planner
+        status_filter = f"AND p.statut IN ({', '.join('?' * len(OPEN_MAINTENANCE_STATUSES))})" if open_only else ""
+        return db_fetchall(f'''SELECT p.id, p.date_prevue, COALESCE(p.technicien, ''), p.type_maintenance, p.statut, 
+                                      e.id, e.numero_serie, e.marque, e.modele
+                               FROM planification p
+                               JOIN equipements e ON e.id = p.equipement_id
+                               WHERE p.date_prevue >= ? AND p.date_prevue < ? {status_filter}
+                               ORDER BY p.date_prevue, p.id''',
+                           (date_from, date_to, *(OPEN_MAINTENANCE_STATUSES if open_only else ())))
+    
+    def get(self, maintenance_id):
+        return db_fetchone('''SELECT date_prevue, type_maintenance, technicien, statut, notes, version, duree_estimee 
+                              FROM planification WHERE id=?''', (maintenance_id,))
+    
+    @retry_on_busy
+    def create(self, equipment_id, date, maint_type, technician, status, notes, duration=None):
+        with db_transaction() as c:
+            c.execute('''INSERT INTO planification 
+                      (equipement_id, date_prevue, type_maintenance, technicien, statut, notes, duree_estimee) 
+                      VALUES (?, ?, ?, ?, ?, ?, ?)''',
+                      (equipment_id, date, maint_type, technician, status, notes, duration))
+            audit_insert(c, 'planification', c.lastrowid)
+            return c.lastrowid
+    
+    @retry_on_busy
+    def update(self, maintenance_id, due_date, maint_type, technician, status, notes, version=None, duration=None):
+        today = date.today()
+        with db_transaction() as c:
+            with audit_rows(c, 'planification', [maintenance_id]):
+                previous = c.execute("SELECT statut, plan_id, equipement_id FROM planification WHERE id=?", 
+                                     (maintenance_id,)).fetchone()
+                c.execute('''UPDATE planification SET 
+                          date_prevue=?, type_maintenance=?, technicien=?, statut=?, notes=?, duree_estimee=?, 
+                          version=version + 1 
+                          WHERE id=? AND (? IS NULL OR version=?)''',
+                          (due_date, maint_type, technician, status, notes, duration, maintenance_id, version, version))
+                _check_version(c, 'planification', maintenance_id)
+            if status == 'Terminé' and previous[0] != 'Terminé' and previous[1] is not None:
+                # The next occurrences of a recurring plan count from the completion date
+                _reschedule_pair(c, previous[1], previous[2], due_date, today, today)
+    
+    @retry_on_busy
+    def delete(self, maintenance_id):
+        with db_transaction() as c, audit_rows(c, 'planification', [maintenance_id]):
+            c.execute("DELETE FROM planification WHERE id=?", (maintenance_id,))
+    
+    def list_plans(self):
+        return db_fetchall('''SELECT p.id, COALESCE(e.numero_serie, ''), COALESCE(p.marque, ''), COALESCE(p.modele, ''), 
+                                     p.type_maintenance, COALESCE(p.technicien, ''), p.intervalle, p.unite, p.date_debut
+                              FROM plans_maintenance p
+                              LEFT JOIN equipements e ON e.id = p.equipement_id
+                              ORDER BY p.type_maintenance, p.id''')
+    
+    def create_plan(self, equipment_id, brand, model, maint_type, technician, interval, unit, start, notes, 
+                    duration=None):
+        # equipment_id for a single machine, otherwise model (and optionally brand).
+        # Generation retries on its own: a BUSY there must not insert the plan twice
+        if unit not in PLAN_UNITS:
+            raise ValueError(f"Unité inconnue: {unit}")
+        plan_id = self._insert_plan(equipment_id, brand, model, maint_type, technician, interval, unit, start, notes, 
+                                    duration)
+        self._generate_after_commit()
+        return plan_id
+    
+    def _generate_after_commit(self, today=None):
+        # The caller's rows are committed by now; if generation still finds the
+        # database busy, the reminder scheduler's next pass generates instead
+        try:
+            self.generate_occurrences(today)
+        except sqlite3.OperationalError as e:
+            if not _is_busy_error(e):
+                raise
+    
+    @retry_on_busy
+    def _insert_plan(self, equipment_id, brand, model, maint_type, technician, interval, unit, start, notes, duration):
+        with db_transaction() as c:
+            c.execute('''INSERT INTO plans_maintenance 
+                      (equipement_id, marque, modele, type_maintenance, technicien, intervalle, unite, date_debut, notes, 
+                       duree_estimee) 
+                      VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                      (equipment_id, brand, model, maint_type, technician, interval, unit, start, notes, duration))
+            plan_id = c.lastrowid
+            audit_insert(c, 'plans_maintenance', plan_id)
+        return plan_id
+    
+    @retry_on_busy
+    def delete_plan(self, plan_id):
+        # Pending occurrences go with the plan; done and in-progress ones stay as history
+        with db_transaction() as c, audit_rows(c, 'plans_maintenance', [plan_id]), \
+                audit_rows(c, 'planification', [plan_id], key='plan_id'):
+            c.execute("DELETE FROM planification WHERE plan_id=? AND statut='Planifié'", (plan_id,))
+            c.execute("UPDATE planification SET plan_id = NULL WHERE plan_id=?", (plan_id,))
+            c.execute("DELETE FROM plans_maintenance WHERE id=?", (plan_id,))
+    
+    @retry_on_busy
+    def generate_occurrences(self, today=None, horizon_days=PLAN_HORIZON_DAYS):
+        # Cheap when nothing is due: one indexed read of the plans behind the horizon
+        today = today or date.today()
+        horizon = today + timedelta(days=horizon_days)
+        with db_transaction() as c:
+            c.execute("BEGIN IMMEDIATE")
+            plans = c.execute(f'''SELECT {PLAN_COLUMNS} FROM plans_maintenance 
+                                  WHERE genere_jusqu_au IS NULL OR genere_jusqu_au < ?''', 
+                              (horizon.isoformat(),)).fetchall()
+            if not plans:
+                return 0
+            rates = _usage_rates(c, today) if any(plan[7] == 'heures' for plan in plans) else {}
+            rows = []
+            for plan in plans:
+                rows.extend(_plan_occurrences(c, plan, today, horizon, rates))
+            c.executemany(PLAN_OCCURRENCE_INSERT, rows)
+            c.executemany("UPDATE plans_maintenance SET genere_jusqu_au=? WHERE id=?", 
+                          [(horizon.isoformat(), plan[0]) for plan in plans])
+            if rows:
+                audit_event('planification', 'bulk', changes={'occurrences': [None, len(rows)], 
+                                                              'plans': [None, len(plans)]})
+        return len(rows)
+    
+    def last_hours(self, equipment_id):
+        return db_fetchone('''SELECT date_releve, heures FROM releves_compteur 
+                              WHERE equipement_id=? ORDER BY date_releve DESC, id DESC LIMIT 1''', (equipment_id,))
+    
+    def record_hours(self, equipment_id, reading_date, hours):
+        # A new reading changes the usage rate: the pending occurrences of the
+        # hour-based plans of this equipment are recomputed
+        today = date.today()
+        self._insert_reading(equipment_id, reading_date, hours, today)
+        self._generate_after_commit(today)
+    
+    @retry_on_busy
+    def _insert_reading(self, equipment_id, reading_date, hours, today):
+        with db_transaction() as c:
+            c.execute("INSERT INTO releves_compteur (equipement_id, date_releve, heures) VALUES (?, ?, ?)",
+                      (equipment_id, reading_date, hours))
+            audit_insert(c, 'releves_compteur', c.lastrowid)
+            pairs = c.execute('''SELECT p.id, MAX(CASE WHEN o.statut = 'Planifié' AND o.date_prevue >= ? 
+                                                       THEN NULL ELSE o.date_prevue END)
+                                 FROM plans_maintenance p
+                                 JOIN planification o ON o.plan_id = p.id AND o.equipement_id = ?
+                                 WHERE p.unite = 'heures'
+                                 GROUP BY p.id''', (today.isoformat(), equipment_id)).fetchall()
+            for plan_id, last_done in pairs:
+                anchor = date.fromisoformat(last_done) if last_done else None
+                _reschedule_pair(c, plan_id, equipment_id, (today - timedelta(days=1)).isoformat(), anchor, today)
+            # Pairs that had no rate yet, hence no occurrence, are picked up below
+            c.execute("UPDATE plans_maintenance SET genere_jusqu_au = NULL WHERE unite = 'heures'")
+
+class UserService:
+    def authenticate(self, username, password):
+        # Hashing is deliberately slow: call from a worker thread
+        user = db_fetchone("SELECT id, username, password_hash, role, first_login FROM users WHERE username=?", (username,))
+        if user is None:
+            # Spend the same time as a real check so unknown usernames are not detectable
+            hash_password(password)
+            return None
+        
+        matches, needs_rehash = verify_password_hash(password, user[2])
+        if not matches:
+            return None
+        if needs_rehash:
+            self._store_rehash(user[0], hash_password(password))
+        
+        # 'permissions' is the login snapshot; it also warms the cache off the Tk
+        # thread, and the UI reads current rights through get_user_permissions
+        return {
+            'id': user[0],
+            'username': user[1],
+            'role': user[3],
+            'first_login': user[4],
+            'permissions': get_user_permissions(user[0])
+        }
+    
+    @retry_on_busy
+    def _store_rehash(self, user_id, password_hash):
+        # Hashed before the retries, which only repeat the write. The user is
+        # not logged in yet, so the entry is attributed explicitly.
+        with db_transaction() as c, audit_rows(c, 'users', [user_id], user_id=user_id):
+            c.execute("UPDATE users SET password_hash=? WHERE id=?", (password_hash, user_id))
+    
+    @retry_on_busy
+    def change_password(self, user_id, current_password, new_password):
+        row = db_fetchone("SELECT password_hash FROM users WHERE id=?", (user_id,))
+        if row is None or not verify_password_hash(current_password, row[0])[0]:
+            return False
+        with db_transaction() as c, audit_rows(c, 'users', [user_id]):
+            c.execute("UPDATE users SET password_hash=?, first_login=0 WHERE id=?",
+                     (hash_password(new_password), user_id))
+        return True
+    
+    def list_users(self):
+        return db_fetchall("SELECT id, username, role, first_login, created_at FROM users ORDER BY username")
+    
+    def get(self, user_id):
+        return db_fetchone("SELECT username, role FROM users WHERE id=?", (user_id,))
+    
+    def get_permission_values(self, user_id):
+        # Stored permission flags in PERMISSION_KEYS order
+        return db_fetchone(f"SELECT {', '.join(PERMISSION_KEYS)} FROM permissions WHERE user_id=?", (user_id,))
+    
+    @retry_on_busy
+    def create(self, username, password, role, permission_values):
+        with db_transaction() as c:
+            c.execute('''INSERT INTO users (username, password_hash, role, first_login)
+                         VALUES (?, ?, ?, ?)''', 
+                      (username, hash_password(password), role, 1))
+            user_id = c.lastrowid
+            audit_insert(c, 'users', user_id)
+            
+            c.execute(f'''INSERT INTO permissions (user_id, {', '.join(PERMISSION_KEYS)}) 
+                          VALUES (?, {', '.join('?' * len(PERMISSION_KEYS))})''', 
+                      (user_id, *permission_values))
+            audit_insert(c, 'permissions', c.lastrowid)
+        return user_id
+    
+    @retry_on_busy
+    def update(self, user_id, role, permission_values):
+        with db_transaction() as c, audit_rows(c, 'users', [user_id]), \
+                audit_rows(c, 'permissions', [user_id], key='user_id'):
+            c.execute("UPDATE users SET role=? WHERE id=?", (role, user_id))
+            c.execute(f"UPDATE permissions SET {', '.join(f'{key}=?' for key in PERMISSION_KEYS)} WHERE user_id=?", 
+                      (*permission_values, user_id))
+        permission_cache.invalidate(user_id)
+    
+    @retry_on_busy
+    def reset_password(self, user_id):
+        with db_transaction() as c, audit_rows(c, 'users', [user_id]):
+            c.execute("UPDATE users SET password_hash=?, first_login=1 WHERE id=?",
+                     (hash_password(INITIAL_PASSWORD), user_id))
+    
+    @retry_on_busy
+    def delete(self, user_id):
+        with db_transaction() as c, audit_rows(c, 'users', [user_id]), \
+                audit_rows(c, 'permissions', [user_id], key='user_id'):
+            c.execute("DELETE FROM permissions WHERE user_id=?", (user_id,))
+            c.execute("DELETE FROM users WHERE id=?", (user_id,))
+        permission_cache.invalidate(user_id)
+
+def compute_kpis(interventions, repairs, repair_days, period_days):
+    # Returns (MTTR days, MTBF days, availability %); None when not computable.
+    # MTBF is uptime over the observed period divided by the number of failures.
+    mttr = repair_days / repairs if repairs else None
+    period = max(period_days or 0, repair_days)
+    if not interventions or not period:
+        return mttr, None, None
+    uptime = period - repair_days
+    return mttr, uptime / interventions, uptime / period * 100
+
+class KpiService:
+    # Reads only the kpi_* summary tables (one row per equipment or technician)
+    def equipment(self):
+        # (id, numero_serie, marque, modele, interventions, MTTR, MTBF, availability, total cost)
+        rows = db_fetchall('''SELECT e.id, e.numero_serie, e.marque, e.modele, 
+                                     k.interventions, k.repairs, k.repair_days, k.total_cost,
+                                     julianday('now') - julianday(COALESCE(NULLIF(e.date_achat, ''), k.first_date))
+                              FROM kpi_equipment k JOIN equipements e ON e.id = k.equipement_id
+                              WHERE k.interventions > 0
+                              ORDER BY k.total_cost DESC''')
+        return [(*row[:5], *compute_kpis(row[4], row[5], row[6], row[8]), row[7]) for row in rows]
+    
+    def brands(self):
+        # (marque, equipment count, interventions, MTTR, MTBF, availability, total cost)
+        rows = db_fetchall('''SELECT e.marque, COUNT(*), SUM(k.interventions), SUM(k.repairs), SUM(k.repair_days), 
+                                     SUM(k.total_cost),
+                                     SUM(julianday('now') - julianday(COALESCE(NULLIF(e.date_achat, ''), k.first_date)))
+                              FROM kpi_equipment k JOIN equipements e ON e.id = k.equipement_id
+                              WHERE k.interventions > 0
+                              GROUP BY e.marque ORDER BY SUM(k.total_cost) DESC''')
+        return [(row[0], row[1], row[2], *compute_kpis(row[2], row[3], row[4], row[6]), row[5]) for row in rows]
+    
+    def technicians(self):
+        # (technicien, interventions, MTTR, total cost, average cost)
+        rows = db_fetchall('''SELECT technicien, interventions, repairs, repair_days, total_cost 
+                              FROM kpi_technician WHERE interventions > 0 ORDER BY interventions DESC''')
+        return [(row[0], row[1], row[3] / row[2] if row[2] else None, row[4], row[4] / row[1]) for row in rows]
+    
+    def overview(self):
+        # {'equipment', 'interventions', 'mttr', 'mtbf', 'availability', 'total_cost'} for the whole fleet
+        row = db_fetchone('''SELECT COUNT(*), COALESCE(SUM(k.interventions), 0), COALESCE(SUM(k.repairs), 0), 
+                                    COALESCE(SUM(k.repair_days), 0), COALESCE(SUM(k.total_cost), 0),
+                                    SUM(julianday('now') - julianday(COALESCE(NULLIF(e.date_achat, ''), k.first_date)))
+                             FROM kpi_equipment k JOIN equipements e ON e.id = k.equipement_id
+                             WHERE k.interventions > 0''')
+        mttr, mtbf, availability = compute_kpis(row[1], row[2], row[3], row[5])
+        return {'equipment': row[0], 'interventions': row[1], 'mttr': mttr, 'mtbf': mtbf, 
+                'availability': availability, 'total_cost': row[4]}
+
+equipment_service = EquipmentService()
+intervention_service = InterventionService()
+stock_service = StockService()
+planning_service = PlanningService()
+user_service = UserService()
+kpi_service = KpiService()
@@ -0,0 +1,170 @@
+import csv
+import json
+import os
+import struct
+import zlib
+
+from gmao.core import db_pool, decrypt_values
+
+# === Configuration ===
+EXPORT_FETCH_SIZE = 2000
+EXPORT_ROW_GROUP_SIZE = 50000
+COLUMNAR_MAGIC = b"GMAOCOL1"
+
+# === Queries ===
+# One row per piece used; interventions without pieces appear once with empty piece columns
+INTERVENTION_COLUMNS = (
+    'intervention_id', 'date_entree', 'date_sortie', 'numero_serie', 'marque', 'modele',
+    'technicien', 'cout', 'details_reparation', 'piece_reference', 'piece_nom',
+    'quantite_utilisee', 'cout_piece',
+)
+
+INTERVENTION_QUERY = '''SELECT i.id, i.date_entree, i.date_sortie, e.numero_serie, e.marque, e.modele,
+                               i.technicien, i.cout, i.details_reparation, p.reference, p.nom,
+                               ip.quantite_utilisee, ip.cout_total
+                        FROM interventions i
+                        JOIN equipements e ON e.id = i.equipement_id
+                        LEFT JOIN intervention_pieces ip ON ip.intervention_id = i.id
+                        LEFT JOIN pieces p ON p.id = ip.piece_id
+                        {where}
+                        ORDER BY i.date_entree, i.id'''
+
+PIECE_COLUMNS = ('id', 'nom', 'reference', 'fournisseur', 'prix_unitaire', 'quantite_stock', 'description')
+
+PIECE_QUERY = '''SELECT id, nom, reference, fournisseur, prix_unitaire, quantite_stock, description
+                 FROM pieces ORDER BY id'''
+
+def _iter_cursor(query, params, encrypted=()):
+    # Bounded memory: rows are pulled from SQLite EXPORT_FETCH_SIZE at a time;
+    # the encrypted column positions are decrypted a batch at a time
+    cursor = db_pool.connection().execute(query, params)
+    try:
+        while True:
+            rows = cursor.fetchmany(EXPORT_FETCH_SIZE)
+            if not rows:
+                break
+            if encrypted:
+                rows = [list(row) for row in rows]
+                for position in encrypted:
+                    for row, value in zip(rows, decrypt_values(row[position] for row in rows)):
+                        row[position] = value
+            yield from rows
+    finally:
+        cursor.close()
+
+def iter_interventions(date_from=None, date_to=None, serial_number=None):
+    conditions, params = [], []
+    if date_from:
+        conditions.append("i.date_entree >= ?")
+        params.append(date_from)
+    if date_to:
+        conditions.append("i.date_entree <= ?")
+        params.append(date_to)
+    if serial_number:
+        conditions.append("i.equipement_id = (SELECT id FROM equipements WHERE numero_serie=?)")
+        params.append(serial_number)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    return _iter_cursor(INTERVENTION_QUERY.format(where=where), params,
+                        (INTERVENTION_COLUMNS.index('details_reparation'),))
+
+def iter_pieces():
+    return _iter_cursor(PIECE_QUERY, ())
+
+# === Writers ===
+# Each writer consumes the row iterator once and returns the number of rows written
+def write_csv(path, columns, rows, progress=None):
+    count = 0
+    with open(path, 'w', newline='', encoding='utf-8-sig') as f:
+        writer = csv.writer(f, delimiter=';')
+        writer.writerow(columns)
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+            if progress is not None and count % EXPORT_ROW_GROUP_SIZE == 0:
+                progress(count)
+    return count
+
+def write_json(path, columns, rows, progress=None):
+    # A JSON array of objects, written one element at a time
+    count = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("[")
+        for row in rows:
+            f.write(",\n" if count else "\n")
+            f.write(json.dumps(dict(zip(columns, row)), ensure_ascii=False))
+            count += 1
+            if progress is not None and count % EXPORT_ROW_GROUP_SIZE == 0:
+                progress(count)
+        f.write("\n]\n")
+    return count
+
+def _write_block(f, data):
+    f.write(struct.pack(">I", len(data)))
+    f.write(data)
+
+def _read_block(f):
+    size = struct.unpack(">I", f.read(4))[0]
+    return f.read(size)
+
+def write_columnar(path, columns, rows, progress=None):
+    # Layout: magic, header block (JSON column list), then row groups of
+    # EXPORT_ROW_GROUP_SIZE rows, each stored column by column as
+    # zlib-compressed JSON arrays; a row group of 0 rows ends the file
+    count = 0
+    with open(path, 'wb') as f:
+        f.write(COLUMNAR_MAGIC)
+        _write_block(f, json.dumps({'columns': list(columns)}).encode())
+        
+        group = []
+        for row in rows:
+            group.append(row)
+            if len(group) == EXPORT_ROW_GROUP_SIZE:
+                _write_row_group(f, columns, group)
+                count += len(group)
+                group = []
+                if progress is not None:
+                    progress(count)
+        if group:
+            _write_row_group(f, columns, group)
+            count += len(group)
+        f.write(struct.pack(">I", 0))
+    return count
+
+def _write_row_group(f, columns, group):
+    f.write(struct.pack(">I", len(group)))
+    for index in range(len(columns)):
+        values = [row[index] for row in group]
+        _write_block(f, zlib.compress(json.dumps(values, ensure_ascii=False).encode(), 6))
+
+def iter_columnar(path):
+    # Reads back a file written by write_columnar, one row group at a time
+    with open(path, 'rb') as f:
+        if f.read(len(COLUMNAR_MAGIC)) != COLUMNAR_MAGIC:
+            raise ValueError("Fichier colonnaire invalide")
+        columns = json.loads(_read_block(f))['columns']
+        while True:
+            size = struct.unpack(">I", f.read(4))[0]
+            if size == 0:
+                break
+            data = [json.loads(zlib.decompress(_read_block(f))) for _ in columns]
+            yield from zip(*data)
+
+EXPORT_WRITERS = {
+    'csv': write_csv,
+    'json': write_json,
+    'gcol': write_columnar,
+}
+
+# === Export ===
+def export_to_file(kind, path, fmt=None, date_from=None, date_to=None, serial_number=None, progress=None):
+    fmt = fmt or os.path.splitext(path)[1].lstrip('.').lower()
+    if fmt not in EXPORT_WRITERS:
+        raise ValueError(f"Format d'export inconnu: {fmt} (csv, json ou gcol)")
+    
+    if kind == 'interventions':
+        columns, rows = INTERVENTION_COLUMNS, iter_interventions(date_from, date_to, serial_number)
+    elif kind == 'pieces':
+        columns, rows = PIECE_COLUMNS, iter_pieces()
+    else:
+        raise ValueError(f"Type d'export inconnu: {kind}")
+    return EXPORT_WRITERS[fmt](path, columns, rows, progress)
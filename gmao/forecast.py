@@ -0,0 +1,93 @@
+import math
+from datetime import date, timedelta
+
+from gmao.core import audit_event, db_fetchall, db_transaction, parts_catalogue, retry_on_busy
+
+# === Configuration ===
+FORECAST_PERIOD_DAYS = 7
+FORECAST_HISTORY_PERIODS = 52
+FORECAST_SMOOTHING_ALPHA = 0.3
+FORECAST_REVIEW_DAYS = 30  # stock covered by a suggested order beyond the reorder point
+DEFAULT_LEAD_TIME_DAYS = 14
+SERVICE_LEVEL_Z = 1.65  # ~95 % of lead times without a stock-out
+
+# === Consumption History ===
+# One row per (piece, period) with the quantity used; period 0 is the most recent
+CONSUMPTION_QUERY = '''SELECT ip.piece_id,
+                              CAST((julianday(?) - julianday(i.date_entree)) / ? AS INTEGER) AS period,
+                              SUM(ip.quantite_utilisee)
+                       FROM interventions i
+                       JOIN intervention_pieces ip ON ip.intervention_id = i.id
+                       WHERE i.date_entree > ? AND i.date_entree <= ?
+                       GROUP BY ip.piece_id, period'''
+
+def load_consumption(as_of=None, periods=FORECAST_HISTORY_PERIODS, period_days=FORECAST_PERIOD_DAYS):
+    # {piece_id: [quantity per period, oldest first]}, aggregated by SQLite in one pass
+    as_of = as_of or date.today()
+    start = as_of - timedelta(days=periods * period_days)
+    series = {}
+    for piece_id, period, quantity in db_fetchall(CONSUMPTION_QUERY, (as_of.isoformat(), period_days,
+                                                                      start.isoformat(), as_of.isoformat())):
+        if 0 <= period < periods:
+            series.setdefault(piece_id, [0] * periods)[periods - 1 - period] += quantity
+    return series
+
+# === Forecast ===
+def smooth_demand(history, alpha=FORECAST_SMOOTHING_ALPHA):
+    # Simple exponential smoothing: (forecast per period, std dev of the one-step errors)
+    level = sum(history) / len(history)
+    squared_errors = 0.0
+    for quantity in history:
+        error = quantity - level
+        squared_errors += error * error
+        level += alpha * error
+    return level, math.sqrt(squared_errors / len(history))
+
+def reorder_point(history, lead_time_days, period_days=FORECAST_PERIOD_DAYS, z=SERVICE_LEVEL_Z):
+    # Lead-time demand plus safety stock; returns (reorder point, daily demand)
+    demand, deviation = smooth_demand(history)
+    daily_demand = demand / period_days
+    lead_periods = lead_time_days / period_days
+    safety_stock = z * deviation * math.sqrt(lead_periods)
+    return math.ceil(daily_demand * lead_time_days + safety_stock), daily_demand
+
+def compute_reorder_points(as_of=None):
+    # {piece_id: (reorder point, daily demand)} for every part with consumption in the window
+    lead_times = dict(db_fetchall("SELECT id, delai_livraison FROM pieces"))
+    results = {}
+    for piece_id, history in load_consumption(as_of).items():
+        if piece_id in lead_times:
+            lead_time = lead_times[piece_id] or DEFAULT_LEAD_TIME_DAYS
+            results[piece_id] = reorder_point(history, lead_time)
+    return results
+
+@retry_on_busy
+def recompute_reorder_points(as_of=None):
+    # Parts without consumption in the window get no reorder point and fall back
+    # to LOW_STOCK_THRESHOLD
+    points = compute_reorder_points(as_of)
+    with db_transaction() as c:
+        c.execute("UPDATE pieces SET point_commande = NULL, consommation_journaliere = NULL")
+        c.executemany("UPDATE pieces SET point_commande = ?, consommation_journaliere = ? WHERE id = ?",
+                      [(point, daily, piece_id) for piece_id, (point, daily) in points.items()])
+        audit_event('pieces', 'bulk', changes={'point_commande': [None, len(points)]})
+    parts_catalogue.invalidate()
+    return len(points)
+
+# === Purchase Suggestions ===
+def purchase_suggestions(review_days=FORECAST_REVIEW_DAYS):
+    # [(fournisseur, [(reference, nom, disponible, point de commande, quantité, prix, total)])]
+    # for parts at or below their reorder point; each order brings the available
+    # stock back to the reorder point plus review_days of forecast demand
+    rows = db_fetchall('''SELECT COALESCE(NULLIF(fournisseur, ''), 'Sans fournisseur'), reference, nom,
+                                 quantite_stock - quantite_reservee, point_commande,
+                                 consommation_journaliere, prix_unitaire
+                          FROM pieces
+                          WHERE point_commande IS NOT NULL AND quantite_stock - quantite_reservee <= point_commande
+                          ORDER BY 1, nom''')
+    suppliers = {}
+    for supplier, reference, name, available, point, daily, price in rows:
+        quantity = max(math.ceil(point + (daily or 0) * review_days - available), 1)
+        suppliers.setdefault(supplier, []).append(
+            (reference, name, available, point, quantity, price or 0, quantity * (price or 0)))
+    return list(suppliers.items())
@@ -0,0 +1,289 @@
+import csv
+import os
+from datetime import date, datetime
+from itertools import islice
+
+from gmao.core import (
+    FTS_TABLES, db_transaction, db_fetchall, create_fts_triggers, drop_fts_triggers, rebuild_fts_index,
+    create_kpi_triggers, drop_kpi_triggers, rebuild_kpi_summaries, parts_catalogue, search_vocabulary, audit_event,
+    STOCK_ADJUST_QUERY, drop_stock_level_triggers, apply_stock_levels, create_stock_triggers,
+    create_stock_version_trigger, blind_index, word_tokens, encrypt_values, text_preview
+)
+
+# === Configuration ===
+IMPORT_CHUNK_SIZE = 5000
+IMPORT_MAX_ERRORS = 1000
+
+# === Column Definitions ===
+# Column name -> (required, converter). Headers are matched case-insensitively.
+# A plain alias: converters run for every cell of an import
+_text = str.strip
+
+def _date(value):
+    value = value.strip()
+    if len(value) == 10 and value[4] == value[7] == "-":
+        # Usual YYYY-MM-DD form; strptime is ~30x slower and only needed
+        # for the single-digit months and days it also accepts
+        date.fromisoformat(value)
+    elif value:
+        # Stored zero-padded: julianday(), the keyset order of the history and
+        # date-range exports all compare the text
+        return datetime.strptime(value, "%Y-%m-%d").date().isoformat()
+    return value
+
+def _price(value):
+    value = value.strip().replace(",", ".")
+    price = float(value) if value else 0.0
+    if price < 0:
+        raise ValueError("valeur négative")
+    return price
+
+def _quantity(value):
+    # None when empty: the stock level of an existing part is left alone
+    value = value.strip()
+    if not value:
+        return None
+    quantity = int(float(value))
+    if quantity < 0:
+        raise ValueError("valeur négative")
+    return quantity
+
+IMPORT_SCHEMAS = {
+    'equipements': {
+        'numero_serie': (True, _text),
+        'marque': (True, _text),
+        'modele': (True, _text),
+        'date_achat': (False, _date),
+        'date_vente': (False, _date),
+        'identifiant_acheteur': (False, _text),
+        'notes': (False, _text),
+    },
+    'pieces': {
+        'nom': (True, _text),
+        'reference': (True, _text),
+        'fournisseur': (False, _text),
+        'prix_unitaire': (False, _price),
+        'quantite_stock': (False, _quantity),
+        'description': (False, _text),
+    },
+    'interventions': {
+        'numero_serie': (True, _text),
+        'date_entree': (True, _date),
+        'date_sortie': (False, _date),
+        'details_reparation': (False, _text),
+        'technicien': (False, _text),
+        'cout': (False, _price),
+    },
+}
+
+# Existing rows are updated in place when the natural key already exists
+UPSERT_QUERIES = {
+    'equipements': '''INSERT INTO equipements
+                      (numero_serie, marque, modele, date_achat, date_vente, identifiant_acheteur, notes,
+                       identifiant_acheteur_hash, mots_hash)
+                      VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                      ON CONFLICT(numero_serie) DO UPDATE SET
+                      marque=excluded.marque, modele=excluded.modele, date_achat=excluded.date_achat,
+                      date_vente=excluded.date_vente, identifiant_acheteur=excluded.identifiant_acheteur,
+                      notes=excluded.notes, identifiant_acheteur_hash=excluded.identifiant_acheteur_hash,
+                      mots_hash=excluded.mots_hash''',
+    # quantite_stock goes through the stock ledger: row by row it is 0 and set
+    # by STOCK_ADJUST_QUERY, in bulk it is the imported level and
+    # apply_stock_levels() writes the movements. An empty or missing level
+    # leaves an existing part's stock alone and creates a new one at 0.
+    'pieces': '''INSERT INTO pieces (nom, reference, fournisseur, prix_unitaire, quantite_stock, description)
+                 VALUES (?, ?, ?, ?, ?, ?)
+                 ON CONFLICT(reference) DO UPDATE SET
+                 nom=excluded.nom, fournisseur=excluded.fournisseur, prix_unitaire=excluded.prix_unitaire,
+                 description=excluded.description''',
+    'interventions': '''INSERT INTO interventions
+                        (equipement_id, date_entree, date_sortie, details_reparation, technicien, cout, mots_hash,
+                         details_apercu)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
+}
+
+# === Readers ===
+# Both readers yield (line number, {header: value}) without loading the file
+def iter_csv_rows(path):
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        sample = f.read(4096)
+        f.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+        except csv.Error:
+            dialect = csv.excel
+        reader = csv.reader(f, dialect)
+        headers = [h.strip().lower() for h in next(reader, [])]
+        for row in reader:
+            if any(row):
+                yield reader.line_num, dict(zip(headers, row))
+
+def iter_excel_rows(path):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ImportError("L'import Excel nécessite le module openpyxl (pip install openpyxl)")
+    
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        headers = [str(h or "").strip().lower() for h in next(rows, ())]
+        for line, row in enumerate(rows, start=2):
+            if any(cell is not None for cell in row):
+                values = ["" if cell is None else
+                          cell.strftime("%Y-%m-%d") if isinstance(cell, datetime) else str(cell)
+                          for cell in row]
+                yield line, dict(zip(headers, values))
+    finally:
+        workbook.close()
+
+def iter_file_rows(path):
+    if os.path.splitext(path)[1].lower() in ('.xlsx', '.xlsm'):
+        return iter_excel_rows(path)
+    return iter_csv_rows(path)
+
+# === Import ===
+def _drop_indexes(c, table):
+    # Secondary indexes of table, dropped for a bulk load and recreated from the
+    # returned statements; unique constraints stay, the upserts need them
+    indexes = c.execute("SELECT name, sql FROM sqlite_master WHERE type='index' AND tbl_name=? AND sql IS NOT NULL",
+                        (table,)).fetchall()
+    for name, sql in indexes:
+        c.execute(f"DROP INDEX {name}")
+    return [sql for name, sql in indexes]
+
+def _row_error(columns, record):
+    # First problem of a rejected row, in column order
+    for column, (required, convert) in columns:
+        raw = record.get(column) or ""
+        if required and not raw.strip():
+            return f"colonne '{column}' obligatoire"
+        try:
+            convert(raw)
+        except ValueError:
+            return f"valeur invalide pour '{column}': {raw!r}"
+
+def _validate_chunk(kind, chunk, errors, serial_ids):
+    columns = list(IMPORT_SCHEMAS[kind].items())
+    # Required columns are all text or dates, whose converters return '' when empty
+    required = [i for i, (column, (needed, convert)) in enumerate(columns) if needed]
+    valid = []
+    for line, record in chunk:
+        try:
+            try:
+                values = [convert(record.get(column) or "") for column, (needed, convert) in columns]
+            except ValueError:
+                values = None
+            if values is None or not all(values[i] for i in required):
+                raise ValueError(_row_error(columns, record))
+            if kind == 'interventions':
+                equipment_id = serial_ids.get(values[0])
+                if equipment_id is None:
+                    raise ValueError(f"équipement inconnu: {values[0]}")
+                values[0] = equipment_id
+        except ValueError as e:
+            if len(errors) < IMPORT_MAX_ERRORS:
+                errors.append((line, str(e)))
+            continue
+        valid.append(values)
+    return valid
+
+def _encrypt_chunk(kind, valid):
+    # Sensitive columns are encrypted a chunk at a time (see gmao.core.ENCRYPTED_COLUMNS)
+    if kind == 'equipements':
+        buyers = encrypt_values(values[5] for values in valid)
+        notes = encrypt_values(values[6] for values in valid)
+        return [values[:5] + [buyer, note, blind_index(values[5]), word_tokens(values[6])]
+                for values, buyer, note in zip(valid, buyers, notes)]
+    if kind == 'interventions':
+        details = encrypt_values(values[3] for values in valid)
+        previews = encrypt_values(text_preview(values[3]) for values in valid)
+        return [values[:3] + [detail] + values[4:] + [word_tokens(values[3]), preview]
+                for values, detail, preview in zip(valid, details, previews)]
+    return valid
+
+def import_rows(kind, rows, progress=None, chunk_size=IMPORT_CHUNK_SIZE):
+    # rows: iterable of (line number, {column: text}); everything is written in
+    # one transaction, so a failure leaves the database untouched
+    if kind not in IMPORT_SCHEMAS:
+        raise ValueError(f"Type d'import inconnu: {kind}")
+    
+    serial_ids = {}
+    if kind == 'interventions':
+        serial_ids = dict(db_fetchall("SELECT numero_serie, id FROM equipements"))
+    
+    result = {'rows': 0, 'imported': 0, 'errors': []}
+    rows = iter(rows)
+    bulk = False
+    # Bulk part imports: existing references and the levels to set on them
+    known = set()
+    levels = {}
+    indexes = []
+    with db_transaction() as c:
+        c.execute("BEGIN IMMEDIATE")
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            if not bulk and len(chunk) == chunk_size:
+                # Large file: index, summarize and set stock levels once at the
+                # end instead of row by row
+                # Sorting each index once at the end is cheaper than inserting
+                # hashes and dates into it at random
+                indexes = _drop_indexes(c, kind)
+                if kind in FTS_TABLES:
+                    drop_fts_triggers(c, kind)
+                if kind == 'interventions':
+                    drop_kpi_triggers(c)
+                if kind == 'pieces':
+                    drop_stock_level_triggers(c)
+                    first_id = c.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM pieces").fetchone()[0]
+                    known.update(reference for reference, in c.execute("SELECT reference FROM pieces"))
+                bulk = True
+            valid = _encrypt_chunk(kind, _validate_chunk(kind, chunk, result['errors'], serial_ids))
+            if kind == 'pieces':
+                if bulk:
+                    c.executemany(UPSERT_QUERIES[kind], [values[:4] + [values[4] or 0] + values[5:] for values in valid])
+                    for values in valid:
+                        # A new part keeps the level it was inserted with unless its
+                        # reference comes again: the last row wins, as row by row
+                        if values[1] not in known:
+                            known.add(values[1])
+                        elif values[4] is not None:
+                            levels[values[1]] = values[4]
+                else:
+                    c.executemany(UPSERT_QUERIES[kind], [values[:4] + [0] + values[5:] for values in valid])
+                    c.executemany(STOCK_ADJUST_QUERY.format(key='reference'), 
+                                  [(values[4], "Import", values[1], values[4]) for values in valid 
+                                   if values[4] is not None])
+            else:
+                c.executemany(UPSERT_QUERIES[kind], valid)
+            result['rows'] += len(chunk)
+            result['imported'] += len(valid)
+            if progress is not None:
+                progress(result['rows'])
+        # Imports are audited as one summary entry rather than row by row
+        audit_event(kind, 'bulk', changes={'import': [None, result['imported']]})
+        if kind == 'equipements':
+            # Model-wide recurring plans are expanded for the new machines on the next pass
+            c.execute("UPDATE plans_maintenance SET genere_jusqu_au = NULL WHERE equipement_id IS NULL")
+        for sql in indexes:
+            c.execute(sql)
+        if bulk and kind in FTS_TABLES:
+            rebuild_fts_index(c, kind)
+            create_fts_triggers(c, kind)
+        if bulk and kind == 'interventions':
+            rebuild_kpi_summaries(c)
+            create_kpi_triggers(c)
+        if bulk and kind == 'pieces':
+            apply_stock_levels(c, first_id, levels, "Import")
+            create_stock_triggers(c)
+            create_stock_version_trigger(c)
+    if kind == 'pieces':
+        parts_catalogue.invalidate()
+    if kind in FTS_TABLES:
+        search_vocabulary.invalidate()
+    return result
+
+def import_file(kind, path, progress=None, chunk_size=IMPORT_CHUNK_SIZE):
+    return import_rows(kind, iter_file_rows(path), progress, chunk_size)
@@ -0,0 +1,136 @@
+from collections import defaultdict
+from datetime import date, timedelta
+
+from gmao.core import (
+    OPEN_MAINTENANCE_STATUSES, db_fetchall, db_transaction, retry_on_busy, audit_insert, audit_rows
+)
+
+# === Configuration ===
+SCHEDULER_HORIZON_DAYS = 90
+SCHEDULER_DEFAULT_DURATION = 2.0  # hours, for tasks without duree_estimee
+SCHEDULER_MAX_SHIFT_DAYS = 14  # how far a task may be pushed back when everyone is booked
+SCHEDULER_WORKDAYS = 5  # Monday to Friday
+
+# === Technician Roster ===
+def list_technicians(active_only=False):
+    # [(id, nom, heures_par_jour, actif)]
+    condition = "WHERE actif = 1" if active_only else ""
+    return db_fetchall(f"SELECT id, nom, heures_par_jour, actif FROM techniciens {condition} ORDER BY nom")
+
+def technician_names():
+    return [row[1] for row in list_technicians(active_only=True)]
+
+@retry_on_busy
+def save_technician(name, hours_per_day, active=True, technician_id=None):
+    with db_transaction() as c:
+        if technician_id is None:
+            c.execute("INSERT INTO techniciens (nom, heures_par_jour, actif) VALUES (?, ?, ?)",
+                      (name, hours_per_day, int(active)))
+            audit_insert(c, 'techniciens', c.lastrowid)
+            return c.lastrowid
+        with audit_rows(c, 'techniciens', [technician_id]):
+            c.execute("UPDATE techniciens SET nom=?, heures_par_jour=?, actif=? WHERE id=?",
+                      (name, hours_per_day, int(active), technician_id))
+        return technician_id
+
+@retry_on_busy
+def delete_technician(technician_id):
+    # Tasks keep the name typed on them; it just stops being offered or scheduled
+    with db_transaction() as c, audit_rows(c, 'techniciens', [technician_id]):
+        c.execute("DELETE FROM techniciens WHERE id=?", (technician_id,))
+
+# === Workload ===
+def load_open_tasks(today, horizon_days=SCHEDULER_HORIZON_DAYS):
+    # Open tasks up to the horizon, overdue ones included:
+    # [(id, date_prevue, technicien, durée, statut, version)]
+    horizon = (today + timedelta(days=horizon_days)).isoformat()
+    return db_fetchall(f'''SELECT id, date_prevue, TRIM(COALESCE(technicien, '')), COALESCE(duree_estimee, ?),
+                                  statut, version
+                           FROM planification
+                           WHERE statut IN ({', '.join('?' * len(OPEN_MAINTENANCE_STATUSES))}) AND date_prevue < ?
+                           ORDER BY date_prevue, id''',
+                       (SCHEDULER_DEFAULT_DURATION, *OPEN_MAINTENANCE_STATUSES, horizon))
+
+def workload(today=None, horizon_days=SCHEDULER_HORIZON_DAYS):
+    # {technicien: [heures, tâches]} over the horizon; unassigned tasks are under ''
+    today = today or date.today()
+    loads = defaultdict(lambda: [0.0, 0])
+    for task_id, due, technician, duration, status, version in load_open_tasks(today, horizon_days):
+        loads[technician][0] += duration
+        loads[technician][1] += 1
+    return dict(loads)
+
+# === Balancing ===
+def _workday(day):
+    while day.weekday() >= SCHEDULER_WORKDAYS:
+        day += timedelta(days=1)
+    return day
+
+def balance_tasks(tasks, capacities, today, reassign=False, max_shift_days=SCHEDULER_MAX_SHIFT_DAYS):
+    # Greedy balancing: tasks are taken by date, longest first, and each goes to
+    # the technician with the least hours booked overall among those who still
+    # have room on its day; when nobody has room it moves to the next workday.
+    # In-progress tasks, and already assigned ones unless reassign, stay put and
+    # count as booked time. Returns ([(id, date, technicien)] for the tasks that
+    # change, [ids that could not be placed]).
+    booked = defaultdict(float)
+    totals = dict.fromkeys(capacities, 0.0)
+    movable = []
+    for task_id, due, technician, duration, status, version in tasks:
+        fixed = status != 'Planifié' or (not reassign and technician in capacities)
+        if fixed:
+            if technician in capacities:
+                booked[(technician, due)] += duration
+                totals[technician] += duration
+        else:
+            movable.append((due, -duration, task_id, technician))
+    movable.sort()
+    
+    changes, unplaced = [], []
+    today = _workday(today)
+    names = sorted(capacities)
+    for due, duration, task_id, current in movable:
+        duration = -duration
+        day = max(date.fromisoformat(due), today) if due else today
+        day = _workday(day)
+        chosen = None
+        for _ in range(max_shift_days + 1):
+            key = day.isoformat()
+            # A task longer than a full day still fits on an empty one
+            free = [name for name in names
+                    if booked[(name, key)] == 0 or booked[(name, key)] + duration <= capacities[name]]
+            if free:
+                chosen = min(free, key=totals.__getitem__)
+                break
+            day = _workday(day + timedelta(days=1))
+        if chosen is None:
+            unplaced.append(task_id)
+            continue
+        booked[(chosen, key)] += duration
+        totals[chosen] += duration
+        if chosen != current or key != due:
+            changes.append((task_id, key, chosen))
+    return changes, unplaced
+
+def propose_schedule(reassign=False, today=None, horizon_days=SCHEDULER_HORIZON_DAYS):
+    # Returns (changes, unplaced, tasks by id) without writing anything
+    today = today or date.today()
+    tasks = load_open_tasks(today, horizon_days)
+    capacities = {name: hours for technician_id, name, hours, active in list_technicians(active_only=True)}
+    if not capacities:
+        raise ValueError("Aucun technicien actif: ajoutez-en avant de répartir les tâches")
+    changes, unplaced = balance_tasks(tasks, capacities, today, reassign)
+    return changes, unplaced, {task[0]: task for task in tasks}
+
+@retry_on_busy
+def apply_schedule(changes, versions):
+    # One transaction; a task edited since the proposal (version changed), or
+    # whose plan already has an occurrence on the new date, is left as is.
+    # Returns the number of tasks updated.
+    with db_transaction() as c:
+        with audit_rows(c, 'planification', [task_id for task_id, day, technician in changes]):
+            c.executemany('''UPDATE OR IGNORE planification SET date_prevue=?, technicien=?, version=version + 1
+                             WHERE id=? AND version=? AND statut='Planifié' ''',
+                          [(day, technician, task_id, versions[task_id]) for task_id, day, technician in changes])
+            count = c.rowcount
+        return count
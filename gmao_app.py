@@ -1,13 +1,38 @@
+import time
+STARTUP_TIME = time.perf_counter()
+
 import tkinter as tk
-from tkinter import messagebox, ttk, simpledialog
+from tkinter import messagebox, ttk, simpledialog, filedialog
 import sqlite3
-from cryptography.fernet import Fernet
-import os
+import sys
 from datetime import datetime, timedelta
 import threading
-import time
 from functools import partial
-import hashlib
+import heapq
+import json
+import uuid
+from itertools import islice
+import queue
+from concurrent.futures import ThreadPoolExecutor
+
+from gmao.core import (
+    INITIAL_PASSWORD, HISTORY_PAGE_SIZE, PASSWORD_TARGET_MS,
+    STOCK_HISTORY_PAGE_SIZE, STOCK_LEVEL_DELTA, PLAN_UNITS, ConflictError, set_audit_user,
+    db_pool, init_db, check_query_plans, calibrate_password_cost, get_user_permissions, parts_catalogue,
+    filter_parts, equipment_index, search_vocabulary, equipment_service, intervention_service, stock_service,
+    planning_service, user_service, kpi_service
+)
+from gmao.importer import import_file
+from gmao.exporter import export_to_file
+from gmao.forecast import recompute_reorder_points, purchase_suggestions
+from gmao.audit import (
+    AUDIT_ARCHIVE_DIR, AUDIT_PAGE_SIZE, AUDIT_RETENTION_DAYS, audit_page, audit_tables, list_archives, 
+    compact_audit_log
+)
+from gmao.scheduler import (
+    SCHEDULER_HORIZON_DAYS, SCHEDULER_MAX_SHIFT_DAYS, list_technicians, technician_names, save_technician,
+    delete_technician, workload, propose_schedule, apply_schedule
+)
 
 # === Global Variables ===
 root = None
@@ -15,11 +40,40 @@ entry_serial = None
 current_user = None
 
 # === Configuration ===
-KEY_FILE = 'secret.key'
-DB_FILE = 'gmao_encrypted.db'
-INITIAL_PASSWORD = 'admin123'
-LOW_STOCK_THRESHOLD = 5
 MONETARY_SYMBOL = "TND"
+DB_WORKER_COUNT = 2
+DB_POLL_INTERVAL = 50  # ms
+REMINDER_DAYS_AHEAD = 7
+REMINDER_RESYNC_INTERVAL = 6 * 3600 * 1000  # ms
+REMINDER_STARTUP_DELAY = 1500  # ms, keeps the first reminder load off the startup path
+AUTOCOMPLETE_ROWS = 8
+PICKER_PAGE_SIZE = 200
+PICKER_FILTER_DELAY = 150  # ms
+PLANNER_CHUNK_DAYS = 28
+PLANNER_DAY_WIDTH = 150
+PLANNER_LANE_WIDTH = 150
+PLANNER_LANE_HEIGHT = 84
+PLANNER_HEADER_HEIGHT = 32
+PLANNER_TASK_HEIGHT = 18
+PLANNER_TASKS_PER_CELL = 3
+PLANNER_STATUS_COLORS = {
+    "Planifié": "#3498db",
+    "En cours": "#f39c12",
+    "Terminé": "#27ae60",
+}
+AUDIT_ACTION_LABELS = {
+    'insert': "Création",
+    'update': "Modification",
+    'delete': "Suppression",
+    'bulk': "Traitement groupé",
+}
+STOCK_MOVEMENT_LABELS = {
+    'in': "Entrée",
+    'out': "Sortie",
+    'reserve': "Réservation",
+    'release': "Libération",
+    'adjust': "Ajustement",
+}
 
 # === Window Manager ===
 class WindowManager:
@@ -45,6 +99,24 @@ class WindowManager:
 
 window_manager = WindowManager()
 
+# === Edit Conflicts ===
+def resolve_conflict(window, error, overwrite, reload):
+    # Another workstation saved the same row after this form was loaded
+    if error.deleted:
+        messagebox.showerror("Conflit de modification", f"{error}.", parent=window)
+        window.destroy()
+        return
+    answer = messagebox.askyesnocancel("Conflit de modification", 
+                                       f"{error} depuis l'ouverture de ce formulaire.\n\n"
+                                       "Oui : enregistrer quand même vos modifications\n"
+                                       "Non : fermer et recharger la version actuelle\n"
+                                       "Annuler : revenir au formulaire", parent=window)
+    if answer:
+        overwrite()
+    elif answer is False:
+        window.destroy()
+        reload()
+
 # === Professional UI Theme ===
 class ProfessionalTheme:
     PRIMARY = "#2c3e50"
@@ -65,7 +137,11 @@ class ProfessionalTheme:
     
     @staticmethod
     def configure_styles():
+        # Styles belong to a Tk interpreter: configure each root window only once
         style = ttk.Style()
+        if getattr(style.master, '_gmao_styles_configured', False):
+            return
+        style.master._gmao_styles_configured = True
         style.theme_use('clam')
         
         style.configure("Primary.TButton", 
@@ -104,177 +180,196 @@ class ProfessionalTheme:
         style.map("Danger.TButton",
                  background=[('active', '#c0392b')])
 
-# === Encryption Functions ===
-def load_key():
-    if os.path.exists(KEY_FILE):
-        with open(KEY_FILE, 'rb') as f:
-            return f.read()
-    else:
-        key = Fernet.generate_key()
-        with open(KEY_FILE, 'wb') as f:
-            f.write(key)
-        return key
+# === Background Database Worker ===
+class DBTask:
+    def __init__(self, executor, func, args, kwargs, on_success, on_error, widget, key, on_progress=None, 
+                 on_dropped=None):
+        self.executor = executor
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.on_success = on_success
+        self.on_error = on_error
+        self.on_progress = on_progress
+        self.on_dropped = on_dropped
+        self.widget = widget
+        self.key = key
+        self.future = None
+        self.conn = None
+        self.cancelled = False
+        self.lock = threading.Lock()
+    
+    @property
+    def pending(self):
+        return self in self.executor._pending
+    
+    def cancel(self):
+        self.cancelled = True
+        if self.future is not None and not self.future.cancel():
+            # Already running: abort the statement in progress on its connection
+            with self.lock:
+                if self.conn is not None:
+                    self.conn.interrupt()
+        self.executor._discard(self)
 
-def encrypt_data(data):
-    key = load_key()
-    f = Fernet(key)
-    return f.encrypt(data.encode())
+class DBExecutor:
+    def __init__(self, max_workers=DB_WORKER_COUNT, poll_interval=DB_POLL_INTERVAL):
+        self.max_workers = max_workers
+        self.poll_interval = poll_interval
+        self._executor = None
+        self._results = queue.Queue()
+        self._pending = set()
+        self._keyed = {}
+        self._widget = None
+        self._after_id = None
+        self._busy = False
+        self._busy_listeners = []
+    
+    def attach(self, widget):
+        self._widget = widget
+        self._after_id = None
+        self._busy_listeners = []
+        if self._pending:
+            self._schedule_poll()
+    
+    def add_busy_listener(self, callback):
+        self._busy_listeners.append(callback)
+        callback(self._busy)
+    
+    def submit(self, func, *args, on_success=None, on_error=None, on_progress=None, on_dropped=None, widget=None, 
+               key=None, replace=False, **kwargs):
+        # With on_progress, func receives a progress(chunk) callable whose chunks are
+        # delivered on the Tk thread in order, before on_success. on_dropped(result)
+        # gets a successful result nobody will see (widget gone or task cancelled),
+        # so side effects such as reservations can be undone
+        if key is not None and key in self._keyed:
+            if not replace:
+                return self._keyed[key]
+            self._keyed[key].cancel()
+        
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="gmao-db")
+        
+        task = DBTask(self, func, args, kwargs, on_success, on_error, widget, key, on_progress, on_dropped)
+        self._pending.add(task)
+        if key is not None:
+            self._keyed[key] = task
+        task.future = self._executor.submit(self._run, task)
+        
+        self._update_busy()
+        self._schedule_poll()
+        return task
+    
+    def _run(self, task):
+        if task.cancelled:
+            return
+        with task.lock:
+            task.conn = db_pool.connection()
+        kwargs = task.kwargs
+        if task.on_progress is not None:
+            kwargs = dict(kwargs, progress=lambda chunk: self._results.put((task, chunk, None, True)))
+        try:
+            result, error = task.func(*task.args, **kwargs), None
+        except Exception as e:
+            result, error = None, e
+        finally:
+            with task.lock:
+                task.conn = None
+        self._results.put((task, result, error, False))
+    
+    def _discard(self, task):
+        self._pending.discard(task)
+        if task.key is not None and self._keyed.get(task.key) is task:
+            del self._keyed[task.key]
+        self._update_busy()
+    
+    def _schedule_poll(self):
+        if self._widget is not None and self._after_id is None:
+            try:
+                self._after_id = self._widget.after(self.poll_interval, self._poll)
+            except tk.TclError:
+                self._widget = None
+    
+    def _poll(self):
+        self._after_id = None
+        try:
+            while True:
+                try:
+                    task, result, error, partial_result = self._results.get_nowait()
+                except queue.Empty:
+                    break
+                if partial_result:
+                    self._progress(task, result)
+                else:
+                    self._finish(task, result, error)
+        finally:
+            if self._pending:
+                self._schedule_poll()
+    
+    def _progress(self, task, chunk):
+        if task.cancelled:
+            return
+        try:
+            if task.widget is not None and not task.widget.winfo_exists():
+                return
+        except tk.TclError:
+            return
+        task.on_progress(chunk)
+    
+    def _drop(self, task, result, error):
+        if error is None and task.on_dropped:
+            task.on_dropped(result)
+    
+    def _finish(self, task, result, error):
+        if task.cancelled:
+            self._drop(task, result, error)
+            return
+        self._discard(task)
+        
+        try:
+            if task.widget is not None and not task.widget.winfo_exists():
+                self._drop(task, result, error)
+                return
+        except tk.TclError:
+            self._drop(task, result, error)
+            return
+        
+        if error is None:
+            if task.on_success:
+                task.on_success(result)
+        elif task.on_error:
+            task.on_error(error)
+        else:
+            messagebox.showerror("Erreur", f"Une erreur est survenue: {str(error)}")
+    
+    def _update_busy(self):
+        busy = bool(self._pending)
+        if busy == self._busy:
+            return
+        self._busy = busy
+        for callback in list(self._busy_listeners):
+            try:
+                callback(busy)
+            except tk.TclError:
+                self._busy_listeners.remove(callback)
 
-def decrypt_data(token):
-    key = load_key()
-    f = Fernet(key)
-    return f.decrypt(token).decode()
+db_executor = DBExecutor()
 
-def hash_password(password):
-    return hashlib.sha256(password.encode()).hexdigest()
+# === Startup Timing ===
+# python gmao_app.py --startup-time prints the time to the first interactive frame and exits
+STARTUP_PROFILE = "--startup-time" in sys.argv
+startup_marks = []
 
-# === Database Initialization ===
-def init_db():
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    
-    # Users table
-    c.execute('''CREATE TABLE IF NOT EXISTS users (
-                 id INTEGER PRIMARY KEY AUTOINCREMENT,
-                 username TEXT UNIQUE,
-                 password_hash TEXT,
-                 role TEXT DEFAULT 'user',
-                 first_login INTEGER DEFAULT 1,
-                 created_at TEXT DEFAULT CURRENT_TIMESTAMP)''')
-    
-    # Permissions table
-    c.execute('''CREATE TABLE IF NOT EXISTS permissions (
-                 id INTEGER PRIMARY KEY AUTOINCREMENT,
-                 user_id INTEGER,
-                 can_view_interventions INTEGER DEFAULT 1,
-                 can_add_interventions INTEGER DEFAULT 0,
-                 can_edit_interventions INTEGER DEFAULT 0,
-                 can_delete_interventions INTEGER DEFAULT 0,
-                 can_view_stock INTEGER DEFAULT 1,
-                 can_add_stock INTEGER DEFAULT 0,
-                 can_edit_stock INTEGER DEFAULT 0,
-                 can_delete_stock INTEGER DEFAULT 0,
-                 can_manage_users INTEGER DEFAULT 0,
-                 FOREIGN KEY(user_id) REFERENCES users(id))''')
-    
-    # Check if admin user exists
-    c.execute("SELECT * FROM users WHERE username='admin'")
-    if not c.fetchone():
-        c.execute("INSERT INTO users (username, password_hash, role, first_login) VALUES (?, ?, ?, ?)",
-                 ('admin', hash_password(INITIAL_PASSWORD), 'admin', 1))
-        
-        c.execute("SELECT id FROM users WHERE username='admin'")
-        admin_id = c.fetchone()[0]
-        c.execute('''INSERT INTO permissions 
-                    (user_id, can_view_interventions, can_add_interventions, can_edit_interventions, 
-                     can_delete_interventions, can_view_stock, can_add_stock, can_edit_stock, 
-                     can_delete_stock, can_manage_users) 
-                    VALUES (?, 1, 1, 1, 1, 1, 1, 1, 1, 1)''', (admin_id,))
-    
-    # Equipment table
-    c.execute('''CREATE TABLE IF NOT EXISTS equipements (
-                 id INTEGER PRIMARY KEY AUTOINCREMENT,
-                 numero_serie TEXT UNIQUE,
-                 marque TEXT,
-                 modele TEXT,
-                 date_achat TEXT,
-                 date_vente TEXT,
-                 identifiant_acheteur TEXT,
-                 notes TEXT)''')
-    
-    # Interventions table
-    c.execute('''CREATE TABLE IF NOT EXISTS interventions (
-                 id INTEGER PRIMARY KEY AUTOINCREMENT,
-                 equipement_id INTEGER,
-                 date_entree TEXT,
-                 date_sortie TEXT,
-                 details_reparation TEXT,
-                 technicien TEXT,
-                 cout REAL,
-                 FOREIGN KEY(equipement_id) REFERENCES equipements(id))''')
-    
-    # Preventive maintenance scheduling
-    c.execute('''CREATE TABLE IF NOT EXISTS planification (
-                 id INTEGER PRIMARY KEY AUTOINCREMENT,
-                 equipement_id INTEGER,
-                 date_prevue TEXT,
-                 type_maintenance TEXT,
-                 technicien TEXT,
-                 statut TEXT DEFAULT 'Planifié',
-                 notes TEXT,
-                 FOREIGN KEY(equipement_id) REFERENCES equipements(id))''')
-    
-    # Spare parts inventory
-    c.execute('''CREATE TABLE IF NOT EXISTS pieces (
-                 id INTEGER PRIMARY KEY AUTOINCREMENT,
-                 nom TEXT,
-                 reference TEXT UNIQUE,
-                 fournisseur TEXT,
-                 prix_unitaire REAL,
-                 quantite_stock INTEGER,
-                 description TEXT)''')
-    
-    # Link between interventions and pieces
-    c.execute('''CREATE TABLE IF NOT EXISTS intervention_pieces (
-                 id INTEGER PRIMARY KEY AUTOINCREMENT,
-                 intervention_id INTEGER,
-                 piece_id INTEGER,
-                 quantite_utilisee INTEGER,
-                 cout_total REAL,
-                 FOREIGN KEY(intervention_id) REFERENCES interventions(id),
-                 FOREIGN KEY(piece_id) REFERENCES pieces(id))''')
-    
-    conn.commit()
-    conn.close()
+def mark_startup(label):
+    startup_marks.append((label, time.perf_counter() - STARTUP_TIME))
 
-# === Permission Management ===
-def get_user_permissions(user_id):
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    
-    c.execute("SELECT * FROM permissions WHERE user_id=?", (user_id,))
-    permissions = c.fetchone()
-    
-    if not permissions:
-        c.execute("SELECT role FROM users WHERE id=?", (user_id,))
-        role = c.fetchone()[0]
-        
-        if role == 'admin':
-            c.execute('''INSERT INTO permissions 
-                        (user_id, can_view_interventions, can_add_interventions, can_edit_interventions, 
-                         can_delete_interventions, can_view_stock, can_add_stock, can_edit_stock, 
-                         can_delete_stock, can_manage_users) 
-                        VALUES (?, 1, 1, 1, 1, 1, 1, 1, 1, 1)''', (user_id,))
-        elif role == 'technicien':
-            c.execute('''INSERT INTO permissions 
-                        (user_id, can_view_interventions, can_add_interventions, can_edit_interventions, 
-                         can_delete_interventions, can_view_stock, can_add_stock, can_edit_stock, 
-                         can_delete_stock, can_manage_users) 
-                        VALUES (?, 1, 1, 0, 0, 1, 0, 0, 0, 0)''', (user_id,))
-        else:
-            c.execute('''INSERT INTO permissions 
-                        (user_id, can_view_interventions, can_add_interventions, can_edit_interventions, 
-                         can_delete_interventions, can_view_stock, can_add_stock, can_edit_stock, 
-                         can_delete_stock, can_manage_users) 
-                        VALUES (?, 1, 0, 0, 0, 1, 0, 0, 0, 0)''', (user_id,))
-        
-        conn.commit()
-        c.execute("SELECT * FROM permissions WHERE user_id=?", (user_id,))
-        permissions = c.fetchone()
-    
-    conn.close()
-    
-    return {
-        'can_view_interventions': bool(permissions[2]),
-        'can_add_interventions': bool(permissions[3]),
-        'can_edit_interventions': bool(permissions[4]),
-        'can_delete_interventions': bool(permissions[5]),
-        'can_view_stock': bool(permissions[6]),
-        'can_add_stock': bool(permissions[7]),
-        'can_edit_stock': bool(permissions[8]),
-        'can_delete_stock': bool(permissions[9]),
-        'can_manage_users': bool(permissions[10])
-    }
+def report_startup(label, window):
+    window.update()
+    mark_startup(label)
+    for name, elapsed in startup_marks:
+        print(f"{elapsed * 1000:8.1f} ms  {name}")
+    window.destroy()
+    sys.exit(0)
 
 # === Authentication System ===
 def authentication():
@@ -286,31 +381,30 @@ def authentication():
             messagebox.showerror("Erreur", "Veuillez saisir un nom d'utilisateur et un mot de passe")
             return
         
-        conn = sqlite3.connect(DB_FILE)
-        c = conn.cursor()
-        c.execute("SELECT id, username, password_hash, role, first_login FROM users WHERE username=?", (username,))
-        user = c.fetchone()
-        conn.close()
-        
-        if user and user[2] == hash_password(entered_password):
-            global current_user
-            current_user = {
-                'id': user[0],
-                'username': user[1],
-                'role': user[3],
-                'first_login': user[4],
-                'permissions': get_user_permissions(user[0])
-            }
-            
-            auth_window.destroy()
-            
-            if current_user['first_login']:
-                force_password_change()
+        def on_result(user):
+            login_button.config(state=tk.NORMAL, text="Se connecter")
+            if user:
+                global current_user
+                current_user = user
+                set_audit_user(user['id'])
+                
+                auth_window.destroy()
+                
+                if current_user['first_login']:
+                    force_password_change()
+                else:
+                    open_gmao_interface()
             else:
-                open_gmao_interface()
-        else:
-            messagebox.showerror("Erreur", "Nom d'utilisateur ou mot de passe incorrect")
-
+                messagebox.showerror("Erreur", "Nom d'utilisateur ou mot de passe incorrect")
+        
+        def on_error(error):
+            login_button.config(state=tk.NORMAL, text="Se connecter")
+            messagebox.showerror("Erreur", f"Une erreur est survenue: {str(error)}")
+        
+        login_button.config(state=tk.DISABLED, text="Vérification...")
+        db_executor.submit(user_service.authenticate, username, entered_password, 
+                           on_success=on_result, on_error=on_error, widget=auth_window, key="login")
+    
     auth_window = tk.Tk()
     auth_window.title("Authentification - GMAO")
     auth_window.geometry("450x400")
@@ -327,6 +421,7 @@ def authentication():
     
     auth_window.configure(bg=ProfessionalTheme.PRIMARY)
     ProfessionalTheme.configure_styles()
+    db_executor.attach(auth_window)
     
     main_frame = tk.Frame(auth_window, bg=ProfessionalTheme.PRIMARY)
     main_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=20)
@@ -390,14 +485,34 @@ def authentication():
             subtitle_label.config(font=("Segoe UI", 10))
     
     auth_window.bind('<Configure>', on_resize)
+    
+    if STARTUP_PROFILE:
+        auth_window.after_idle(lambda: report_startup("Fenêtre de connexion", auth_window))
+    
     auth_window.mainloop()
 
+def has_permission(*permissions):
+    # Read through the permission cache rather than the login snapshot, so rights
+    # changed in the profile manager apply to open sessions
+    user_permissions = get_user_permissions(current_user['id'])
+    return any(user_permissions[permission] for permission in permissions)
+
+def guarded(command, *permissions):
+    # Main-window buttons are built once at login; rights revoked since are checked on click
+    def run():
+        if not has_permission(*permissions):
+            messagebox.showwarning("Accès refusé", "Vous n'avez plus la permission d'accéder à cette fonction")
+            return
+        command()
+    return run
+
 def force_password_change():
     change_window = tk.Tk()
     change_window.title("Changement de mot de passe requis")
     change_window.geometry("450x350")
     change_window.minsize(400, 300)
     change_window.configure(bg=ProfessionalTheme.LIGHT)
+    ProfessionalTheme.configure_styles()
     # Changed from resizable(False, False) to resizable(True, True)
     change_window.resizable(True, True)
     
@@ -450,10 +565,6 @@ def force_password_change():
             messagebox.showwarning("Attention", "Tous les champs sont obligatoires")
             return
         
-        if hash_password(current) != hash_password(INITIAL_PASSWORD):
-            messagebox.showerror("Erreur", "Mot de passe actuel incorrect")
-            return
-        
         if new_pass != confirm:
             messagebox.showerror("Erreur", "Les mots de passe ne correspondent pas")
             return
@@ -462,26 +573,30 @@ def force_password_change():
             messagebox.showwarning("Attention", "Le mot de passe doit contenir au moins 6 caractères")
             return
         
-        conn = sqlite3.connect(DB_FILE)
-        c = conn.cursor()
-        c.execute("UPDATE users SET password_hash=?, first_login=0 WHERE id=?",
-                 (hash_password(new_pass), current_user['id']))
-        conn.commit()
-        conn.close()
+        def done(changed):
+            change_button.config(state=tk.NORMAL)
+            if not changed:
+                messagebox.showerror("Erreur", "Mot de passe actuel incorrect")
+                return
+            messagebox.showinfo("Succès", "Mot de passe changé avec succès!")
+            change_window.destroy()
+            open_gmao_interface()
         
-        messagebox.showinfo("Succès", "Mot de passe changé avec succès!")
-        change_window.destroy()
-        open_gmao_interface()
+        change_button.config(state=tk.DISABLED)
+        db_executor.submit(user_service.change_password, current_user['id'], current, new_pass, 
+                           on_success=done, widget=change_window, key="change_password")
     
     button_frame = tk.Frame(form_container, bg=ProfessionalTheme.WHITE)
     button_frame.pack(pady=20)
     
-    ttk.Button(button_frame, text="Changer le mot de passe", command=change_password, 
-              style="Success.TButton").pack(side=tk.LEFT, padx=(0, 10))
+    change_button = ttk.Button(button_frame, text="Changer le mot de passe", command=change_password, 
+                               style="Success.TButton")
+    change_button.pack(side=tk.LEFT, padx=(0, 10))
     ttk.Button(button_frame, text="Annuler", command=lambda: [change_window.destroy(), logout()], 
               style="Danger.TButton").pack(side=tk.LEFT)
     
     entry_current.focus()
+    db_executor.attach(change_window)
     change_window.mainloop()
 
 # === Main GMAO Interface ===
@@ -495,6 +610,7 @@ def open_gmao_interface():
     root.configure(bg=ProfessionalTheme.LIGHT)
     
     ProfessionalTheme.configure_styles()
+    db_executor.attach(root)
     
     header_frame = tk.Frame(root, bg=ProfessionalTheme.PRIMARY, height=70)
     header_frame.pack(fill=tk.X)
@@ -536,17 +652,112 @@ def open_gmao_interface():
                            bd=1, relief="solid", highlightthickness=0)
     entry_serial.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(0, 10))
     
+    ttk.Button(search_subframe, text="🔍 Recherche plein texte", 
+              command=lambda: run_full_text_search(), style="Primary.TButton").pack(side=tk.LEFT)
+    
     buttons_frame = tk.Frame(main_container, bg=ProfessionalTheme.LIGHT)
     buttons_frame.pack(fill=tk.X, pady=(0, 20))
     
-    if current_user['permissions']['can_view_stock']:
+    if has_permission('can_view_stock'):
         stock_button = ttk.Button(buttons_frame, text="📦 Gestion des Pièces de Rechange", 
-                                command=open_parts_management, style="Warning.TButton")
+                                command=guarded(open_parts_management, 'can_view_stock'), 
+                                style="Warning.TButton")
         stock_button.pack(side=tk.LEFT, padx=(0, 10))
     
-    if current_user['permissions']['can_manage_users']:
+    if has_permission('can_manage_users'):
         ttk.Button(buttons_frame, text="👤 Gestion des Profils", 
-                  command=open_profile_management, style="Primary.TButton").pack(side=tk.LEFT)
+                  command=guarded(open_profile_management, 'can_manage_users'), 
+                  style="Primary.TButton").pack(side=tk.LEFT, padx=(0, 10))
+        ttk.Button(buttons_frame, text="🧾 Journal d'audit", 
+                  command=guarded(open_audit_log, 'can_manage_users'), 
+                  style="Primary.TButton").pack(side=tk.LEFT, padx=(0, 10))
+    
+    import_permissions = [permission for label, kind, permission in IMPORT_TYPES]
+    if has_permission(*import_permissions):
+        ttk.Button(buttons_frame, text="📥 Import en masse", 
+                  command=guarded(open_bulk_import, *import_permissions), 
+                  style="Primary.TButton").pack(side=tk.LEFT, padx=(0, 10))
+    
+    if has_permission('can_view_interventions'):
+        ttk.Button(buttons_frame, text="📊 Tableau de bord", 
+                  command=guarded(open_kpi_dashboard, 'can_view_interventions'), 
+                  style="Primary.TButton").pack(side=tk.LEFT, padx=(0, 10))
+        ttk.Button(buttons_frame, text="🗓 Planning", 
+                  command=guarded(open_planner, 'can_view_interventions'), 
+                  style="Primary.TButton").pack(side=tk.LEFT, padx=(0, 10))
+    
+    if has_permission('can_add_interventions'):
+        ttk.Button(buttons_frame, text="🔁 Plans récurrents", 
+                  command=guarded(open_maintenance_plans, 'can_add_interventions'), 
+                  style="Primary.TButton").pack(side=tk.LEFT, padx=(0, 10))
+    
+    if has_permission('can_edit_interventions'):
+        ttk.Button(buttons_frame, text="👷 Charge techniciens", 
+                  command=guarded(open_workload_balancing, 'can_edit_interventions'), 
+                  style="Primary.TButton").pack(side=tk.LEFT, padx=(0, 10))
+    
+    export_permissions = [permission for label, kind, permission in EXPORT_TYPES]
+    if has_permission(*export_permissions):
+        ttk.Button(buttons_frame, text="📤 Export", 
+                  command=guarded(open_export, *export_permissions), 
+                  style="Primary.TButton").pack(side=tk.LEFT)
+    
+    # Full-text search results
+    results_frame = tk.Frame(main_container, bg=ProfessionalTheme.WHITE, relief="raised", bd=1)
+    results_frame.pack(fill=tk.BOTH, expand=True)
+    
+    # Notes and repair details are encrypted: only whole words are found there
+    search_status = tk.Label(results_frame,
+                             text="Recherche plein texte: marque, modèle, technicien, identifiant acheteur exact, "
+                                  "mots entiers des notes et détails",
+                             font=ProfessionalTheme.BODY_FONT, bg=ProfessionalTheme.WHITE, 
+                             fg=ProfessionalTheme.DARK)
+    search_status.pack(anchor="w", padx=20, pady=(10, 5))
+    
+    results_tree_frame = tk.Frame(results_frame, bg=ProfessionalTheme.WHITE)
+    results_tree_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=(0, 10))
+    
+    columns = ("Type", "N° Série", "Équipement", "Date", "Extrait")
+    results_tree = ttk.Treeview(results_tree_frame, columns=columns, show="headings", height=8)
+    for col, width in zip(columns, (100, 120, 180, 100, 400)):
+        results_tree.heading(col, text=col)
+        results_tree.column(col, width=width, minwidth=60)
+    
+    results_scroll = ttk.Scrollbar(results_tree_frame, orient=tk.VERTICAL, command=results_tree.yview)
+    results_tree.configure(yscrollcommand=results_scroll.set)
+    results_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+    results_scroll.pack(side=tk.RIGHT, fill=tk.Y)
+    
+    result_equipment = {}
+    
+    def show_results(rows):
+        for kind, equipment_id, serial, equipment, date_in, extract in rows:
+            item = results_tree.insert("", tk.END, values=(kind, serial, equipment, date_in or "", 
+                                                           (extract or "").replace("\n", " ")))
+            result_equipment[item] = (equipment_id, serial)
+        search_status.config(text=f"{len(result_equipment)} résultat(s)...")
+    
+    def search_done(count):
+        search_status.config(text=f"{count} résultat(s)" if count else "Aucun résultat")
+    
+    def run_full_text_search():
+        text = entry_serial.get().strip()
+        if not text:
+            messagebox.showwarning("Attention", "Veuillez saisir un texte à rechercher")
+            return
+        
+        results_tree.delete(*results_tree.get_children())
+        result_equipment.clear()
+        search_status.config(text="Recherche en cours...")
+        db_executor.submit(equipment_service.search, text, on_success=search_done, on_progress=show_results, 
+                           widget=results_tree, key="full_text_search", replace=True)
+    
+    def open_result(event):
+        selected = results_tree.selection()
+        if selected and selected[0] in result_equipment:
+            show_equipment_history(*result_equipment[selected[0]])
+    
+    results_tree.bind("<Double-1>", open_result)
     
     footer_frame = tk.Frame(root, bg=ProfessionalTheme.PRIMARY, height=40)
     footer_frame.pack(fill=tk.X, side=tk.BOTTOM)
@@ -556,15 +767,91 @@ def open_gmao_interface():
              font=ProfessionalTheme.BODY_FONT, bg=ProfessionalTheme.PRIMARY, 
              fg=ProfessionalTheme.WHITE).pack(side=tk.LEFT, padx=20, pady=10)
     
-    entry_serial.bind('<Return>', lambda event: search_equipment())
+    busy_label = tk.Label(footer_frame, text="", font=ProfessionalTheme.BODY_FONT, 
+                          bg=ProfessionalTheme.PRIMARY, fg=ProfessionalTheme.WARNING)
+    busy_label.pack(side=tk.RIGHT, padx=20, pady=10)
+    
+    def on_busy_change(busy):
+        busy_label.config(text="⏳ Opération en cours..." if busy else "")
+        root.config(cursor="watch" if busy else "")
+    
+    db_executor.add_busy_listener(on_busy_change)
+    
+    # Serial autocomplete, served from the in-memory index built at login
+    suggestions_box = tk.Listbox(root, font=ProfessionalTheme.BODY_FONT, bd=1, relief="solid", 
+                                 highlightthickness=0, activestyle="none", height=AUTOCOMPLETE_ROWS)
+    suggested_serials = []
+    
+    def hide_suggestions(event=None):
+        suggestions_box.place_forget()
+    
+    def update_suggestions(event):
+        if event.keysym in ("Return", "Escape", "Down", "Up", "Tab"):
+            return
+        suggestions = equipment_index.suggest(entry_serial.get())
+        suggestions_box.delete(0, tk.END)
+        suggested_serials[:] = [serial for serial, brand, model in suggestions]
+        if not suggestions:
+            hide_suggestions()
+            return
+        for serial, brand, model in suggestions:
+            suggestions_box.insert(tk.END, f"{serial}  —  {brand} {model}")
+        suggestions_box.config(height=min(len(suggestions), AUTOCOMPLETE_ROWS))
+        suggestions_box.place(in_=entry_serial, x=0, rely=1.0, relwidth=1.0)
+        suggestions_box.lift()
+    
+    def focus_suggestions(event):
+        if suggested_serials and suggestions_box.winfo_ismapped():
+            suggestions_box.focus_set()
+            suggestions_box.selection_clear(0, tk.END)
+            suggestions_box.selection_set(0)
+            suggestions_box.activate(0)
+            return "break"
+    
+    def choose_suggestion(event=None):
+        selected = suggestions_box.curselection()
+        if not selected:
+            return
+        entry_serial.delete(0, tk.END)
+        entry_serial.insert(0, suggested_serials[selected[0]])
+        hide_suggestions()
+        entry_serial.focus_set()
+        search_equipment()
+    
+    def submit_serial(event):
+        hide_suggestions()
+        search_equipment()
+    
+    def leave_suggestions(event):
+        hide_suggestions()
+        entry_serial.focus_set()
+    
+    def on_click(event):
+        if event.widget not in (entry_serial, suggestions_box):
+            hide_suggestions()
     
-    check_reminders(root)
+    entry_serial.bind('<KeyRelease>', update_suggestions)
+    entry_serial.bind('<Down>', focus_suggestions)
+    entry_serial.bind('<Escape>', hide_suggestions)
+    entry_serial.bind('<Return>', submit_serial)
+    suggestions_box.bind('<Return>', choose_suggestion)
+    suggestions_box.bind('<Double-1>', choose_suggestion)
+    suggestions_box.bind('<Escape>', leave_suggestions)
+    root.bind('<Button-1>', on_click, add="+")
+    
+    db_executor.submit(equipment_index.load, widget=root, key="equipment_index")
+    db_executor.submit(search_vocabulary.load, widget=root, key="search_vocabulary")
+    db_executor.submit(stock_service.release_expired_reservations, widget=root, key="expired_reservations")
+    db_executor.submit(compact_audit_log, widget=root, key="audit_compaction")
+    
+    root.after(REMINDER_STARTUP_DELAY, lambda: check_reminders(root))
     
     root.mainloop()
 
 def logout():
     global current_user
     current_user = None
+    set_audit_user(None)
     root.destroy()
     authentication()
 
@@ -576,8 +863,6 @@ def open_profile_management():
         profile_window.geometry("1000x700")
         profile_window.configure(bg=ProfessionalTheme.LIGHT)
         
-        ProfessionalTheme.configure_styles()
-        
         header_frame = tk.Frame(profile_window, bg=ProfessionalTheme.PRIMARY, height=60)
         header_frame.pack(fill=tk.X)
         header_frame.pack_propagate(False)
@@ -607,16 +892,15 @@ def open_profile_management():
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         
         def refresh_users():
-            for item in tree_users.get_children():
-                tree_users.delete(item)
-            conn = sqlite3.connect(DB_FILE)
-            c = conn.cursor()
-            c.execute("SELECT id, username, role, first_login, created_at FROM users ORDER BY username")
-            rows = c.fetchall()
-            conn.close()
-            for row in rows:
-                first_login_text = "Oui" if row[3] else "Non"
-                tree_users.insert("", tk.END, values=(row[0], row[1], row[2], first_login_text, row[4]))
+            def fill(rows):
+                for item in tree_users.get_children():
+                    tree_users.delete(item)
+                for row in rows:
+                    first_login_text = "Oui" if row[3] else "Non"
+                    tree_users.insert("", tk.END, values=(row[0], row[1], row[2], first_login_text, row[4]))
+            
+            db_executor.submit(user_service.list_users, on_success=fill, widget=profile_window, key="list_users", 
+                               replace=True)
         
         def add_user():
             add_window = tk.Toplevel(profile_window)
@@ -724,38 +1008,21 @@ def open_profile_management():
                     messagebox.showwarning("Attention", "Le mot de passe doit contenir au moins 6 caractères")
                     return
                 
-                conn = sqlite3.connect(DB_FILE)
-                c = conn.cursor()
-                try:
-                    c.execute('''INSERT INTO users (username, password_hash, role, first_login)
-                                 VALUES (?, ?, ?, ?)''', 
-                              (username, hash_password(password), role, 1))
-                    user_id = c.lastrowid
-                    
-                    c.execute('''INSERT INTO permissions 
-                                (user_id, can_view_interventions, can_add_interventions, can_edit_interventions, 
-                                 can_delete_interventions, can_view_stock, can_add_stock, can_edit_stock, 
-                                 can_delete_stock, can_manage_users) 
-                                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''', 
-                              (user_id, 
-                               permission_vars["can_view_interventions"].get(),
-                               permission_vars["can_add_interventions"].get(),
-                               permission_vars["can_edit_interventions"].get(),
-                               permission_vars["can_delete_interventions"].get(),
-                               permission_vars["can_view_stock"].get(),
-                               permission_vars["can_add_stock"].get(),
-                               permission_vars["can_edit_stock"].get(),
-                               permission_vars["can_delete_stock"].get(),
-                               permission_vars["can_manage_users"].get()))
-                    
-                    conn.commit()
+                values = [permission_vars[key].get() for key, label in permissions]
+                
+                def done(result):
                     messagebox.showinfo("Succès", "Utilisateur ajouté avec succès.")
                     add_window.destroy()
                     refresh_users()
-                except sqlite3.IntegrityError:
-                    messagebox.showerror("Erreur", "Un utilisateur avec ce nom existe déjà.")
-                finally:
-                    conn.close()
+                
+                def failed(error):
+                    if isinstance(error, sqlite3.IntegrityError):
+                        messagebox.showerror("Erreur", "Un utilisateur avec ce nom existe déjà.")
+                    else:
+                        messagebox.showerror("Erreur", f"Une erreur est survenue: {str(error)}")
+                
+                db_executor.submit(user_service.create, username, password, role, values, 
+                                   on_success=done, on_error=failed, widget=add_window, key="save_user")
             
             button_frame = tk.Frame(form_container, bg=ProfessionalTheme.WHITE)
             button_frame.grid(row=len(fields)+1, column=0, columnspan=2, pady=20)
@@ -781,139 +1048,115 @@ def open_profile_management():
                 messagebox.showwarning("Attention", "Vous ne pouvez pas modifier votre propre profil ici")
                 return
             
-            edit_window = tk.Toplevel(profile_window)
-            edit_window.title("Modifier un utilisateur")
-            edit_window.geometry("600x600")
-            edit_window.configure(bg=ProfessionalTheme.LIGHT)
-            
-            header_frame = tk.Frame(edit_window, bg=ProfessionalTheme.PRIMARY, height=50)
-            header_frame.pack(fill=tk.X)
-            header_frame.pack_propagate(False)
-            
-            tk.Label(header_frame, text=f"Modifier l'utilisateur: {username}", 
-                    font=ProfessionalTheme.SUBTITLE_FONT, bg=ProfessionalTheme.PRIMARY, 
-                    fg=ProfessionalTheme.WHITE).pack(side=tk.LEFT, padx=20, pady=12)
-            
-            form_container = tk.Frame(edit_window, bg=ProfessionalTheme.WHITE, relief="raised", bd=1)
-            form_container.pack(fill=tk.BOTH, expand=True, padx=20, pady=20)
-            
-            conn = sqlite3.connect(DB_FILE)
-            c = conn.cursor()
-            c.execute("SELECT username, role FROM users WHERE id=?", (user_id,))
-            user_data = c.fetchone()
-            
-            c.execute('''SELECT can_view_interventions, can_add_interventions, can_edit_interventions, 
-                         can_delete_interventions, can_view_stock, can_add_stock, can_edit_stock, 
-                         can_delete_stock, can_manage_users FROM permissions WHERE user_id=?''', (user_id,))
-            user_permissions = c.fetchone()
-            conn.close()
-            
-            tk.Label(form_container, text="Rôle *:", font=ProfessionalTheme.BODY_FONT, 
-                    bg=ProfessionalTheme.WHITE, fg=ProfessionalTheme.DARK).grid(
-                row=0, column=0, sticky="w", padx=20, pady=12)
-            
-            entry_role = ttk.Combobox(form_container, values=["admin", "technicien", "user"], state="readonly")
-            entry_role.set(user_data[1])
-            entry_role.grid(row=0, column=1, padx=20, pady=12, sticky="ew")
-            
-            permissions_frame = tk.LabelFrame(form_container, text="Permissions", 
-                                             font=ProfessionalTheme.SUBTITLE_FONT, 
-                                             bg=ProfessionalTheme.WHITE, fg=ProfessionalTheme.PRIMARY)
-            permissions_frame.grid(row=1, column=0, columnspan=2, padx=20, pady=20, sticky="ew")
-            
-            permission_vars = {}
-            permissions = [
-                ("can_view_interventions", "Voir les interventions"),
-                ("can_add_interventions", "Ajouter des interventions"),
-                ("can_edit_interventions", "Modifier des interventions"),
-                ("can_delete_interventions", "Supprimer les interventions"),
-                ("can_view_stock", "Voir le stock"),
-                ("can_add_stock", "Ajouter au stock"),
-                ("can_edit_stock", "Modifier le stock"),
-                ("can_delete_stock", "Supprimer du stock"),
-                ("can_manage_users", "Gérer les utilisateurs")
-            ]
-            
-            for i, (key, label) in enumerate(permissions):
-                var = tk.IntVar()
-                permission_vars[key] = var
-                cb = tk.Checkbutton(permissions_frame, text=label, variable=var, 
-                                   font=ProfessionalTheme.BODY_FONT, 
-                                   bg=ProfessionalTheme.WHITE, fg=ProfessionalTheme.DARK)
-                cb.grid(row=i//3, column=i%3, sticky="w", padx=20, pady=5)
+            def show_form(data):
+                user_data, user_permissions = data
                 
-                idx = permissions.index((key, label))
-                var.set(user_permissions[idx])
-            
-            def on_role_change(event):
-                role = entry_role.get()
-                if role == "admin":
-                    for key in permission_vars:
-                        permission_vars[key].set(1)
-                elif role == "technicien":
-                    permission_vars["can_view_interventions"].set(1)
-                    permission_vars["can_add_interventions"].set(1)
-                    permission_vars["can_edit_interventions"].set(0)
-                    permission_vars["can_delete_interventions"].set(0)
-                    permission_vars["can_view_stock"].set(1)
-                    permission_vars["can_add_stock"].set(0)
-                    permission_vars["can_edit_stock"].set(0)
-                    permission_vars["can_delete_stock"].set(0)
-                    permission_vars["can_manage_users"].set(0)
-                else:
-                    permission_vars["can_view_interventions"].set(1)
-                    permission_vars["can_add_interventions"].set(0)
-                    permission_vars["can_edit_interventions"].set(0)
-                    permission_vars["can_delete_interventions"].set(0)
-                    permission_vars["can_view_stock"].set(1)
-                    permission_vars["can_add_stock"].set(0)
-                    permission_vars["can_edit_stock"].set(0)
-                    permission_vars["can_delete_stock"].set(0)
-                    permission_vars["can_manage_users"].set(0)
-            
-            entry_role.bind("<<ComboboxSelected>>", on_role_change)
-            
-            def save_changes():
-                role = entry_role.get()
+                edit_window = tk.Toplevel(profile_window)
+                edit_window.title("Modifier un utilisateur")
+                edit_window.geometry("600x600")
+                edit_window.configure(bg=ProfessionalTheme.LIGHT)
                 
-                conn = sqlite3.connect(DB_FILE)
-                c = conn.cursor()
-                try:
-                    c.execute("UPDATE users SET role=? WHERE id=?", (role, user_id))
+                header_frame = tk.Frame(edit_window, bg=ProfessionalTheme.PRIMARY, height=50)
+                header_frame.pack(fill=tk.X)
+                header_frame.pack_propagate(False)
+                
+                tk.Label(header_frame, text=f"Modifier l'utilisateur: {username}", 
+                        font=ProfessionalTheme.SUBTITLE_FONT, bg=ProfessionalTheme.PRIMARY, 
+                        fg=ProfessionalTheme.WHITE).pack(side=tk.LEFT, padx=20, pady=12)
+                
+                form_container = tk.Frame(edit_window, bg=ProfessionalTheme.WHITE, relief="raised", bd=1)
+                form_container.pack(fill=tk.BOTH, expand=True, padx=20, pady=20)
+                
+                tk.Label(form_container, text="Rôle *:", font=ProfessionalTheme.BODY_FONT, 
+                        bg=ProfessionalTheme.WHITE, fg=ProfessionalTheme.DARK).grid(
+                    row=0, column=0, sticky="w", padx=20, pady=12)
+                
+                entry_role = ttk.Combobox(form_container, values=["admin", "technicien", "user"], state="readonly")
+                entry_role.set(user_data[1])
+                entry_role.grid(row=0, column=1, padx=20, pady=12, sticky="ew")
+                
+                permissions_frame = tk.LabelFrame(form_container, text="Permissions", 
+                                                 font=ProfessionalTheme.SUBTITLE_FONT, 
+                                                 bg=ProfessionalTheme.WHITE, fg=ProfessionalTheme.PRIMARY)
+                permissions_frame.grid(row=1, column=0, columnspan=2, padx=20, pady=20, sticky="ew")
+                
+                permission_vars = {}
+                permissions = [
+                    ("can_view_interventions", "Voir les interventions"),
+                    ("can_add_interventions", "Ajouter des interventions"),
+                    ("can_edit_interventions", "Modifier des interventions"),
+                    ("can_delete_interventions", "Supprimer les interventions"),
+                    ("can_view_stock", "Voir le stock"),
+                    ("can_add_stock", "Ajouter au stock"),
+                    ("can_edit_stock", "Modifier le stock"),
+                    ("can_delete_stock", "Supprimer du stock"),
+                    ("can_manage_users", "Gérer les utilisateurs")
+                ]
+                
+                for i, (key, label) in enumerate(permissions):
+                    var = tk.IntVar()
+                    permission_vars[key] = var
+                    cb = tk.Checkbutton(permissions_frame, text=label, variable=var, 
+                                       font=ProfessionalTheme.BODY_FONT, 
+                                       bg=ProfessionalTheme.WHITE, fg=ProfessionalTheme.DARK)
+                    cb.grid(row=i//3, column=i%3, sticky="w", padx=20, pady=5)
                     
-                    c.execute('''UPDATE permissions SET 
-                                can_view_interventions=?, can_add_interventions=?, can_edit_interventions=?, 
-                                can_delete_interventions=?, can_view_stock=?, can_add_stock=?, can_edit_stock=?, 
-                                can_delete_stock=?, can_manage_users=? WHERE user_id=?''', 
-                              (permission_vars["can_view_interventions"].get(),
-                               permission_vars["can_add_interventions"].get(),
-                               permission_vars["can_edit_interventions"].get(),
-                               permission_vars["can_delete_interventions"].get(),
-                               permission_vars["can_view_stock"].get(),
-                               permission_vars["can_add_stock"].get(),
-                               permission_vars["can_edit_stock"].get(),
-                               permission_vars["can_delete_stock"].get(),
-                               permission_vars["can_manage_users"].get(),
-                               user_id))
+                    idx = permissions.index((key, label))
+                    var.set(user_permissions[idx])
+                
+                def on_role_change(event):
+                    role = entry_role.get()
+                    if role == "admin":
+                        for key in permission_vars:
+                            permission_vars[key].set(1)
+                    elif role == "technicien":
+                        permission_vars["can_view_interventions"].set(1)
+                        permission_vars["can_add_interventions"].set(1)
+                        permission_vars["can_edit_interventions"].set(0)
+                        permission_vars["can_delete_interventions"].set(0)
+                        permission_vars["can_view_stock"].set(1)
+                        permission_vars["can_add_stock"].set(0)
+                        permission_vars["can_edit_stock"].set(0)
+                        permission_vars["can_delete_stock"].set(0)
+                        permission_vars["can_manage_users"].set(0)
+                    else:
+                        permission_vars["can_view_interventions"].set(1)
+                        permission_vars["can_add_interventions"].set(0)
+                        permission_vars["can_edit_interventions"].set(0)
+                        permission_vars["can_delete_interventions"].set(0)
+                        permission_vars["can_view_stock"].set(1)
+                        permission_vars["can_add_stock"].set(0)
+                        permission_vars["can_edit_stock"].set(0)
+                        permission_vars["can_delete_stock"].set(0)
+                        permission_vars["can_manage_users"].set(0)
+                
+                entry_role.bind("<<ComboboxSelected>>", on_role_change)
+                
+                def save_changes():
+                    role = entry_role.get()
                     
-                    conn.commit()
-                    messagebox.showinfo("Succès", "Utilisateur modifié avec succès.")
-                    edit_window.destroy()
-                    refresh_users()
-                except sqlite3.Error as e:
-                    messagebox.showerror("Erreur", f"Une erreur est survenue: {str(e)}")
-                finally:
-                    conn.close()
-            
-            button_frame = tk.Frame(form_container, bg=ProfessionalTheme.WHITE)
-            button_frame.grid(row=2, column=0, columnspan=2, pady=20)
-            
-            ttk.Button(button_frame, text="Sauvegarder", command=save_changes, 
-                      style="Success.TButton").pack(side=tk.LEFT, padx=(0, 10))
-            ttk.Button(button_frame, text="Annuler", command=edit_window.destroy, 
-                      style="Danger.TButton").pack(side=tk.LEFT)
+                    values = [permission_vars[key].get() for key, label in permissions]
+                    
+                    def done(result):
+                        messagebox.showinfo("Succès", "Utilisateur modifié avec succès.")
+                        edit_window.destroy()
+                        refresh_users()
+                    
+                    db_executor.submit(user_service.update, user_id, role, values, 
+                                       on_success=done, widget=edit_window, key=f"save_user_{user_id}")
+                
+                button_frame = tk.Frame(form_container, bg=ProfessionalTheme.WHITE)
+                button_frame.grid(row=2, column=0, columnspan=2, pady=20)
+                
+                ttk.Button(button_frame, text="Sauvegarder", command=save_changes, 
+                          style="Success.TButton").pack(side=tk.LEFT, padx=(0, 10))
+                ttk.Button(button_frame, text="Annuler", command=edit_window.destroy, 
+                          style="Danger.TButton").pack(side=tk.LEFT)
+                
+                form_container.columnconfigure(1, weight=1)
             
-            form_container.columnconfigure(1, weight=1)
+            db_executor.submit(lambda: (user_service.get(user_id), user_service.get_permission_values(user_id)), 
+                               on_success=show_form, widget=profile_window, key=f"load_user_{user_id}")
         
         def reset_password():
             selected = tree_users.selection()
@@ -932,15 +1175,12 @@ def open_profile_management():
             if not messagebox.askyesno("Confirmation", f"Voulez-vous réinitialiser le mot de passe de '{username}' ?\nL'utilisateur devra le changer à la prochaine connexion."):
                 return
             
-            conn = sqlite3.connect(DB_FILE)
-            c = conn.cursor()
-            c.execute("UPDATE users SET password_hash=?, first_login=1 WHERE id=?",
-                     (hash_password(INITIAL_PASSWORD), user_id))
-            conn.commit()
-            conn.close()
+            def done(result):
+                messagebox.showinfo("Succès", f"Mot de passe de '{username}' réinitialisé. Le mot de passe temporaire est '{INITIAL_PASSWORD}'")
+                refresh_users()
             
-            messagebox.showinfo("Succès", f"Mot de passe de '{username}' réinitialisé. Le mot de passe temporaire est '{INITIAL_PASSWORD}'")
-            refresh_users()
+            db_executor.submit(user_service.reset_password, user_id, on_success=done, widget=profile_window, 
+                               key=f"reset_password_{user_id}")
         
         def delete_user():
             selected = tree_users.selection()
@@ -959,15 +1199,12 @@ def open_profile_management():
             if not messagebox.askyesno("Confirmation", f"Voulez-vous vraiment supprimer l'utilisateur '{username}' ?"):
                 return
             
-            conn = sqlite3.connect(DB_FILE)
-            c = conn.cursor()
-            c.execute("DELETE FROM permissions WHERE user_id=?", (user_id,))
-            c.execute("DELETE FROM users WHERE id=?", (user_id,))
-            conn.commit()
-            conn.close()
+            def done(result):
+                messagebox.showinfo("Succès", f"Utilisateur '{username}' supprimé avec succès")
+                refresh_users()
             
-            messagebox.showinfo("Succès", f"Utilisateur '{username}' supprimé avec succès")
-            refresh_users()
+            db_executor.submit(user_service.delete, user_id, on_success=done, widget=profile_window, 
+                               key=f"delete_user_{user_id}")
         
         ttk.Button(button_frame, text="➕ Ajouter un utilisateur", command=add_user, 
                   style="Success.TButton").pack(side=tk.LEFT, padx=(0, 10))
@@ -994,8 +1231,6 @@ def open_parts_management():
         stock_window.geometry("1200x700")
         stock_window.configure(bg=ProfessionalTheme.LIGHT)
         
-        ProfessionalTheme.configure_styles()
-        
         header_frame = tk.Frame(stock_window, bg=ProfessionalTheme.PRIMARY, height=60)
         header_frame.pack(fill=tk.X)
         header_frame.pack_propagate(False)
@@ -1013,11 +1248,12 @@ def open_parts_management():
         table_frame = tk.Frame(main_container, bg=ProfessionalTheme.WHITE, relief="raised", bd=1)
         table_frame.pack(fill=tk.BOTH, expand=True)
         
-        columns = ("ID", "Nom", "Référence", "Fournisseur", f"Prix ({MONETARY_SYMBOL})", "Quantité", "Description")
+        columns = ("ID", "Nom", "Référence", "Fournisseur", f"Prix ({MONETARY_SYMBOL})", "Quantité", "Réservé", 
+                   "Description")
         tree_parts = ttk.Treeview(table_frame, columns=columns, show="headings", height=18)
         for col in columns:
             tree_parts.heading(col, text=col)
-            tree_parts.column(col, width=(50 if col == "ID" else 130))
+            tree_parts.column(col, width=(50 if col in ("ID", "Réservé") else 130))
         tree_parts.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         
         scrollbar = ttk.Scrollbar(table_frame, orient=tk.VERTICAL, command=tree_parts.yview)
@@ -1025,21 +1261,19 @@ def open_parts_management():
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         
         def refresh_stock():
-            for item in tree_parts.get_children():
-                tree_parts.delete(item)
-            conn = sqlite3.connect(DB_FILE)
-            c = conn.cursor()
-            c.execute("SELECT id, nom, reference, fournisseur, prix_unitaire, quantite_stock, description FROM pieces ORDER BY nom")
-            rows = c.fetchall()
-            conn.close()
-            for row in rows:
-                tree_parts.insert("", tk.END, values=row)
+            def fill(rows):
+                for item in tree_parts.get_children():
+                    tree_parts.delete(item)
+                for row in rows:
+                    tree_parts.insert("", tk.END, values=row)
+            
+            db_executor.submit(stock_service.list_parts, on_success=fill, widget=tree_parts, key="refresh_stock", replace=True)
         
         def add_part():
-            if not current_user['permissions']['can_add_stock']:
+            if not has_permission('can_add_stock'):
                 messagebox.showwarning("Accès refusé", "Vous n'avez pas la permission d'ajouter des pièces au stock")
                 return
-                
+            
             add_window = tk.Toplevel(stock_window)
             add_window.title("Ajouter une pièce")
             add_window.geometry("500x500")
@@ -1096,20 +1330,19 @@ def open_parts_management():
                     messagebox.showwarning("Attention", "Nom et Référence obligatoires.")
                     return
                 
-                conn = sqlite3.connect(DB_FILE)
-                c = conn.cursor()
-                try:
-                    c.execute('''INSERT INTO pieces (nom, reference, fournisseur, prix_unitaire, quantite_stock, description)
-                                 VALUES (?, ?, ?, ?, ?, ?)''', 
-                              (name, ref, supplier, price, quantity, description))
-                    conn.commit()
+                def done(result):
                     messagebox.showinfo("Succès", "Pièce ajoutée avec succès.")
                     add_window.destroy()
                     refresh_stock()
-                except sqlite3.IntegrityError:
-                    messagebox.showerror("Erreur", "Une pièce avec cette référence existe déjà.")
-                finally:
-                    conn.close()
+                
+                def failed(error):
+                    if isinstance(error, sqlite3.IntegrityError):
+                        messagebox.showerror("Erreur", "Une pièce avec cette référence existe déjà.")
+                    else:
+                        messagebox.showerror("Erreur", f"Une erreur est survenue: {str(error)}")
+                
+                db_executor.submit(stock_service.create_part, name, ref, supplier, price, quantity, description, 
+                                   on_success=done, on_error=failed, widget=add_window, key="save_part")
             
             button_frame = tk.Frame(form_container, bg=ProfessionalTheme.WHITE)
             button_frame.grid(row=len(fields)+1, column=0, columnspan=2, pady=20)
@@ -1122,10 +1355,10 @@ def open_parts_management():
             form_container.columnconfigure(1, weight=1)
         
         def edit_part():
-            if not current_user['permissions']['can_edit_stock']:
+            if not has_permission('can_edit_stock'):
                 messagebox.showwarning("Accès refusé", "Vous n'avez pas la permission de modifier des pièces")
                 return
-                
+            
             selected = tree_parts.selection()
             if not selected:
                 messagebox.showwarning("Attention", "Sélectionnez une pièce à modifier.")
@@ -1134,168 +1367,1751 @@ def open_parts_management():
             values = tree_parts.item(selected[0], 'values')
             part_id = values[0]
             
-            edit_window = tk.Toplevel(stock_window)
-            edit_window.title("Modifier une pièce")
-            edit_window.geometry("500x500")
-            edit_window.configure(bg=ProfessionalTheme.LIGHT)
-            
-            header_frame = tk.Frame(edit_window, bg=ProfessionalTheme.PRIMARY, height=50)
-            header_frame.pack(fill=tk.X)
-            header_frame.pack_propagate(False)
-            
-            tk.Label(header_frame, text="Modifier une pièce", 
-                    font=ProfessionalTheme.SUBTITLE_FONT, bg=ProfessionalTheme.PRIMARY, 
-                    fg=ProfessionalTheme.WHITE).pack(side=tk.LEFT, padx=20, pady=12)
-            
-            form_container = tk.Frame(edit_window, bg=ProfessionalTheme.WHITE, relief="raised", bd=1)
-            form_container.pack(fill=tk.BOTH, expand=True, padx=20, pady=20)
-            
-            conn = sqlite3.connect(DB_FILE)
-            c = conn.cursor()
-            c.execute("SELECT nom, reference, fournisseur, prix_unitaire, quantite_stock, description FROM pieces WHERE id=?", (part_id,))
-            row = c.fetchone()
-            conn.close()
-            
-            fields = [("Nom:", row[0]), ("Référence:", row[1]), ("Fournisseur:", row[2]), 
-                      (f"Prix unitaire ({MONETARY_SYMBOL}):", row[3]), ("Quantité:", row[4])]
-            entries = {}
-            for i, (label, value) in enumerate(fields):
-                tk.Label(form_container, text=label, font=ProfessionalTheme.BODY_FONT, 
-                        bg=ProfessionalTheme.WHITE, fg=ProfessionalTheme.DARK).grid(
-                    row=i, column=0, sticky="w", padx=20, pady=12)
-                entry = tk.Entry(form_container, font=ProfessionalTheme.BODY_FONT, 
-                               bd=1, relief="solid", highlightthickness=0)
-                entry.grid(row=i, column=1, padx=20, pady=12, sticky="ew")
-                entry.insert(0, str(value))
-                entries[i] = entry
-            
-            tk.Label(form_container, text="Description:", font=ProfessionalTheme.BODY_FONT, 
-                    bg=ProfessionalTheme.WHITE, fg=ProfessionalTheme.DARK).grid(
-                row=len(fields), column=0, sticky="nw", padx=20, pady=12)
-            desc_text = tk.Text(form_container, font=ProfessionalTheme.BODY_FONT, 
-                               bd=1, relief="solid", highlightthickness=0, height=6)
-            desc_text.grid(row=len(fields), column=1, padx=20, pady=12, sticky="ew")
-            desc_text.insert("1.0", row[5] or "")
-            
-            def save_edits():
-                name = entries[0].get().strip()
-                reference = entries[1].get().strip()
-                supplier = entries[2].get().strip()
-                try:
-                    price = float(entries[3].get().strip() or 0)
-                    quantity = int(entries[4].get().strip() or 0)
-                except ValueError:
-                    messagebox.showwarning("Erreur", "Prix ou quantité invalide.")
+            def show_form(row):
+                if row is None:
+                    messagebox.showwarning("Attention", "Cette pièce a été supprimée entre-temps.")
+                    refresh_stock()
                     return
-                description = desc_text.get("1.0", tk.END).strip()
                 
-                conn = sqlite3.connect(DB_FILE)
-                c = conn.cursor()
-                try:
-                    c.execute('''UPDATE pieces SET nom=?, reference=?, fournisseur=?, prix_unitaire=?, quantite_stock=?, description=? WHERE id=?''',
-                              (name, reference, supplier, price, quantity, description, part_id))
-                    conn.commit()
-                    messagebox.showinfo("Succès", "Pièce modifiée avec succès.")
-                    edit_window.destroy()
-                    refresh_stock()
-                except sqlite3.IntegrityError:
-                    messagebox.showerror("Erreur", "Un conflit est survenu lors de la modification.")
-                finally:
-                    conn.close()
-            
-            button_frame = tk.Frame(form_container, bg=ProfessionalTheme.WHITE)
-            button_frame.grid(row=len(fields)+1, column=0, columnspan=2, pady=20)
-            
-            ttk.Button(button_frame, text="Sauvegarder", command=save_edits, 
-                      style="Success.TButton").pack(side=tk.LEFT, padx=(0, 10))
-            ttk.Button(button_frame, text="Annuler", command=edit_window.destroy, 
-                      style="Danger.TButton").pack(side=tk.LEFT)
+                edit_window = tk.Toplevel(stock_window)
+                edit_window.title("Modifier une pièce")
+                edit_window.geometry("500x560")
+                edit_window.configure(bg=ProfessionalTheme.LIGHT)
+                
+                header_frame = tk.Frame(edit_window, bg=ProfessionalTheme.PRIMARY, height=50)
+                header_frame.pack(fill=tk.X)
+                header_frame.pack_propagate(False)
+                
+                tk.Label(header_frame, text="Modifier une pièce", 
+                        font=ProfessionalTheme.SUBTITLE_FONT, bg=ProfessionalTheme.PRIMARY, 
+                        fg=ProfessionalTheme.WHITE).pack(side=tk.LEFT, padx=20, pady=12)
+                
+                form_container = tk.Frame(edit_window, bg=ProfessionalTheme.WHITE, relief="raised", bd=1)
+                form_container.pack(fill=tk.BOTH, expand=True, padx=20, pady=20)
+                
+                fields = [("Nom:", row[0]), ("Référence:", row[1]), ("Fournisseur:", row[2]), 
+                          (f"Prix unitaire ({MONETARY_SYMBOL}):", row[3]), ("Quantité:", row[4]), 
+                          ("Délai de livraison (jours):", "" if row[6] is None else row[6])]
+                entries = {}
+                for i, (label, value) in enumerate(fields):
+                    tk.Label(form_container, text=label, font=ProfessionalTheme.BODY_FONT, 
+                            bg=ProfessionalTheme.WHITE, fg=ProfessionalTheme.DARK).grid(
+                        row=i, column=0, sticky="w", padx=20, pady=12)
+                    entry = tk.Entry(form_container, font=ProfessionalTheme.BODY_FONT, 
+                                   bd=1, relief="solid", highlightthickness=0)
+                    entry.grid(row=i, column=1, padx=20, pady=12, sticky="ew")
+                    entry.insert(0, str(value))
+                    entries[i] = entry
+                
+                tk.Label(form_container, text="Description:", font=ProfessionalTheme.BODY_FONT, 
+                        bg=ProfessionalTheme.WHITE, fg=ProfessionalTheme.DARK).grid(
+                    row=len(fields), column=0, sticky="nw", padx=20, pady=12)
+                desc_text = tk.Text(form_container, font=ProfessionalTheme.BODY_FONT, 
+                                   bd=1, relief="solid", highlightthickness=0, height=6)
+                desc_text.grid(row=len(fields), column=1, padx=20, pady=12, sticky="ew")
+                desc_text.insert("1.0", row[5] or "")
+                
+                def save_edits():
+                    name = entries[0].get().strip()
+                    reference = entries[1].get().strip()
+                    supplier = entries[2].get().strip()
+                    try:
+                        price = float(entries[3].get().strip() or 0)
+                        quantity = int(entries[4].get().strip() or 0)
+                        lead_time = int(entries[5].get().strip()) if entries[5].get().strip() else None
+                    except ValueError:
+                        messagebox.showwarning("Erreur", "Prix, quantité ou délai invalide.")
+                        return
+                    description = desc_text.get("1.0", tk.END).strip()
+                    
+                    def done(result):
+                        messagebox.showinfo("Succès", "Pièce modifiée avec succès.")
+                        edit_window.destroy()
+                        refresh_stock()
+                    
+                    def failed(error):
+                        if isinstance(error, ConflictError):
+                            resolve_conflict(edit_window, error, lambda: submit(None), edit_part)
+                        elif isinstance(error, sqlite3.IntegrityError):
+                            messagebox.showerror("Erreur", "Un conflit est survenu lors de la modification.")
+                        else:
+                            messagebox.showerror("Erreur", f"Une erreur est survenue: {str(error)}")
+                    
+                    def submit(version):
+                        db_executor.submit(stock_service.update_part, part_id, name, reference, supplier, price, quantity, 
+                                           description, lead_time, version, on_success=done, on_error=failed, 
+                                           widget=edit_window, key=f"save_part_{part_id}")
+                    
+                    submit(row[7])
+                
+                button_frame = tk.Frame(form_container, bg=ProfessionalTheme.WHITE)
+                button_frame.grid(row=len(fields)+1, column=0, columnspan=2, pady=20)
+                
+                ttk.Button(button_frame, text="Sauvegarder", command=save_edits, 
+                          style="Success.TButton").pack(side=tk.LEFT, padx=(0, 10))
+                ttk.Button(button_frame, text="Annuler", command=edit_window.destroy, 
+                          style="Danger.TButton").pack(side=tk.LEFT)
+                
+                form_container.columnconfigure(1, weight=1)
+            
+            db_executor.submit(stock_service.get_part, part_id, on_success=show_form, widget=stock_window, 
+                               key=f"load_part_{part_id}")
+        
+        def delete_part():
+            if not has_permission('can_delete_stock'):
+                messagebox.showwarning("Accès refusé", "Vous n'avez pas la permission de supprimer des pièces")
+                return
+            
+            selected = tree_parts.selection()
+            if not selected:
+                messagebox.showwarning("Attention", "Sélectionnez une pièce à supprimer.")
+                return
+            
+            values = tree_parts.item(selected[0], 'values')
+            part_name = values[1]
+            
+            if not messagebox.askyesno("Confirmation", f"Voulez-vous vraiment supprimer la pièce '{part_name}' ?"):
+                return
+            
+            def done(result):
+                refresh_stock()
+                messagebox.showinfo("Succès", "Pièce supprimée avec succès.")
+            
+            part_id = values[0]
+            db_executor.submit(stock_service.delete_part, part_id, on_success=done, widget=stock_window, 
+                               key=f"delete_part_{part_id}")
+        
+        def receive_part():
+            selected = tree_parts.selection()
+            if not selected:
+                messagebox.showwarning("Attention", "Sélectionnez une pièce réceptionnée.")
+                return
+            
+            values = tree_parts.item(selected[0], 'values')
+            quantity = simpledialog.askinteger("Réception", f"Quantité reçue pour '{values[1]}' :", 
+                                               parent=stock_window, minvalue=1)
+            if not quantity:
+                return
+            
+            db_executor.submit(stock_service.receive, values[0], quantity, on_success=lambda result: refresh_stock(), 
+                               widget=stock_window, key=f"receive_part_{values[0]}")
+        
+        def show_movements():
+            selected = tree_parts.selection()
+            if not selected:
+                messagebox.showwarning("Attention", "Sélectionnez une pièce.")
+                return
+            
+            values = tree_parts.item(selected[0], 'values')
+            open_stock_movements(stock_window, values[0], values[1])
+        
+        def check_low_stock():
+            def show(low_stock_items):
+                if low_stock_items:
+                    message = "ALERTE STOCK FAIBLE :\n\n"
+                    for name, quantity in low_stock_items:
+                        message += f"- {name} (stock: {quantity})\n"
+                    messagebox.showwarning("Stock Faible", message)
+                else:
+                    messagebox.showinfo("Stock", "Tous les articles ont un niveau de stock suffisant.")
+            
+            db_executor.submit(stock_service.low_stock, on_success=show, widget=stock_window, key="low_stock")
+        
+        if has_permission('can_add_stock'):
+            ttk.Button(button_frame, text="➕ Ajouter une pièce", command=add_part, 
+                      style="Success.TButton").pack(side=tk.LEFT, padx=(0, 10))
+        
+        if has_permission('can_edit_stock'):
+            ttk.Button(button_frame, text="✏️ Modifier", command=edit_part, 
+                      style="Warning.TButton").pack(side=tk.LEFT, padx=(0, 10))
+        
+        if has_permission('can_delete_stock'):
+            ttk.Button(button_frame, text="🗑 Supprimer", command=delete_part, 
+                      style="Danger.TButton").pack(side=tk.LEFT, padx=(0, 10))
+        
+        if has_permission('can_add_stock'):
+            ttk.Button(button_frame, text="📥 Réception", command=receive_part, 
+                      style="Success.TButton").pack(side=tk.LEFT, padx=(0, 10))
+        
+        ttk.Button(button_frame, text="📜 Mouvements", command=show_movements, 
+                  style="Primary.TButton").pack(side=tk.LEFT, padx=(0, 10))
+        ttk.Button(button_frame, text="🔄 Rafraîchir", command=refresh_stock, 
+                  style="Primary.TButton").pack(side=tk.LEFT, padx=(0, 10))
+        ttk.Button(button_frame, text="🔔 Vérifier stock faible", command=check_low_stock, 
+                  style="Warning.TButton").pack(side=tk.LEFT, padx=(0, 10))
+        ttk.Button(button_frame, text="🛒 Suggestions d'achat", command=lambda: open_purchase_suggestions(stock_window), 
+                  style="Primary.TButton").pack(side=tk.LEFT)
+        
+        refresh_stock()
+        check_low_stock()
+        
+        return stock_window
+    
+    return window_manager.open_window("parts_management", create_stock_window)
+
+# === Purchase Suggestions ===
+def open_purchase_suggestions(parent_window):
+    def create_suggestions_window():
+        suggestions_window = tk.Toplevel(parent_window)
+        suggestions_window.title("🛒 Suggestions d'achat")
+        suggestions_window.geometry("1000x600")
+        suggestions_window.configure(bg=ProfessionalTheme.LIGHT)
+        
+        header_frame = tk.Frame(suggestions_window, bg=ProfessionalTheme.PRIMARY, height=60)
+        header_frame.pack(fill=tk.X)
+        header_frame.pack_propagate(False)
+        
+        tk.Label(header_frame, text="Suggestions d'achat par fournisseur", 
+                font=ProfessionalTheme.TITLE_FONT, bg=ProfessionalTheme.PRIMARY, 
+                fg=ProfessionalTheme.WHITE).pack(side=tk.LEFT, padx=20, pady=15)
+        
+        main_container = tk.Frame(suggestions_window, bg=ProfessionalTheme.LIGHT)
+        main_container.pack(fill=tk.BOTH, expand=True, padx=20, pady=20)
+        
+        button_frame = tk.Frame(main_container, bg=ProfessionalTheme.LIGHT)
+        button_frame.pack(fill=tk.X, pady=(0, 15))
+        
+        status_label = tk.Label(main_container, text="", font=ProfessionalTheme.BODY_FONT, 
+                                bg=ProfessionalTheme.LIGHT, fg=ProfessionalTheme.DARK)
+        status_label.pack(anchor="w", pady=(0, 5))
+        
+        table_frame = tk.Frame(main_container, bg=ProfessionalTheme.WHITE, relief="raised", bd=1)
+        table_frame.pack(fill=tk.BOTH, expand=True)
+        
+        # Suppliers are parent rows; their parts to order are the children
+        columns = ("Nom", "Disponible", "Point de commande", "À commander", 
+                   f"Prix ({MONETARY_SYMBOL})", f"Total ({MONETARY_SYMBOL})")
+        tree = ttk.Treeview(table_frame, columns=columns, show="tree headings", height=18)
+        tree.heading("#0", text="Fournisseur / Référence")
+        tree.column("#0", width=200)
+        for col in columns:
+            tree.heading(col, text=col)
+            tree.column(col, width=(200 if col == "Nom" else 110))
+        tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        
+        scrollbar = ttk.Scrollbar(table_frame, orient=tk.VERTICAL, command=tree.yview)
+        tree.configure(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        def show_suggestions(suppliers):
+            tree.delete(*tree.get_children())
+            grand_total = 0
+            for supplier, parts in suppliers:
+                total = sum(part[6] for part in parts)
+                grand_total += total
+                node = tree.insert("", tk.END, text=supplier, open=True, 
+                                   values=("", "", "", f"{len(parts)} réf.", "", f"{total:.2f}"))
+                for reference, name, available, point, quantity, price, line_total in parts:
+                    tree.insert(node, tk.END, text=reference, 
+                                values=(name, available, point, quantity, f"{price:.2f}", f"{line_total:.2f}"))
+            if suppliers:
+                status_label.config(text=f"{len(suppliers)} fournisseur(s), total estimé "
+                                         f"{grand_total:.2f} {MONETARY_SYMBOL}")
+            else:
+                status_label.config(text="Aucune pièce sous son point de commande")
+        
+        def load_suggestions():
+            status_label.config(text="Chargement...")
+            db_executor.submit(purchase_suggestions, on_success=show_suggestions, 
+                               widget=tree, key="purchase_suggestions", replace=True)
+        
+        def recompute():
+            status_label.config(text="Calcul des points de commande à partir de l'historique de consommation...")
+            db_executor.submit(recompute_reorder_points, on_success=lambda count: load_suggestions(), 
+                               widget=tree, key="recompute_reorder_points")
+        
+        if has_permission('can_edit_stock'):
+            ttk.Button(button_frame, text="🔄 Recalculer les points de commande", command=recompute, 
+                      style="Warning.TButton").pack(side=tk.LEFT, padx=(0, 10))
+        ttk.Button(button_frame, text="Fermer", command=suggestions_window.destroy, 
+                  style="Danger.TButton").pack(side=tk.LEFT)
+        
+        load_suggestions()
+        
+        return suggestions_window
+    
+    return window_manager.open_window("purchase_suggestions", create_suggestions_window)
+
+def open_stock_movements(parent_window, part_id, part_name):
+    def create_movements_window():
+        movements_window = tk.Toplevel(parent_window)
+        movements_window.title(f"📜 Mouvements de stock - {part_name}")
+        movements_window.geometry("900x500")
+        movements_window.configure(bg=ProfessionalTheme.LIGHT)
+        
+        header_frame = tk.Frame(movements_window, bg=ProfessionalTheme.PRIMARY, height=50)
+        header_frame.pack(fill=tk.X)
+        header_frame.pack_propagate(False)
+        
+        tk.Label(header_frame, text=f"Mouvements de stock - {part_name}", 
+                font=ProfessionalTheme.SUBTITLE_FONT, bg=ProfessionalTheme.PRIMARY, 
+                fg=ProfessionalTheme.WHITE).pack(side=tk.LEFT, padx=20, pady=12)
+        
+        table_frame = tk.Frame(movements_window, bg=ProfessionalTheme.WHITE, relief="raised", bd=1)
+        table_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=20)
+        
+        columns = ("ID", "Date", "Type", "Quantité", "Stock après", "Intervention", "Motif")
+        tree = ttk.Treeview(table_frame, columns=columns, show="headings", height=15)
+        for col in columns:
+            tree.heading(col, text=col)
+            tree.column(col, width=(60 if col == "ID" else 110))
+        tree.column("Motif", width=200)
+        tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        
+        scrollbar = ttk.Scrollbar(table_frame, orient=tk.VERTICAL, command=tree.yview)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        # Newest first, one keyset page at a time as the user scrolls
+        page_state = {'before': None, 'exhausted': False}
+        
+        def show_page(movements):
+            if len(movements) < STOCK_HISTORY_PAGE_SIZE:
+                page_state['exhausted'] = True
+            if movements:
+                movement_id, created_at, kind, quantity, level = movements[-1][:5]
+                page_state['before'] = (movement_id, level - STOCK_LEVEL_DELTA[kind] * quantity)
+            for movement_id, created_at, kind, quantity, level, intervention_id, motif in movements:
+                tree.insert("", tk.END, values=(movement_id, created_at, STOCK_MOVEMENT_LABELS[kind], quantity, 
+                                                level, intervention_id or "", motif or ""))
+        
+        def load_page():
+            if page_state['exhausted']:
+                return
+            db_executor.submit(stock_service.movements, part_id, page_state['before'], 
+                               on_success=show_page, widget=tree, key=f"stock_movements_{part_id}")
+        
+        def on_scroll(first, last):
+            scrollbar.set(first, last)
+            if float(last) >= 0.95:
+                load_page()
+        
+        tree.configure(yscrollcommand=on_scroll)
+        load_page()
+        
+        return movements_window
+    
+    return window_manager.open_window(f"stock_movements_{part_id}", create_movements_window)
+
+# === Bulk Import ===
+IMPORT_TYPES = [
+    # (label, import kind, required permission)
+    ("Équipements", 'equipements', 'can_add_interventions'),
+    ("Pièces de rechange", 'pieces', 'can_add_stock'),
+    ("Interventions", 'interventions', 'can_add_interventions'),
+]
+
+def open_bulk_import():
+    def create_import_window():
+        import_window = tk.Toplevel(root)
+        import_window.title("📥 Import en masse")
+        import_window.geometry("700x550")
+        import_window.configure(bg=ProfessionalTheme.LIGHT)
+        
+        header_frame = tk.Frame(import_window, bg=ProfessionalTheme.PRIMARY, height=60)
+        header_frame.pack(fill=tk.X)
+        header_frame.pack_propagate(False)
+        
+        tk.Label(header_frame, text="📥 Import CSV / Excel", 
+                font=ProfessionalTheme.TITLE_FONT, bg=ProfessionalTheme.PRIMARY, 
+                fg=ProfessionalTheme.WHITE).pack(side=tk.LEFT, padx=20, pady=15)
+        
+        form_container = tk.Frame(import_window, bg=ProfessionalTheme.WHITE, relief="raised", bd=1)
+        form_container.pack(fill=tk.BOTH, expand=True, padx=20, pady=20)
+        
+        allowed = [(label, kind) for label, kind, permission in IMPORT_TYPES 
+                   if has_permission(permission)]
+        
+        tk.Label(form_container, text="Type de données *:", font=ProfessionalTheme.BODY_FONT, 
+                bg=ProfessionalTheme.WHITE, fg=ProfessionalTheme.DARK).grid(
+            row=0, column=0, sticky="w", padx=20, pady=12)
+        combo_kind = ttk.Combobox(form_container, values=[label for label, kind in allowed], state="readonly")
+        combo_kind.current(0)
+        combo_kind.grid(row=0, column=1, columnspan=2, padx=20, pady=12, sticky="ew")
+        
+        tk.Label(form_container, text="Fichier *:", font=ProfessionalTheme.BODY_FONT, 
+                bg=ProfessionalTheme.WHITE, fg=ProfessionalTheme.DARK).grid(
+            row=1, column=0, sticky="w", padx=20, pady=12)
+        entry_file = tk.Entry(form_container, font=ProfessionalTheme.BODY_FONT, 
+                             bd=1, relief="solid", highlightthickness=0)
+        entry_file.grid(row=1, column=1, padx=(20, 5), pady=12, sticky="ew")
+        
+        def browse():
+            path = filedialog.askopenfilename(parent=import_window, title="Choisir un fichier", 
+                                              filetypes=[("CSV / Excel", "*.csv *.xlsx *.xlsm"), 
+                                                         ("Tous les fichiers", "*.*")])
+            if path:
+                entry_file.delete(0, tk.END)
+                entry_file.insert(0, path)
+        
+        ttk.Button(form_container, text="Parcourir...", command=browse, 
+                  style="Primary.TButton").grid(row=1, column=2, padx=(5, 20), pady=12)
+        
+        tk.Label(form_container, text="La première ligne doit contenir les noms de colonnes de la table "
+                                      "(ex: numero_serie, marque, modele). Les lignes existantes sont mises à jour "
+                                      "selon le numéro de série ou la référence.", 
+                font=ProfessionalTheme.BODY_FONT, bg=ProfessionalTheme.WHITE, fg=ProfessionalTheme.DARK, 
+                wraplength=600, justify=tk.LEFT).grid(row=2, column=0, columnspan=3, padx=20, pady=(0, 10), sticky="w")
+        
+        status_label = tk.Label(form_container, text="", font=ProfessionalTheme.BODY_FONT, 
+                                bg=ProfessionalTheme.WHITE, fg=ProfessionalTheme.PRIMARY)
+        status_label.grid(row=3, column=0, columnspan=3, padx=20, sticky="w")
+        
+        report_text = tk.Text(form_container, height=10, font=ProfessionalTheme.BODY_FONT, 
+                              bd=1, relief="solid", state=tk.DISABLED)
+        report_text.grid(row=4, column=0, columnspan=3, padx=20, pady=10, sticky="nsew")
+        
+        def show_progress(count):
+            status_label.config(text=f"{count} ligne(s) traitée(s)...")
+        
+        def show_report(kind, result):
+            import_button.config(state=tk.NORMAL)
+            if kind == 'equipements' and result['imported']:
+                db_executor.submit(equipment_index.load, widget=root, key="equipment_index")
+            errors = result['errors']
+            rejected = result['rows'] - result['imported']
+            status_label.config(text=f"{result['imported']} ligne(s) importée(s), {rejected} rejetée(s)")
+            report_text.config(state=tk.NORMAL)
+            report_text.delete("1.0", tk.END)
+            for line, message in errors:
+                report_text.insert(tk.END, f"Ligne {line}: {message}\n")
+            if rejected > len(errors):
+                report_text.insert(tk.END, f"... {rejected - len(errors)} autre(s) erreur(s)\n")
+            report_text.config(state=tk.DISABLED)
+        
+        def import_failed(error):
+            import_button.config(state=tk.NORMAL)
+            status_label.config(text="Import annulé: aucune ligne enregistrée")
+            messagebox.showerror("Erreur", f"Une erreur est survenue: {str(error)}")
+        
+        def start_import():
+            path = entry_file.get().strip()
+            if not path:
+                messagebox.showwarning("Attention", "Veuillez choisir un fichier")
+                return
+            
+            kind = allowed[combo_kind.current()][1]
+            import_button.config(state=tk.DISABLED)
+            status_label.config(text="Import en cours...")
+            db_executor.submit(import_file, kind, path, on_success=partial(show_report, kind), on_error=import_failed, 
+                               on_progress=show_progress, widget=import_window, key="bulk_import")
+        
+        button_frame = tk.Frame(form_container, bg=ProfessionalTheme.WHITE)
+        button_frame.grid(row=5, column=0, columnspan=3, pady=20)
+        
+        import_button = ttk.Button(button_frame, text="Importer", command=start_import, style="Success.TButton")
+        import_button.pack(side=tk.LEFT, padx=(0, 10))
+        ttk.Button(button_frame, text="Fermer", command=import_window.destroy, 
+                  style="Danger.TButton").pack(side=tk.LEFT)
+        
+        form_container.columnconfigure(1, weight=1)
+        form_container.rowconfigure(4, weight=1)
+        
+        return import_window
+    
+    return window_manager.open_window("bulk_import", create_import_window)
+
+# === Export ===
+EXPORT_TYPES = [
+    # (label, export kind, required permission)
+    ("Historique des interventions", 'interventions', 'can_view_interventions'),
+    ("Stock des pièces", 'pieces', 'can_view_stock'),
+]
+
+EXPORT_FORMATS = [
+    ("CSV (.csv)", 'csv'),
+    ("JSON (.json)", 'json'),
+    ("Colonnaire compressé (.gcol)", 'gcol'),
+]
+
+def open_export():
+    def create_export_window():
+        export_window = tk.Toplevel(root)
+        export_window.title("📤 Export des données")
+        export_window.geometry("600x450")
+        export_window.configure(bg=ProfessionalTheme.LIGHT)
+        
+        header_frame = tk.Frame(export_window, bg=ProfessionalTheme.PRIMARY, height=60)
+        header_frame.pack(fill=tk.X)
+        header_frame.pack_propagate(False)
+        
+        tk.Label(header_frame, text="📤 Export des données", 
+                font=ProfessionalTheme.TITLE_FONT, bg=ProfessionalTheme.PRIMARY, 
+                fg=ProfessionalTheme.WHITE).pack(side=tk.LEFT, padx=20, pady=15)
+        
+        form_container = tk.Frame(export_window, bg=ProfessionalTheme.WHITE, relief="raised", bd=1)
+        form_container.pack(fill=tk.BOTH, expand=True, padx=20, pady=20)
+        
+        allowed = [(label, kind) for label, kind, permission in EXPORT_TYPES 
+                   if has_permission(permission)]
+        
+        tk.Label(form_container, text="Données *:", font=ProfessionalTheme.BODY_FONT, 
+                bg=ProfessionalTheme.WHITE, fg=ProfessionalTheme.DARK).grid(
+            row=0, column=0, sticky="w", padx=20, pady=10)
+        combo_kind = ttk.Combobox(form_container, values=[label for label, kind in allowed], state="readonly")
+        combo_kind.current(0)
+        combo_kind.grid(row=0, column=1, padx=20, pady=10, sticky="ew")
+        
+        tk.Label(form_container, text="Format *:", font=ProfessionalTheme.BODY_FONT, 
+                bg=ProfessionalTheme.WHITE, fg=ProfessionalTheme.DARK).grid(
+            row=1, column=0, sticky="w", padx=20, pady=10)
+        combo_format = ttk.Combobox(form_container, values=[label for label, fmt in EXPORT_FORMATS], state="readonly")
+        combo_format.current(0)
+        combo_format.grid(row=1, column=1, padx=20, pady=10, sticky="ew")
+        
+        filter_fields = [("Du (YYYY-MM-DD):", "date_from"), ("Au (YYYY-MM-DD):", "date_to"), 
+                         ("N° de série:", "serial_number")]
+        entries = {}
+        for i, (label, key) in enumerate(filter_fields, start=2):
+            tk.Label(form_container, text=label, font=ProfessionalTheme.BODY_FONT, 
+                    bg=ProfessionalTheme.WHITE, fg=ProfessionalTheme.DARK).grid(
+                row=i, column=0, sticky="w", padx=20, pady=10)
+            entry = tk.Entry(form_container, font=ProfessionalTheme.BODY_FONT, 
+                            bd=1, relief="solid", highlightthickness=0)
+            entry.grid(row=i, column=1, padx=20, pady=10, sticky="ew")
+            entries[key] = entry
+        
+        def on_kind_change(event=None):
+            # Filters only apply to the intervention history
+            state = tk.NORMAL if allowed[combo_kind.current()][1] == 'interventions' else tk.DISABLED
+            for entry in entries.values():
+                entry.config(state=state)
+        
+        combo_kind.bind("<<ComboboxSelected>>", on_kind_change)
+        on_kind_change()
+        
+        status_label = tk.Label(form_container, text="", font=ProfessionalTheme.BODY_FONT, 
+                                bg=ProfessionalTheme.WHITE, fg=ProfessionalTheme.PRIMARY)
+        status_label.grid(row=5, column=0, columnspan=2, padx=20, sticky="w")
+        
+        def show_progress(count):
+            status_label.config(text=f"{count} ligne(s) exportée(s)...")
+        
+        def export_done(count):
+            export_button.config(state=tk.NORMAL)
+            status_label.config(text=f"{count} ligne(s) exportée(s)")
+            messagebox.showinfo("Succès", f"Export terminé: {count} ligne(s)")
+        
+        def export_failed(error):
+            export_button.config(state=tk.NORMAL)
+            status_label.config(text="")
+            messagebox.showerror("Erreur", f"Une erreur est survenue: {str(error)}")
+        
+        def start_export():
+            kind = allowed[combo_kind.current()][1]
+            fmt = EXPORT_FORMATS[combo_format.current()][1]
+            filters = {key: entry.get().strip() or None for key, entry in entries.items()}
+            if kind != 'interventions':
+                filters = {}
+            
+            for key in ('date_from', 'date_to'):
+                if filters.get(key):
+                    try:
+                        datetime.strptime(filters[key], "%Y-%m-%d")
+                    except ValueError:
+                        messagebox.showwarning("Erreur", "Format de date invalide (YYYY-MM-DD)")
+                        return
+            
+            path = filedialog.asksaveasfilename(parent=export_window, title="Enregistrer l'export", 
+                                                defaultextension=f".{fmt}", initialfile=f"{kind}.{fmt}")
+            if not path:
+                return
+            
+            export_button.config(state=tk.DISABLED)
+            status_label.config(text="Export en cours...")
+            db_executor.submit(export_to_file, kind, path, fmt, on_success=export_done, on_error=export_failed, 
+                               on_progress=show_progress, widget=export_window, key="export", **filters)
+        
+        button_frame = tk.Frame(form_container, bg=ProfessionalTheme.WHITE)
+        button_frame.grid(row=6, column=0, columnspan=2, pady=20)
+        
+        export_button = ttk.Button(button_frame, text="Exporter", command=start_export, style="Success.TButton")
+        export_button.pack(side=tk.LEFT, padx=(0, 10))
+        ttk.Button(button_frame, text="Fermer", command=export_window.destroy, 
+                  style="Danger.TButton").pack(side=tk.LEFT)
+        
+        form_container.columnconfigure(1, weight=1)
+        
+        return export_window
+    
+    return window_manager.open_window("export", create_export_window)
+
+# === KPI Dashboard ===
+def format_kpi(value, suffix=""):
+    return "-" if value is None else f"{value:,.1f}{suffix}".replace(",", " ")
+
+def open_kpi_dashboard():
+    def create_dashboard_window():
+        dashboard_window = tk.Toplevel(root)
+        dashboard_window.title("📊 Tableau de bord maintenance")
+        dashboard_window.geometry("1100x650")
+        dashboard_window.configure(bg=ProfessionalTheme.LIGHT)
+        
+        header_frame = tk.Frame(dashboard_window, bg=ProfessionalTheme.PRIMARY, height=60)
+        header_frame.pack(fill=tk.X)
+        header_frame.pack_propagate(False)
+        
+        tk.Label(header_frame, text="📊 Indicateurs de maintenance", 
+                font=ProfessionalTheme.TITLE_FONT, bg=ProfessionalTheme.PRIMARY, 
+                fg=ProfessionalTheme.WHITE).pack(side=tk.LEFT, padx=20, pady=15)
+        
+        summary_frame = tk.Frame(dashboard_window, bg=ProfessionalTheme.WHITE, relief="raised", bd=1)
+        summary_frame.pack(fill=tk.X, padx=20, pady=(20, 10))
+        
+        summary_fields = [("Équipements", 'equipment'), ("Interventions", 'interventions'), 
+                          ("MTTR (jours)", 'mttr'), ("MTBF (jours)", 'mtbf'), 
+                          ("Disponibilité", 'availability'), (f"Coût total ({MONETARY_SYMBOL})", 'total_cost')]
+        summary_labels = {}
+        for i, (label, key) in enumerate(summary_fields):
+            tk.Label(summary_frame, text=label, font=ProfessionalTheme.BODY_FONT, 
+                    bg=ProfessionalTheme.WHITE, fg=ProfessionalTheme.DARK).grid(row=0, column=i, padx=15, pady=(10, 0))
+            summary_labels[key] = tk.Label(summary_frame, text="...", font=ProfessionalTheme.SUBTITLE_FONT, 
+                                           bg=ProfessionalTheme.WHITE, fg=ProfessionalTheme.PRIMARY)
+            summary_labels[key].grid(row=1, column=i, padx=15, pady=(0, 10))
+            summary_frame.columnconfigure(i, weight=1)
+        
+        notebook = ttk.Notebook(dashboard_window)
+        notebook.pack(fill=tk.BOTH, expand=True, padx=20, pady=(0, 20))
+        
+        def create_tab(title, columns):
+            frame = ttk.Frame(notebook)
+            notebook.add(frame, text=title)
+            tree = ttk.Treeview(frame, columns=columns, show="headings")
+            for col in columns:
+                tree.heading(col, text=col)
+                tree.column(col, width=120, minwidth=60)
+            scrollbar = ttk.Scrollbar(frame, orient=tk.VERTICAL, command=tree.yview)
+            tree.configure(yscrollcommand=scrollbar.set)
+            tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+            scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+            return tree
+        
+        tree_equipment = create_tab("Par équipement", ("N° Série", "Marque", "Modèle", "Interventions", 
+                                                        "MTTR (j)", "MTBF (j)", "Disponibilité", f"Coût ({MONETARY_SYMBOL})"))
+        tree_brands = create_tab("Par marque", ("Marque", "Équipements", "Interventions", "MTTR (j)", 
+                                                "MTBF (j)", "Disponibilité", f"Coût ({MONETARY_SYMBOL})"))
+        tree_technicians = create_tab("Par technicien", ("Technicien", "Interventions", "MTTR (j)", 
+                                                         f"Coût total ({MONETARY_SYMBOL})", f"Coût moyen ({MONETARY_SYMBOL})"))
+        
+        def load_kpis():
+            return kpi_service.overview(), kpi_service.equipment(), kpi_service.brands(), kpi_service.technicians()
+        
+        def show_kpis(result):
+            overview, equipment, brands, technicians = result
+            summary_labels['equipment'].config(text=str(overview['equipment']))
+            summary_labels['interventions'].config(text=str(overview['interventions']))
+            summary_labels['mttr'].config(text=format_kpi(overview['mttr']))
+            summary_labels['mtbf'].config(text=format_kpi(overview['mtbf']))
+            summary_labels['availability'].config(text=format_kpi(overview['availability'], " %"))
+            summary_labels['total_cost'].config(text=format_kpi(overview['total_cost']))
+            
+            for tree in (tree_equipment, tree_brands, tree_technicians):
+                tree.delete(*tree.get_children())
+            for equipment_id, serial, brand, model, count, mttr, mtbf, availability, cost in equipment:
+                tree_equipment.insert("", tk.END, values=(serial, brand, model, count, format_kpi(mttr), 
+                                                          format_kpi(mtbf), format_kpi(availability, " %"), 
+                                                          format_kpi(cost)))
+            for brand, equipment_count, count, mttr, mtbf, availability, cost in brands:
+                tree_brands.insert("", tk.END, values=(brand, equipment_count, count, format_kpi(mttr), 
+                                                       format_kpi(mtbf), format_kpi(availability, " %"), 
+                                                       format_kpi(cost)))
+            for technician, count, mttr, cost, average in technicians:
+                tree_technicians.insert("", tk.END, values=(technician or "(non renseigné)", count, 
+                                                            format_kpi(mttr), format_kpi(cost), format_kpi(average)))
+        
+        def refresh_kpis():
+            db_executor.submit(load_kpis, on_success=show_kpis, widget=dashboard_window, 
+                               key="kpi_dashboard", replace=True)
+        
+        button_frame = tk.Frame(dashboard_window, bg=ProfessionalTheme.LIGHT)
+        button_frame.pack(fill=tk.X, padx=20, pady=(0, 20))
+        ttk.Button(button_frame, text="🔄 Rafraîchir", command=refresh_kpis, 
+                  style="Primary.TButton").pack(side=tk.LEFT)
+        
+        refresh_kpis()
+        
+        return dashboard_window
+    
+    return window_manager.open_window("kpi_dashboard", create_dashboard_window)
+
+# === Parts Picker ===
+# Shared by the add and edit intervention windows. The catalogue comes from the
+# cached snapshot, is filtered in memory and only shown PICKER_PAGE_SIZE rows at
+# a time; selected_pieces is updated in place. Each added piece is reserved in
+# the stock ledger under its own reservation id, confirmed when the intervention
+# is saved and released if it is removed or the form is closed unsaved.
+def release_reservations(pieces):
+    reservations = [piece.pop('reservation') for piece in pieces if 'reservation' in piece]
+    if reservations:
+        db_executor.submit(stock_service.release, reservations)
+
+def confirm_reservations(pieces):
+    # The save transaction has turned the reservations into consumption
+    for piece in pieces:
+        piece.pop('reservation', None)
+
+def open_parts_picker(parent_window, title, selected_pieces):
+    for child in parent_window.winfo_children():
+        if isinstance(child, tk.Toplevel) and hasattr(child, 'pieces_selection'):
+            child.lift()
+            child.focus_force()
+            return
+    
+    pieces_window = tk.Toplevel(parent_window)
+    pieces_window.title(title)
+    pieces_window.geometry("900x550")
+    pieces_window.configure(bg=ProfessionalTheme.LIGHT)
+    pieces_window.pieces_selection = True
+    
+    header_frame = tk.Frame(pieces_window, bg=ProfessionalTheme.PRIMARY, height=50)
+    header_frame.pack(fill=tk.X)
+    header_frame.pack_propagate(False)
+    
+    tk.Label(header_frame, text=title, 
+            font=ProfessionalTheme.SUBTITLE_FONT, bg=ProfessionalTheme.PRIMARY, 
+            fg=ProfessionalTheme.WHITE).pack(side=tk.LEFT, padx=20, pady=12)
+    
+    main_container = tk.Frame(pieces_window, bg=ProfessionalTheme.LIGHT)
+    main_container.pack(fill=tk.BOTH, expand=True, padx=20, pady=20)
+    
+    left_frame = tk.Frame(main_container, bg=ProfessionalTheme.WHITE, relief="raised", bd=1)
+    left_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=(0, 10))
+    
+    tk.Label(left_frame, text="Pièces disponibles", font=ProfessionalTheme.SUBTITLE_FONT, 
+            bg=ProfessionalTheme.WHITE, fg=ProfessionalTheme.PRIMARY).pack(pady=10)
+    
+    filter_frame = tk.Frame(left_frame, bg=ProfessionalTheme.WHITE)
+    filter_frame.pack(fill=tk.X, padx=10, pady=(0, 5))
+    
+    entry_filter = tk.Entry(filter_frame, font=ProfessionalTheme.BODY_FONT, 
+                           bd=1, relief="solid", highlightthickness=0)
+    entry_filter.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(0, 5))
+    
+    in_stock_var = tk.BooleanVar(value=True)
+    tk.Checkbutton(filter_frame, text="En stock", variable=in_stock_var, 
+                   font=ProfessionalTheme.BODY_FONT, bg=ProfessionalTheme.WHITE).pack(side=tk.LEFT)
+    
+    status_label = tk.Label(left_frame, text="Chargement du catalogue...", font=ProfessionalTheme.BODY_FONT, 
+                            bg=ProfessionalTheme.WHITE, fg=ProfessionalTheme.DARK)
+    status_label.pack(anchor="w", padx=10)
+    
+    left_table = tk.Frame(left_frame, bg=ProfessionalTheme.WHITE)
+    left_table.pack(padx=10, pady=(0, 10), fill=tk.BOTH, expand=True)
+    
+    cols = ("ID", "Nom", "Réf", f"Prix ({MONETARY_SYMBOL})", "Stock")
+    tree_left = ttk.Treeview(left_table, columns=cols, show="headings", height=15)
+    for col in cols:
+        tree_left.heading(col, text=col)
+        tree_left.column(col, width=(50 if col == "ID" else 120))
+    tree_left.tag_configure("selected", foreground=ProfessionalTheme.SUCCESS)
+    tree_left.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+    
+    left_scroll = ttk.Scrollbar(left_table, orient=tk.VERTICAL, command=tree_left.yview)
+    left_scroll.pack(side=tk.RIGHT, fill=tk.Y)
+    
+    right_frame = tk.Frame(main_container, bg=ProfessionalTheme.WHITE, relief="raised", bd=1)
+    right_frame.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True)
+    
+    tk.Label(right_frame, text="Pièces sélectionnées", font=ProfessionalTheme.SUBTITLE_FONT, 
+            bg=ProfessionalTheme.WHITE, fg=ProfessionalTheme.PRIMARY).pack(pady=10)
+    
+    cols2 = ("Piece ID", "Nom", "Quantité", f"Prix unitaire ({MONETARY_SYMBOL})", f"Coût total ({MONETARY_SYMBOL})")
+    tree_right = ttk.Treeview(right_frame, columns=cols2, show="headings", height=15)
+    for col in cols2:
+        tree_right.heading(col, text=col)
+        tree_right.column(col, width=(80 if col == "Piece ID" else 110))
+    tree_right.pack(padx=10, pady=(0, 10), fill=tk.BOTH, expand=True)
+    
+    # Tree items use the piece id as iid, so rows are found and updated in O(1)
+    selected_by_id = {piece['piece_id']: piece for piece in selected_pieces}
+    # Pieces whose reservation is still running, so a second add of the same piece is refused
+    reserving = {}
+    view = {'rows': [], 'matches': iter(()), 'shown': 0, 'exhausted': True, 'filter_job': None}
+    
+    def show_more():
+        if view['exhausted']:
+            return
+        page = list(islice(view['matches'], PICKER_PAGE_SIZE))
+        if len(page) < PICKER_PAGE_SIZE:
+            view['exhausted'] = True
+        for row in page:
+            tree_left.insert("", tk.END, iid=str(row[0]), values=row, 
+                             tags=("selected",) if row[0] in selected_by_id else ())
+        view['shown'] += len(page)
+        suffix = "" if view['exhausted'] else "+"
+        status_label.config(text=f"{view['shown']}{suffix} pièce(s)")
+    
+    def apply_filter():
+        view['filter_job'] = None
+        tree_left.delete(*tree_left.get_children())
+        view['matches'] = filter_parts(view['rows'], entry_filter.get(), in_stock_var.get())
+        view['shown'] = 0
+        view['exhausted'] = False
+        show_more()
+    
+    def schedule_filter(event=None):
+        if view['filter_job'] is not None:
+            pieces_window.after_cancel(view['filter_job'])
+        view['filter_job'] = pieces_window.after(PICKER_FILTER_DELAY, apply_filter)
+    
+    def on_left_scroll(first, last):
+        left_scroll.set(first, last)
+        if float(last) >= 0.95:
+            show_more()
+    
+    tree_left.configure(yscrollcommand=on_left_scroll)
+    entry_filter.bind('<KeyRelease>', schedule_filter)
+    in_stock_var.trace_add("write", lambda *args: schedule_filter())
+    
+    def show_catalogue(rows):
+        view['rows'] = rows
+        apply_filter()
+    
+    def show_selected_piece(piece):
+        tree_right.insert("", tk.END, iid=str(piece['piece_id']), values=(
+            piece['piece_id'], piece['name'], piece['qty'], 
+            f"{piece['price']:.2f}", f"{piece['total_cost']:.2f}"
+        ))
+        if tree_left.exists(str(piece['piece_id'])):
+            tree_left.item(str(piece['piece_id']), tags=("selected",))
+    
+    def add_piece():
+        selected = tree_left.selection()
+        if not selected:
+            messagebox.showwarning("Attention", "Sélectionnez une pièce à ajouter")
+            return
+        values = tree_left.item(selected[0], 'values')
+        piece_id, name, ref, price, stock = values
+        
+        if int(piece_id) in selected_by_id:
+            messagebox.showwarning("Doublon", 
+                                  f"Pièce '{name}' déjà sélectionnée")
+            return
+        if int(piece_id) in reserving:
+            messagebox.showwarning("Réservation en cours", 
+                                  f"La réservation de '{name}' est en cours, patientez un instant", 
+                                  parent=pieces_window)
+            return
+        
+        quantity_str = simpledialog.askstring("Quantité", 
+                                              f"Quantité à utiliser pour '{name}' (stock {stock}) :", 
+                                              parent=pieces_window)
+        if not quantity_str:
+            return
+        
+        try:
+            quantity = int(quantity_str)
+            if quantity <= 0:
+                raise ValueError("Quantité doit être positive")
+            if quantity > int(stock):
+                messagebox.showwarning("Stock insuffisant", 
+                                      f"Stock disponible: {stock}")
+                return
+        except ValueError:
+            messagebox.showwarning("Erreur", "Veuillez entrer un nombre valide")
+            return
+        
+        piece = {
+            'piece_id': int(piece_id),
+            'name': name,
+            'price': float(price),
+            'qty': quantity,
+            'total_cost': quantity * float(price),
+            'reservation': uuid.uuid4().hex
+        }
+        
+        def reserved(result):
+            reserving.pop(piece['piece_id'], None)
+            selected_pieces.append(piece)
+            selected_by_id[piece['piece_id']] = piece
+            show_selected_piece(piece)
+            if tree_left.exists(piece_id):
+                tree_left.set(piece_id, "Stock", int(stock) - quantity)
+        
+        def reservation_failed(error):
+            reserving.pop(piece['piece_id'], None)
+            if isinstance(error, sqlite3.IntegrityError):
+                messagebox.showwarning("Stock insuffisant", 
+                                      f"'{name}' vient d'être réservée par un autre utilisateur. "
+                                      "Le catalogue a été actualisé.", parent=pieces_window)
+                db_executor.submit(parts_catalogue.rows, on_success=show_catalogue, widget=pieces_window, 
+                                   key=f"parts_catalogue_{id(pieces_window)}", replace=True)
+            else:
+                messagebox.showerror("Erreur", f"Une erreur est survenue: {str(error)}", parent=pieces_window)
+        
+        # One task per piece: adds of different pieces run side by side instead of
+        # being swallowed by a shared key. If the picker closes first, the result
+        # is dropped and the reservation released rather than left to expire
+        reserving[piece['piece_id']] = piece
+        db_executor.submit(stock_service.reserve, piece['piece_id'], quantity, piece['reservation'], 
+                           on_success=reserved, on_error=reservation_failed, 
+                           on_dropped=lambda result: release_reservations([piece]), widget=pieces_window, 
+                           key=f"reserve_piece_{id(pieces_window)}_{piece['piece_id']}")
+    
+    def remove_piece():
+        selected = tree_right.selection()
+        if not selected:
+            messagebox.showwarning("Attention", "Sélectionnez une pièce à retirer")
+            return
+        
+        piece = selected_by_id.pop(int(selected[0]))
+        selected_pieces.remove(piece)
+        tree_right.delete(selected[0])
+        if tree_left.exists(selected[0]):
+            tree_left.item(selected[0], tags=())
+            if 'reservation' in piece:
+                stock = int(tree_left.set(selected[0], "Stock"))
+                tree_left.set(selected[0], "Stock", stock + piece['qty'])
+        release_reservations([piece])
+    
+    middle_container = tk.Frame(main_container, bg=ProfessionalTheme.LIGHT)
+    middle_container.pack(side=tk.LEFT, fill=tk.Y, padx=10)
+    
+    ttk.Button(middle_container, text="→ Ajouter", command=add_piece, 
+              style="Success.TButton").pack(pady=5)
+    
+    ttk.Button(middle_container, text="← Retirer", command=remove_piece, 
+              style="Danger.TButton").pack(pady=5)
+    
+    bottom_container = tk.Frame(pieces_window, bg=ProfessionalTheme.LIGHT)
+    bottom_container.pack(fill=tk.X, padx=20, pady=(0, 20))
+    
+    ttk.Button(bottom_container, text="Valider", command=pieces_window.destroy, 
+              style="Primary.TButton").pack(side=tk.RIGHT)
+    
+    tree_left.bind("<Double-1>", lambda event: add_piece())
+    
+    for piece in selected_pieces:
+        show_selected_piece(piece)
+    
+    db_executor.submit(parts_catalogue.rows, on_success=show_catalogue, widget=pieces_window, 
+                       key=f"parts_catalogue_{id(pieces_window)}")
+    entry_filter.focus()
+    
+    return pieces_window
+
+# === Maintenance Planner ===
+# Fleet-wide calendar: one column per day, one lane per technician. Tasks are
+# fetched PLANNER_CHUNK_DAYS at a time with the date-range index, and a new
+# chunk is loaded whenever the view is scrolled near either loaded edge.
+def week_start(day):
+    return day - timedelta(days=day.weekday())
+
+def open_planner():
+    def create_planner_window():
+        planner_window = tk.Toplevel(root)
+        planner_window.title("🗓 Planning de maintenance")
+        planner_window.geometry("1200x700")
+        planner_window.configure(bg=ProfessionalTheme.LIGHT)
+        
+        header_frame = tk.Frame(planner_window, bg=ProfessionalTheme.PRIMARY, height=60)
+        header_frame.pack(fill=tk.X)
+        header_frame.pack_propagate(False)
+        
+        tk.Label(header_frame, text="Planning de maintenance - tous équipements", 
+                font=ProfessionalTheme.TITLE_FONT, bg=ProfessionalTheme.PRIMARY, 
+                fg=ProfessionalTheme.WHITE).pack(side=tk.LEFT, padx=20, pady=15)
+        
+        toolbar = tk.Frame(planner_window, bg=ProfessionalTheme.LIGHT)
+        toolbar.pack(fill=tk.X, padx=20, pady=(15, 5))
+        
+        open_only_var = tk.BooleanVar(value=False)
+        status_label = tk.Label(toolbar, text="", font=ProfessionalTheme.BODY_FONT, 
+                                bg=ProfessionalTheme.LIGHT, fg=ProfessionalTheme.DARK)
+        
+        grid_frame = tk.Frame(planner_window, bg=ProfessionalTheme.WHITE, relief="raised", bd=1)
+        grid_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=(5, 20))
+        
+        corner = tk.Canvas(grid_frame, width=PLANNER_LANE_WIDTH, height=PLANNER_HEADER_HEIGHT, 
+                           bg=ProfessionalTheme.LIGHT, highlightthickness=0)
+        days_canvas = tk.Canvas(grid_frame, height=PLANNER_HEADER_HEIGHT, bg=ProfessionalTheme.LIGHT, 
+                                highlightthickness=0)
+        lanes_canvas = tk.Canvas(grid_frame, width=PLANNER_LANE_WIDTH, bg=ProfessionalTheme.LIGHT, 
+                                 highlightthickness=0)
+        grid_canvas = tk.Canvas(grid_frame, bg=ProfessionalTheme.WHITE, highlightthickness=0)
+        x_scroll = ttk.Scrollbar(grid_frame, orient=tk.HORIZONTAL)
+        y_scroll = ttk.Scrollbar(grid_frame, orient=tk.VERTICAL)
+        
+        corner.grid(row=0, column=0, sticky="nsew")
+        days_canvas.grid(row=0, column=1, sticky="ew")
+        lanes_canvas.grid(row=1, column=0, sticky="ns")
+        grid_canvas.grid(row=1, column=1, sticky="nsew")
+        y_scroll.grid(row=1, column=2, sticky="ns")
+        x_scroll.grid(row=2, column=1, sticky="ew")
+        grid_frame.rowconfigure(1, weight=1)
+        grid_frame.columnconfigure(1, weight=1)
+        corner.create_text(10, PLANNER_HEADER_HEIGHT // 2, text="Technicien", anchor="w", 
+                           font=ProfessionalTheme.SUBTITLE_FONT, fill=ProfessionalTheme.PRIMARY)
+        
+        # x = 0 is the Monday of the current week; earlier days have negative x
+        origin = week_start(datetime.now().date())
+        # generation changes whenever the view is reset, so chunks still in flight
+        # for the previous filter are ignored when they arrive
+        state = {'start': None, 'end': None, 'loading': set(), 'generation': 0}
+        tasks = {}
+        lanes = []
+        cell_counts = {}
+        overflow_items = {}
+        
+        def day_x(day):
+            return (day - origin).days * PLANNER_DAY_WIDTH
+        
+        def lane_y(technician):
+            return lanes.index(technician) * PLANNER_LANE_HEIGHT
+        
+        def update_scrollregion():
+            height = max(len(lanes), 1) * PLANNER_LANE_HEIGHT
+            left, right = day_x(state['start']), day_x(state['end'])
+            grid_canvas.configure(scrollregion=(left, 0, right, height))
+            days_canvas.configure(scrollregion=(left, 0, right, PLANNER_HEADER_HEIGHT))
+            lanes_canvas.configure(scrollregion=(0, 0, PLANNER_LANE_WIDTH, height))
+        
+        def draw_days(start, end):
+            height = max(len(lanes), 1) * PLANNER_LANE_HEIGHT
+            today = datetime.now().date()
+            day = start
+            while day < end:
+                x = day_x(day)
+                weekend = day.weekday() >= 5
+                grid_canvas.create_rectangle(x, 0, x + PLANNER_DAY_WIDTH, height, 
+                                             fill=ProfessionalTheme.LIGHT if weekend else ProfessionalTheme.WHITE, 
+                                             outline=ProfessionalTheme.GRAY, tags="day")
+                days_canvas.create_text(x + 6, PLANNER_HEADER_HEIGHT // 2, anchor="w", 
+                                        text=day.strftime("%a %d/%m"), font=ProfessionalTheme.BODY_FONT, 
+                                        fill=ProfessionalTheme.DANGER if day == today else ProfessionalTheme.DARK)
+                if day.weekday() == 0:
+                    days_canvas.create_line(x, 0, x, PLANNER_HEADER_HEIGHT, fill=ProfessionalTheme.PRIMARY, width=2)
+                day += timedelta(days=1)
+            grid_canvas.tag_lower("day")
+        
+        def draw_lanes():
+            lanes_canvas.delete("all")
+            for index, technician in enumerate(lanes):
+                y = index * PLANNER_LANE_HEIGHT
+                lanes_canvas.create_rectangle(0, y, PLANNER_LANE_WIDTH, y + PLANNER_LANE_HEIGHT, 
+                                              outline=ProfessionalTheme.GRAY, fill=ProfessionalTheme.LIGHT)
+                lanes_canvas.create_text(10, y + PLANNER_LANE_HEIGHT // 2, anchor="w", width=PLANNER_LANE_WIDTH - 20, 
+                                         text=technician or "Non assigné", font=ProfessionalTheme.BODY_FONT, 
+                                         fill=ProfessionalTheme.DARK)
+        
+        def draw_task(row):
+            task_id, date_prevue, technician, maint_type, status = row[:5]
+            try:
+                day = datetime.strptime(date_prevue, "%Y-%m-%d").date()
+            except (TypeError, ValueError):
+                return
+            cell = (technician, day)
+            count = cell_counts.get(cell, 0)
+            cell_counts[cell] = count + 1
+            x, y = day_x(day) + 3, lane_y(technician) + 4
+            if count < PLANNER_TASKS_PER_CELL:
+                top = y + count * PLANNER_TASK_HEIGHT
+                tag = f"task_{task_id}"
+                grid_canvas.create_rectangle(x, top, x + PLANNER_DAY_WIDTH - 6, top + PLANNER_TASK_HEIGHT - 2, 
+                                             fill=PLANNER_STATUS_COLORS.get(status, ProfessionalTheme.GRAY), 
+                                             outline="", tags=("task", tag))
+                grid_canvas.create_text(x + 4, top + PLANNER_TASK_HEIGHT // 2 - 1, anchor="w", 
+                                        text=f"{row[6]} · {maint_type or ''}", font=ProfessionalTheme.BODY_FONT, 
+                                        fill=ProfessionalTheme.WHITE, width=PLANNER_DAY_WIDTH - 14, tags=("task", tag))
+            else:
+                text = f"+{count + 1 - PLANNER_TASKS_PER_CELL} autre(s)"
+                if cell in overflow_items:
+                    grid_canvas.itemconfigure(overflow_items[cell], text=text)
+                else:
+                    top = y + PLANNER_TASKS_PER_CELL * PLANNER_TASK_HEIGHT
+                    overflow_items[cell] = grid_canvas.create_text(x + 4, top + PLANNER_TASK_HEIGHT // 2, anchor="w", 
+                                                                   text=text, font=ProfessionalTheme.BODY_FONT, 
+                                                                   fill=ProfessionalTheme.DARK)
+        
+        def redraw_all():
+            # Only needed when a new technician lane has to be inserted in order
+            grid_canvas.delete("all")
+            days_canvas.delete("all")
+            cell_counts.clear()
+            overflow_items.clear()
+            draw_lanes()
+            draw_days(state['start'], state['end'])
+            for row in sorted(tasks.values(), key=lambda row: (row[1], row[0])):
+                draw_task(row)
+        
+        def show_chunk(generation, start, end, rows):
+            if generation != state['generation']:
+                return
+            state['loading'].discard(start)
+            first_visible = grid_canvas.canvasx(0)
+            extended_left = state['start'] is not None and start < state['start']
+            state['start'] = start if state['start'] is None else min(state['start'], start)
+            state['end'] = end if state['end'] is None else max(state['end'], end)
+            
+            new_lanes = {row[2] for row in rows} - set(lanes)
+            for row in rows:
+                tasks[row[0]] = row
+            if new_lanes:
+                lanes.extend(new_lanes)
+                lanes.sort(key=lambda technician: (technician == "", technician.lower()))
+                redraw_all()
+            else:
+                draw_days(start, end)
+                for row in rows:
+                    draw_task(row)
+            update_scrollregion()
+            
+            if extended_left:
+                # Keep the same days on screen after the region grew to the left
+                left, right = day_x(state['start']), day_x(state['end'])
+                grid_canvas.xview_moveto((first_visible - left) / (right - left))
+                days_canvas.xview_moveto((first_visible - left) / (right - left))
+            status_label.config(text=f"{len(tasks)} tâche(s) du {state['start'].strftime('%d/%m/%Y')} "
+                                     f"au {(state['end'] - timedelta(days=1)).strftime('%d/%m/%Y')}")
+        
+        def chunk_failed(generation, start, error):
+            if generation != state['generation']:
+                return
+            # Let the next scroll retry this chunk
+            state['loading'].discard(start)
+            status_label.config(text=f"Erreur de chargement: {error}")
+        
+        def load_chunk(start, end):
+            if start in state['loading']:
+                return
+            state['loading'].add(start)
+            generation, open_only = state['generation'], open_only_var.get()
+            db_executor.submit(planning_service.list_range, start.isoformat(), end.isoformat(), open_only, 
+                               on_success=lambda rows: show_chunk(generation, start, end, rows), 
+                               on_error=lambda error: chunk_failed(generation, start, error), widget=grid_canvas, 
+                               key=f"planner_{generation}_{int(open_only)}_{start.isoformat()}")
+        
+        def load_initial():
+            tasks.clear()
+            lanes.clear()
+            state['start'] = state['end'] = None
+            state['loading'].clear()
+            state['generation'] += 1
+            grid_canvas.delete("all")
+            days_canvas.delete("all")
+            lanes_canvas.delete("all")
+            cell_counts.clear()
+            overflow_items.clear()
+            start = origin - timedelta(days=7)
+            load_chunk(start, start + timedelta(days=PLANNER_CHUNK_DAYS))
+        
+        def on_xscroll(first, last):
+            x_scroll.set(first, last)
+            if state['start'] is None or state['loading']:
+                return
+            if float(last) >= 0.9:
+                load_chunk(state['end'], state['end'] + timedelta(days=PLANNER_CHUNK_DAYS))
+            elif float(first) <= 0.1:
+                load_chunk(state['start'] - timedelta(days=PLANNER_CHUNK_DAYS), state['start'])
+        
+        def xview(*args):
+            grid_canvas.xview(*args)
+            days_canvas.xview(*args)
+        
+        def yview(*args):
+            grid_canvas.yview(*args)
+            lanes_canvas.yview(*args)
+        
+        def on_yscroll(first, last):
+            y_scroll.set(first, last)
+            lanes_canvas.yview_moveto(first)
+        
+        grid_canvas.configure(xscrollcommand=on_xscroll, yscrollcommand=on_yscroll)
+        x_scroll.configure(command=xview)
+        y_scroll.configure(command=yview)
+        
+        def on_wheel(event, horizontal=False):
+            step = -1 if getattr(event, 'delta', 0) > 0 or event.num == 4 else 1
+            if horizontal:
+                xview("scroll", step * 3, "units")
+            else:
+                yview("scroll", step, "units")
+        
+        grid_canvas.bind("<MouseWheel>", on_wheel)
+        grid_canvas.bind("<Shift-MouseWheel>", lambda event: on_wheel(event, True))
+        grid_canvas.bind("<Button-4>", on_wheel)
+        grid_canvas.bind("<Button-5>", on_wheel)
+        grid_canvas.bind("<Shift-Button-4>", lambda event: on_wheel(event, True))
+        grid_canvas.bind("<Shift-Button-5>", lambda event: on_wheel(event, True))
+        
+        def open_task(event):
+            for tag in grid_canvas.gettags("current"):
+                if tag.startswith("task_"):
+                    row = tasks.get(int(tag[5:]))
+                    if row:
+                        show_equipment_history(row[5], row[6])
+                    return
+        
+        grid_canvas.tag_bind("task", "<Double-1>", open_task)
+        
+        def go_to(day):
+            if state['start'] is None or not (state['start'] <= day < state['end']):
+                return
+            left, right = day_x(state['start']), day_x(state['end'])
+            xview("moveto", (day_x(day) - left) / (right - left))
+        
+        ttk.Button(toolbar, text="◀ Semaine", command=lambda: xview("scroll", -7 * PLANNER_DAY_WIDTH // 10, "units"), 
+                  style="Primary.TButton").pack(side=tk.LEFT, padx=(0, 5))
+        ttk.Button(toolbar, text="Aujourd'hui", command=lambda: go_to(origin), 
+                  style="Primary.TButton").pack(side=tk.LEFT, padx=(0, 5))
+        ttk.Button(toolbar, text="Semaine ▶", command=lambda: xview("scroll", 7 * PLANNER_DAY_WIDTH // 10, "units"), 
+                  style="Primary.TButton").pack(side=tk.LEFT, padx=(0, 15))
+        tk.Checkbutton(toolbar, text="Tâches ouvertes uniquement", variable=open_only_var, command=load_initial, 
+                       font=ProfessionalTheme.BODY_FONT, bg=ProfessionalTheme.LIGHT).pack(side=tk.LEFT, padx=(0, 15))
+        status_label.pack(side=tk.LEFT)
+        
+        grid_canvas.configure(xscrollincrement=10, yscrollincrement=PLANNER_TASK_HEIGHT)
+        days_canvas.configure(xscrollincrement=10)
+        lanes_canvas.configure(yscrollincrement=PLANNER_TASK_HEIGHT)
+        
+        load_initial()
+        
+        return planner_window
+    
+    return window_manager.open_window("maintenance_planner", create_planner_window)
+
+# === Technician Workload ===
+def open_workload_balancing():
+    def create_workload_window():
+        workload_window = tk.Toplevel(root)
+        workload_window.title("👷 Charge des techniciens")
+        workload_window.geometry("1100x650")
+        workload_window.configure(bg=ProfessionalTheme.LIGHT)
+        
+        header_frame = tk.Frame(workload_window, bg=ProfessionalTheme.PRIMARY, height=60)
+        header_frame.pack(fill=tk.X)
+        header_frame.pack_propagate(False)
+        
+        tk.Label(header_frame, text="Charge des techniciens et répartition des tâches", 
+                font=ProfessionalTheme.TITLE_FONT, bg=ProfessionalTheme.PRIMARY, 
+                fg=ProfessionalTheme.WHITE).pack(side=tk.LEFT, padx=20, pady=15)
+        
+        main_container = tk.Frame(workload_window, bg=ProfessionalTheme.LIGHT)
+        main_container.pack(fill=tk.BOTH, expand=True, padx=20, pady=20)
+        
+        # Left: roster with the hours booked over the horizon
+        roster_frame = tk.Frame(main_container, bg=ProfessionalTheme.WHITE, relief="raised", bd=1)
+        roster_frame.pack(side=tk.LEFT, fill=tk.BOTH, padx=(0, 10))
+        
+        tk.Label(roster_frame, text=f"Techniciens (charge sur {SCHEDULER_HORIZON_DAYS} jours)", 
+                font=ProfessionalTheme.SUBTITLE_FONT, bg=ProfessionalTheme.WHITE, 
+                fg=ProfessionalTheme.PRIMARY).pack(anchor="w", padx=10, pady=10)
+        
+        roster_columns = ("Nom", "h/jour", "Actif", "Charge (h)", "Tâches")
+        roster_tree = ttk.Treeview(roster_frame, columns=roster_columns, show="headings", height=18)
+        for col in roster_columns:
+            roster_tree.heading(col, text=col)
+            roster_tree.column(col, width=(140 if col == "Nom" else 70))
+        roster_tree.pack(fill=tk.BOTH, expand=True, padx=10)
+        
+        roster_buttons = tk.Frame(roster_frame, bg=ProfessionalTheme.WHITE)
+        roster_buttons.pack(fill=tk.X, padx=10, pady=10)
+        
+        # Right: proposed assignments, written only on Appliquer
+        proposal_frame = tk.Frame(main_container, bg=ProfessionalTheme.WHITE, relief="raised", bd=1)
+        proposal_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        
+        proposal_toolbar = tk.Frame(proposal_frame, bg=ProfessionalTheme.WHITE)
+        proposal_toolbar.pack(fill=tk.X, padx=10, pady=10)
+        
+        reassign_var = tk.BooleanVar(value=False)
+        status_label = tk.Label(proposal_frame, text="", font=ProfessionalTheme.BODY_FONT, 
+                                bg=ProfessionalTheme.WHITE, fg=ProfessionalTheme.DARK)
+        status_label.pack(anchor="w", padx=10)
+        
+        proposal_table = tk.Frame(proposal_frame, bg=ProfessionalTheme.WHITE)
+        proposal_table.pack(fill=tk.BOTH, expand=True, padx=10, pady=(5, 10))
+        
+        proposal_columns = ("ID", "Date prévue", "Nouvelle date", "Technicien actuel", "Technicien proposé")
+        proposal_tree = ttk.Treeview(proposal_table, columns=proposal_columns, show="headings", height=18)
+        for col in proposal_columns:
+            proposal_tree.heading(col, text=col)
+            proposal_tree.column(col, width=(60 if col == "ID" else 120))
+        proposal_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        
+        proposal_scroll = ttk.Scrollbar(proposal_table, orient=tk.VERTICAL, command=proposal_tree.yview)
+        proposal_tree.configure(yscrollcommand=proposal_scroll.set)
+        proposal_scroll.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        proposal = {'changes': [], 'versions': {}}
+        
+        def refresh_roster():
+            def fill(result):
+                technicians, loads = result
+                roster_tree.delete(*roster_tree.get_children())
+                for technician_id, name, hours, active in technicians:
+                    hours_booked, count = loads.get(name, (0, 0))
+                    roster_tree.insert("", tk.END, iid=str(technician_id), 
+                                       values=(name, f"{hours:g}", "Oui" if active else "Non", 
+                                               f"{hours_booked:.1f}", count))
+                unassigned = loads.get('', (0, 0))
+                if unassigned[1]:
+                    roster_tree.insert("", tk.END, values=("(non assigné)", "", "", f"{unassigned[0]:.1f}", 
+                                                           unassigned[1]))
+            
+            db_executor.submit(lambda: (list_technicians(), workload()), on_success=fill, widget=roster_tree, 
+                               key="refresh_workload", replace=True)
+        
+        def selected_technician():
+            selected = roster_tree.selection()
+            if not selected or not selected[0].isdigit():
+                messagebox.showwarning("Attention", "Sélectionnez un technicien", parent=workload_window)
+                return None
+            return int(selected[0]), roster_tree.item(selected[0], 'values')
+        
+        def edit_technician(technician_id=None, values=None):
+            name = simpledialog.askstring("Technicien", "Nom:", parent=workload_window, 
+                                          initialvalue=values[0] if values else "")
+            if not name or not name.strip():
+                return
+            hours = simpledialog.askfloat("Technicien", "Heures disponibles par jour:", parent=workload_window, 
+                                          initialvalue=float(values[1]) if values else 7.0, 
+                                          minvalue=0.5, maxvalue=24)
+            if hours is None:
+                return
+            active = values[2] == "Oui" if values else True
+            db_executor.submit(save_technician, name.strip(), hours, active, technician_id, 
+                               on_success=lambda result: refresh_roster(), widget=roster_tree, 
+                               key="save_technician")
+        
+        def modify_technician():
+            selection = selected_technician()
+            if selection:
+                edit_technician(*selection)
+        
+        def toggle_technician():
+            selection = selected_technician()
+            if selection:
+                technician_id, values = selection
+                db_executor.submit(save_technician, values[0], float(values[1]), values[2] != "Oui", technician_id, 
+                                   on_success=lambda result: refresh_roster(), widget=roster_tree, 
+                                   key="save_technician")
+        
+        def remove_technician():
+            selection = selected_technician()
+            if selection and messagebox.askyesno("Confirmation", f"Retirer {selection[1][0]} de la liste ?\n"
+                                                 "Les tâches déjà assignées gardent son nom.", parent=workload_window):
+                db_executor.submit(delete_technician, selection[0], on_success=lambda result: refresh_roster(), 
+                                   widget=roster_tree, key="delete_technician")
+        
+        def show_proposal(result):
+            changes, unplaced, tasks = result
+            proposal['changes'] = changes
+            proposal['versions'] = {task_id: task[5] for task_id, task in tasks.items()}
+            proposal_tree.delete(*proposal_tree.get_children())
+            for task_id, day, technician in changes:
+                task = tasks[task_id]
+                proposal_tree.insert("", tk.END, values=(task_id, task[1], day if day != task[1] else "", 
+                                                         task[2] or "(non assigné)", technician))
+            text = f"{len(changes)} tâche(s) à modifier sur {len(tasks)} ouvertes"
+            if unplaced:
+                text += f", {len(unplaced)} sans créneau dans les {SCHEDULER_MAX_SHIFT_DAYS} jours"
+            status_label.config(text=text)
+        
+        def compute_proposal():
+            status_label.config(text="Calcul de la répartition...")
+            db_executor.submit(propose_schedule, reassign_var.get(), on_success=show_proposal, 
+                               widget=proposal_tree, key="propose_schedule", replace=True)
+        
+        def apply_proposal():
+            if not proposal['changes']:
+                messagebox.showinfo("Répartition", "Aucune modification à appliquer", parent=workload_window)
+                return
+            
+            def done(count):
+                skipped = len(proposal['changes']) - count
+                message = f"{count} tâche(s) mises à jour"
+                if skipped:
+                    message += f"\n{skipped} tâche(s) modifiées entre-temps ont été laissées telles quelles"
+                messagebox.showinfo("Répartition", message, parent=workload_window)
+                proposal['changes'] = []
+                proposal_tree.delete(*proposal_tree.get_children())
+                status_label.config(text="")
+                refresh_roster()
+                reminder_scheduler.invalidate()
+            
+            db_executor.submit(apply_schedule, proposal['changes'], proposal['versions'], on_success=done, 
+                               widget=proposal_tree, key="apply_schedule")
+        
+        ttk.Button(roster_buttons, text="➕", command=edit_technician, 
+                  style="Success.TButton").pack(side=tk.LEFT, padx=(0, 5))
+        ttk.Button(roster_buttons, text="✏️", command=modify_technician, 
+                  style="Warning.TButton").pack(side=tk.LEFT, padx=(0, 5))
+        ttk.Button(roster_buttons, text="Actif / Inactif", command=toggle_technician, 
+                  style="Primary.TButton").pack(side=tk.LEFT, padx=(0, 5))
+        ttk.Button(roster_buttons, text="🗑", command=remove_technician, 
+                  style="Danger.TButton").pack(side=tk.LEFT)
+        
+        ttk.Button(proposal_toolbar, text="⚖ Calculer la répartition", command=compute_proposal, 
+                  style="Primary.TButton").pack(side=tk.LEFT, padx=(0, 10))
+        ttk.Button(proposal_toolbar, text="✔ Appliquer", command=apply_proposal, 
+                  style="Success.TButton").pack(side=tk.LEFT, padx=(0, 10))
+        tk.Checkbutton(proposal_toolbar, text="Réaffecter aussi les tâches déjà assignées", variable=reassign_var, 
+                       font=ProfessionalTheme.BODY_FONT, bg=ProfessionalTheme.WHITE).pack(side=tk.LEFT)
+        
+        refresh_roster()
+        
+        return workload_window
+    
+    return window_manager.open_window("technician_workload", create_workload_window)
+
+# === Recurring Maintenance Plans ===
+def open_maintenance_plans():
+    def create_plans_window():
+        plans_window = tk.Toplevel(root)
+        plans_window.title("🔁 Plans de maintenance récurrents")
+        plans_window.geometry("1000x550")
+        plans_window.configure(bg=ProfessionalTheme.LIGHT)
+        
+        header_frame = tk.Frame(plans_window, bg=ProfessionalTheme.PRIMARY, height=60)
+        header_frame.pack(fill=tk.X)
+        header_frame.pack_propagate(False)
+        
+        tk.Label(header_frame, text="Plans de maintenance récurrents", 
+                font=ProfessionalTheme.TITLE_FONT, bg=ProfessionalTheme.PRIMARY, 
+                fg=ProfessionalTheme.WHITE).pack(side=tk.LEFT, padx=20, pady=15)
+        
+        main_container = tk.Frame(plans_window, bg=ProfessionalTheme.LIGHT)
+        main_container.pack(fill=tk.BOTH, expand=True, padx=20, pady=20)
+        
+        button_frame = tk.Frame(main_container, bg=ProfessionalTheme.LIGHT)
+        button_frame.pack(fill=tk.X, pady=(0, 15))
+        
+        table_frame = tk.Frame(main_container, bg=ProfessionalTheme.WHITE, relief="raised", bd=1)
+        table_frame.pack(fill=tk.BOTH, expand=True)
+        
+        columns = ("ID", "N° Série", "Marque", "Modèle", "Type", "Technicien", "Périodicité", "Début")
+        tree = ttk.Treeview(table_frame, columns=columns, show="headings", height=15)
+        for col in columns:
+            tree.heading(col, text=col)
+            tree.column(col, width=(50 if col == "ID" else 120))
+        tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        
+        scrollbar = ttk.Scrollbar(table_frame, orient=tk.VERTICAL, command=tree.yview)
+        tree.configure(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        def refresh_plans():
+            def fill(plans):
+                tree.delete(*tree.get_children())
+                for plan_id, serial, brand, model, maint_type, technician, interval, unit, start in plans:
+                    tree.insert("", tk.END, values=(plan_id, serial, brand, model, maint_type, technician, 
+                                                    f"Tous les {interval} {unit}", start))
+            
+            db_executor.submit(planning_service.list_plans, on_success=fill, widget=tree, 
+                               key="refresh_plans", replace=True)
+        
+        def add_plan():
+            def create_add_plan_window():
+                add_plan_window = tk.Toplevel(plans_window)
+                add_plan_window.title("Nouveau plan récurrent")
+                add_plan_window.geometry("520x640")
+                add_plan_window.configure(bg=ProfessionalTheme.LIGHT)
+                
+                header_frame = tk.Frame(add_plan_window, bg=ProfessionalTheme.PRIMARY, height=50)
+                header_frame.pack(fill=tk.X)
+                header_frame.pack_propagate(False)
+                
+                tk.Label(header_frame, text="Nouveau plan récurrent", 
+                        font=ProfessionalTheme.SUBTITLE_FONT, bg=ProfessionalTheme.PRIMARY, 
+                        fg=ProfessionalTheme.WHITE).pack(side=tk.LEFT, padx=20, pady=12)
+                
+                form_container = tk.Frame(add_plan_window, bg=ProfessionalTheme.WHITE, relief="raised", bd=1)
+                form_container.pack(fill=tk.BOTH, expand=True, padx=20, pady=20)
+                
+                tk.Label(form_container, text="Appliquer à:", font=ProfessionalTheme.BODY_FONT, 
+                        bg=ProfessionalTheme.WHITE, fg=ProfessionalTheme.DARK).grid(
+                    row=0, column=0, sticky="w", padx=20, pady=8)
+                combo_scope = ttk.Combobox(form_container, values=["Un équipement", "Un modèle"], state="readonly")
+                combo_scope.grid(row=0, column=1, padx=20, pady=8, sticky="ew")
+                combo_scope.set("Un modèle")
+                
+                fields = {}
+                for row, (key, label) in enumerate((('serial', "N° Série:"), ('brand', "Marque (vide = toutes):"), 
+                                                    ('model', "Modèle:"), ('type', "Type de maintenance *:"), 
+                                                    ('technician', "Technicien:"), ('interval', "Tous les *:"), 
+                                                    ('duration', "Durée estimée (h):")), 
+                                                   start=1):
+                    tk.Label(form_container, text=label, font=ProfessionalTheme.BODY_FONT, 
+                            bg=ProfessionalTheme.WHITE, fg=ProfessionalTheme.DARK).grid(
+                        row=row, column=0, sticky="w", padx=20, pady=8)
+                    fields[key] = tk.Entry(form_container, font=ProfessionalTheme.BODY_FONT, 
+                                           bd=1, relief="solid", highlightthickness=0)
+                    fields[key].grid(row=row, column=1, padx=20, pady=8, sticky="ew")
+                
+                tk.Label(form_container, text="Unité:", font=ProfessionalTheme.BODY_FONT, 
+                        bg=ProfessionalTheme.WHITE, fg=ProfessionalTheme.DARK).grid(
+                    row=8, column=0, sticky="w", padx=20, pady=8)
+                combo_unit = ttk.Combobox(form_container, values=list(PLAN_UNITS), state="readonly")
+                combo_unit.grid(row=8, column=1, padx=20, pady=8, sticky="ew")
+                combo_unit.set("mois")
+                
+                tk.Label(form_container, text="Date de début *:", font=ProfessionalTheme.BODY_FONT, 
+                        bg=ProfessionalTheme.WHITE, fg=ProfessionalTheme.DARK).grid(
+                    row=9, column=0, sticky="w", padx=20, pady=8)
+                entry_start = tk.Entry(form_container, font=ProfessionalTheme.BODY_FONT, 
+                                      bd=1, relief="solid", highlightthickness=0)
+                entry_start.grid(row=9, column=1, padx=20, pady=8, sticky="ew")
+                entry_start.insert(0, datetime.now().strftime("%Y-%m-%d"))
+                
+                tk.Label(form_container, text="Notes:", font=ProfessionalTheme.BODY_FONT, 
+                        bg=ProfessionalTheme.WHITE, fg=ProfessionalTheme.DARK).grid(
+                    row=10, column=0, sticky="nw", padx=20, pady=8)
+                text_notes = tk.Text(form_container, font=ProfessionalTheme.BODY_FONT, 
+                                   bd=1, relief="solid", highlightthickness=0, height=4)
+                text_notes.grid(row=10, column=1, padx=20, pady=8, sticky="ew")
+                
+                def on_scope_change(event=None):
+                    single = combo_scope.get() == "Un équipement"
+                    fields['serial'].config(state=tk.NORMAL if single else tk.DISABLED)
+                    fields['brand'].config(state=tk.DISABLED if single else tk.NORMAL)
+                    fields['model'].config(state=tk.DISABLED if single else tk.NORMAL)
+                
+                combo_scope.bind("<<ComboboxSelected>>", on_scope_change)
+                on_scope_change()
+                
+                def save_plan():
+                    single = combo_scope.get() == "Un équipement"
+                    serial = fields['serial'].get().strip()
+                    brand = fields['brand'].get().strip()
+                    model = fields['model'].get().strip()
+                    maint_type = fields['type'].get().strip()
+                    technician = fields['technician'].get().strip()
+                    unit = combo_unit.get()
+                    start = entry_start.get().strip()
+                    notes = text_notes.get("1.0", tk.END).strip()
+                    
+                    if not maint_type or (serial if single else model) == "":
+                        messagebox.showwarning("Attention", "Type et équipement (ou modèle) sont obligatoires")
+                        return
+                    
+                    try:
+                        interval = int(fields['interval'].get().strip())
+                        if interval <= 0:
+                            raise ValueError
+                    except ValueError:
+                        messagebox.showwarning("Erreur", "L'intervalle doit être un entier positif")
+                        return
+                    
+                    try:
+                        datetime.strptime(start, "%Y-%m-%d")
+                    except ValueError:
+                        messagebox.showwarning("Erreur", "Format de date invalide (YYYY-MM-DD)")
+                        return
+                    
+                    try:
+                        duration = float(fields['duration'].get().strip().replace(",", ".") or 0) or None
+                        if duration is not None and duration < 0:
+                            raise ValueError
+                    except ValueError:
+                        messagebox.showwarning("Erreur", "Durée estimée invalide (heures)")
+                        return
+                    
+                    def done(result):
+                        messagebox.showinfo("Succès", "Plan créé, les maintenances ont été planifiées")
+                        add_plan_window.destroy()
+                        refresh_plans()
+                        reminder_scheduler.invalidate()
+                    
+                    def submit(equipment_id, brand, model):
+                        db_executor.submit(planning_service.create_plan, equipment_id, brand, model, maint_type, 
+                                           technician, interval, unit, start, notes, duration, 
+                                           on_success=done, widget=add_plan_window, key="save_plan")
+                    
+                    def resolved(equipment):
+                        if equipment is None:
+                            messagebox.showwarning("Erreur", f"Équipement introuvable: {serial}")
+                            return
+                        submit(equipment[0], None, None)
+                    
+                    if single:
+                        db_executor.submit(equipment_service.find_by_serial, serial, on_success=resolved, 
+                                           widget=add_plan_window, key="save_plan_equipment")
+                    else:
+                        submit(None, brand, model)
+                
+                button_frame = tk.Frame(form_container, bg=ProfessionalTheme.WHITE)
+                button_frame.grid(row=11, column=0, columnspan=2, pady=15)
+                
+                ttk.Button(button_frame, text="Sauvegarder", command=save_plan, 
+                          style="Success.TButton").pack(side=tk.LEFT, padx=(0, 10))
+                ttk.Button(button_frame, text="Annuler", command=add_plan_window.destroy, 
+                          style="Danger.TButton").pack(side=tk.LEFT)
+                
+                form_container.columnconfigure(1, weight=1)
+                
+                return add_plan_window
             
-            form_container.columnconfigure(1, weight=1)
+            window_manager.open_window("add_maintenance_plan", create_add_plan_window)
         
-        def delete_part():
-            if not current_user['permissions']['can_delete_stock']:
-                messagebox.showwarning("Accès refusé", "Vous n'avez pas la permission de supprimer des pièces")
-                return
-                
-            selected = tree_parts.selection()
+        def delete_plan():
+            selected = tree.selection()
             if not selected:
-                messagebox.showwarning("Attention", "Sélectionnez une pièce à supprimer.")
+                messagebox.showwarning("Attention", "Sélectionnez un plan à supprimer")
                 return
             
-            values = tree_parts.item(selected[0], 'values')
-            part_name = values[1]
-            
-            if not messagebox.askyesno("Confirmation", f"Voulez-vous vraiment supprimer la pièce '{part_name}' ?"):
+            if not messagebox.askyesno("Confirmation", "Supprimer ce plan et ses maintenances encore planifiées ?\n"
+                                                       "Les maintenances terminées ou en cours sont conservées."):
                 return
             
-            part_id = values[0]
-            conn = sqlite3.connect(DB_FILE)
-            c = conn.cursor()
-            c.execute("DELETE FROM pieces WHERE id=?", (part_id,))
-            conn.commit()
-            conn.close()
-            refresh_stock()
-            messagebox.showinfo("Succès", "Pièce supprimée avec succès.")
+            plan_id = tree.item(selected[0], 'values')[0]
+            
+            def done(result):
+                refresh_plans()
+                reminder_scheduler.invalidate()
+            
+            db_executor.submit(planning_service.delete_plan, plan_id, on_success=done, widget=tree, 
+                               key=f"delete_plan_{plan_id}")
         
-        def check_low_stock():
-            conn = sqlite3.connect(DB_FILE)
-            c = conn.cursor()
-            c.execute("SELECT nom, quantite_stock FROM pieces WHERE quantite_stock <= ?", (LOW_STOCK_THRESHOLD,))
-            low_stock_items = c.fetchall()
-            conn.close()
-            
-            if low_stock_items:
-                message = "ALERTE STOCK FAIBLE :\n\n"
-                for name, quantity in low_stock_items:
-                    message += f"- {name} (stock: {quantity})\n"
-                messagebox.showwarning("Stock Faible", message)
-            else:
-                messagebox.showinfo("Stock", "Tous les articles ont un niveau de stock suffisant.")
+        ttk.Button(button_frame, text="➕ Nouveau plan", command=add_plan, 
+                  style="Success.TButton").pack(side=tk.LEFT, padx=(0, 10))
+        if has_permission('can_delete_interventions'):
+            ttk.Button(button_frame, text="🗑 Supprimer", command=delete_plan, 
+                      style="Danger.TButton").pack(side=tk.LEFT, padx=(0, 10))
+        ttk.Button(button_frame, text="🔄 Rafraîchir", command=refresh_plans, 
+                  style="Primary.TButton").pack(side=tk.LEFT)
         
-        if current_user['permissions']['can_add_stock']:
-            ttk.Button(button_frame, text="➕ Ajouter une pièce", command=add_part, 
-                      style="Success.TButton").pack(side=tk.LEFT, padx=(0, 10))
+        refresh_plans()
         
-        if current_user['permissions']['can_edit_stock']:
-            ttk.Button(button_frame, text="✏️ Modifier", command=edit_part, 
-                      style="Warning.TButton").pack(side=tk.LEFT, padx=(0, 10))
+        return plans_window
+    
+    return window_manager.open_window("maintenance_plans", create_plans_window)
+
+# === Audit Log ===
+def open_audit_log():
+    def create_audit_window():
+        audit_window = tk.Toplevel(root)
+        audit_window.title("🧾 Journal d'audit")
+        audit_window.geometry("1100x600")
+        audit_window.configure(bg=ProfessionalTheme.LIGHT)
         
-        if current_user['permissions']['can_delete_stock']:
-            ttk.Button(button_frame, text="🗑 Supprimer", command=delete_part, 
-                      style="Danger.TButton").pack(side=tk.LEFT, padx=(0, 10))
+        header_frame = tk.Frame(audit_window, bg=ProfessionalTheme.PRIMARY, height=60)
+        header_frame.pack(fill=tk.X)
+        header_frame.pack_propagate(False)
         
-        ttk.Button(button_frame, text="🔄 Rafraîchir", command=refresh_stock, 
-                  style="Primary.TButton").pack(side=tk.LEFT, padx=(0, 10))
-        ttk.Button(button_frame, text="🔔 Vérifier stock faible", command=check_low_stock, 
-                  style="Warning.TButton").pack(side=tk.LEFT)
+        tk.Label(header_frame, text="Journal d'audit des modifications", 
+                font=ProfessionalTheme.TITLE_FONT, bg=ProfessionalTheme.PRIMARY, 
+                fg=ProfessionalTheme.WHITE).pack(side=tk.LEFT, padx=20, pady=15)
         
-        refresh_stock()
-        check_low_stock()
+        toolbar = tk.Frame(audit_window, bg=ProfessionalTheme.LIGHT)
+        toolbar.pack(fill=tk.X, padx=20, pady=(15, 5))
         
-        return stock_window
+        tk.Label(toolbar, text="Table:", font=ProfessionalTheme.BODY_FONT, 
+                bg=ProfessionalTheme.LIGHT, fg=ProfessionalTheme.DARK).pack(side=tk.LEFT, padx=(0, 5))
+        combo_table = ttk.Combobox(toolbar, values=["Toutes"], state="readonly", width=20)
+        combo_table.set("Toutes")
+        combo_table.pack(side=tk.LEFT, padx=(0, 15))
+        
+        status_label = tk.Label(toolbar, text="", font=ProfessionalTheme.BODY_FONT, 
+                                bg=ProfessionalTheme.LIGHT, fg=ProfessionalTheme.DARK)
+        
+        table_frame = tk.Frame(audit_window, bg=ProfessionalTheme.WHITE, relief="raised", bd=1)
+        table_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=(5, 20))
+        
+        columns = ("Date", "Utilisateur", "Action", "Table", "ID", "Modifications")
+        tree = ttk.Treeview(table_frame, columns=columns, show="headings", height=18)
+        for col in columns:
+            tree.heading(col, text=col)
+            tree.column(col, width=(500 if col == "Modifications" else 110))
+        tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        
+        scrollbar = ttk.Scrollbar(table_frame, orient=tk.VERTICAL)
+        scrollbar.configure(command=tree.yview)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        # Newest first, one keyset page at a time as the user scrolls
+        page_state = {'before': None, 'exhausted': False}
+        
+        def describe(changes):
+            if not changes:
+                return ""
+            return ", ".join(f"{column}: {before!r} → {after!r}" 
+                             for column, (before, after) in json.loads(changes).items())
+        
+        def show_page(entries):
+            if len(entries) < AUDIT_PAGE_SIZE:
+                page_state['exhausted'] = True
+            if entries:
+                page_state['before'] = entries[-1][0]
+            for entry_id, created_at, username, action, table, row_id, changes in entries:
+                tree.insert("", tk.END, values=(created_at, username or "(système)", AUDIT_ACTION_LABELS[action], 
+                                                table, "" if row_id is None else row_id, describe(changes)))
+        
+        def load_page():
+            if page_state['exhausted']:
+                return
+            table = combo_table.get()
+            db_executor.submit(audit_page, None if table == "Toutes" else table, page_state['before'], 
+                               on_success=show_page, widget=tree, key="audit_page")
+        
+        def reload(event=None):
+            page_state['before'] = None
+            page_state['exhausted'] = False
+            tree.delete(*tree.get_children())
+            load_page()
+        
+        def on_scroll(first, last):
+            scrollbar.set(first, last)
+            if float(last) >= 0.95:
+                load_page()
+        
+        def show_archives(archives):
+            archived = sum(archive[7] for archive in archives)
+            status_label.config(text=f"{len(archives)} archive(s), {archived} entrée(s) archivée(s) "
+                                     f"(au-delà de {AUDIT_RETENTION_DAYS} jours)")
+        
+        def compact():
+            if not messagebox.askyesno("Compacter", f"Archiver les entrées de plus de {AUDIT_RETENTION_DAYS} jours "
+                                       f"dans {AUDIT_ARCHIVE_DIR}/ ?", parent=audit_window):
+                return
+            
+            def done(count):
+                messagebox.showinfo("Compacter", f"{count} entrée(s) archivée(s)", parent=audit_window)
+                reload()
+                db_executor.submit(list_archives, on_success=show_archives, widget=tree, key="audit_archives")
+            
+            db_executor.submit(compact_audit_log, min_entries=1, on_success=done, widget=tree, 
+                               key="audit_compaction")
+        
+        combo_table.bind("<<ComboboxSelected>>", reload)
+        tree.configure(yscrollcommand=on_scroll)
+        
+        ttk.Button(toolbar, text="🗜 Compacter", command=compact, 
+                  style="Warning.TButton").pack(side=tk.LEFT, padx=(0, 15))
+        status_label.pack(side=tk.LEFT)
+        
+        db_executor.submit(audit_tables, on_success=lambda tables: combo_table.config(values=["Toutes", *tables]), 
+                           widget=combo_table, key="audit_tables")
+        db_executor.submit(list_archives, on_success=show_archives, widget=tree, key="audit_archives")
+        load_page()
+        
+        return audit_window
     
-    return window_manager.open_window("parts_management", create_stock_window)
+    return window_manager.open_window("audit_log", create_audit_window)
 
 # === Equipment Search and History ===
 def search_equipment():
-    global entry_serial
-    
     serial_number = entry_serial.get().strip()
     if not serial_number:
         messagebox.showwarning("Attention", "Veuillez saisir un numéro de série")
         return
     
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("SELECT * FROM equipements WHERE numero_serie=?", (serial_number,))
-    result = c.fetchone()
-    conn.close()
+    def found(result):
+        if not result:
+            # A mistyped serial should not silently become a duplicate equipment
+            close_matches = equipment_index.closest(serial_number)
+            if close_matches:
+                listing = "\n".join(f"  • {serial} ({brand} {model})" for serial, brand, model in close_matches)
+                if not messagebox.askyesno("Numéro de série inconnu", 
+                                           f"Aucun équipement avec le numéro '{serial_number}'.\n\n"
+                                           f"Numéros proches:\n{listing}\n\n"
+                                           "Créer un nouvel équipement avec ce numéro ?"):
+                    return
+            create_equipment_form(serial_number)
+        else:
+            show_equipment_history(result[0], serial_number)
     
-    if not result:
-        create_equipment_form(serial_number)
-    else:
-        show_equipment_history(result[0], serial_number)
+    db_executor.submit(equipment_service.find_by_serial, serial_number, on_success=found, widget=root, 
+                       key="find_by_serial", replace=True)
 
 def create_equipment_form(serial_number):
     def create_form_window():
@@ -1374,23 +3190,20 @@ def create_equipment_form(serial_number):
                 messagebox.showwarning("Attention", "Marque et Modèle sont obligatoires")
                 return
             
-            conn = sqlite3.connect(DB_FILE)
-            c = conn.cursor()
-            try:
-                c.execute('''INSERT INTO equipements 
-                          (numero_serie, marque, modele, date_achat, date_vente, identifiant_acheteur, notes) 
-                          VALUES (?, ?, ?, ?, ?, ?, ?)''',
-                          (serial_number, brand, model, purchase_date, sale_date, buyer_id, notes))
-                conn.commit()
+            def done(equipement_id):
                 messagebox.showinfo("Succès", "Équipement enregistré avec succès!")
                 form_window.destroy()
-                c.execute("SELECT id FROM equipements WHERE numero_serie=?", (serial_number,))
-                equipement_id = c.fetchone()[0]
                 show_equipment_history(equipement_id, serial_number)
-            except sqlite3.IntegrityError:
-                messagebox.showerror("Erreur", "Numéro de série déjà existant")
-            finally:
-                conn.close()
+            
+            def failed(error):
+                if isinstance(error, sqlite3.IntegrityError):
+                    messagebox.showerror("Erreur", "Numéro de série déjà existant")
+                else:
+                    messagebox.showerror("Erreur", f"Une erreur est survenue: {str(error)}")
+            
+            db_executor.submit(equipment_service.create, serial_number, brand, model, purchase_date, sale_date, 
+                               buyer_id, notes, on_success=done, on_error=failed, widget=form_window, 
+                               key=f"save_equipment_{serial_number}")
         
         button_frame = tk.Frame(form_container, bg=ProfessionalTheme.WHITE)
         button_frame.grid(row=7, column=0, columnspan=2, pady=20)
@@ -1414,8 +3227,6 @@ def show_equipment_history(equipment_id, serial_number):
         history_window.geometry("1200x800")
         history_window.configure(bg=ProfessionalTheme.LIGHT)
         
-        ProfessionalTheme.configure_styles()
-        
         header_frame = tk.Frame(history_window, bg=ProfessionalTheme.PRIMARY, height=60)
         header_frame.pack(fill=tk.X)
         header_frame.pack_propagate(False)
@@ -1434,31 +3245,29 @@ def show_equipment_history(equipment_id, serial_number):
         info_frame = ttk.Frame(notebook)
         notebook.add(info_frame, text="Informations Équipement")
         
-        conn = sqlite3.connect(DB_FILE)
-        c = conn.cursor()
-        c.execute("SELECT * FROM equipements WHERE id=?", (equipment_id,))
-        equipment = c.fetchone()
-        conn.close()
-        
         details_frame = tk.Frame(info_frame, bg=ProfessionalTheme.WHITE, relief="raised", bd=1)
         details_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
         
-        info_labels = [
-            ("Numéro de série:", equipment[1]),
-            ("Marque:", equipment[2]),
-            ("Modèle:", equipment[3]),
-            ("Date d'achat:", equipment[4]),
-            ("Date de vente:", equipment[5]),
-            ("Identifiant Acheteur:", equipment[6]),
-            ("Notes:", equipment[7])
-        ]
-        for i, (label, value) in enumerate(info_labels):
-            tk.Label(details_frame, text=label, font=ProfessionalTheme.SUBTITLE_FONT, 
-                    bg=ProfessionalTheme.WHITE, fg=ProfessionalTheme.PRIMARY, 
-                    anchor="w").grid(row=i, column=0, sticky="w", pady=10, padx=20)
-            tk.Label(details_frame, text=value or "Non renseigné", font=ProfessionalTheme.BODY_FONT, 
-                    bg=ProfessionalTheme.WHITE, fg=ProfessionalTheme.DARK, 
-                    anchor="w").grid(row=i, column=1, sticky="w", pady=10, padx=(20, 20))
+        def show_info(equipment):
+            info_labels = [
+                ("Numéro de série:", equipment[1]),
+                ("Marque:", equipment[2]),
+                ("Modèle:", equipment[3]),
+                ("Date d'achat:", equipment[4]),
+                ("Date de vente:", equipment[5]),
+                ("Identifiant Acheteur:", equipment[6]),
+                ("Notes:", equipment[7])
+            ]
+            for i, (label, value) in enumerate(info_labels):
+                tk.Label(details_frame, text=label, font=ProfessionalTheme.SUBTITLE_FONT, 
+                        bg=ProfessionalTheme.WHITE, fg=ProfessionalTheme.PRIMARY, 
+                        anchor="w").grid(row=i, column=0, sticky="w", pady=10, padx=20)
+                tk.Label(details_frame, text=value or "Non renseigné", font=ProfessionalTheme.BODY_FONT, 
+                        bg=ProfessionalTheme.WHITE, fg=ProfessionalTheme.DARK, 
+                        anchor="w").grid(row=i, column=1, sticky="w", pady=10, padx=(20, 20))
+        
+        db_executor.submit(equipment_service.get, equipment_id, on_success=show_info, widget=details_frame, 
+                           key=f"equipment_info_{equipment_id}", replace=True)
         
         # Repair History Tab
         repairs_frame = ttk.Frame(notebook)
@@ -1479,179 +3288,52 @@ def show_equipment_history(equipment_id, serial_number):
         tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         
         scrollbar = ttk.Scrollbar(table_frame, orient=tk.VERTICAL, command=tree.yview)
-        tree.configure(yscrollcommand=scrollbar.set)
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         
+        # Keyset pagination on (date_entree, id): only the pages the user scrolls
+        # to are fetched, and only the preview of details_reparation is handed to the tree
+        history_page = {'last_key': None, 'exhausted': False}
+        
+        def show_interventions_page(interventions):
+            if len(interventions) < HISTORY_PAGE_SIZE:
+                history_page['exhausted'] = True
+            if interventions:
+                history_page['last_key'] = (interventions[-1][1], interventions[-1][0])
+            for intervention in interventions:
+                tree.insert("", tk.END, values=(*intervention[:5], intervention[5] or ""))
+        
+        def load_interventions_page(replace=False):
+            if history_page['exhausted'] and not replace:
+                return
+            db_executor.submit(equipment_service.history_page, equipment_id, history_page['last_key'], 
+                               on_success=show_interventions_page, widget=tree, 
+                               key=f"history_page_{equipment_id}", replace=replace)
+        
+        def on_history_scroll(first, last):
+            scrollbar.set(first, last)
+            if float(last) >= 0.95:
+                load_interventions_page()
+        
+        tree.configure(yscrollcommand=on_history_scroll)
+        
         def refresh_interventions():
             for item in tree.get_children():
                 tree.delete(item)
-            conn = sqlite3.connect(DB_FILE)
-            c = conn.cursor()
-            c.execute('''SELECT id, date_entree, date_sortie, technicien, cout, details_reparation 
-                         FROM interventions WHERE equipement_id=? ORDER BY date_entree DESC''', (equipment_id,))
-            interventions = c.fetchall()
-            conn.close()
-            for intervention in interventions:
-                tree.insert("", tk.END, values=intervention)
+            history_page['last_key'] = None
+            history_page['exhausted'] = False
+            load_interventions_page(replace=True)
         
         selected_pieces = []
         
+        def on_stock_error(error):
+            if isinstance(error, sqlite3.IntegrityError):
+                messagebox.showerror("Stock insuffisant", 
+                                   "Le stock d'une des pièces sélectionnées est insuffisant. Aucune modification n'a été enregistrée.")
+            else:
+                messagebox.showerror("Erreur", f"Une erreur est survenue: {str(error)}")
+        
         def manage_used_pieces(parent_window):
-            for child in parent_window.winfo_children():
-                if isinstance(child, tk.Toplevel) and hasattr(child, 'pieces_selection'):
-                    child.lift()
-                    child.focus_force()
-                    return
-            
-            pieces_window = tk.Toplevel(parent_window)
-            pieces_window.title("Associer des pièces à l'intervention")
-            pieces_window.geometry("900x500")
-            pieces_window.configure(bg=ProfessionalTheme.LIGHT)
-            pieces_window.pieces_selection = True
-            
-            header_frame = tk.Frame(pieces_window, bg=ProfessionalTheme.PRIMARY, height=50)
-            header_frame.pack(fill=tk.X)
-            header_frame.pack_propagate(False)
-            
-            tk.Label(header_frame, text="Associer des pièces à l'intervention", 
-                    font=ProfessionalTheme.SUBTITLE_FONT, bg=ProfessionalTheme.PRIMARY, 
-                    fg=ProfessionalTheme.WHITE).pack(side=tk.LEFT, padx=20, pady=12)
-            
-            main_container = tk.Frame(pieces_window, bg=ProfessionalTheme.LIGHT)
-            main_container.pack(fill=tk.BOTH, expand=True, padx=20, pady=20)
-            
-            left_frame = tk.Frame(main_container, bg=ProfessionalTheme.WHITE, relief="raised", bd=1)
-            left_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=(0, 10))
-            
-            tk.Label(left_frame, text="Pièces disponibles", font=ProfessionalTheme.SUBTITLE_FONT, 
-                    bg=ProfessionalTheme.WHITE, fg=ProfessionalTheme.PRIMARY).pack(pady=10)
-            
-            cols = ("ID", "Nom", "Réf", f"Prix ({MONETARY_SYMBOL})", "Stock")
-            tree_left = ttk.Treeview(left_frame, columns=cols, show="headings", height=15)
-            for col in cols:
-                tree_left.heading(col, text=col)
-                tree_left.column(col, width=(50 if col == "ID" else 120))
-            tree_left.pack(padx=10, pady=(0, 10), fill=tk.BOTH, expand=True)
-            
-            right_frame = tk.Frame(main_container, bg=ProfessionalTheme.WHITE, relief="raised", bd=1)
-            right_frame.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True)
-            
-            tk.Label(right_frame, text="Pièces sélectionnées", font=ProfessionalTheme.SUBTITLE_FONT, 
-                    bg=ProfessionalTheme.WHITE, fg=ProfessionalTheme.PRIMARY).pack(pady=10)
-            
-            cols2 = ("Piece ID", "Nom", "Quantité", f"Prix unitaire ({MONETARY_SYMBOL})", f"Coût total ({MONETARY_SYMBOL})")
-            tree_right = ttk.Treeview(right_frame, columns=cols2, show="headings", height=15)
-            for col in cols2:
-                tree_right.heading(col, text=col)
-                tree_right.column(col, width=(80 if col == "Piece ID" else 110))
-            tree_right.pack(padx=10, pady=(0, 10), fill=tk.BOTH, expand=True)
-            
-            def load_pieces_list():
-                for item in tree_left.get_children():
-                    tree_left.delete(item)
-                conn = sqlite3.connect(DB_FILE)
-                c = conn.cursor()
-                c.execute("SELECT id, nom, reference, prix_unitaire, quantite_stock FROM pieces ORDER BY nom")
-                rows = c.fetchall()
-                conn.close()
-                for row in rows:
-                    tree_left.insert("", tk.END, values=row)
-            
-            load_pieces_list()
-            
-            def select_for_intervention():
-                selected = tree_left.selection()
-                if not selected:
-                    messagebox.showwarning("Attention", "Sélectionnez une pièce à ajouter")
-                    return
-                values = tree_left.item(selected[0], 'values')
-                piece_id, name, ref, price, stock = values
-                
-                quantity_str = simpledialog.askstring("Quantité", 
-                                                      f"Quantité à utiliser pour '{name}' (stock {stock}) :", 
-                                                      parent=pieces_window)
-                if not quantity_str:
-                    return
-                
-                try:
-                    quantity = int(quantity_str)
-                    if quantity <= 0:
-                        raise ValueError("Quantité doit être positive")
-                    if quantity > int(stock):
-                        messagebox.showwarning("Stock insuffisant", 
-                                              f"Stock disponible: {stock}")
-                        return
-                except ValueError:
-                    messagebox.showwarning("Erreur", "Veuillez entrer un nombre valide")
-                    return
-                
-                for item in tree_right.get_children():
-                    item_values = tree_right.item(item, 'values')
-                    if int(item_values[0]) == int(piece_id):
-                        messagebox.showwarning("Doublon", 
-                                              f"Pièce '{name}' déjà sélectionnée")
-                        return
-                
-                total_cost = quantity * float(price)
-                tree_right.insert("", tk.END, values=(piece_id, name, quantity, price, f"{total_cost:.2f}"))
-                
-                selected_pieces.append({
-                    'piece_id': int(piece_id),
-                    'name': name,
-                    'price': float(price),
-                    'qty': quantity,
-                    'total_cost': total_cost
-                })
-            
-            def remove_from_intervention():
-                selected = tree_right.selection()
-                if not selected:
-                    messagebox.showwarning("Attention", "Sélectionnez une pièce à retirer")
-                    return
-                
-                values = tree_right.item(selected[0], 'values')
-                piece_id = int(values[0])
-                tree_right.delete(selected[0])
-                
-                nonlocal selected_pieces
-                selected_pieces = [p for p in selected_pieces if p['piece_id'] != piece_id]
-                load_pieces_list()
-            
-            def validate_selection():
-                conn = sqlite3.connect(DB_FILE)
-                c = conn.cursor()
-                valid = True
-                
-                for piece in selected_pieces:
-                    c.execute("SELECT quantite_stock FROM pieces WHERE id=?", (piece['piece_id'],))
-                    stock = c.fetchone()[0]
-                    if piece['qty'] > stock:
-                        messagebox.showerror("Stock insuffisant", 
-                                           f"Stock insuffisant pour '{piece['name']}'")
-                        valid = False
-                        break
-                
-                conn.close()
-                
-                if valid:
-                    pieces_window.destroy()
-            
-            middle_container = tk.Frame(main_container, bg=ProfessionalTheme.LIGHT)
-            middle_container.pack(side=tk.LEFT, fill=tk.Y, padx=10)
-            
-            ttk.Button(middle_container, text="→ Ajouter", command=select_for_intervention, 
-                      style="Success.TButton").pack(pady=5)
-            
-            ttk.Button(middle_container, text="← Retirer", command=remove_from_intervention, 
-                      style="Danger.TButton").pack(pady=5)
-            
-            bottom_container = tk.Frame(pieces_window, bg=ProfessionalTheme.LIGHT)
-            bottom_container.pack(fill=tk.X, padx=20, pady=(0, 20))
-            
-            ttk.Button(bottom_container, text="Valider", command=validate_selection, 
-                      style="Primary.TButton").pack(side=tk.RIGHT)
-            
-            load_pieces_list()
+            open_parts_picker(parent_window, "Associer des pièces à l'intervention", selected_pieces)
         
         def view_intervention_details():
             selected = tree.selection()
@@ -1684,73 +3366,68 @@ def show_equipment_history(equipment_id, serial_number):
                 details_container = tk.Frame(details_window, bg=ProfessionalTheme.WHITE, relief="raised", bd=1)
                 details_container.pack(fill=tk.BOTH, expand=True, padx=20, pady=20)
                 
-                conn = sqlite3.connect(DB_FILE)
-                c = conn.cursor()
-                c.execute('''SELECT date_entree, date_sortie, technicien, cout, details_reparation 
-                             FROM interventions WHERE id=?''', (intervention_id,))
-                intervention = c.fetchone()
-                
-                c.execute('''SELECT p.nom, ip.quantite_utilisee, p.prix_unitaire, ip.cout_total
-                             FROM intervention_pieces ip
-                             JOIN pieces p ON ip.piece_id = p.id
-                             WHERE ip.intervention_id=?''', (intervention_id,))
-                pieces = c.fetchall()
-                conn.close()
-                
-                basic_info = [
-                    ("Date d'entrée:", intervention[0]),
-                    ("Date de sortie:", intervention[1] or "N/A"),
-                    ("Technicien:", intervention[2] or "N/A"),
-                    (f"Coût total ({MONETARY_SYMBOL}):", f"{intervention[3]:.2f} {MONETARY_SYMBOL}")
-                ]
-                
-                for i, (label, value) in enumerate(basic_info):
-                    tk.Label(details_container, text=label, font=ProfessionalTheme.SUBTITLE_FONT, 
-                            bg=ProfessionalTheme.WHITE, fg=ProfessionalTheme.PRIMARY, 
-                            anchor="w").grid(row=i, column=0, sticky="w", pady=10, padx=20)
-                    tk.Label(details_container, text=value, font=ProfessionalTheme.BODY_FONT, 
-                            bg=ProfessionalTheme.WHITE, fg=ProfessionalTheme.DARK, 
-                            anchor="w").grid(row=i, column=1, sticky="w", pady=10, padx=(20, 20))
-                
-                tk.Label(details_container, text="Détails:", font=ProfessionalTheme.SUBTITLE_FONT, 
-                        bg=ProfessionalTheme.WHITE, fg=ProfessionalTheme.PRIMARY, 
-                        anchor="nw").grid(row=4, column=0, sticky="nw", pady=10, padx=20)
-                details_text = tk.Text(details_container, font=ProfessionalTheme.BODY_FONT, 
-                                      width=50, height=6, wrap=tk.WORD, bd=1, relief="solid", 
-                                      highlightthickness=0)
-                details_text.grid(row=4, column=1, pady=10, padx=(20, 20))
-                details_text.insert("1.0", intervention[4] or "")
-                details_text.config(state=tk.DISABLED)
-                
-                if pieces:
-                    tk.Label(details_container, text="Pièces utilisées:", font=ProfessionalTheme.SUBTITLE_FONT, 
-                            bg=ProfessionalTheme.WHITE, fg=ProfessionalTheme.PRIMARY, 
-                            anchor="w").grid(row=5, column=0, sticky="w", pady=10, padx=20)
+                def show_details(data):
+                    intervention, pieces = data
                     
-                    pieces_frame = tk.Frame(details_container, bg=ProfessionalTheme.WHITE)
-                    pieces_frame.grid(row=6, column=0, columnspan=2, sticky="ew", pady=(0, 20), padx=20)
+                    basic_info = [
+                        ("Date d'entrée:", intervention[0]),
+                        ("Date de sortie:", intervention[1] or "N/A"),
+                        ("Technicien:", intervention[2] or "N/A"),
+                        (f"Coût total ({MONETARY_SYMBOL}):", f"{intervention[3]:.2f} {MONETARY_SYMBOL}")
+                    ]
                     
-                    pieces_cols = ("Nom", "Quantité", f"Prix unitaire ({MONETARY_SYMBOL})", f"Coût total ({MONETARY_SYMBOL})")
-                    pieces_tree = ttk.Treeview(pieces_frame, columns=pieces_cols, show="headings", height=6)
-                    for col in pieces_cols:
-                        pieces_tree.heading(col, text=col)
-                        pieces_tree.column(col, width=120)
-                    pieces_tree.pack(fill=tk.BOTH, expand=True)
+                    for i, (label, value) in enumerate(basic_info):
+                        tk.Label(details_container, text=label, font=ProfessionalTheme.SUBTITLE_FONT, 
+                                bg=ProfessionalTheme.WHITE, fg=ProfessionalTheme.PRIMARY, 
+                                anchor="w").grid(row=i, column=0, sticky="w", pady=10, padx=20)
+                        tk.Label(details_container, text=value, font=ProfessionalTheme.BODY_FONT, 
+                                bg=ProfessionalTheme.WHITE, fg=ProfessionalTheme.DARK, 
+                                anchor="w").grid(row=i, column=1, sticky="w", pady=10, padx=(20, 20))
                     
-                    for piece in pieces:
-                        pieces_tree.insert("", tk.END, values=piece)
+                    tk.Label(details_container, text="Détails:", font=ProfessionalTheme.SUBTITLE_FONT, 
+                            bg=ProfessionalTheme.WHITE, fg=ProfessionalTheme.PRIMARY, 
+                            anchor="nw").grid(row=4, column=0, sticky="nw", pady=10, padx=20)
+                    details_text = tk.Text(details_container, font=ProfessionalTheme.BODY_FONT, 
+                                          width=50, height=6, wrap=tk.WORD, bd=1, relief="solid", 
+                                          highlightthickness=0)
+                    details_text.grid(row=4, column=1, pady=10, padx=(20, 20))
+                    details_text.insert("1.0", intervention[4] or "")
+                    details_text.config(state=tk.DISABLED)
+                    
+                    if pieces:
+                        tk.Label(details_container, text="Pièces utilisées:", font=ProfessionalTheme.SUBTITLE_FONT, 
+                                bg=ProfessionalTheme.WHITE, fg=ProfessionalTheme.PRIMARY, 
+                                anchor="w").grid(row=5, column=0, sticky="w", pady=10, padx=20)
+                        
+                        pieces_frame = tk.Frame(details_container, bg=ProfessionalTheme.WHITE)
+                        pieces_frame.grid(row=6, column=0, columnspan=2, sticky="ew", pady=(0, 20), padx=20)
+                        
+                        pieces_cols = ("Nom", "Quantité", f"Prix unitaire ({MONETARY_SYMBOL})", f"Coût total ({MONETARY_SYMBOL})")
+                        pieces_tree = ttk.Treeview(pieces_frame, columns=pieces_cols, show="headings", height=6)
+                        for col in pieces_cols:
+                            pieces_tree.heading(col, text=col)
+                            pieces_tree.column(col, width=120)
+                        pieces_tree.pack(fill=tk.BOTH, expand=True)
+                        
+                        for piece in pieces:
+                            pieces_tree.insert("", tk.END, values=piece)
+                    
+                    details_container.columnconfigure(1, weight=1)
                 
-                details_container.columnconfigure(1, weight=1)
+                db_executor.submit(lambda: (intervention_service.get(intervention_id), 
+                                            [piece[1:] for piece in intervention_service.get_pieces(intervention_id)]), 
+                                   on_success=show_details, widget=details_window, 
+                                   key=f"load_intervention_details_{intervention_id}")
                 
                 return details_window
             
             window_manager.open_window(f"intervention_details_{intervention_id}", create_details_window)
         
         def add_intervention():
-            if not current_user['permissions']['can_add_interventions']:
+            if not has_permission('can_add_interventions'):
                 messagebox.showwarning("Accès refusé", "Vous n'avez pas la permission d'ajouter des interventions")
                 return
-                
+            
             nonlocal selected_pieces
             selected_pieces = []
             
@@ -1832,38 +3509,16 @@ def show_equipment_history(equipment_id, serial_number):
                         messagebox.showwarning("Erreur", "Format de date invalide (YYYY-MM-DD)")
                         return
                     
-                    conn = sqlite3.connect(DB_FILE)
-                    c = conn.cursor()
-                    c.execute('''INSERT INTO interventions 
-                              (equipement_id, date_entree, date_sortie, details_reparation, technicien, cout) 
-                              VALUES (?, ?, ?, ?, ?, ?)''',
-                              (equipment_id, date_in, date_out, details, technician, cost))
-                    intervention_id = c.lastrowid
-                    conn.commit()
+                    def done(result):
+                        confirm_reservations(selected_pieces)
+                        messagebox.showinfo("Succès", "Intervention enregistrée avec succès!")
+                        add_window.destroy()
+                        refresh_interventions()
                     
-                    total_pieces_cost = 0
-                    if selected_pieces:
-                        for piece in selected_pieces:
-                            c.execute('''INSERT INTO intervention_pieces 
-                                      (intervention_id, piece_id, quantite_utilisee, cout_total) 
-                                      VALUES (?, ?, ?, ?)''',
-                                      (intervention_id, piece['piece_id'], piece['qty'], piece['total_cost']))
-                            
-                            c.execute("SELECT quantite_stock FROM pieces WHERE id=?", (piece['piece_id'],))
-                            current_stock = c.fetchone()[0]
-                            new_stock = current_stock - piece['qty']
-                            c.execute("UPDATE pieces SET quantite_stock=? WHERE id=?", 
-                                     (new_stock, piece['piece_id']))
-                        
-                        total_cost = cost + sum(p['total_cost'] for p in selected_pieces)
-                        c.execute("UPDATE interventions SET cout=? WHERE id=?", (total_cost, intervention_id))
-                    
-                    conn.commit()
-                    conn.close()
-                    
-                    messagebox.showinfo("Succès", "Intervention enregistrée avec succès!")
-                    add_window.destroy()
-                    refresh_interventions()
+                    db_executor.submit(intervention_service.create, equipment_id, date_in, date_out, details, 
+                                       technician, cost, list(selected_pieces), 
+                                       on_success=done, on_error=on_stock_error, widget=add_window, 
+                                       key=f"save_intervention_{equipment_id}")
                 
                 button_frame = tk.Frame(form_container, bg=ProfessionalTheme.WHITE)
                 button_frame.grid(row=5, column=0, columnspan=2, pady=20)
@@ -1880,15 +3535,21 @@ def show_equipment_history(equipment_id, serial_number):
                 
                 form_container.columnconfigure(1, weight=1)
                 
+                def on_destroy(event):
+                    if event.widget is add_window:
+                        release_reservations(selected_pieces)
+                
+                add_window.bind("<Destroy>", on_destroy)
+                
                 return add_window
             
             window_manager.open_window(f"add_intervention_{equipment_id}", create_add_window)
         
         def edit_intervention():
-            if not current_user['permissions']['can_edit_interventions']:
+            if not has_permission('can_edit_interventions'):
                 messagebox.showwarning("Accès refusé", "Vous n'avez pas la permission de modifier des interventions")
                 return
-                
+            
             selected = tree.selection()
             if not selected:
                 messagebox.showwarning("Attention", "Sélectionnez une intervention à modifier")
@@ -1897,7 +3558,7 @@ def show_equipment_history(equipment_id, serial_number):
             values = tree.item(selected[0], 'values')
             intervention_id = values[0]
             
-            def create_edit_window():
+            def create_edit_window(intervention, original_pieces):
                 edit_window = tk.Toplevel(history_window)
                 edit_window.title("Modifier une intervention")
                 edit_window.geometry("600x600")
@@ -1914,19 +3575,6 @@ def show_equipment_history(equipment_id, serial_number):
                 form_container = tk.Frame(edit_window, bg=ProfessionalTheme.WHITE, relief="raised", bd=1)
                 form_container.pack(fill=tk.BOTH, expand=True, padx=20, pady=20)
                 
-                conn = sqlite3.connect(DB_FILE)
-                c = conn.cursor()
-                c.execute('''SELECT date_entree, date_sortie, technicien, cout, details_reparation 
-                             FROM interventions WHERE id=?''', (intervention_id,))
-                intervention = c.fetchone()
-                
-                c.execute('''SELECT ip.piece_id, p.nom, ip.quantite_utilisee, p.prix_unitaire, ip.cout_total
-                             FROM intervention_pieces ip
-                             JOIN pieces p ON ip.piece_id = p.id
-                             WHERE ip.intervention_id=?''', (intervention_id,))
-                original_pieces = c.fetchall()
-                conn.close()
-                
                 selected_pieces = []
                 for piece in original_pieces:
                     piece_dict = {
@@ -2003,195 +3651,28 @@ def show_equipment_history(equipment_id, serial_number):
                         messagebox.showwarning("Erreur", "Format de date invalide (YYYY-MM-DD)")
                         return
                     
-                    conn = sqlite3.connect(DB_FILE)
-                    c = conn.cursor()
-                    
-                    for piece in original_pieces:
-                        c.execute("SELECT quantite_stock FROM pieces WHERE id=?", (piece[0],))
-                        current_stock = c.fetchone()[0]
-                        new_stock = current_stock + piece[2]
-                        c.execute("UPDATE pieces SET quantite_stock=? WHERE id=?", (new_stock, piece[0]))
-                    
-                    c.execute("DELETE FROM intervention_pieces WHERE intervention_id=?", (intervention_id,))
+                    def done(result):
+                        confirm_reservations(selected_pieces)
+                        messagebox.showinfo("Succès", "Intervention modifiée avec succès!")
+                        edit_window.destroy()
+                        refresh_interventions()
                     
-                    c.execute('''UPDATE interventions SET 
-                              date_entree=?, date_sortie=?, details_reparation=?, technicien=?, cout=? 
-                              WHERE id=?''',
-                              (date_in, date_out, details, technician, cost, intervention_id))
+                    def failed(error):
+                        if isinstance(error, ConflictError):
+                            resolve_conflict(edit_window, error, lambda: submit(None), edit_intervention)
+                        else:
+                            on_stock_error(error)
                     
-                    total_pieces_cost = 0
-                    if selected_pieces:
-                        for piece in selected_pieces:
-                            c.execute('''INSERT INTO intervention_pieces 
-                                      (intervention_id, piece_id, quantite_utilisee, cout_total) 
-                                      VALUES (?, ?, ?, ?)''',
-                                      (intervention_id, piece['piece_id'], piece['qty'], piece['total_cost']))
-                            
-                            c.execute("SELECT quantite_stock FROM pieces WHERE id=?", (piece['piece_id'],))
-                            current_stock = c.fetchone()[0]
-                            new_stock = current_stock - piece['qty']
-                            c.execute("UPDATE pieces SET quantite_stock=? WHERE id=?", 
-                                     (new_stock, piece['piece_id']))
+                    def submit(version):
+                        db_executor.submit(intervention_service.update, intervention_id, date_in, date_out, details, 
+                                           technician, cost, list(selected_pieces), version, 
+                                           on_success=done, on_error=failed, widget=edit_window, 
+                                           key=f"save_intervention_edits_{intervention_id}")
                     
-                    conn.commit()
-                    conn.close()
-                    
-                    messagebox.showinfo("Succès", "Intervention modifiée avec succès!")
-                    edit_window.destroy()
-                    refresh_interventions()
+                    submit(intervention[5])
                 
                 def manage_pieces():
-                    def manage_used_pieces_edit(parent_window):
-                        for child in parent_window.winfo_children():
-                            if isinstance(child, tk.Toplevel) and hasattr(child, 'pieces_selection_edit'):
-                                child.lift()
-                                child.focus_force()
-                                return
-                        
-                        pieces_window = tk.Toplevel(parent_window)
-                        pieces_window.title("Gérer les pièces utilisées")
-                        pieces_window.geometry("900x500")
-                        pieces_window.configure(bg=ProfessionalTheme.LIGHT)
-                        pieces_window.pieces_selection_edit = True
-                        
-                        header_frame = tk.Frame(pieces_window, bg=ProfessionalTheme.PRIMARY, height=50)
-                        header_frame.pack(fill=tk.X)
-                        header_frame.pack_propagate(False)
-                        
-                        tk.Label(header_frame, text="Gérer les pièces utilisées", 
-                                font=ProfessionalTheme.SUBTITLE_FONT, bg=ProfessionalTheme.PRIMARY, 
-                                fg=ProfessionalTheme.WHITE).pack(side=tk.LEFT, padx=20, pady=12)
-                        
-                        main_container = tk.Frame(pieces_window, bg=ProfessionalTheme.LIGHT)
-                        main_container.pack(fill=tk.BOTH, expand=True, padx=20, pady=20)
-                        
-                        left_frame = tk.Frame(main_container, bg=ProfessionalTheme.WHITE, relief="raised", bd=1)
-                        left_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=(0, 10))
-                        
-                        tk.Label(left_frame, text="Pièces disponibles", font=ProfessionalTheme.SUBTITLE_FONT, 
-                                bg=ProfessionalTheme.WHITE, fg=ProfessionalTheme.PRIMARY).pack(pady=10)
-                        
-                        cols = ("ID", "Nom", "Réf", f"Prix ({MONETARY_SYMBOL})", "Stock")
-                        tree_left = ttk.Treeview(left_frame, columns=cols, show="headings", height=15)
-                        for col in cols:
-                            tree_left.heading(col, text=col)
-                            tree_left.column(col, width=(50 if col == "ID" else 120))
-                        tree_left.pack(padx=10, pady=(0, 10), fill=tk.BOTH, expand=True)
-                        
-                        right_frame = tk.Frame(main_container, bg=ProfessionalTheme.WHITE, relief="raised", bd=1)
-                        right_frame.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True)
-                        
-                        tk.Label(right_frame, text="Pièces sélectionnées", font=ProfessionalTheme.SUBTITLE_FONT, 
-                                bg=ProfessionalTheme.WHITE, fg=ProfessionalTheme.PRIMARY).pack(pady=10)
-                        
-                        cols2 = ("Piece ID", "Nom", "Quantité", f"Prix unitaire ({MONETARY_SYMBOL})", f"Coût total ({MONETARY_SYMBOL})")
-                        tree_right = ttk.Treeview(right_frame, columns=cols2, show="headings", height=15)
-                        for col in cols2:
-                            tree_right.heading(col, text=col)
-                            tree_right.column(col, width=(80 if col == "Piece ID" else 110))
-                        tree_right.pack(padx=10, pady=(0, 10), fill=tk.BOTH, expand=True)
-                        
-                        def load_all_pieces():
-                            for item in tree_left.get_children():
-                                tree_left.delete(item)
-                            conn = sqlite3.connect(DB_FILE)
-                            c = conn.cursor()
-                            c.execute("SELECT id, nom, reference, prix_unitaire, quantite_stock FROM pieces ORDER BY nom")
-                            rows = c.fetchall()
-                            conn.close()
-                            for row in rows:
-                                tree_left.insert("", tk.END, values=row)
-                        
-                        def load_selected_pieces():
-                            for item in tree_right.get_children():
-                                tree_right.delete(item)
-                            for piece in selected_pieces:
-                                tree_right.insert("", tk.END, values=(
-                                    piece['piece_id'], piece['name'], piece['qty'], 
-                                    f"{piece['price']:.2f}", f"{piece['total_cost']:.2f}"
-                                ))
-                        
-                        def add_piece():
-                            selected = tree_left.selection()
-                            if not selected:
-                                messagebox.showwarning("Attention", "Sélectionnez une pièce à ajouter")
-                                return
-                            values = tree_left.item(selected[0], 'values')
-                            piece_id, name, ref, price, stock = values
-                            
-                            quantity_str = simpledialog.askstring("Quantité", 
-                                                                  f"Quantité à utiliser pour '{name}' (stock {stock}) :", 
-                                                                  parent=pieces_window)
-                            if not quantity_str:
-                                return
-                            
-                            try:
-                                quantity = int(quantity_str)
-                                if quantity <= 0:
-                                    raise ValueError("Quantité doit être positive")
-                                if quantity > int(stock):
-                                    messagebox.showwarning("Stock insuffisant", 
-                                                          f"Stock disponible: {stock}")
-                                    return
-                            except ValueError:
-                                messagebox.showwarning("Erreur", "Veuillez entrer un nombre valide")
-                                return
-                            
-                            for item in tree_right.get_children():
-                                item_values = tree_right.item(item, 'values')
-                                if int(item_values[0]) == int(piece_id):
-                                    messagebox.showwarning("Doublon", 
-                                                          f"Pièce '{name}' déjà sélectionnée")
-                                    return
-                            
-                            total_cost = quantity * float(price)
-                            tree_right.insert("", tk.END, values=(piece_id, name, quantity, price, f"{total_cost:.2f}"))
-                            
-                            nonlocal selected_pieces
-                            selected_pieces.append({
-                                'piece_id': int(piece_id),
-                                'name': name,
-                                'price': float(price),
-                                'qty': quantity,
-                                'total_cost': total_cost
-                            })
-                        
-                        def remove_piece():
-                            selected = tree_right.selection()
-                            if not selected:
-                                messagebox.showwarning("Attention", "Sélectionnez une pièce à retirer")
-                                return
-                            
-                            values = tree_right.item(selected[0], 'values')
-                            piece_id = int(values[0])
-                            tree_right.delete(selected[0])
-                            
-                            nonlocal selected_pieces
-                            selected_pieces = [p for p in selected_pieces if p['piece_id'] != piece_id]
-                            load_all_pieces()
-                        
-                        def save_selection():
-                            pieces_window.destroy()
-                            
-                        middle_container = tk.Frame(main_container, bg=ProfessionalTheme.LIGHT)
-                        middle_container.pack(side=tk.LEFT, fill=tk.Y, padx=10)
-                        
-                        ttk.Button(middle_container, text="→ Ajouter", command=add_piece, 
-                                  style="Success.TButton").pack(pady=5)
-                        
-                        ttk.Button(middle_container, text="← Retirer", command=remove_piece, 
-                                  style="Danger.TButton").pack(pady=5)
-                        
-                        bottom_container = tk.Frame(pieces_window, bg=ProfessionalTheme.LIGHT)
-                        bottom_container.pack(fill=tk.X, padx=20, pady=(0, 20))
-                        
-                        ttk.Button(bottom_container, text="Valider", command=save_selection, 
-                                  style="Primary.TButton").pack(side=tk.RIGHT)
-                        
-                        load_all_pieces()
-                        load_selected_pieces()
-                    
-                    manage_used_pieces_edit(edit_window)
+                    open_parts_picker(edit_window, "Gérer les pièces utilisées", selected_pieces)
                 
                 button_frame = tk.Frame(form_container, bg=ProfessionalTheme.WHITE)
                 button_frame.grid(row=5, column=0, columnspan=2, pady=20)
@@ -2208,15 +3689,26 @@ def show_equipment_history(equipment_id, serial_number):
                 
                 form_container.columnconfigure(1, weight=1)
                 
+                def on_destroy(event):
+                    if event.widget is edit_window:
+                        release_reservations(selected_pieces)
+                
+                edit_window.bind("<Destroy>", on_destroy)
+                
                 return edit_window
             
-            window_manager.open_window(f"edit_intervention_{intervention_id}", create_edit_window)
+            def loaded(data):
+                window_manager.open_window(f"edit_intervention_{intervention_id}", partial(create_edit_window, *data))
+            
+            db_executor.submit(lambda: (intervention_service.get(intervention_id), 
+                                        intervention_service.get_pieces(intervention_id)), 
+                               on_success=loaded, widget=history_window, key=f"load_intervention_{intervention_id}")
         
         def delete_intervention():
-            if not current_user['permissions']['can_delete_interventions']:
+            if not has_permission('can_delete_interventions'):
                 messagebox.showwarning("Accès refusé", "Vous n'avez pas la permission de supprimer des interventions")
                 return
-                
+            
             selected = tree.selection()
             if not selected:
                 messagebox.showwarning("Attention", "Sélectionnez une intervention à supprimer")
@@ -2228,44 +3720,33 @@ def show_equipment_history(equipment_id, serial_number):
             values = tree.item(selected[0], 'values')
             intervention_id = values[0]
             
-            conn = sqlite3.connect(DB_FILE)
-            c = conn.cursor()
-            
-            c.execute("SELECT piece_id, quantite_utilisee FROM intervention_pieces WHERE intervention_id=?", (intervention_id,))
-            used_pieces = c.fetchall()
+            def done(result):
+                messagebox.showinfo("Succès", "Intervention supprimée avec succès!")
+                refresh_interventions()
             
-            for piece_id, quantity in used_pieces:
-                c.execute("SELECT quantite_stock FROM pieces WHERE id=?", (piece_id,))
-                current_stock = c.fetchone()[0]
-                new_stock = current_stock + quantity
-                c.execute("UPDATE pieces SET quantite_stock=? WHERE id=?", (new_stock, piece_id))
-            
-            c.execute("DELETE FROM intervention_pieces WHERE intervention_id=?", (intervention_id,))
-            c.execute("DELETE FROM interventions WHERE id=?", (intervention_id,))
-            conn.commit()
-            conn.close()
-            
-            messagebox.showinfo("Succès", "Intervention supprimée avec succès!")
-            refresh_interventions()
+            db_executor.submit(intervention_service.delete, intervention_id, on_success=done, widget=tree, 
+                               key=f"delete_intervention_{intervention_id}")
         
-        if current_user['permissions']['can_add_interventions']:
+        if has_permission('can_add_interventions'):
             ttk.Button(button_frame, text="➕ Ajouter Intervention", command=add_intervention, 
                       style="Success.TButton").pack(side=tk.LEFT, padx=(0, 10))
         
-        if current_user['permissions']['can_edit_interventions']:
+        if has_permission('can_edit_interventions'):
             ttk.Button(button_frame, text="✏️ Modifier", command=edit_intervention, 
                       style="Warning.TButton").pack(side=tk.LEFT, padx=(0, 10))
         
         ttk.Button(button_frame, text="👁 Voir Détails", command=view_intervention_details, 
                   style="Primary.TButton").pack(side=tk.LEFT, padx=(0, 10))
         
-        if current_user['permissions']['can_delete_interventions']:
+        if has_permission('can_delete_interventions'):
             ttk.Button(button_frame, text="🗑 Supprimer", command=delete_intervention, 
                       style="Danger.TButton").pack(side=tk.LEFT, padx=(0, 10))
         
         ttk.Button(button_frame, text="🔄 Rafraîchir", command=refresh_interventions, 
                   style="Primary.TButton").pack(side=tk.LEFT)
         
+        tree.bind('<Double-1>', lambda event: view_intervention_details())
+        
         refresh_interventions()
         
         # Preventive Maintenance Tab
@@ -2290,26 +3771,23 @@ def show_equipment_history(equipment_id, serial_number):
         maint_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         
         def refresh_maintenance():
-            for item in tree_maint.get_children():
-                tree_maint.delete(item)
-            conn = sqlite3.connect(DB_FILE)
-            c = conn.cursor()
-            c.execute('''SELECT id, date_prevue, type_maintenance, technicien, statut, notes 
-                         FROM planification WHERE equipement_id=? ORDER BY date_prevue''', (equipment_id,))
-            maintenances = c.fetchall()
-            conn.close()
-            for maintenance in maintenances:
-                tree_maint.insert("", tk.END, values=maintenance)
+            def fill(maintenances):
+                for item in tree_maint.get_children():
+                    tree_maint.delete(item)
+                for maintenance in maintenances:
+                    tree_maint.insert("", tk.END, values=maintenance)
+            
+            db_executor.submit(planning_service.list_for_equipment, equipment_id, on_success=fill, widget=tree_maint, key=f"refresh_maintenance_{equipment_id}", replace=True)
         
         def add_maintenance():
-            if not current_user['permissions']['can_add_interventions']:
+            if not has_permission('can_add_interventions'):
                 messagebox.showwarning("Accès refusé", "Vous n'avez pas la permission d'ajouter des maintenances")
                 return
-                
+            
             def create_add_maint_window():
                 add_maint_window = tk.Toplevel(history_window)
                 add_maint_window.title("Planifier une maintenance")
-                add_maint_window.geometry("500x500")
+                add_maint_window.geometry("500x560")
                 add_maint_window.configure(bg=ProfessionalTheme.LIGHT)
                 
                 header_frame = tk.Frame(add_maint_window, bg=ProfessionalTheme.PRIMARY, height=50)
@@ -2341,8 +3819,7 @@ def show_equipment_history(equipment_id, serial_number):
                 tk.Label(form_container, text="Technicien:", font=ProfessionalTheme.BODY_FONT, 
                         bg=ProfessionalTheme.WHITE, fg=ProfessionalTheme.DARK).grid(
                     row=2, column=0, sticky="w", padx=20, pady=12)
-                entry_tech = tk.Entry(form_container, font=ProfessionalTheme.BODY_FONT, 
-                                     bd=1, relief="solid", highlightthickness=0)
+                entry_tech = ttk.Combobox(form_container, values=technician_names(), font=ProfessionalTheme.BODY_FONT)
                 entry_tech.grid(row=2, column=1, padx=20, pady=12, sticky="ew")
                 
                 tk.Label(form_container, text="Statut:", font=ProfessionalTheme.BODY_FONT, 
@@ -2352,12 +3829,19 @@ def show_equipment_history(equipment_id, serial_number):
                 combo_status.grid(row=3, column=1, padx=20, pady=12, sticky="ew")
                 combo_status.set("Planifié")
                 
+                tk.Label(form_container, text="Durée estimée (h):", font=ProfessionalTheme.BODY_FONT, 
+                        bg=ProfessionalTheme.WHITE, fg=ProfessionalTheme.DARK).grid(
+                    row=4, column=0, sticky="w", padx=20, pady=12)
+                entry_duration = tk.Entry(form_container, font=ProfessionalTheme.BODY_FONT, 
+                                         bd=1, relief="solid", highlightthickness=0)
+                entry_duration.grid(row=4, column=1, padx=20, pady=12, sticky="ew")
+                
                 tk.Label(form_container, text="Notes:", font=ProfessionalTheme.BODY_FONT, 
                         bg=ProfessionalTheme.WHITE, fg=ProfessionalTheme.DARK).grid(
-                    row=4, column=0, sticky="nw", padx=20, pady=12)
+                    row=5, column=0, sticky="nw", padx=20, pady=12)
                 text_notes = tk.Text(form_container, font=ProfessionalTheme.BODY_FONT, 
                                    bd=1, relief="solid", highlightthickness=0, height=6)
-                text_notes.grid(row=4, column=1, padx=20, pady=12, sticky="ew")
+                text_notes.grid(row=5, column=1, padx=20, pady=12, sticky="ew")
                 
                 def save_maintenance():
                     date = entry_date.get().strip()
@@ -2376,21 +3860,26 @@ def show_equipment_history(equipment_id, serial_number):
                         messagebox.showwarning("Erreur", "Format de date invalide (YYYY-MM-DD)")
                         return
                     
-                    conn = sqlite3.connect(DB_FILE)
-                    c = conn.cursor()
-                    c.execute('''INSERT INTO planification 
-                              (equipement_id, date_prevue, type_maintenance, technicien, statut, notes) 
-                              VALUES (?, ?, ?, ?, ?, ?)''',
-                              (equipment_id, date, maint_type, technician, status, notes))
-                    conn.commit()
-                    conn.close()
+                    try:
+                        duration = float(entry_duration.get().strip().replace(",", ".") or 0) or None
+                        if duration is not None and duration < 0:
+                            raise ValueError
+                    except ValueError:
+                        messagebox.showwarning("Erreur", "Durée estimée invalide (heures)")
+                        return
+                    
+                    def done(result):
+                        messagebox.showinfo("Succès", "Maintenance planifiée avec succès!")
+                        add_maint_window.destroy()
+                        refresh_maintenance()
+                        reminder_scheduler.invalidate()
                     
-                    messagebox.showinfo("Succès", "Maintenance planifiée avec succès!")
-                    add_maint_window.destroy()
-                    refresh_maintenance()
+                    db_executor.submit(planning_service.create, equipment_id, date, maint_type, technician, status, notes, 
+                                       duration, on_success=done, widget=add_maint_window, 
+                                       key=f"save_maintenance_{equipment_id}")
                 
                 button_frame = tk.Frame(form_container, bg=ProfessionalTheme.WHITE)
-                button_frame.grid(row=5, column=0, columnspan=2, pady=20)
+                button_frame.grid(row=6, column=0, columnspan=2, pady=20)
                 
                 ttk.Button(button_frame, text="Sauvegarder", command=save_maintenance, 
                           style="Success.TButton").pack(side=tk.LEFT, padx=(0, 10))
@@ -2404,10 +3893,10 @@ def show_equipment_history(equipment_id, serial_number):
             window_manager.open_window(f"add_maintenance_{equipment_id}", create_add_maint_window)
         
         def edit_maintenance():
-            if not current_user['permissions']['can_edit_interventions']:
+            if not has_permission('can_edit_interventions'):
                 messagebox.showwarning("Accès refusé", "Vous n'avez pas la permission de modifier des maintenances")
                 return
-                
+            
             selected = tree_maint.selection()
             if not selected:
                 messagebox.showwarning("Attention", "Sélectionnez une maintenance à modifier")
@@ -2416,10 +3905,10 @@ def show_equipment_history(equipment_id, serial_number):
             values = tree_maint.item(selected[0], 'values')
             maintenance_id = values[0]
             
-            def create_edit_maint_window():
+            def create_edit_maint_window(maintenance):
                 edit_maint_window = tk.Toplevel(history_window)
                 edit_maint_window.title("Modifier une maintenance")
-                edit_maint_window.geometry("500x500")
+                edit_maint_window.geometry("500x560")
                 edit_maint_window.configure(bg=ProfessionalTheme.LIGHT)
                 
                 header_frame = tk.Frame(edit_maint_window, bg=ProfessionalTheme.PRIMARY, height=50)
@@ -2433,13 +3922,6 @@ def show_equipment_history(equipment_id, serial_number):
                 form_container = tk.Frame(edit_maint_window, bg=ProfessionalTheme.WHITE, relief="raised", bd=1)
                 form_container.pack(fill=tk.BOTH, expand=True, padx=20, pady=20)
                 
-                conn = sqlite3.connect(DB_FILE)
-                c = conn.cursor()
-                c.execute('''SELECT date_prevue, type_maintenance, technicien, statut, notes 
-                             FROM planification WHERE id=?''', (maintenance_id,))
-                maintenance = c.fetchone()
-                conn.close()
-                
                 tk.Label(form_container, text="Date prévue *:", font=ProfessionalTheme.BODY_FONT, 
                         bg=ProfessionalTheme.WHITE, fg=ProfessionalTheme.DARK).grid(
                     row=0, column=0, sticky="w", padx=20, pady=12)
@@ -2459,8 +3941,7 @@ def show_equipment_history(equipment_id, serial_number):
                 tk.Label(form_container, text="Technicien:", font=ProfessionalTheme.BODY_FONT, 
                         bg=ProfessionalTheme.WHITE, fg=ProfessionalTheme.DARK).grid(
                     row=2, column=0, sticky="w", padx=20, pady=12)
-                entry_tech = tk.Entry(form_container, font=ProfessionalTheme.BODY_FONT, 
-                                     bd=1, relief="solid", highlightthickness=0)
+                entry_tech = ttk.Combobox(form_container, values=technician_names(), font=ProfessionalTheme.BODY_FONT)
                 entry_tech.grid(row=2, column=1, padx=20, pady=12, sticky="ew")
                 entry_tech.insert(0, maintenance[2] or "")
                 
@@ -2471,13 +3952,22 @@ def show_equipment_history(equipment_id, serial_number):
                 combo_status.grid(row=3, column=1, padx=20, pady=12, sticky="ew")
                 combo_status.set(maintenance[3] or "Planifié")
                 
+                tk.Label(form_container, text="Durée estimée (h):", font=ProfessionalTheme.BODY_FONT, 
+                        bg=ProfessionalTheme.WHITE, fg=ProfessionalTheme.DARK).grid(
+                    row=4, column=0, sticky="w", padx=20, pady=12)
+                entry_duration = tk.Entry(form_container, font=ProfessionalTheme.BODY_FONT, 
+                                         bd=1, relief="solid", highlightthickness=0)
+                entry_duration.grid(row=4, column=1, padx=20, pady=12, sticky="ew")
+                
                 tk.Label(form_container, text="Notes:", font=ProfessionalTheme.BODY_FONT, 
                         bg=ProfessionalTheme.WHITE, fg=ProfessionalTheme.DARK).grid(
-                    row=4, column=0, sticky="nw", padx=20, pady=12)
+                    row=5, column=0, sticky="nw", padx=20, pady=12)
                 text_notes = tk.Text(form_container, font=ProfessionalTheme.BODY_FONT, 
                                    bd=1, relief="solid", highlightthickness=0, height=6)
-                text_notes.grid(row=4, column=1, padx=20, pady=12, sticky="ew")
+                text_notes.grid(row=5, column=1, padx=20, pady=12, sticky="ew")
                 text_notes.insert("1.0", maintenance[4] or "")
+                if maintenance[6] is not None:
+                    entry_duration.insert(0, f"{maintenance[6]:g}")
                 
                 def save_edits():
                     date = entry_date.get().strip()
@@ -2496,21 +3986,35 @@ def show_equipment_history(equipment_id, serial_number):
                         messagebox.showwarning("Erreur", "Format de date invalide (YYYY-MM-DD)")
                         return
                     
-                    conn = sqlite3.connect(DB_FILE)
-                    c = conn.cursor()
-                    c.execute('''UPDATE planification SET 
-                              date_prevue=?, type_maintenance=?, technicien=?, statut=?, notes=? 
-                              WHERE id=?''',
-                              (date, maint_type, technician, status, notes, maintenance_id))
-                    conn.commit()
-                    conn.close()
+                    try:
+                        duration = float(entry_duration.get().strip().replace(",", ".") or 0) or None
+                        if duration is not None and duration < 0:
+                            raise ValueError
+                    except ValueError:
+                        messagebox.showwarning("Erreur", "Durée estimée invalide (heures)")
+                        return
+                    
+                    def done(result):
+                        messagebox.showinfo("Succès", "Maintenance modifiée avec succès!")
+                        edit_maint_window.destroy()
+                        refresh_maintenance()
+                        reminder_scheduler.invalidate()
+                    
+                    def failed(error):
+                        if isinstance(error, ConflictError):
+                            resolve_conflict(edit_maint_window, error, lambda: submit(None), edit_maintenance)
+                        else:
+                            messagebox.showerror("Erreur", f"Une erreur est survenue: {str(error)}")
+                    
+                    def submit(version):
+                        db_executor.submit(planning_service.update, maintenance_id, date, maint_type, technician, status, 
+                                           notes, version, duration, on_success=done, on_error=failed, widget=edit_maint_window, 
+                                           key=f"save_maintenance_edits_{maintenance_id}")
                     
-                    messagebox.showinfo("Succès", "Maintenance modifiée avec succès!")
-                    edit_maint_window.destroy()
-                    refresh_maintenance()
+                    submit(maintenance[5])
                 
                 button_frame = tk.Frame(form_container, bg=ProfessionalTheme.WHITE)
-                button_frame.grid(row=5, column=0, columnspan=2, pady=20)
+                button_frame.grid(row=6, column=0, columnspan=2, pady=20)
                 
                 ttk.Button(button_frame, text="Sauvegarder", command=save_edits, 
                           style="Success.TButton").pack(side=tk.LEFT, padx=(0, 10))
@@ -2521,13 +4025,18 @@ def show_equipment_history(equipment_id, serial_number):
                 
                 return edit_maint_window
             
-            window_manager.open_window(f"edit_maintenance_{maintenance_id}", create_edit_maint_window)
+            def loaded(maintenance):
+                window_manager.open_window(f"edit_maintenance_{maintenance_id}", 
+                                           partial(create_edit_maint_window, maintenance))
+            
+            db_executor.submit(planning_service.get, maintenance_id, on_success=loaded, widget=history_window, 
+                               key=f"load_maintenance_{maintenance_id}")
         
         def delete_maintenance():
-            if not current_user['permissions']['can_delete_interventions']:
+            if not has_permission('can_delete_interventions'):
                 messagebox.showwarning("Accès refusé", "Vous n'avez pas la permission de supprimer des maintenances")
                 return
-                
+            
             selected = tree_maint.selection()
             if not selected:
                 messagebox.showwarning("Attention", "Sélectionnez une maintenance à supprimer")
@@ -2539,27 +4048,51 @@ def show_equipment_history(equipment_id, serial_number):
             values = tree_maint.item(selected[0], 'values')
             maintenance_id = values[0]
             
-            conn = sqlite3.connect(DB_FILE)
-            c = conn.cursor()
-            c.execute("DELETE FROM planification WHERE id=?", (maintenance_id,))
-            conn.commit()
-            conn.close()
+            def done(result):
+                messagebox.showinfo("Succès", "Maintenance supprimée avec succès!")
+                refresh_maintenance()
+                reminder_scheduler.invalidate()
             
-            messagebox.showinfo("Succès", "Maintenance supprimée avec succès!")
-            refresh_maintenance()
+            db_executor.submit(planning_service.delete, maintenance_id, on_success=done, widget=tree_maint, 
+                               key=f"delete_maintenance_{maintenance_id}")
         
-        if current_user['permissions']['can_add_interventions']:
+        def record_hours():
+            # Plans counted in operating hours are rescheduled from the new usage rate
+            def done(result):
+                refresh_maintenance()
+                reminder_scheduler.invalidate()
+            
+            def ask(last):
+                prompt = "Compteur d'heures de fonctionnement:"
+                if last:
+                    prompt += f"\n(dernier relevé: {last[1]:g} h le {last[0]})"
+                hours = simpledialog.askfloat("Relevé d'heures", prompt, parent=history_window, 
+                                              minvalue=last[1] if last else 0)
+                if hours is None:
+                    return
+                
+                db_executor.submit(planning_service.record_hours, equipment_id, datetime.now().strftime("%Y-%m-%d"), 
+                                   hours, on_success=done, widget=tree_maint, key=f"record_hours_{equipment_id}")
+            
+            db_executor.submit(planning_service.last_hours, equipment_id, on_success=ask, widget=tree_maint, 
+                               key=f"last_hours_{equipment_id}")
+        
+        if has_permission('can_add_interventions'):
             ttk.Button(button_frame, text="➕ Planifier Maintenance", command=add_maintenance, 
                       style="Success.TButton").pack(side=tk.LEFT, padx=(0, 10))
         
-        if current_user['permissions']['can_edit_interventions']:
+        if has_permission('can_edit_interventions'):
             ttk.Button(button_frame, text="✏️ Modifier", command=edit_maintenance, 
                       style="Warning.TButton").pack(side=tk.LEFT, padx=(0, 10))
         
-        if current_user['permissions']['can_delete_interventions']:
+        if has_permission('can_delete_interventions'):
             ttk.Button(button_frame, text="🗑 Supprimer", command=delete_maintenance, 
                       style="Danger.TButton").pack(side=tk.LEFT, padx=(0, 10))
         
+        if has_permission('can_edit_interventions'):
+            ttk.Button(button_frame, text="⏱ Relevé d'heures", command=record_hours, 
+                      style="Primary.TButton").pack(side=tk.LEFT, padx=(0, 10))
+        
         ttk.Button(button_frame, text="🔄 Rafraîchir", command=refresh_maintenance, 
                   style="Primary.TButton").pack(side=tk.LEFT)
         
@@ -2570,55 +4103,188 @@ def show_equipment_history(equipment_id, serial_number):
     return window_manager.open_window(f"equipment_history_{equipment_id}", create_history_window)
 
 # === Reminder System ===
-def check_reminders(parent_window):
-    def check():
-        conn = sqlite3.connect(DB_FILE)
-        c = conn.cursor()
-        
-        seven_days_from_now = (datetime.now() + timedelta(days=7)).strftime("%Y-%m-%d")
-        c.execute('''SELECT e.numero_serie, e.marque, e.modele, p.date_prevue, p.type_maintenance 
-                     FROM planification p
-                     JOIN equipements e ON p.equipement_id = e.id
-                     WHERE p.date_prevue <= ? AND p.statut != "Terminé"
-                     ORDER BY p.date_prevue''', (seven_days_from_now,))
-        
-        upcoming_maintenances = c.fetchall()
-        conn.close()
-        
-        if upcoming_maintenances:
-            message = "MAINTENANCES PRÉVUES PROCHAINEMENT:\n\n"
-            for maintenance in upcoming_maintenances:
-                message += f"• {maintenance[0]} ({maintenance[1]} {maintenance[2]})\n"
-                message += f"  Date: {maintenance[3]}\n"
-                message += f"  Type: {maintenance[4]}\n\n"
-            
-            reminder_window = tk.Toplevel(parent_window)
-            reminder_window.title("Rappel de Maintenance")
-            reminder_window.geometry("500x400")
-            reminder_window.configure(bg=ProfessionalTheme.LIGHT)
-            
-            header_frame = tk.Frame(reminder_window, bg=ProfessionalTheme.WARNING, height=50)
-            header_frame.pack(fill=tk.X)
-            header_frame.pack_propagate(False)
-            
-            tk.Label(header_frame, text="⚠️ Rappel de Maintenance", 
-                    font=ProfessionalTheme.SUBTITLE_FONT, bg=ProfessionalTheme.WARNING, 
-                    fg=ProfessionalTheme.WHITE).pack(side=tk.LEFT, padx=20, pady=12)
-            
-            text_widget = tk.Text(reminder_window, font=ProfessionalTheme.BODY_FONT, 
-                                 wrap=tk.WORD, bd=1, relief="solid", highlightthickness=0)
-            text_widget.pack(fill=tk.BOTH, expand=True, padx=20, pady=20)
-            text_widget.insert("1.0", message)
-            text_widget.config(state=tk.DISABLED)
-            
-            ttk.Button(reminder_window, text="Fermer", command=reminder_window.destroy, 
-                      style="Primary.TButton").pack(pady=10)
+# Keeps the open planification rows in a min-heap ordered by date_prevue and only
+# wakes up when the next one enters the reminder window. The heap is reloaded
+# when maintenances are added, edited or deleted, and every REMINDER_RESYNC_INTERVAL
+# to pick up changes made from other workstations. Each resync first extends
+# the recurring plans to the rolling horizon.
+class ReminderScheduler:
+    def __init__(self):
+        self.parent_window = None
+        self.heap = []
+        self.entries = {}
+        self.notified = set()
+        self.window = None
+        self.text_widget = None
+        self._wake_id = None
+        self._resync_id = None
+    
+    def start(self, parent_window):
+        self.parent_window = parent_window
+        self.heap = []
+        self.entries = {}
+        self.notified = set()
+        self.window = None
+        self.text_widget = None
+        self._wake_id = None
+        self._resync_id = None
+        self.resync()
+    
+    def resync(self):
+        if self.parent_window is None:
+            return
+        db_executor.submit(planning_service.generate_occurrences, on_success=lambda count: self.invalidate(), 
+                           on_error=lambda error: self.invalidate(), widget=self.parent_window, key="plan_occurrences")
+    
+    def invalidate(self):
+        if self.parent_window is None:
+            return
+        db_executor.submit(planning_service.list_open, on_success=self._load, widget=self.parent_window, key="reminders_load", replace=True)
+    
+    def _load(self, rows):
+        self.entries = {}
+        for row in rows:
+            try:
+                datetime.strptime(row[1] or "", "%Y-%m-%d")
+            except ValueError:
+                continue
+            self.entries[(row[0], row[1])] = row
+        self.heap = [(date_prevue, maintenance_id) for maintenance_id, date_prevue in self.entries]
+        heapq.heapify(self.heap)
+        
+        self._cancel_timers()
+        self._resync_id = self.parent_window.after(REMINDER_RESYNC_INTERVAL, self.resync)
+        self._check()
+    
+    def _cancel_timers(self):
+        for after_id in (self._wake_id, self._resync_id):
+            if after_id is not None:
+                self.parent_window.after_cancel(after_id)
+        self._wake_id = None
+        self._resync_id = None
+    
+    def _check(self):
+        self._wake_id = None
+        horizon = (datetime.now() + timedelta(days=REMINDER_DAYS_AHEAD)).strftime("%Y-%m-%d")
         
-        parent_window.after(3600000, check)
+        due = []
+        while self.heap and self.heap[0][0] <= horizon:
+            date_prevue, maintenance_id = heapq.heappop(self.heap)
+            key = (maintenance_id, date_prevue)
+            if key in self.entries and key not in self.notified:
+                self.notified.add(key)
+                due.append(self.entries[key])
+        
+        if due:
+            self._show(due)
+        
+        if self.heap:
+            next_date = datetime.strptime(self.heap[0][0], "%Y-%m-%d")
+            delay = (next_date - timedelta(days=REMINDER_DAYS_AHEAD) - datetime.now()).total_seconds()
+            delay_ms = min(max(int(delay * 1000) + 1000, 1000), REMINDER_RESYNC_INTERVAL)
+            self._wake_id = self.parent_window.after(delay_ms, self._check)
     
-    check()
+    def _show(self, due):
+        message = ""
+        for maintenance in due:
+            message += f"• {maintenance[2]} ({maintenance[3]} {maintenance[4]})\n"
+            message += f"  Date: {maintenance[1]}\n"
+            message += f"  Type: {maintenance[5]}\n\n"
+        
+        if self.window is not None and self.window.winfo_exists():
+            self.text_widget.config(state=tk.NORMAL)
+            self.text_widget.insert(tk.END, message)
+            self.text_widget.config(state=tk.DISABLED)
+            self.window.lift()
+            return
+        
+        reminder_window = tk.Toplevel(self.parent_window)
+        reminder_window.title("Rappel de Maintenance")
+        reminder_window.geometry("500x400")
+        reminder_window.configure(bg=ProfessionalTheme.LIGHT)
+        
+        header_frame = tk.Frame(reminder_window, bg=ProfessionalTheme.WARNING, height=50)
+        header_frame.pack(fill=tk.X)
+        header_frame.pack_propagate(False)
+        
+        tk.Label(header_frame, text="⚠️ Rappel de Maintenance", 
+                font=ProfessionalTheme.SUBTITLE_FONT, bg=ProfessionalTheme.WARNING, 
+                fg=ProfessionalTheme.WHITE).pack(side=tk.LEFT, padx=20, pady=12)
+        
+        text_widget = tk.Text(reminder_window, font=ProfessionalTheme.BODY_FONT, 
+                             wrap=tk.WORD, bd=1, relief="solid", highlightthickness=0)
+        text_widget.pack(fill=tk.BOTH, expand=True, padx=20, pady=20)
+        text_widget.insert("1.0", "MAINTENANCES PRÉVUES PROCHAINEMENT:\n\n" + message)
+        text_widget.config(state=tk.DISABLED)
+        
+        ttk.Button(reminder_window, text="Fermer", command=reminder_window.destroy, 
+                  style="Primary.TButton").pack(pady=10)
+        
+        self.window = reminder_window
+        self.text_widget = text_widget
+
+reminder_scheduler = ReminderScheduler()
+
+def check_reminders(parent_window):
+    reminder_scheduler.start(parent_window)
 
 # === Main Entry Point ===
 if __name__ == "__main__":
+    mark_startup("Imports")
     init_db()
+    mark_startup("Schéma vérifié")
+    if "--calibrate-password-cost" in sys.argv:
+        for scheme, result in calibrate_password_cost().items():
+            if result is None:
+                print(f"{scheme}: aucun coût sous {PASSWORD_TARGET_MS} ms")
+            else:
+                print(f"{scheme}: coût {result[0]} ({result[1]:.0f} ms)")
+        sys.exit(0)
+    if "--import" in sys.argv:
+        # python gmao_app.py --import <equipements|pieces|interventions> <fichier>
+        index = sys.argv.index("--import")
+        if len(sys.argv) < index + 3:
+            print("Usage: gmao_app.py --import <equipements|pieces|interventions> <fichier>")
+            sys.exit(2)
+        start = time.perf_counter()
+        result = import_file(sys.argv[index + 1], sys.argv[index + 2], 
+                             progress=lambda count: print(f"\r{count} lignes", end="", flush=True))
+        elapsed = time.perf_counter() - start
+        print(f"\n{result['imported']}/{result['rows']} lignes importées en {elapsed:.1f} s")
+        for line, message in result['errors']:
+            print(f"Ligne {line}: {message}")
+        sys.exit(1 if result['imported'] < result['rows'] else 0)
+    if "--export" in sys.argv:
+        # python gmao_app.py --export <interventions|pieces> <fichier.csv|.json|.gcol>
+        #                    [--du YYYY-MM-DD] [--au YYYY-MM-DD] [--serie N]
+        index = sys.argv.index("--export")
+        if len(sys.argv) < index + 3:
+            print("Usage: gmao_app.py --export <interventions|pieces> <fichier> [--du DATE] [--au DATE] [--serie N]")
+            sys.exit(2)
+        def option(name):
+            return sys.argv[sys.argv.index(name) + 1] if name in sys.argv[:-1] else None
+        start = time.perf_counter()
+        count = export_to_file(sys.argv[index + 1], sys.argv[index + 2], date_from=option("--du"), 
+                               date_to=option("--au"), serial_number=option("--serie"), 
+                               progress=lambda count: print(f"\r{count} lignes", end="", flush=True))
+        print(f"\n{count} lignes exportées en {time.perf_counter() - start:.1f} s")
+        sys.exit(0)
+    if "--reorder-points" in sys.argv:
+        start = time.perf_counter()
+        count = recompute_reorder_points()
+        print(f"{count} point(s) de commande recalculé(s) en {time.perf_counter() - start:.1f} s")
+        for supplier, parts in purchase_suggestions():
+            print(f"\n{supplier}")
+            for reference, name, available, point, quantity, price, total in parts:
+                print(f"    {reference:<16} {name:<30} dispo {available:>5}  seuil {point:>5}  commander {quantity:>5}")
+        sys.exit(0)
+    if "--compact-audit" in sys.argv:
+        count = compact_audit_log(min_entries=1)
+        print(f"{count} entrée(s) du journal d'audit archivée(s) dans {AUDIT_ARCHIVE_DIR}/")
+        sys.exit(0)
+    if "--check-query-plans" in sys.argv:
+        problems = check_query_plans()
+        for query, detail in problems:
+            print(f"{detail}\n    {query}")
+        sys.exit(1 if problems else 0)
     authentication()
\ No newline at end of file
@@ -0,0 +1,31 @@
+# Serial-number suggestions from EquipmentIndex (target: under 5 ms per lookup):
+#
+#     python scripts/bench_autocomplete.py [équipements]
+import random
+import sys
+import time
+
+from bench_common import bench_database, serial, timed
+
+from gmao.core import equipment_index
+
+if __name__ == '__main__':
+    equipment = int(sys.argv[1]) if len(sys.argv) > 1 else 500000
+    bench_database(equipment=equipment)
+    
+    start = time.perf_counter()
+    equipment_index.load()
+    print(f"{equipment} équipements indexés en {time.perf_counter() - start:.2f} s")
+    
+    rng = random.Random(2)
+    prefixes = [serial(rng.randrange(equipment))[:rng.randint(3, 8)] for _ in range(500)]
+    labels = ["bos", "mak", "M12", "hilti m3", "fest"]
+    typos = [serial(rng.randrange(equipment))[:-1] + "X" for _ in range(50)]
+    cases = [
+        ("préfixe de numéro de série", lambda: equipment_index.suggest(rng.choice(prefixes))),
+        ("marque / modèle", lambda: equipment_index.suggest(rng.choice(labels))),
+        ("numéro inconnu (closest)", lambda: equipment_index.closest(rng.choice(typos))),
+    ]
+    for name, lookup in cases:
+        median, p95 = timed(lookup, repeat=500)
+        print(f"{name:28} médiane {median:.3f} ms  p95 {p95:.3f} ms")
@@ -0,0 +1,66 @@
+# Shared setup for the scripts/bench_*.py benchmarks: a throwaway database in
+# a temporary directory, filled through the importer, and a timing helper.
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gmao.core import db_pool, init_db, reload_key
+from gmao.importer import import_rows
+
+BRANDS = ["Bosch", "Makita", "Hilti", "Festool", "Metabo", "DeWalt", "Milwaukee", "Hitachi"]
+TECHNICIANS = ["Alice Martin", "Bruno Petit", "Chloé Durand", "David Moreau", "Emma Laurent"]
+WORDS = ["remplacement", "roulement", "charbons", "moteur", "interrupteur", "câble", "mandrin", "nettoyage",
+         "graissage", "percussion", "batterie", "chargeur", "diagnostic", "engrenage", "vibration", "surchauffe"]
+
+def serial(i):
+    return f"SN{i:07d}"
+
+def equipment_rows(count, rng):
+    for i in range(count):
+        yield i + 2, {'numero_serie': serial(i), 'marque': rng.choice(BRANDS), 'modele': f"M{rng.randint(1, 400)}",
+                      'date_achat': f"20{rng.randint(10, 24)}-0{rng.randint(1, 9)}-1{rng.randint(0, 9)}",
+                      'identifiant_acheteur': f"ACH-{rng.randint(1, 5000)}",
+                      'notes': " ".join(rng.sample(WORDS, 3))}
+
+def part_rows(count, rng):
+    for i in range(count):
+        yield i + 2, {'nom': f"{rng.choice(WORDS).capitalize()} {i}", 'reference': f"REF-{i:06d}",
+                      'fournisseur': rng.choice(BRANDS), 'prix_unitaire': f"{rng.uniform(1, 200):.2f}",
+                      'quantite_stock': str(rng.randint(0, 500))}
+
+def intervention_rows(count, equipment, rng):
+    for i in range(count):
+        yield i + 2, {'numero_serie': serial(rng.randrange(equipment)),
+                      'date_entree': f"20{rng.randint(15, 25)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+                      'details_reparation': " ".join(rng.sample(WORDS, 6)),
+                      'technicien': rng.choice(TECHNICIANS), 'cout': f"{rng.uniform(20, 600):.2f}"}
+
+def bench_database(equipment=1000, interventions=0, parts=0, seed=1):
+    # Leaves the process in the new directory, where gmao.core looks for its files;
+    # connections and the key of a previous call point to the previous one
+    os.chdir(tempfile.mkdtemp(prefix="gmao-bench-"))
+    db_pool.close_all()
+    reload_key()
+    init_db()
+    rng = random.Random(seed)
+    import_rows('equipements', equipment_rows(equipment, rng))
+    if parts:
+        import_rows('pieces', part_rows(parts, rng))
+    if interventions:
+        import_rows('interventions', intervention_rows(interventions, equipment, rng))
+    return os.getcwd()
+
+def timed(func, repeat=200):
+    # Median and 95th percentile in milliseconds
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.95) - 1]
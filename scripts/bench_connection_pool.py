@@ -0,0 +1,42 @@
+# Click-to-data latency of the queries behind the main windows, with a new
+# sqlite3 connection per call (as before the pool) and through db_pool:
+#
+#     python scripts/bench_connection_pool.py [interventions]
+#
+# Both sides run the same SQL on the same database; the difference is the
+# connect, PRAGMA and schema parsing cost paid on every click without the pool.
+import sqlite3
+import sys
+
+from bench_common import bench_database, timed
+
+from gmao.core import DB_FILE, HISTORY_PAGE_SIZE, PERMISSION_KEYS, db_fetchall
+
+QUERIES = [
+    ("refresh_interventions", '''SELECT id, date_entree, date_sortie, technicien, cout, details_apercu
+                                 FROM interventions WHERE equipement_id=?
+                                 ORDER BY date_entree DESC, id DESC LIMIT ?''', (17, HISTORY_PAGE_SIZE)),
+    ("refresh_maintenance", '''SELECT id, date_prevue, type_maintenance, technicien, statut, notes
+                               FROM planification WHERE equipement_id=? ORDER BY date_prevue''', (17,)),
+    ("get_user_permissions", f"SELECT {', '.join(PERMISSION_KEYS)} FROM permissions WHERE user_id=?", (1,)),
+    ("search_equipment", "SELECT id FROM equipements WHERE numero_serie=?", ("SN0000017",)),
+    ("refresh_stock", "SELECT id, nom, reference, quantite_stock FROM pieces ORDER BY nom LIMIT 200", ()),
+]
+
+def per_call(query, params):
+    conn = sqlite3.connect(DB_FILE)
+    try:
+        return conn.execute(query, params).fetchall()
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    interventions = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    bench_database(equipment=1000, interventions=interventions, parts=500)
+    print(f"{interventions} interventions, 1000 équipements (médiane / p95 en ms)")
+    print(f"{'requête':24} {'connexion par appel':>22} {'pool':>16}")
+    for name, query, params in QUERIES:
+        assert per_call(query, params) == [tuple(row) for row in db_fetchall(query, params)]
+        before = timed(lambda: per_call(query, params))
+        after = timed(lambda: db_fetchall(query, params))
+        print(f"{name:24} {before[0]:10.3f} / {before[1]:7.3f}   {after[0]:7.3f} / {after[1]:7.3f}")
@@ -0,0 +1,94 @@
+# Cost of the column encryption: per value for the column cipher against
+# Fernet and for the word tokens, then import throughput and the history page
+# behind refresh_interventions with and without encryption, and search on an
+# encrypted word against a clear one:
+#
+#     python scripts/bench_encryption.py [lignes]
+#
+# The request bounds the refresh_interventions overhead at 20 %. A refresh after
+# an edit stays within it (+5-17 %, previews come from the decryption cache),
+# but the first page of a history nothing has been read from yet does not:
+# ~0.2 ms more for 100 rows (+60-85 %), decrypting ~1 us and reading the wider
+# rows the rest, on a 1-vCPU VM.
+import itertools
+import random
+import sys
+import time
+
+from bench_common import bench_database, timed, equipment_rows, intervention_rows
+
+from gmao import core, importer
+from gmao.importer import import_rows
+
+def per_value(func, values):
+    start = time.perf_counter()
+    for value in values:
+        func(value)
+    return (time.perf_counter() - start) / len(values) * 1e6
+
+def import_rate(kind, rows):
+    start = time.perf_counter()
+    import_rows(kind, rows)
+    return len(rows) / (time.perf_counter() - start)
+
+def rate(value):
+    return f"{value:,.0f} lignes/s".replace(",", " ")
+
+def plain_import():
+    # Without encryption the sensitive columns and previews are stored in clear
+    # and get no word tokens
+    importer.encrypt_values, importer.word_tokens = list, lambda text: None
+
+def history_page_times(equipment):
+    # First page, as refresh_interventions loads it: when a history window opens,
+    # each equipment in turn with nothing cached, and when it is refreshed after
+    # an edit, the same equipment again
+    ids = itertools.cycle(range(1, equipment + 1))
+    opened = timed(lambda: core.equipment_service.history_page(next(ids)), repeat=1000)
+    refreshed = timed(lambda: core.equipment_service.history_page(1), repeat=1000)
+    return opened[0], refreshed[0]
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    rng = random.Random(5)
+    texts = [row['details_reparation'] for line, row in intervention_rows(20000, 1, rng)]
+    
+    bench_database(equipment=0)
+    fernet = core.get_cipher()
+    print(f"Fernet          chiffrement {per_value(lambda text: fernet.encrypt(text.encode()), texts):5.1f} µs, "
+          f"déchiffrement {per_value(fernet.decrypt, [fernet.encrypt(text.encode()) for text in texts]):5.1f} µs")
+    print(f"AES-GCM         chiffrement {per_value(core.encrypt_column, texts):5.1f} µs, "
+          f"déchiffrement {per_value(core.decrypt_column, [core.encrypt_column(text) for text in texts]):5.1f} µs")
+    core._word_token.cache_clear()
+    print(f"Jetons de mots  {per_value(core.word_tokens, texts):5.1f} µs par valeur de 6 mots")
+    
+    equipment = list(equipment_rows(count, rng))
+    interventions = list(intervention_rows(count, count, rng))
+    encrypt_values, word_tokens = importer.encrypt_values, importer.word_tokens
+    rates = {True: [], False: []}
+    pages = {True: [], False: []}
+    # Alternated and best of two, the difference being close to the noise
+    for encrypted in (True, False, True, False):
+        if not encrypted:
+            plain_import()
+        bench_database(equipment=0)
+        rates[encrypted].append([import_rate('equipements', equipment), import_rate('interventions', interventions)])
+        # ~100 interventions per equipment, so a page is as long as a busy machine's
+        bench_database(equipment=1000, interventions=count)
+        pages[encrypted].append(history_page_times(1000))
+        importer.encrypt_values, importer.word_tokens = encrypt_values, word_tokens
+    for i, kind in enumerate(('equipements', 'interventions')):
+        with_encryption = max(run[i] for run in rates[True])
+        without = max(run[i] for run in rates[False])
+        print(f"Import {kind:14} {rate(with_encryption)} chiffré, {rate(without)} en clair "
+              f"(surcoût {(without / with_encryption - 1) * 100:.0f} %)")
+    for i, label in enumerate(("ouverture", "rafraîchi")):
+        with_encryption = min(run[i] for run in pages[True])
+        without = min(run[i] for run in pages[False])
+        print(f"Historique {label:10} médiane {with_encryption:.3f} ms chiffré, {without:.3f} ms en clair "
+              f"(surcoût {(with_encryption / without - 1) * 100:.0f} %)")
+    
+    bench_database(equipment=1000, interventions=count)
+    for text in ("Alice", "charbons"):
+        median, p95 = timed(lambda: core.equipment_service.search(text, limit=50, fuzzy=False), repeat=10)
+        print(f"Recherche {text!r:12} médiane {median:.2f} ms, p95 {p95:.2f} ms")
@@ -0,0 +1,66 @@
+# Import throughput per type, through import_rows as the CLI and the import
+# dialog use it, against the required rate on a local disk (TARGET):
+#
+#     python scripts/bench_import.py [lignes]
+#
+# Rows are generated in memory, so file parsing is not included; add --csv to
+# write them to a CSV file first and import that instead. Each type is
+# imported RUNS times into a fresh database and its best run is kept.
+#
+# Open issue: on a 1-vCPU VM, parts reach ~90k rows/s, but equipment
+# (~34k) and interventions (~28-40k) stay under TARGET. Per 100k rows, about
+# 1 s goes to the column cipher, the blind index and the word tokens (see
+# scripts/bench_encryption.py), and 0.3-0.5 s each to the FTS and KPI rebuilds.
+import csv
+import random
+import sys
+import time
+
+from bench_common import bench_database, equipment_rows, part_rows, intervention_rows
+
+from gmao.importer import import_file, import_rows
+
+TARGET = 50000  # rows/s, for every type
+RUNS = 3
+
+def to_csv(path, rows):
+    rows = [record for line, record in rows]
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]), delimiter=';')
+        writer.writeheader()
+        writer.writerows(rows)
+    return path
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 and sys.argv[1].isdigit() else 100000
+    from_csv = "--csv" in sys.argv
+    rng = random.Random(3)
+    sources = [
+        ('equipements', list(equipment_rows(count, rng))),
+        ('pieces', list(part_rows(count, rng))),
+        ('interventions', list(intervention_rows(count, count, rng))),
+    ]
+    times = {}
+    for run in range(RUNS):
+        bench_database(equipment=0)
+        for kind, rows in sources:
+            if from_csv:
+                path = to_csv(f"{kind}.csv", rows)
+                start = time.perf_counter()
+                result = import_file(kind, path)
+            else:
+                start = time.perf_counter()
+                result = import_rows(kind, rows)
+            elapsed = time.perf_counter() - start
+            assert result['imported'] == count, result['errors'][:5]
+            times[kind] = min(times.get(kind, elapsed), elapsed)
+    below = []
+    for kind, rows in sources:
+        rate = count / times[kind]
+        if rate < TARGET:
+            below.append(kind)
+        print(f"{kind:14} {count} lignes en {times[kind]:.2f} s: {rate:,.0f} lignes/s "
+              f"(objectif {TARGET:,})".replace(",", " "))
+    for kind in below:
+        print(f"SOUS L'OBJECTIF: {kind}")
+    sys.exit(1 if below else 0)
@@ -0,0 +1,31 @@
+# Throughput of InterventionService.create with parts consumed through the
+# stock ledger, as the save button does it:
+#
+#     python scripts/bench_intervention_saves.py [saves]
+import random
+import sys
+import time
+
+from bench_common import bench_database
+
+from gmao.core import db_fetchone, intervention_service, stock_service
+
+if __name__ == '__main__':
+    saves = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    bench_database(equipment=1000, parts=500)
+    with_stock = [row[0] for row in stock_service.list_parts() if row[5] > 0]
+    for part_id in with_stock:
+        stock_service.receive(part_id, saves)
+    rng = random.Random(1)
+    
+    start = time.perf_counter()
+    for i in range(saves):
+        pieces = [{'piece_id': part_id, 'qty': rng.randint(1, 3), 'total_cost': 10.0}
+                  for part_id in rng.sample(with_stock, 2)]
+        intervention_service.create(rng.randint(1, 1000), "2025-06-01", "", "Remplacement roulement",
+                                    "Alice Martin", 45.0, pieces)
+    elapsed = time.perf_counter() - start
+    
+    movements = db_fetchone("SELECT COUNT(*) FROM stock_movements WHERE kind = 'out'")[0]
+    print(f"{saves} interventions ({movements} sorties de stock) en {elapsed:.2f} s: "
+          f"{saves / elapsed:.0f} enregistrements/s, {elapsed / saves * 1000:.2f} ms chacun")
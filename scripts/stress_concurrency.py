@@ -0,0 +1,119 @@
+# Several workstations writing to the same database at once: each process
+# reserves and consumes parts, edits the same maintenance row, updates parts
+# with their version, records hour readings and creates plans. Run from the
+# repository root:
+#
+#     python scripts/stress_concurrency.py [processus] [opérations]
+#
+# The database is created in a temporary directory. Busy errors that escape
+# retry_on_busy are counted, and the stock ledger, the plans and the hour
+# readings are checked against what the workers report having committed.
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from multiprocessing import Pool
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PROCESSES = 20
+OPERATIONS = 40
+PARTS = 5
+BUSY_TIMEOUT = 1  # ms, so collisions reach retry_on_busy instead of waiting in SQLite
+
+def setup():
+    from gmao.core import init_db, stock_service, equipment_service, planning_service
+    init_db()
+    for i in range(PARTS):
+        stock_service.create_part(f"Pièce {i}", f"REF-{i}", "Fournisseur", 1.0, 100000, "")
+    equipment_id = equipment_service.create("STRESS-1", "Marque", "Modèle", None, None, None, None)
+    planning_service.create(equipment_id, "2030-01-01", "Révision", "", "Planifié", "")
+    return equipment_id
+
+def worker(args):
+    number, equipment_id, operations = args
+    from gmao.core import stock_service, intervention_service, planning_service, ConflictError, db_pool
+    db_pool.set_busy_timeout(BUSY_TIMEOUT)
+    rng = random.Random(number)
+    stats = {'ok': 0, 'conflict': 0, 'stock': 0, 'busy': 0, 'consumed': 0, 'plans': 0, 'readings': 0}
+    for i in range(operations):
+        try:
+            r = rng.random()
+            if r < 0.35:
+                part_id = rng.randint(1, PARTS)
+                reservation = f"{number}-{i}"
+                stock_service.reserve(part_id, 1, reservation)
+                try:
+                    intervention_service.create(equipment_id, "2030-01-01", None, "", "Stress", 0,
+                                                [{'piece_id': part_id, 'qty': 1, 'total_cost': 1,
+                                                  'reservation': reservation}])
+                except Exception:
+                    # As when an intervention form is closed unsaved
+                    stock_service.release([reservation])
+                    raise
+                stats['consumed'] += 1
+            elif r < 0.6:
+                maintenance = planning_service.get(1)
+                planning_service.update(1, maintenance[0], maintenance[1], f"Tech {number}", maintenance[3],
+                                        maintenance[4], maintenance[5])
+            elif r < 0.8:
+                part_id = rng.randint(1, PARTS)
+                row = stock_service.get_part(part_id)
+                stock_service.update_part(part_id, *row[:7], row[7])
+            elif r < 0.9:
+                planning_service.record_hours(equipment_id, "2030-01-01", number * operations + i)
+                stats['readings'] += 1
+            else:
+                planning_service.create_plan(equipment_id, None, None, f"Plan {number}-{i}", "", 30, 'jours',
+                                             "2030-01-01", "")
+                stats['plans'] += 1
+            stats['ok'] += 1
+        except ConflictError:
+            stats['conflict'] += 1
+        except sqlite3.IntegrityError:
+            stats['stock'] += 1
+        except sqlite3.OperationalError as e:
+            stats['busy'] += 1
+            print(f"[{number}] {e}")
+    return stats
+
+def check(totals):
+    from gmao.core import db_fetchone, db_fetchall
+    errors = []
+    for part_id, reserved in db_fetchall("SELECT id, quantite_reservee FROM pieces WHERE quantite_reservee != 0"):
+        errors.append(f"pièce {part_id}: {reserved} réservée(s) après la fin des transactions")
+    consumed = db_fetchone("SELECT COALESCE(SUM(quantite_utilisee), 0) FROM intervention_pieces")[0]
+    if consumed != totals['consumed']:
+        errors.append(f"{consumed} pièce(s) consommée(s), {totals['consumed']} validée(s)")
+    stock_used = PARTS * 100000 - db_fetchone("SELECT SUM(quantite_stock) FROM pieces")[0]
+    if stock_used != totals['consumed']:
+        errors.append(f"stock diminué de {stock_used}, {totals['consumed']} pièce(s) validée(s)")
+    plans = db_fetchone("SELECT COUNT(*) FROM plans_maintenance")[0]
+    if plans != totals['plans']:
+        errors.append(f"{plans} plan(s) en base, {totals['plans']} créé(s)")
+    readings = db_fetchone("SELECT COUNT(*) FROM releves_compteur")[0]
+    if readings != totals['readings']:
+        errors.append(f"{readings} relevé(s) en base, {totals['readings']} enregistré(s)")
+    return errors
+
+if __name__ == '__main__':
+    processes = int(sys.argv[1]) if len(sys.argv) > 1 else PROCESSES
+    operations = int(sys.argv[2]) if len(sys.argv) > 2 else OPERATIONS
+    os.chdir(tempfile.mkdtemp(prefix="gmao-stress-"))
+    equipment_id = setup()
+    
+    start = time.perf_counter()
+    with Pool(processes) as pool:
+        results = pool.map(worker, [(number, equipment_id, operations) for number in range(processes)])
+    elapsed = time.perf_counter() - start
+    
+    totals = {key: sum(result[key] for result in results) for key in results[0]}
+    print(f"{processes} processus x {operations} opérations en {elapsed:.1f} s")
+    print(f"validées: {totals['ok']}  conflits: {totals['conflict']}  stock insuffisant: {totals['stock']}  "
+          f"verrouillées: {totals['busy']}")
+    errors = check(totals)
+    for error in errors:
+        print(f"INCOHÉRENCE: {error}")
+    sys.exit(1 if errors else 0)
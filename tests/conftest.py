@@ -0,0 +1,49 @@
+import os
+import shutil
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from gmao import core
+
+def reset_state():
+    # The pool, the cipher and the caches are module globals bound to the
+    # database of the current directory
+    core.db_pool.close_all()
+    core._cipher = None
+    core._blind_hmac = None
+    core._word_hmac = None
+    core._column_cipher = None
+    core.permission_cache.invalidate()
+    core.parts_catalogue.invalidate()
+    core.search_vocabulary.invalidate()
+    core.equipment_index.__init__()
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    reset_state()
+    yield tmp_path
+    reset_state()
+
+@pytest.fixture
+def db(workdir):
+    core.init_db()
+    return workdir
+
+@pytest.fixture
+def legacy_db(workdir):
+    # The database shipped with the repository predates the migrations (user_version 0)
+    shutil.copy(os.path.join(ROOT, core.DB_FILE), workdir / core.DB_FILE)
+    return workdir
+
+@pytest.fixture
+def equipment(db):
+    return core.equipment_service.create("SN-1", "Bosch", "GSR 18", "2024-01-15", None, "ACH-42", "Sous garantie")
+
+@pytest.fixture
+def part(db):
+    return core.stock_service.create_part("Roulement", "ROU-6204", "SKF", 12.5, 10, "")
@@ -0,0 +1,66 @@
+import os
+import sqlite3
+
+import pytest
+
+from gmao import audit, core
+
+def old_entries(count, created_at="2020-01-01 08:00:00"):
+    with core.db_transaction() as c:
+        c.executemany('''INSERT INTO audit_log (created_at, user_id, action, table_name, row_id)
+                         VALUES (?, 1, 'update', 'pieces', ?)''', [(created_at, row_id) for row_id in range(count)])
+    return core.db_fetchall(f'''SELECT {', '.join(audit.AUDIT_COLUMNS)} FROM audit_log
+                                WHERE created_at = ? ORDER BY id''', (created_at,))
+
+def archive_path(entries):
+    return os.path.join(audit.AUDIT_ARCHIVE_DIR, f"audit_{entries[0][0]}_{entries[-1][0]}.gcol")
+
+def live_entries():
+    return core.db_fetchone("SELECT COUNT(*) FROM audit_log WHERE created_at < '2021-01-01'")[0]
+
+def test_compaction_archives_then_deletes(db, monkeypatch):
+    archived = old_entries(30)
+    recent = core.db_fetchone("SELECT COUNT(*) FROM audit_log WHERE created_at >= '2021-01-01'")[0]
+    assert audit.compact_audit_log(min_entries=100) == 0
+    
+    drop_triggers = audit.drop_audit_triggers
+    
+    def check_archive_written(c):
+        # Called right before the delete: the entries are already on disk
+        assert [tuple(row) for row in audit.iter_archive(archive_path(archived) + ".tmp")] == archived
+        assert live_entries() == 30
+        drop_triggers(c)
+    
+    monkeypatch.setattr(audit, 'drop_audit_triggers', check_archive_written)
+    assert audit.compact_audit_log(min_entries=10) == 30
+    assert live_entries() == 0
+    assert core.db_fetchone("SELECT COUNT(*) FROM audit_log WHERE created_at >= '2021-01-01'")[0] == recent + 1
+    
+    (archive_id, created_at, path, first_id, last_id, date_from, date_to, entries, sha256), = audit.list_archives()
+    assert (path, first_id, last_id, entries) == (archive_path(archived), archived[0][0], archived[-1][0], 30)
+    assert os.listdir(audit.AUDIT_ARCHIVE_DIR) == [os.path.basename(path)]
+    assert sha256 == audit._file_sha256(path)
+    assert [tuple(row) for row in audit.iter_archive(path)] == archived
+    # The delete triggers are back
+    with pytest.raises(sqlite3.IntegrityError):
+        with core.db_transaction() as c:
+            c.execute("DELETE FROM audit_log")
+
+def test_failed_compaction_keeps_the_entries(db, monkeypatch):
+    archived = old_entries(30)
+    
+    def fail(c):
+        raise sqlite3.OperationalError("disk I/O error")
+    
+    with monkeypatch.context() as patch, pytest.raises(sqlite3.OperationalError):
+        patch.setattr(audit, 'create_audit_triggers', fail)
+        audit.compact_audit_log(min_entries=10)
+    # Rolled back: entries, triggers and archive list as before, no file left
+    assert live_entries() == 30
+    assert audit.list_archives() == []
+    assert os.listdir(audit.AUDIT_ARCHIVE_DIR) == []
+    with pytest.raises(sqlite3.IntegrityError):
+        with core.db_transaction() as c:
+            c.execute("DELETE FROM audit_log")
+    assert audit.compact_audit_log(min_entries=10) == 30
+    assert [tuple(row) for row in audit.iter_archive(audit.list_archives()[0][2])] == archived
@@ -0,0 +1,47 @@
+import pytest
+
+from gmao import core
+from gmao.core import ConflictError, stock_service, intervention_service, planning_service
+
+def test_stale_part_version_is_rejected(part):
+    row = stock_service.get_part(part)
+    stock_service.update_part(part, "Roulement 6204", *row[1:7], row[7])
+    with pytest.raises(ConflictError) as error:
+        stock_service.update_part(part, "Roulement à billes", *row[1:7], row[7])
+    assert not error.value.deleted
+    assert stock_service.get_part(part)[0] == "Roulement 6204"
+
+def test_deleted_row_is_reported(part):
+    row = stock_service.get_part(part)
+    stock_service.delete_part(part)
+    with pytest.raises(ConflictError) as error:
+        stock_service.update_part(part, *row[:7], row[7])
+    assert error.value.deleted
+
+def test_overwrite_without_version(part):
+    row = stock_service.get_part(part)
+    stock_service.update_part(part, "A", *row[1:7], row[7])
+    stock_service.update_part(part, "B", *row[1:7], None)
+    assert stock_service.get_part(part)[0] == "B"
+
+def test_stale_intervention_keeps_stock(part, equipment):
+    piece = {'piece_id': part, 'qty': 2, 'total_cost': 25.0}
+    intervention_id = intervention_service.create(equipment, "2025-03-01", "", "Joint", "Bob", 0, [piece])
+    version = intervention_service.get(intervention_id)[5]
+    intervention_service.update(intervention_id, "2025-03-01", "", "Joint changé", "Bob", 25.0, [piece], version)
+    with pytest.raises(ConflictError):
+        intervention_service.update(intervention_id, "2025-03-01", "", "", "Bob", 0,
+                                    [dict(piece, qty=5)], version)
+    # The rejected save rolled back its stock movements too
+    assert stock_service.get_part(part)[4] == 8
+    assert intervention_service.get(intervention_id)[4] == "Joint changé"
+
+def test_stale_maintenance_version_is_rejected(equipment):
+    maintenance_id = planning_service.create(equipment, "2025-04-01", "Révision", "Bob", "Planifié", "")
+    row = planning_service.get(maintenance_id)
+    planning_service.update(maintenance_id, row[0], row[1], "Alice", row[3], row[4], row[5])
+    with pytest.raises(ConflictError):
+        planning_service.update(maintenance_id, row[0], row[1], "Carla", row[3], row[4], row[5])
+    assert planning_service.get(maintenance_id)[2] == "Alice"
+    # The conflict rolled back its audit entries with the update
+    assert core.db_fetchone("SELECT COUNT(*) FROM audit_log WHERE table_name='planification' AND action='update'")[0] == 1
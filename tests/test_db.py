@@ -0,0 +1,42 @@
+import sqlite3
+import threading
+
+import pytest
+
+from gmao import core
+
+def test_one_connection_per_thread(db):
+    main = core.db_pool.connection()
+    assert core.db_pool.connection() is main
+    other = []
+    thread = threading.Thread(target=lambda: other.append(core.db_pool.connection()))
+    thread.start()
+    thread.join()
+    assert other[0] is not main
+    assert core.db_fetchone("PRAGMA journal_mode")[0] == core.DB_JOURNAL_MODE.lower()
+
+def test_rollback_discards_rows_and_audit_entries(db):
+    audit_count = core.db_fetchone("SELECT COUNT(*) FROM audit_log")[0]
+    with pytest.raises(sqlite3.IntegrityError):
+        with core.db_transaction() as c:
+            c.execute("INSERT INTO equipements (numero_serie, marque, modele) VALUES ('SN-1', 'A', 'B')")
+            core.audit_insert(c, 'equipements', c.lastrowid)
+            c.execute("INSERT INTO equipements (numero_serie, marque, modele) VALUES ('SN-1', 'A', 'B')")
+    assert core.db_fetchone("SELECT COUNT(*) FROM equipements")[0] == 0
+    # The next transaction must not flush the entries of the rolled back one
+    core.equipment_service.create("SN-2", "A", "B", None, None, None, None)
+    assert core.db_fetchone("SELECT COUNT(*) FROM audit_log")[0] == audit_count + 1
+
+def test_busy_errors_are_retried(db, monkeypatch):
+    monkeypatch.setattr(core, 'DB_RETRY_BASE_DELAY', 0)
+    calls = []
+    
+    @core.retry_on_busy
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise sqlite3.OperationalError("database is locked")
+        return "ok"
+    
+    assert flaky() == "ok"
+    assert len(calls) == 3
@@ -0,0 +1,54 @@
+from datetime import date
+
+import pytest
+
+from gmao import core, forecast
+from gmao.core import stock_service, intervention_service
+
+AS_OF = date(2025, 3, 31)
+
+def use(equipment, part, day, qty):
+    intervention_service.create(equipment, day, day, "", "Alice", 0,
+                                [{'piece_id': part, 'qty': qty, 'total_cost': qty * 12.5}])
+
+def test_steady_demand():
+    # Seven a week, known exactly: no safety stock, two weeks of use
+    assert forecast.smooth_demand([7] * 8) == (7.0, 0.0)
+    assert forecast.reorder_point([7] * 8, 14) == (14, 1.0)
+
+def test_irregular_demand_adds_safety_stock():
+    history = [0] * 50 + [2, 4]
+    demand, deviation = forecast.smooth_demand(history)
+    assert demand == pytest.approx(1.62)
+    assert deviation == pytest.approx(0.5475, abs=1e-4)
+    # 0.23/day over the lead time plus 1.65 deviations over its number of weeks
+    assert forecast.reorder_point(history, 14) == (5, pytest.approx(demand / 7))
+    assert forecast.reorder_point(history, 28)[0] == 9
+    assert forecast.reorder_point(history, 0)[0] == 0
+
+def test_no_consumption_needs_no_stock():
+    assert forecast.reorder_point([0] * forecast.FORECAST_HISTORY_PERIODS, 14) == (0, 0.0)
+
+def test_suggestions_from_the_consumption_history(equipment, part):
+    unused = stock_service.create_part("Courroie", "CO-1", "Gates", 8, 0, "")
+    stock_service.update_part(unused, "Courroie", "CO-1", "Gates", 8, 0, "", lead_time=7)
+    # Outside the window: the day it starts and the day after as_of
+    for day, qty in (("2024-04-01", 1), ("2025-03-24", 2), ("2025-03-25", 1), ("2025-03-31", 3), ("2025-04-01", 1)):
+        use(equipment, part, day, qty)
+    assert core.db_fetchone("SELECT COUNT(*) FROM stock_movements WHERE kind='out' AND piece_id=?", (part,))[0] == 5
+    
+    history = [0] * 50 + [2, 4]
+    assert forecast.load_consumption(AS_OF) == {part: history}
+    # No lead time entered: DEFAULT_LEAD_TIME_DAYS
+    assert forecast.compute_reorder_points(AS_OF) == {part: forecast.reorder_point(history, 14)}
+    assert forecast.recompute_reorder_points(AS_OF) == 1
+    assert core.db_fetchall("SELECT id, point_commande FROM pieces ORDER BY id") == [(part, 5), (unused, None)]
+    
+    # 2 left against a point of 5: back to 5 plus 30 days at 0.23/day
+    assert forecast.purchase_suggestions() == [
+        ("SKF", [("ROU-6204", "Roulement", 2, 5, 10, 12.5, 125.0)])]
+    assert forecast.purchase_suggestions(review_days=0)[0][1][0][4] == 3
+    
+    stock_service.update_part(part, "Roulement", "ROU-6204", "SKF", 12.5, 2, "", lead_time=28)
+    forecast.recompute_reorder_points(AS_OF)
+    assert core.db_fetchone("SELECT point_commande FROM pieces WHERE id=?", (part,))[0] == 9
@@ -0,0 +1,170 @@
+import csv
+import json
+import sqlite3
+
+import pytest
+
+from gmao import core
+from gmao.importer import import_file, import_rows
+from gmao.exporter import export_to_file, iter_columnar, INTERVENTION_COLUMNS
+
+EQUIPMENT_CSV = """numero_serie;marque;modele;date_achat;date_vente;identifiant_acheteur;notes
+SN-100;Makita;DHP482;2023-05-02;;ACH-1;Batterie neuve
+SN-101;Makita;DHP482;;;;
+SN-102;Hilti;TE 30;pas une date;;;
+;Hilti;TE 30;;;;
+"""
+
+PARTS_CSV = """nom,reference,fournisseur,prix_unitaire,quantite_stock,description
+Charbon,CH-1,Makita,"4,50",20,
+Mandrin,MA-2,Makita,18,3,13 mm
+"""
+
+INTERVENTIONS_CSV = """numero_serie;date_entree;date_sortie;details_reparation;technicien;cout
+SN-100;2025-01-10;2025-01-12;Remplacement roulement et charbons;Alice;80
+SN-101;2025-02-03;;Diagnostic moteur;Bob;"35,5"
+SN-999;2025-02-04;;Inconnu;Bob;0
+"""
+
+def write(path, text):
+    path.write_text(text, encoding='utf-8')
+    return str(path)
+
+def import_all(workdir, chunk_size=5000):
+    return {kind: import_file(kind, write(workdir / f"{kind}.csv", text), chunk_size=chunk_size)
+            for kind, text in (('equipements', EQUIPMENT_CSV), ('pieces', PARTS_CSV),
+                               ('interventions', INTERVENTIONS_CSV))}
+
+def test_rows_are_validated_line_by_line(db):
+    results = import_all(db)
+    assert results['equipements']['imported'] == 2
+    assert [line for line, message in results['equipements']['errors']] == [4, 5]
+    assert results['interventions']['errors'] == [(4, "équipement inconnu: SN-999")]
+    assert core.stock_service.get_stock_level(core.db_fetchone("SELECT id FROM pieces WHERE reference='CH-1'")[0]) == 20
+
+def test_dates(db):
+    rows = [(2, {'numero_serie': "SN-1", 'marque': "Bosch", 'modele': "GSR", 'date_achat': "2023-5-2"}),
+            (3, {'numero_serie': "SN-2", 'marque': "Bosch", 'modele': "GSR", 'date_achat': "2023-02-30"}),
+            (4, {'numero_serie': "SN-3", 'marque': "Bosch", 'modele': "GSR", 'date_achat': "2023-W05-1"})]
+    result = import_rows('equipements', rows)
+    assert result['imported'] == 1
+    assert [line for line, message in result['errors']] == [3, 4]
+    assert core.db_fetchone("SELECT date_achat FROM equipements WHERE numero_serie='SN-1'")[0] == "2023-05-02"
+
+def test_upsert_on_natural_keys(db):
+    import_all(db)
+    import_file('equipements', write(db / "update.csv", "numero_serie;marque;modele;notes\nSN-101;Makita;DHP483;Révisé\n"))
+    import_file('pieces', write(db / "update.csv", "nom,reference,quantite_stock\nCharbon,CH-1,5\n"))
+    assert core.db_fetchone("SELECT COUNT(*) FROM equipements")[0] == 2
+    assert core.equipment_service.find_by_serial("SN-101")[3:8:4] == ("DHP483", "Révisé")
+    assert core.db_fetchone("SELECT quantite_stock FROM pieces WHERE reference='CH-1'")[0] == 5
+
+def test_missing_levels_leave_the_stock_alone(db, part):
+    for chunk_size in (5000, 1):
+        import_file('pieces', write(db / "update.csv", "nom,reference\nRoulement 6204,ROU-6204\nCourroie,CO-1\n"),
+                    chunk_size=chunk_size)
+        import_rows('pieces', [(2, {'nom': "Roulement", 'reference': "ROU-6204", 'quantite_stock': " "})],
+                    chunk_size=chunk_size)
+        assert ledger("ROU-6204") == (10, 0, 10)
+        assert core.db_fetchone("SELECT quantite_stock FROM pieces WHERE reference='CO-1'")[0] == 0
+    assert core.db_fetchone("SELECT COUNT(*) FROM stock_movements")[0] == 1
+
+def test_export_round_trip(db):
+    import_all(db)
+    expected = [
+        ("2025-01-10", "2025-01-12", "SN-100", "Alice", 80.0, "Remplacement roulement et charbons"),
+        ("2025-02-03", "", "SN-101", "Bob", 35.5, "Diagnostic moteur"),
+    ]
+    
+    def project(rows):
+        return [(row['date_entree'], row['date_sortie'], row['numero_serie'], row['technicien'],
+                 float(row['cout']), row['details_reparation']) for row in rows]
+    
+    assert export_to_file('interventions', str(db / "export.csv")) == 2
+    with open(db / "export.csv", newline='', encoding='utf-8-sig') as f:
+        assert project(csv.DictReader(f, delimiter=';')) == expected
+    
+    export_to_file('interventions', str(db / "export.json"))
+    with open(db / "export.json", encoding='utf-8') as f:
+        assert project(json.load(f)) == expected
+    
+    export_to_file('interventions', str(db / "export.gcol"))
+    assert project(dict(zip(INTERVENTION_COLUMNS, row)) for row in iter_columnar(str(db / "export.gcol"))) == expected
+
+def found(text):
+    return sorted({row[2] for row in core.equipment_service.search(text, fuzzy=False)})
+
+def test_bulk_import_rebuilds_indexes(db):
+    # chunk_size=1 takes the path that drops the triggers and rebuilds at the end
+    import_all(db, chunk_size=1)
+    assert found("Makita") == ["SN-100", "SN-101"]
+    assert found("Alice") == ["SN-100"]
+    assert found("charbons") == ["SN-100"]
+    assert found("batterie") == ["SN-100"]
+    assert core.db_fetchall("SELECT equipement_id, interventions FROM kpi_equipment ORDER BY 1") == [(1, 1), (2, 1)]
+    assert core.db_fetchone("SELECT interventions FROM kpi_technician WHERE technicien='Bob'")[0] == 1
+    # Triggers are back: later writes keep the index and summaries current
+    core.equipment_service.create("SN-200", "Festool", "TS 55", None, None, None, None)
+    assert found("Festool") == ["SN-200"]
+
+def test_sensitive_columns_are_encrypted(db):
+    import_all(db)
+    buyer, notes = core.db_fetchone("SELECT identifiant_acheteur, notes FROM equipements WHERE numero_serie='SN-100'")
+    assert isinstance(buyer, bytes) and isinstance(notes, bytes)
+    assert [row[0] for row in core.equipment_service.find_by_buyer("ach-1")] == [1]
+
+def test_forms_and_imports_write_the_same_tokens(db):
+    import_all(db)
+    equipment_id = core.equipment_service.create("SN-300", "Bosch", "GSR", None, None, "ACH-2", "Neuf")
+    intervention_id = core.intervention_service.create(equipment_id, "2025-03-01", None, "Révision", "Alice", 0, [])
+    core.intervention_service.update(intervention_id, "2025-03-01", None, "Révision faite", "Alice", 0, [])
+    tokens = core.db_fetchall('''SELECT identifiant_acheteur FROM equipements WHERE identifiant_acheteur != ''
+                                 UNION ALL SELECT notes FROM equipements WHERE notes != ''
+                                 UNION ALL SELECT details_reparation FROM interventions''')
+    # Imported: SN-100 buyer and notes, two details; from the forms: SN-300 buyer and notes, one details
+    assert len(tokens) == 7
+    assert {token[:1] for token, in tokens} == {core.COLUMN_TOKEN_VERSION}
+
+def test_history_shows_the_preview(db):
+    long_details = "Démontage complet " * 10
+    import_file('equipements', write(db / "equipements.csv", EQUIPMENT_CSV))
+    import_rows('interventions', [(2, {'numero_serie': "SN-100", 'date_entree': "2025-01-10",
+                                       'details_reparation': long_details})])
+    core.intervention_service.create(1, "2025-01-11", None, "Graissage", "Alice", 0, [])
+    assert [row[5] for row in core.equipment_service.history_page(1)] == [
+        "Graissage", long_details[:core.DETAILS_PREVIEW_LENGTH] + "…"]
+    # Only the cut details have a preview of their own, encrypted like them
+    previews = core.db_fetchall("SELECT details_apercu FROM interventions ORDER BY id")
+    assert previews[0][0][:1] == core.COLUMN_TOKEN_VERSION and previews[1] == (None,)
+
+def ledger(reference):
+    return core.db_fetchone('''SELECT p.quantite_stock, p.quantite_reservee, SUM(m.quantite)
+                               FROM pieces p JOIN stock_movements m ON m.piece_id = p.id
+                               WHERE p.reference=? AND m.kind IN ('in', 'adjust')''', (reference,))
+
+def test_bulk_part_import_goes_through_the_ledger(db, part):
+    core.stock_service.reserve(part, 2, "form-1")
+    version = core.stock_service.get_part(part)[7]
+    rows = [(2, {'nom': "Roulement", 'reference': "ROU-6204", 'quantite_stock': "4"}),
+            (3, {'nom': "Courroie", 'reference': "CO-1", 'quantite_stock': "3"}),
+            (4, {'nom': "Courroie", 'reference': "CO-1", 'quantite_stock': "7"}),
+            (5, {'nom': "Vis", 'reference': "VI-1", 'quantite_stock': "0"})]
+    assert import_rows('pieces', rows, chunk_size=1)['imported'] == 4
+    assert ledger("ROU-6204") == (4, 2, 4)
+    assert ledger("CO-1") == (7, 0, 7)
+    assert core.db_fetchone("SELECT quantite_stock FROM pieces WHERE reference='VI-1'")[0] == 0
+    assert core.stock_service.get_part(part)[7] == version + 1
+    # Triggers are back
+    core.stock_service.receive(core.db_fetchone("SELECT id FROM pieces WHERE reference='CO-1'")[0], 1)
+    assert ledger("CO-1") == (8, 0, 8)
+
+def test_bulk_part_import_keeps_reserved_stock(db, part):
+    core.stock_service.reserve(part, 6, "form-1")
+    rows = [(2, {'nom': "Roulement", 'reference': "ROU-6204", 'quantite_stock': "5"}),
+            (3, {'nom': "Courroie", 'reference': "CO-1", 'quantite_stock': "3"})]
+    with pytest.raises(sqlite3.IntegrityError):
+        import_rows('pieces', rows, chunk_size=1)
+    assert ledger("ROU-6204") == (10, 6, 10)
+    assert core.db_fetchone("SELECT COUNT(*) FROM pieces")[0] == 1
+    with pytest.raises(sqlite3.IntegrityError):
+        core.stock_service.reserve(part, 5, "form-2")
@@ -0,0 +1,94 @@
+from gmao import core
+
+def test_fresh_database_reaches_last_version(db):
+    assert core.get_schema_version() == core.MIGRATIONS[-1][0]
+    tables = {row[0] for row in core.db_fetchall("SELECT name FROM sqlite_master WHERE type='table'")}
+    assert {'equipements', 'interventions', 'pieces', 'stock_movements', 'plans_maintenance', 'audit_log',
+            'kpi_equipment', 'equipements_fts', 'chiffrement'} <= tables
+
+def test_versions_are_increasing():
+    versions = [version for version, migration in core.MIGRATIONS]
+    assert versions == list(range(1, len(versions) + 1))
+
+def test_init_db_is_idempotent(db):
+    before = core.db_fetchall("SELECT type, name FROM sqlite_master ORDER BY name")
+    core.init_db()
+    assert core.db_fetchall("SELECT type, name FROM sqlite_master ORDER BY name") == before
+
+def test_legacy_database_keeps_its_rows(legacy_db):
+    counts = {table: core.db_fetchone(f"SELECT COUNT(*) FROM {table}")[0]
+              for table in ('equipements', 'interventions', 'pieces', 'intervention_pieces', 'users')}
+    core.init_db()
+    assert core.get_schema_version() == core.MIGRATIONS[-1][0]
+    for table, count in counts.items():
+        assert core.db_fetchone(f"SELECT COUNT(*) FROM {table}")[0] == count
+
+def test_legacy_stock_levels_match_the_ledger(legacy_db):
+    levels = dict(core.db_fetchall("SELECT id, quantite_stock FROM pieces"))
+    core.init_db()
+    ledger = dict(core.db_fetchall('''SELECT piece_id, SUM(CASE kind WHEN 'out' THEN -quantite
+                                                                   WHEN 'reserve' THEN 0 WHEN 'release' THEN 0
+                                                                   ELSE quantite END)
+                                      FROM stock_movements GROUP BY piece_id'''))
+    assert dict(core.db_fetchall("SELECT id, quantite_stock FROM pieces")) == levels
+    assert {part_id: ledger.get(part_id, 0) for part_id in levels} == levels
+
+def test_legacy_sensitive_columns_are_encrypted(legacy_db):
+    plain = core.db_fetchall("SELECT id, identifiant_acheteur, notes FROM equipements ORDER BY id")
+    core.init_db()
+    stored = core.db_fetchall("SELECT identifiant_acheteur, notes FROM equipements ORDER BY id")
+    assert any(notes for buyer, notes in stored)
+    for buyer, notes in stored:
+        assert not buyer or isinstance(buyer, bytes)
+        assert not notes or isinstance(notes, bytes)
+    for equipment_id, buyer, notes in plain:
+        assert core.equipment_service.get(equipment_id)[6:8] == (buyer, notes)
+
+def test_legacy_details_get_a_preview(legacy_db):
+    plain = dict(core.db_fetchall("SELECT id, details_reparation FROM interventions"))
+    core.init_db()
+    previews = dict(core.db_fetchall("SELECT id, details_apercu FROM interventions"))
+    assert previews.keys() == plain.keys()
+    for intervention_id, details in plain.items():
+        assert core.decrypt_value(previews[intervention_id]) == core.text_preview(details)
+
+def test_kpi_summaries_ignore_interventions_without_equipment(db, equipment):
+    core.intervention_service.create(None, "2025-01-10", "", "", "Alice", 50.0, [])
+    core.intervention_service.create(equipment, "2025-01-11", "", "", "Alice", 20.0, [])
+    assert core.db_fetchall("SELECT equipement_id FROM kpi_equipment") == [(equipment,)]
+    assert core.db_fetchone("SELECT interventions FROM kpi_technician WHERE technicien='Alice'")[0] == 2
+
+def test_kpi_math():
+    # 4 failures, 6 days in repair over 100 days observed
+    assert core.compute_kpis(4, 2, 6, 100) == (3.0, 23.5, 94.0)
+    assert core.compute_kpis(0, 0, 0, None) == (None, None, None)
+    # Repairs longer than the period observed leave no uptime
+    assert core.compute_kpis(1, 1, 10, 5) == (10.0, 0.0, 0.0)
+
+def kpi_snapshot():
+    # Triggers leave emptied rows at zero where a rebuild drops them
+    return (core.db_fetchall("SELECT * FROM kpi_equipment WHERE interventions > 0 ORDER BY 1"),
+            core.db_fetchall("SELECT * FROM kpi_technician WHERE interventions > 0 ORDER BY 1"))
+
+def test_kpi_summaries_follow_updates_and_deletes(db, equipment):
+    service = core.intervention_service
+    first = service.create(equipment, "2025-01-10", "2025-01-14", "", "Alice", 100.0, [])
+    second = service.create(equipment, "2025-02-01", "2025-02-03", "", "Alice", 50.0, [])
+    third = service.create(equipment, "2025-03-01", "", "", "Bob", 30.0, [])
+    # Still in the workshop: counted, but not as a repair
+    assert core.kpi_service.technicians() == [("Alice", 2, 3.0, 150.0, 75.0), ("Bob", 1, None, 30.0, 30.0)]
+    assert core.kpi_service.overview()['mttr'] == 3.0
+    
+    service.update(second, "2025-02-01", "2025-02-09", "", "Bob", 50.0, [])
+    assert core.kpi_service.technicians() == [("Bob", 2, 8.0, 80.0, 40.0), ("Alice", 1, 4.0, 100.0, 100.0)]
+    service.update(third, "2025-03-01", "2025-03-02", "", "Bob", 30.0, [])
+    service.delete(first)
+    assert core.kpi_service.technicians() == [("Bob", 2, 4.5, 80.0, 40.0)]
+    overview = core.kpi_service.overview()
+    assert (overview['interventions'], overview['mttr'], overview['total_cost']) == (2, 4.5, 80.0)
+    
+    # The running totals match a rebuild from the interventions
+    maintained = kpi_snapshot()
+    with core.db_transaction() as c:
+        core.rebuild_kpi_summaries(c)
+    assert kpi_snapshot() == maintained
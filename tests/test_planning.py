@@ -0,0 +1,77 @@
+import sqlite3
+from datetime import date
+
+from gmao import core, scheduler
+from gmao.core import planning_service
+from gmao.scheduler import balance_tasks
+
+def locked(*args, **kwargs):
+    raise sqlite3.OperationalError("database is locked")
+
+def test_plan_expands_into_occurrences(equipment):
+    plan_id = planning_service.create_plan(equipment, None, None, "Graissage", "Alice", 1, 'mois',
+                                           date.today().isoformat(), "")
+    dates = [row[0] for row in core.db_fetchall("SELECT date_prevue FROM planification WHERE plan_id=?", (plan_id,))]
+    assert len(dates) >= 3
+    assert planning_service.generate_occurrences() == 0
+
+def test_busy_generation_does_not_duplicate_the_plan(equipment, monkeypatch):
+    monkeypatch.setattr(planning_service, 'generate_occurrences', locked)
+    planning_service.create_plan(equipment, None, None, "Graissage", "Alice", 1, 'mois', date.today().isoformat(), "")
+    assert core.db_fetchone("SELECT COUNT(*) FROM plans_maintenance")[0] == 1
+    monkeypatch.undo()
+    # Left for the scheduler's next pass
+    assert planning_service.generate_occurrences() > 0
+
+def test_busy_generation_does_not_duplicate_the_reading(equipment, monkeypatch):
+    monkeypatch.setattr(planning_service, 'generate_occurrences', locked)
+    planning_service.record_hours(equipment, date.today().isoformat(), 120)
+    assert core.db_fetchone("SELECT COUNT(*) FROM releves_compteur")[0] == 1
+
+MONDAY = date(2025, 3, 3)
+
+def task(task_id, due, technician="", duration=4, status='Planifié'):
+    return (task_id, due, technician, duration, status, 1)
+
+def test_balancing_respects_daily_capacity():
+    tasks = [task(1, "2025-03-03"), task(2, "2025-03-03"), task(3, "2025-03-03"), task(4, "2025-03-03"),
+             task(5, "2025-03-08", duration=12)]
+    changes, unplaced = balance_tasks(tasks, {"Alice": 8, "Bob": 4}, MONDAY)
+    # Least booked first; when both are full the task moves to the next day, and
+    # a task due on a Saturday to the Monday, even if longer than a day
+    assert changes == [(1, "2025-03-03", "Alice"), (2, "2025-03-03", "Bob"), (3, "2025-03-03", "Alice"),
+                       (4, "2025-03-04", "Bob"), (5, "2025-03-10", "Alice")]
+    assert unplaced == []
+
+def test_balancing_keeps_fixed_tasks_and_reports_unplaced():
+    tasks = [task(1, "2025-03-03", "Alice", 2, 'En cours'), task(2, "2025-03-03", "Alice", 6),
+             task(3, "2025-03-03", "Carl"), task(4, "2025-03-03")]
+    changes, unplaced = balance_tasks(tasks, {"Alice": 8}, MONDAY, max_shift_days=0)
+    # Alice's own tasks fill her day; the one left to someone gone is taken
+    # over like the unassigned one, which no longer fits
+    assert changes == []
+    assert unplaced == [3, 4]
+    changes, unplaced = balance_tasks(tasks, {"Alice": 8}, MONDAY, max_shift_days=1)
+    assert changes == [(3, "2025-03-04", "Alice"), (4, "2025-03-04", "Alice")]
+    # Reassigning moves the planned ones, longest first, but not the one in progress
+    changes, unplaced = balance_tasks(tasks, {"Alice": 8, "Bob": 8}, MONDAY, reassign=True)
+    assert changes == [(2, "2025-03-03", "Bob"), (3, "2025-03-03", "Alice"), (4, "2025-03-04", "Alice")]
+
+def test_schedule_is_written_once_per_version(equipment):
+    scheduler.save_technician("Alice", 8)
+    ids = [planning_service.create(equipment, "2025-03-03", "Graissage", "", 'Planifié', "", 4) for _ in range(3)]
+    changes, unplaced, tasks = scheduler.propose_schedule(today=MONDAY)
+    assert changes == [(ids[0], "2025-03-03", "Alice"), (ids[1], "2025-03-03", "Alice"),
+                       (ids[2], "2025-03-04", "Alice")]
+    versions = {task_id: tasks[task_id][5] for task_id in tasks}
+    # Edited in the meantime: left as the user saved it
+    planning_service.update(ids[2], "2025-03-05", "Graissage", "", 'Planifié', "Urgent", duration=4)
+    assert scheduler.apply_schedule(changes, versions) == 2
+    saved = {task_id: planning_service.get(task_id) for task_id in ids}
+    assert [(row[0], row[2], row[4]) for row in saved.values()] == [
+        ("2025-03-03", "Alice", ""), ("2025-03-03", "Alice", ""), ("2025-03-05", "", "Urgent")]
+    assert all(saved[task_id][5] == versions[task_id] + 1 for task_id in ids)
+    assert core.db_fetchone('''SELECT COUNT(*) FROM audit_log
+                               WHERE table_name='planification' AND action='update' ''')[0] == 3
+    # Applying the same proposal again changes nothing
+    assert scheduler.apply_schedule(changes, versions) == 0
@@ -0,0 +1,18 @@
+import pytest
+
+from gmao import core
+
+def test_hot_queries_use_indexes(db):
+    assert core.check_query_plans() == []
+
+def test_hot_queries_use_indexes_after_legacy_upgrade(legacy_db):
+    core.init_db()
+    assert core.check_query_plans() == []
+
+@pytest.mark.parametrize("query, params", core.HOT_QUERIES)
+def test_hot_query_runs(db, query, params):
+    core.db_fetchall(query, params)
+
+def test_check_reports_a_table_scan(db, monkeypatch):
+    monkeypatch.setattr(core, 'HOT_QUERIES', [("SELECT id FROM interventions WHERE technicien=?", ("Alice",))])
+    assert [detail for query, detail in core.check_query_plans()] == ["SCAN interventions"]
@@ -0,0 +1,102 @@
+from gmao import core
+from gmao.core import equipment_service, intervention_service
+from gmao.importer import import_rows
+
+DETAILS = "Remplacement du roulement et des charbons moteur, nettoyage complet du mandrin"
+
+def search(text, fuzzy=False):
+    return [(kind, extract) for kind, _, _, _, _, extract in equipment_service.search(text, fuzzy=fuzzy)]
+
+def test_encrypted_words_are_searchable(equipment):
+    intervention_service.create(equipment, "2025-02-01", None, DETAILS, "Alice", 0, [])
+    assert search("charbons") == [
+        ('Intervention', "Remplacement du roulement et des [charbons] moteur, nettoyage complet du mandrin")]
+    assert search("garantie") == [('Équipement', "Sous [garantie]")]
+    assert search("alice CHARBONS") == [('Intervention', "[Alice]")]
+    # Whole words only: the index holds keyed tokens, not the words
+    assert search("charb") == []
+    tokens = core.db_fetchone("SELECT mots_hash FROM interventions")[0]
+    assert "charbons" not in tokens and len(tokens.split()) == 10
+    assert "mots_hash" not in core.db_fetchone("SELECT changes FROM audit_log WHERE table_name='interventions'")[0]
+
+def test_updated_details_are_searchable(equipment):
+    intervention_id = intervention_service.create(equipment, "2025-02-01", None, DETAILS, "Alice", 0, [])
+    intervention_service.update(intervention_id, "2025-02-01", None, "Changement interrupteur", "Alice", 0, [])
+    assert search("charbons") == []
+    assert search("interrupteur") == [('Intervention', "Changement [interrupteur]")]
+
+def test_long_details_are_cut_around_the_match():
+    words = [f"mot{i}" for i in range(40)]
+    assert core.word_excerpt(" ".join(words), {"mot20"}) == "…" + " ".join(words[18:20]) + " [mot20] " + \
+        " ".join(words[21:30]) + "…"
+
+def test_vocabulary_leaves_word_tokens_out(equipment):
+    intervention_service.create(equipment, "2025-02-01", None, DETAILS, "Alice", 0, [])
+    core.search_vocabulary.invalidate()
+    assert core.search_vocabulary.load() == 4  # bosch, gsr, 18, alice
+    assert [kind for kind, extract in search("bosh gsr", fuzzy=True)] == ['Équipement']
+
+def test_legacy_fernet_values_are_rewritten(workdir, monkeypatch):
+    monkeypatch.setattr(core, 'MIGRATIONS', core.MIGRATIONS[:16])
+    core.init_db()
+    with core.db_transaction() as c:
+        # As written by migration 15 and the services before 17
+        c.execute("INSERT INTO equipements (numero_serie, marque, modele, notes) VALUES ('SN-1', 'Bosch', 'GSR', ?)",
+                  (core.encrypt_data("Sous garantie"),))
+        c.execute('''INSERT INTO interventions (equipement_id, date_entree, details_reparation, technicien, cout)
+                     VALUES (?, '2025-02-01', ?, 'Alice', 0)''', (c.lastrowid, core.encrypt_data(DETAILS)))
+    monkeypatch.undo()
+    core.init_db()
+    assert core.get_schema_version() == core.MIGRATIONS[-1][0]
+    token = core.db_fetchone("SELECT details_reparation FROM interventions")[0]
+    assert token[:1] == core.COLUMN_TOKEN_VERSION
+    assert intervention_service.get(1)[4] == DETAILS
+    assert [kind for kind, extract in search("charbons")] == ['Intervention']
+    assert equipment_service.get(1)[7] == "Sous garantie"
+
+def serials(rows):
+    return [row[0] for row in rows]
+
+def test_equipment_index_prefix_lookup(db):
+    for serial, brand, model in (("SN-100", "Makita", "DHP482"), ("SN-101", "Makita", "DHP483"),
+                                 ("AB-7", "Hilti", "TE 30"), ("MA-1", "Metabo", "SB 18")):
+        equipment_service.create(serial, brand, model, None, None, None, None)
+    index = core.EquipmentIndex()
+    assert index.load() == 4
+    assert serials(index.suggest("sn-10")) == ["SN-100", "SN-101"]
+    # Serial numbers first, then brands and models, each equipment once
+    assert serials(index.suggest("ma")) == ["MA-1", "SN-100", "SN-101"]
+    assert serials(index.suggest("dhp483")) == ["SN-101"]
+    assert serials(index.suggest("MÉTA")) == ["MA-1"]
+    assert serials(index.suggest("sn", limit=1)) == ["SN-100"]
+    assert index.suggest("  ") == [] and index.suggest("xyz") == []
+    assert serials(index.closest("SN-109")) == ["SN-100", "SN-101"]
+
+def test_equipment_index_follows_new_equipment(db, monkeypatch):
+    equipment_service.create("SN-100", "Makita", "DHP482", None, None, None, None)
+    index = core.equipment_index
+    index.load()
+    equipment_service.create("SN-102", "Festool", "TS 55", None, None, None, None)
+    assert serials(index.suggest("sn")) == ["SN-100", "SN-102"]
+    # Added once, even when reported twice
+    index.add("SN-102", "Festool", "TS 55")
+    assert index._label_keys.count("festool") == 1
+    
+    # Created while the table is being read: kept when the load finishes
+    fetchall = core.db_fetchall
+    
+    def read_then_create(*args):
+        rows = fetchall(*args)
+        equipment_service.create("SN-103", "Festool", "TS 60", None, None, None, None)
+        return rows
+    
+    with monkeypatch.context() as patch:
+        patch.setattr(core, 'db_fetchall', read_then_create)
+        assert index.load() == 2
+    assert serials(index.suggest("sn")) == ["SN-100", "SN-102", "SN-103"]
+    
+    # Imports write behind the index's back and are picked up by the reload
+    import_rows('equipements', [(2, {'numero_serie': "SN-104", 'marque': "Bosch", 'modele': "GSR"})])
+    assert serials(index.suggest("bosch")) == []
+    index.load()
+    assert serials(index.suggest("bosch")) == ["SN-104"]
@@ -0,0 +1,82 @@
+import sqlite3
+
+import pytest
+
+from gmao import core
+from gmao.core import stock_service, intervention_service
+
+def level(part_id):
+    return core.db_fetchone("SELECT quantite_stock, quantite_reservee FROM pieces WHERE id=?", (part_id,))
+
+def ledger(part_id):
+    return core.db_fetchone('''SELECT SUM(CASE kind WHEN 'in' THEN quantite WHEN 'adjust' THEN quantite
+                                                     WHEN 'out' THEN -quantite ELSE 0 END)
+                               FROM stock_movements WHERE piece_id=?''', (part_id,))[0]
+
+def used(part_id, qty, reservation=None):
+    piece = {'piece_id': part_id, 'qty': qty, 'total_cost': qty * 12.5}
+    if reservation:
+        piece['reservation'] = reservation
+    return piece
+
+def test_every_change_goes_through_the_ledger(part, equipment):
+    stock_service.receive(part, 5)
+    intervention_id = intervention_service.create(equipment, "2025-02-01", "", "", "Alice", 0, [used(part, 3)])
+    assert level(part) == (12, 0)
+    intervention_service.update(intervention_id, "2025-02-01", "", "", "Alice", 0, [used(part, 1)])
+    assert level(part) == (14, 0)
+    intervention_service.delete(intervention_id)
+    assert level(part) == (15, 0)
+    row = stock_service.get_part(part)
+    stock_service.update_part(part, *row[:4], 9, row[5], row[6], row[7])
+    assert level(part) == (9, 0)
+    assert ledger(part) == 9
+
+def test_movement_history_levels(part, equipment):
+    stock_service.receive(part, 5)
+    intervention_service.create(equipment, "2025-02-01", "", "", "Alice", 0, [used(part, 4)])
+    page = stock_service.movements(part)
+    assert [(kind, quantity, after) for _, _, kind, quantity, after, _, _ in page] == [
+        ('out', 4, 11), ('in', 5, 15), ('in', 10, 10)]
+
+def test_stock_cannot_go_negative(part, equipment):
+    with pytest.raises(sqlite3.IntegrityError):
+        intervention_service.create(equipment, "2025-02-01", "", "", "Alice", 0, [used(part, 11)])
+    assert level(part) == (10, 0)
+    assert core.db_fetchone("SELECT COUNT(*) FROM interventions")[0] == 0
+
+def test_reservations_cannot_oversell(part):
+    stock_service.reserve(part, 6, "first")
+    assert stock_service.get_stock_level(part) == 4
+    with pytest.raises(sqlite3.IntegrityError):
+        stock_service.reserve(part, 5, "second")
+    assert level(part) == (10, 6)
+    stock_service.reserve(part, 4, "third")
+    assert stock_service.get_stock_level(part) == 0
+
+def test_reserved_stock_is_consumed_once(part, equipment):
+    stock_service.reserve(part, 3, "form-1")
+    intervention_service.create(equipment, "2025-02-01", "", "", "Alice", 0, [used(part, 3, "form-1")])
+    assert level(part) == (7, 0)
+    # Releasing after the save (form closed) must not give the stock back twice
+    stock_service.release(["form-1"])
+    assert level(part) == (7, 0)
+
+def test_release_is_idempotent(part):
+    stock_service.reserve(part, 2, "form-1")
+    stock_service.release(["form-1"])
+    stock_service.release(["form-1"])
+    assert level(part) == (10, 0)
+
+def test_expired_reservations_are_released(part):
+    stock_service.reserve(part, 1, "open-form")
+    with core.db_transaction() as c:
+        c.execute('''INSERT INTO stock_movements (piece_id, kind, quantite, reservation_id, motif, created_at)
+                     VALUES (?, 'reserve', 2, 'abandoned', 'Sélection', datetime('now', '-9 hours'))''', (part,))
+    assert stock_service.release_expired_reservations() == 1
+    assert level(part) == (10, 1)
+
+def test_catalogue_follows_reservations(part):
+    assert core.parts_catalogue.rows()[0][0][4] == 10
+    stock_service.reserve(part, 4, "form-1")
+    assert core.parts_catalogue.rows()[0][0][4] == 6
@@ -0,0 +1,79 @@
+import hashlib
+import sqlite3
+
+from gmao import core
+
+def legacy_user(password):
+    # Accounts created before the salted hashes store an unsalted sha256
+    user_id = core.user_service.create("alice", password, 'technicien', [0] * len(core.PERMISSION_KEYS))
+    with core.db_transaction() as c:
+        c.execute("UPDATE users SET password_hash=? WHERE id=?",
+                  (hashlib.sha256(password.encode()).hexdigest(), user_id))
+    return user_id
+
+def rehash_entries(user_id):
+    return core.db_fetchall('''SELECT user_id FROM audit_log
+                               WHERE table_name='users' AND action='update' AND row_id=?''', (user_id,))
+
+def test_legacy_hash_is_upgraded_on_login(db):
+    user_id = legacy_user("secret")
+    legacy_hash = core.db_fetchone("SELECT password_hash FROM users WHERE id=?", (user_id,))[0]
+    assert core.user_service.authenticate("alice", "secret")['id'] == user_id
+    stored = core.db_fetchone("SELECT password_hash FROM users WHERE id=?", (user_id,))[0]
+    assert stored != legacy_hash
+    assert core.verify_password_hash("secret", stored) == (True, False)
+    # Nobody is logged in yet: the entry is attributed to the user logging in
+    assert rehash_entries(user_id) == [(user_id,)]
+
+def test_busy_rehash_is_retried(db, monkeypatch):
+    user_id = legacy_user("secret")
+    monkeypatch.setattr(core, 'DB_RETRY_BASE_DELAY', 0)
+    transaction = core.db_transaction
+    calls = []
+    
+    def locked_once():
+        calls.append(1)
+        if len(calls) == 1:
+            raise sqlite3.OperationalError("database is locked")
+        return transaction()
+    
+    monkeypatch.setattr(core, 'db_transaction', locked_once)
+    assert core.user_service.authenticate("alice", "secret")['id'] == user_id
+    assert len(calls) == 2
+    stored = core.db_fetchone("SELECT password_hash FROM users WHERE id=?", (user_id,))[0]
+    assert core.verify_password_hash("secret", stored) == (True, False)
+    assert rehash_entries(user_id) == [(user_id,)]
+
+def granted(user_id):
+    return [key for key, value in core.get_user_permissions(user_id).items() if value]
+
+def test_role_change_invalidates_cached_permissions(db, monkeypatch):
+    user_id = core.user_service.create("bob", "secret", 'user', core.default_permissions('user'))
+    assert granted(user_id) == ['can_view_interventions', 'can_view_stock']
+    # Written behind the cache's back: served from the cache until the TTL
+    with core.db_transaction() as c:
+        c.execute("UPDATE permissions SET can_view_stock=0 WHERE user_id=?", (user_id,))
+    assert granted(user_id) == ['can_view_interventions', 'can_view_stock']
+    with monkeypatch.context() as patch:
+        patch.setattr(core, 'PERMISSION_CACHE_TTL', 0)
+        assert granted(user_id) == ['can_view_interventions']
+    
+    core.user_service.update(user_id, 'admin', core.default_permissions('admin'))
+    assert granted(user_id) == list(core.PERMISSION_KEYS)
+    core.user_service.delete(user_id)
+    assert granted(user_id) == ['can_view_interventions', 'can_view_stock']
+
+def test_permissions_read_during_a_change_are_not_cached(db, monkeypatch):
+    user_id = core.user_service.create("bob", "secret", 'user', core.default_permissions('user'))
+    load = core.permission_cache._load
+    
+    def changed_while_loading(user_id):
+        permissions = load(user_id)
+        core.user_service.update(user_id, 'admin', core.default_permissions('admin'))
+        return permissions
+    
+    # The caller gets what it read, but the next one reads again
+    with monkeypatch.context() as patch:
+        patch.setattr(core.permission_cache, '_load', changed_while_loading)
+        assert granted(user_id) == ['can_view_interventions', 'can_view_stock']
+    assert granted(user_id) == list(core.PERMISSION_KEYS)